@@ -0,0 +1,330 @@
+"""
+Intermediate representation of a converted document.
+
+The converters in file_to_markdown.py parse a file once into a Document: a flat
+list of Blocks, each with a kind, a heading or list level, the page or slide it
+came from, its text, and an image path or table cells. Markdown and chunks are
+derived from the Document, and it round-trips through a compact gzipped JSON
+file, so consumers that need the document again never reopen it with PyMuPDF,
+python-docx or python-pptx.
+
+UnitCache keeps the blocks of single pages and slides by a hash of their source
+content, so a lightly edited version of a file only reconverts what changed.
+Both caches can be given a size in bytes; past it, the least recently used
+entries are deleted.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+FORMAT_VERSION = 1
+
+# Block kinds
+HEADING = "h"
+PARAGRAPH = "p"
+LIST_ITEM = "li"
+TABLE = "table"
+IMAGE = "img"
+PAGE_BREAK = "break"
+BLANK = "blank"  # an empty line, kept so rendering reproduces the converters' spacing exactly
+
+
+class Block:
+    """One unit of content.
+
+    level is the heading level or list indent. page is the 1-based page or slide
+    number, or 0 for formats without pages (.docx). text is the text, or the alt
+    text of an image. ref is the image path of an IMAGE, or the rows of cells of
+    a TABLE (the first row is the header).
+    """
+
+    __slots__ = ("kind", "text", "level", "page", "ref")
+
+    def __init__(self, kind, text="", level=0, page=0, ref=None):
+        self.kind = kind
+        self.text = text
+        self.level = level
+        self.page = page
+        self.ref = ref
+
+    def lines(self):
+        """Markdown lines for this block."""
+        if self.kind == HEADING:
+            return ['#' * self.level + ' ' + self.text]
+        if self.kind == LIST_ITEM:
+            return ['  ' * self.level + '- ' + self.text]
+        if self.kind == TABLE:
+            lines = []
+            for i, cells in enumerate(self.ref):
+                lines.append('| ' + ' | '.join(cells) + ' |')
+                if i == 0:
+                    lines.append('| ' + ' | '.join(['---'] * len(cells)) + ' |')
+            return lines
+        if self.kind == IMAGE:
+            return [f"![{self.text}]({self.ref})"]
+        if self.kind == PAGE_BREAK:
+            return ['\n---\n']
+        if self.kind == BLANK:
+            return ['']
+        return [self.text]
+
+    def to_list(self):
+        # Positional and with trailing defaults dropped; most blocks serialize as [kind, text].
+        fields = [self.kind, self.text, self.level, self.page, self.ref]
+        while len(fields) > 1 and not fields[-1]:
+            fields.pop()
+        return fields
+
+    @classmethod
+    def from_list(cls, fields):
+        return cls(*fields)
+
+    def __repr__(self):
+        return f"Block({self.kind!r}, {self.text!r}, level={self.level}, page={self.page})"
+
+
+class Chunk:
+    """A run of consecutive blocks rendered together, with the pages it spans."""
+
+    __slots__ = ("text", "first_page", "last_page", "start_block", "end_block")
+
+    def __init__(self, text, first_page, last_page, start_block, end_block):
+        self.text = text
+        self.first_page = first_page
+        self.last_page = last_page
+        self.start_block = start_block
+        self.end_block = end_block  # exclusive
+
+    def __repr__(self):
+        return f"Chunk(pages {self.first_page}-{self.last_page}, {len(self.text)} chars)"
+
+
+class Document:
+    """Blocks of one converted file; format is the source extension without the dot.
+
+    units_reused and units_converted count the pages or slides the conversion
+    that built it took from a UnitCache or converted; they are not serialized.
+    """
+
+    __slots__ = ("format", "blocks", "units_reused", "units_converted")
+
+    def __init__(self, format, blocks=None):
+        self.format = format
+        self.blocks = blocks if blocks is not None else []
+        self.units_reused = 0
+        self.units_converted = 0
+
+    def add(self, kind, text="", level=0, page=0, ref=None):
+        self.blocks.append(Block(kind, text, level, page, ref))
+
+    @property
+    def page_count(self):
+        return max((block.page for block in self.blocks), default=0)
+
+    def to_markdown(self):
+        return '\n'.join(line for block in self.blocks for line in block.lines())
+
+    def chunks(self, max_chars=1600):
+        """
+        Split into chunks of at most about max_chars characters.
+
+        A chunk starts at every heading and page break. A longer section is
+        split between blocks, and each piece after the first repeats the
+        section heading so it still reads in isolation.
+        """
+        chunks = []
+        heading = None
+        start, lines, size = 0, [], 0
+
+        def flush(end):
+            text = '\n'.join(lines).strip()
+            if text and (heading is None or text != heading.lines()[0]):
+                pages = [b.page for b in self.blocks[start:end]]
+                chunks.append(Chunk(text, min(pages), max(pages), start, end))
+
+        for i, block in enumerate(self.blocks):
+            block_lines = block.lines()
+            block_size = sum(len(line) + 1 for line in block_lines)
+            if block.kind in (HEADING, PAGE_BREAK) or (lines and size + block_size > max_chars):
+                flush(i)
+                start, lines, size = i, [], 0
+                if block.kind == HEADING:
+                    heading = block
+                elif block.kind == PAGE_BREAK:
+                    heading = None
+                elif heading is not None:
+                    lines = heading.lines()
+                    size = len(lines[0]) + 1
+            if block.kind != PAGE_BREAK:
+                lines.extend(block_lines)
+                size += block_size
+        flush(len(self.blocks))
+        return chunks
+
+    def to_dict(self):
+        return {"version": FORMAT_VERSION, "format": self.format, "blocks": [b.to_list() for b in self.blocks]}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported document IR version: {data.get('version')}")
+        return cls(data["format"], [Block.from_list(fields) for fields in data["blocks"]])
+
+    def dumps(self):
+        """Gzipped compact JSON."""
+        data = json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return gzip.compress(data, mtime=0)
+
+    @classmethod
+    def loads(cls, data):
+        return cls.from_dict(json.loads(gzip.decompress(data)))
+
+    def save(self, path):
+        _write_atomic(path, self.dumps())
+
+    @classmethod
+    def load(cls, path):
+        return cls.loads(Path(path).read_bytes())
+
+
+class _LruFiles:
+    """
+    Size cap for a directory of cache files.
+
+    Reading an entry touches its mtime, so mtime order is use order. Every
+    prune_every writes, the files matching pattern are totalled and the least
+    recently used are deleted until the rest fit in max_bytes (None: no cap).
+    """
+
+    pattern = "*"
+
+    def __init__(self, directory, max_bytes=None, prune_every=1):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._unchecked = prune_every  # the first write checks
+
+    @staticmethod
+    def _touch(path):
+        try:
+            now = time.time()
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+    def _written(self):
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            self._unchecked += 1
+            due = self._unchecked >= self.prune_every
+            if due:
+                self._unchecked = 0
+        if due:
+            self.prune()
+
+    def prune(self, max_bytes=None):
+        """Delete least recently used entries past max_bytes; returns the number deleted."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        if limit is None:
+            return 0
+        entries = []
+        for path in self.directory.glob(self.pattern):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= limit:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+class DocumentCache(_LruFiles):
+    """Documents stored by the SHA-256 of their source file's bytes."""
+
+    pattern = "*.ir.json.gz"
+
+    @staticmethod
+    def digest(content):
+        return hashlib.sha256(content).hexdigest()
+
+    def path(self, digest):
+        return self.directory / f"{digest}.ir.json.gz"
+
+    def get(self, digest):
+        """The cached Document, or None if it is missing or unreadable."""
+        path = self.path(digest)
+        try:
+            document = Document.load(path)
+        except (OSError, ValueError, KeyError, TypeError, EOFError):
+            return None
+        self._touch(path)
+        return document
+
+    def put(self, digest, document):
+        document.save(self.path(digest))
+        self._written()
+
+
+class UnitCache(_LruFiles):
+    """
+    Blocks of single pages or slides, by a hash of the unit's source content.
+
+    Units are shared across documents: the key depends only on the page or
+    slide itself, so a new version of a deck finds the slides it has in common
+    with any earlier upload. Blocks are stored without their page number, and
+    get() stamps the page they are reused at. A conversion writes many units,
+    so the size cap is checked every 64 writes by default.
+    """
+
+    pattern = "*.json"
+
+    def __init__(self, directory, max_bytes=None, prune_every=64):
+        super().__init__(directory, max_bytes, prune_every)
+
+    def path(self, key):
+        return self.directory / f"{key}.json"
+
+    def get(self, key, page=0):
+        """The unit's blocks numbered as page, or None if it is not cached."""
+        path = self.path(key)
+        try:
+            data = json.loads(path.read_bytes())
+            if data.get("version") != FORMAT_VERSION:
+                return None
+            blocks = [Block.from_list(fields) for fields in data["blocks"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        self._touch(path)
+        for block in blocks:
+            block.page = page
+        return blocks
+
+    def put(self, key, blocks):
+        fields = [Block(b.kind, b.text, b.level, 0, b.ref).to_list() for b in blocks]
+        data = {"version": FORMAT_VERSION, "blocks": fields}
+        _write_atomic(self.path(key), json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        self._written()
+
+
+def _write_atomic(path, data):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
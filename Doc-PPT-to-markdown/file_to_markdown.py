@@ -7,17 +7,73 @@ Converts Word (.docx), PDF (.pdf), and PowerPoint (.ppt, .pptx) files to Markdow
 import os
 import sys
 import argparse
+import hashlib
+import io
+import posixpath
+import re
 import tempfile
+import time
 import uuid
+import zipfile
 from pathlib import Path
 
+import document_ir as ir
+from document_ir import Document, DocumentCache, UnitCache  # noqa: F401 (re-exported for callers of this module)
 
-def convert_docx_to_markdown(file_path, image_dir=None):
-    """Convert a Word document (.docx) to Markdown.
+
+class ConversionLimitExceeded(Exception):
+    """A ConversionLimits budget ran out part-way through a conversion."""
+
+    def __init__(self, limit, value, maximum):
+        self.limit = limit  # "pages", "seconds" or "output_chars"
+        self.value = value
+        self.maximum = maximum
+        super().__init__(f"Document exceeds the {limit} limit ({value} > {maximum})")
+
+
+class ConversionLimits:
+    """Budgets for one conversion, checked between pages, slides and body elements.
+
+    A limit left as None is not enforced. The clock starts when the object is
+    created, so create one per conversion.
+    """
+
+    def __init__(self, max_pages=None, max_seconds=None, max_output_chars=None):
+        self.max_pages = max_pages
+        self.max_seconds = max_seconds
+        self.max_output_chars = max_output_chars
+        self._started = time.monotonic()
+        self._output_chars = 0
+        self._counted = 0
+
+    def check(self, page=None, output=None):
+        """Raise ConversionLimitExceeded if over budget.
+
+        page is the 1-based page or slide about to be converted; output is the
+        list of document blocks built so far (only blocks added since the last
+        check are counted, by their rendered Markdown size).
+        """
+        if page is not None and self.max_pages is not None and page > self.max_pages:
+            raise ConversionLimitExceeded("pages", page, self.max_pages)
+        if self.max_seconds is not None:
+            elapsed = time.monotonic() - self._started
+            if elapsed > self.max_seconds:
+                raise ConversionLimitExceeded("seconds", round(elapsed, 1), self.max_seconds)
+        if output is not None and self.max_output_chars is not None:
+            self._output_chars += sum(len(line) + 1 for block in output[self._counted:] for line in block.lines())
+            self._counted = len(output)
+            if self._output_chars > self.max_output_chars:
+                raise ConversionLimitExceeded("output_chars", self._output_chars, self.max_output_chars)
+
+
+def docx_to_document(file_path, image_dir=None, limits=None):
+    """Parse a Word document (.docx) into a Document.
 
     If image_dir is provided, embedded images are exported there and referenced
-    as Markdown images at the end of the document.
+    as image blocks at the end of the document. limits (ConversionLimits)
+    caps conversion time and output size.
     """
+    limits = limits or ConversionLimits()
     try:
         from docx import Document
         from docx.oxml.text.paragraph import CT_P
@@ -27,10 +83,11 @@ def convert_docx_to_markdown(file_path, image_dir=None):
         from docx.opc.constants import RELATIONSHIP_TYPE as RT
         
         doc = Document(file_path)
-        markdown_content = []
+        document = ir.Document('docx')
         
         # Text and tables
         for element in doc.element.body:
+            limits.check(output=document.blocks)
             if isinstance(element, CT_P):
                 paragraph = Paragraph(element, doc)
                 text = paragraph.text.strip()
@@ -40,28 +97,25 @@ def convert_docx_to_markdown(file_path, image_dir=None):
                     if paragraph.style.name.startswith('Heading'):
                         level = paragraph.style.name.replace('Heading ', '')
                         try:
-                            level_num = int(level)
-                            markdown_content.append('#' * level_num + ' ' + text)
+                            document.add(ir.HEADING, text, level=int(level))
                         except ValueError:
-                            markdown_content.append('## ' + text)
+                            document.add(ir.HEADING, text, level=2)
                     # Check for list items
                     elif paragraph.style.name.startswith('List'):
-                        markdown_content.append('- ' + text)
+                        document.add(ir.LIST_ITEM, text)
                     else:
-                        markdown_content.append(text)
+                        document.add(ir.PARAGRAPH, text)
                 else:
-                    markdown_content.append('')
+                    document.add(ir.BLANK)
                     
             elif isinstance(element, CT_Tbl):
                 table = Table(element, doc)
-                markdown_content.append('\n')
-                # Convert table to markdown
-                for i, row in enumerate(table.rows):
-                    cells = [cell.text.strip() for cell in row.cells]
-                    markdown_content.append('| ' + ' | '.join(cells) + ' |')
-                    if i == 0:  # Add separator after header
-                        markdown_content.append('| ' + ' | '.join(['---'] * len(cells)) + ' |')
-                markdown_content.append('\n')
+                document.add(ir.BLANK)
+                document.add(ir.BLANK)
+                document.add(ir.TABLE, ref=[[cell.text.strip() for cell in row.cells] for row in table.rows])
+                document.add(ir.BLANK)
+                document.add(ir.BLANK)
+        limits.check(output=document.blocks)
 
         # Images (export and append as a separate section)
         if image_dir is not None:
@@ -82,52 +136,60 @@ def convert_docx_to_markdown(file_path, image_dir=None):
 
                     rel_path = f"{image_dir_path.name}/{filename}"
                     if images_added == 1:
-                        markdown_content.append('\n## Images\n')
-                    markdown_content.append(f"![Image {images_added}]({rel_path})")
+                        document.add(ir.BLANK)
+                        document.add(ir.HEADING, 'Images', level=2)
+                        document.add(ir.BLANK)
+                    document.add(ir.IMAGE, f"Image {images_added}", ref=rel_path)
         
-        return '\n'.join(markdown_content)
+        return document
     
+    except ConversionLimitExceeded:
+        raise
     except ImportError:
         raise ImportError("python-docx is required for .docx files. Install it with: pip install python-docx")
     except Exception as e:
         raise Exception(f"Error converting DOCX file: {str(e)}")
 
 
-def convert_pdf_to_markdown(file_path, image_dir=None):
-    """Convert a PDF file (.pdf) to Markdown.
+def pdf_to_document(file_path, image_dir=None, limits=None, unit_cache=None):
+    """Parse a PDF file (.pdf) into a Document.
 
     If image_dir is provided, embedded images are exported there and referenced
-    as Markdown images grouped by page.
+    as image blocks on their page. limits (ConversionLimits) caps pages,
+    conversion time and output size. With a unit_cache (document_ir.UnitCache),
+    the text of pages whose content stream and resources (fonts, form and
+    image XObjects, recursively) are unchanged since an earlier conversion is
+    reused instead of extracted again.
     """
+    limits = limits or ConversionLimits()
     try:
         import fitz  # PyMuPDF
         
         doc = fitz.open(file_path)
-        markdown_content = []
+        document = ir.Document('pdf')
         image_dir_path = Path(image_dir) if image_dir is not None else None
-        image_counter = 0
+        object_digests = {}  # shared by the pages' keys: fonts and XObjects are usually used on many pages
         
         for page_num in range(len(doc)):
+            limits.check(page=page_num + 1, output=document.blocks)
             page = doc[page_num]
-            text = page.get_text()
-            
-            if text.strip():
+            number = page_num + 1
+
+            key = _pdf_page_key(page, object_digests) if unit_cache is not None else None
+            blocks = unit_cache.get(key, number) if key is not None else None
+            if blocks is None:
+                blocks = _pdf_text_blocks(page.get_text(), number)
+                document.units_converted += 1
+                if key is not None:
+                    unit_cache.put(key, blocks)
+            else:
+                document.units_reused += 1
+
+            if blocks:
                 # Add page separator (except for first page)
                 if page_num > 0:
-                    markdown_content.append('\n---\n')
-                
-                # Process text and preserve basic formatting
-                lines = text.split('\n')
-                for line in lines:
-                    line = line.strip()
-                    if line:
-                        # Try to detect headings (all caps or short lines)
-                        if line.isupper() and len(line) < 100:
-                            markdown_content.append('## ' + line)
-                        else:
-                            markdown_content.append(line)
-                    else:
-                        markdown_content.append('')
+                    document.add(ir.PAGE_BREAK, page=number)
+                document.blocks.extend(blocks)
 
             # Export images on this page (if requested)
             if image_dir_path is not None:
@@ -138,158 +200,363 @@ def convert_pdf_to_markdown(file_path, image_dir=None):
                         xref = img[0]
                         img_dict = doc.extract_image(xref)
                         ext = img_dict.get("ext", "png")
-                        image_counter += 1
-                        filename = f"page{page_num + 1}_image{img_index}.{ext}"
+                        filename = f"page{number}_image{img_index}.{ext}"
                         image_path = image_dir_path / filename
                         with open(image_path, "wb") as f:
                             f.write(img_dict["image"])
                         rel_path = f"{image_dir_path.name}/{filename}"
-                        markdown_content.append(f"![Page {page_num + 1} Image {img_index}]({rel_path})")
+                        document.add(ir.IMAGE, f"Page {number} Image {img_index}", page=number, ref=rel_path)
         
         doc.close()
-        return '\n'.join(markdown_content)
+        limits.check(output=document.blocks)
+        return document
     
+    except ConversionLimitExceeded:
+        raise
     except ImportError:
         raise ImportError("PyMuPDF is required for .pdf files. Install it with: pip install PyMuPDF")
     except Exception as e:
         raise Exception(f"Error converting PDF file: {str(e)}")
 
 
-def convert_pptx_to_markdown(file_path, image_dir=None):
-    """Convert a PowerPoint presentation (.pptx) to Markdown.
+def _pdf_text_blocks(text, number):
+    """Blocks for the extracted text of one page (none if it has no text)."""
+    blocks = []
+    if text.strip():
+        # Process text and preserve basic formatting
+        lines = text.split('\n')
+        for line in lines:
+            line = line.strip()
+            if line:
+                # Try to detect headings (all caps or short lines)
+                if line.isupper() and len(line) < 100:
+                    blocks.append(ir.Block(ir.HEADING, line, level=2, page=number))
+                else:
+                    blocks.append(ir.Block(ir.PARAGRAPH, line, page=number))
+            else:
+                blocks.append(ir.Block(ir.BLANK, page=number))
+    return blocks
+
+
+_PDF_REF_RE = re.compile(r"\b(\d+) \d+ R\b")
+
+
+def _pdf_page_key(page, object_digests):
+    """Unit cache key of a page: its decompressed content stream and everything its resources reach.
+
+    Text drawn by a form XObject (`/Fm0 Do`) is not in the page's own stream,
+    so the resources are hashed recursively: every object they refer to, with
+    its stream, down to font files and image data. Object numbers are replaced
+    by the digest of the object they refer to, since a re-exported PDF
+    renumbers everything. object_digests memoizes the object digests for the
+    pages of one document.
+    """
+    doc = page.parent
+    digest = hashlib.sha256(page.read_contents())
+    xref = page.xref
+    while xref:  # resources may be inherited from the page tree
+        kind, value = doc.xref_get_key(xref, "Resources")
+        if kind != "null":
+            digest.update(_pdf_source_digest(doc, value, object_digests).encode('ascii'))
+            break
+        kind, value = doc.xref_get_key(xref, "Parent")
+        xref = int(value.split()[0]) if kind == "xref" else 0
+    return f"pdf{ir.FORMAT_VERSION}-{digest.hexdigest()}"
+
+
+def _pdf_source_digest(doc, source, object_digests):
+    """Digest of PDF object source with each indirect reference replaced by the referenced object's digest."""
+    resolved = _PDF_REF_RE.sub(lambda m: _pdf_object_digest(doc, int(m.group(1)), object_digests), source)
+    return hashlib.sha256(resolved.encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+def _pdf_object_digest(doc, xref, object_digests):
+    if xref in object_digests:
+        return object_digests[xref]
+    object_digests[xref] = "cycle"  # stands in for a reference back to an object being hashed
+    source = doc.xref_object(xref, compressed=True)
+    digest = hashlib.sha256(_pdf_source_digest(doc, source, object_digests).encode('ascii'))
+    if doc.xref_is_stream(xref):
+        digest.update(doc.xref_stream_raw(xref) or b'')
+    object_digests[xref] = digest.hexdigest()
+    return object_digests[xref]
+
+
+def pptx_to_document(file_path, image_dir=None, limits=None, unit_cache=None):
+    """Parse a PowerPoint presentation (.pptx) into a Document.
 
     If image_dir is provided, slide images are exported there and referenced
-    as Markdown images near their slide content.
+    as image blocks near their slide content. limits (ConversionLimits)
+    caps slides, conversion time and output size. With a unit_cache
+    (document_ir.UnitCache) and no image_dir, slides whose XML and related
+    parts are unchanged since an earlier conversion are reused instead of
+    converted again.
     """
+    limits = limits or ConversionLimits()
+    if image_dir is not None:
+        # Exported images are numbered across the whole deck, so slides are not independent units.
+        unit_cache = None
     try:
         from pptx import Presentation
         
-        prs = Presentation(file_path)
-        markdown_content = []
+        document = ir.Document('pptx')
         image_dir_path = Path(image_dir) if image_dir is not None else None
         image_counter = 0
+
+        if unit_cache is None:
+            prs = Presentation(file_path)
+            keys = [None] * len(prs.slides)
+            cached = [None] * len(prs.slides)
+        else:
+            # Slides are hashed from the raw package; python-pptx only loads the ones not in the cache.
+            with zipfile.ZipFile(file_path) as package:
+                slide_parts = _pptx_slide_parts(package)
+                part_digests = {}
+                keys = [_pptx_slide_key(package, part, part_digests) for part in slide_parts]
+                cached = [unit_cache.get(key, slide_num) for slide_num, key in enumerate(keys, 1)]
+                changed = [part for part, blocks in zip(slide_parts, cached) if blocks is None]
+                if len(changed) == len(slide_parts):
+                    prs = Presentation(file_path)
+                elif changed:
+                    prs = Presentation(_pptx_subset(package, slide_parts, changed))
+                else:
+                    prs = None
+        slides = iter(prs.slides) if prs is not None else iter(())
         
-        for slide_num, slide in enumerate(prs.slides, 1):
+        for slide_num, (key, blocks) in enumerate(zip(keys, cached), 1):
+            limits.check(page=slide_num, output=document.blocks)
             # Add slide header
-            markdown_content.append(f'\n## Slide {slide_num}\n')
+            document.add(ir.BLANK, page=slide_num)
+            document.add(ir.HEADING, f'Slide {slide_num}', level=2, page=slide_num)
+            document.add(ir.BLANK, page=slide_num)
             
-            # Process all shapes in the slide
-            for shape in slide.shapes:
-                # Tables -> Markdown tables
-                if hasattr(shape, "has_table") and shape.has_table:
-                    table = shape.table
-                    markdown_content.append('')
-                    for row_idx, row in enumerate(table.rows):
-                        cells = [cell.text.replace('\n', ' ').strip() for cell in row.cells]
-                        markdown_content.append('| ' + ' | '.join(cells) + ' |')
-                        if row_idx == 0:
-                            markdown_content.append('| ' + ' | '.join(['---'] * len(cells)) + ' |')
-                    markdown_content.append('')
-                    # Skip generic text handling for table shapes
-                    continue
-
-                # Charts -> Markdown tables of chart data (best effort)
-                if hasattr(shape, "has_chart") and shape.has_chart:
-                    chart = shape.chart
-                    markdown_content.append('')
-
-                    # Get categories if available
-                    categories = []
-                    try:
-                        plot = chart.plots[0]
-                        if plot.categories is not None:
-                            for c in plot.categories:
-                                # category objects may have .label or be basic types
-                                label = getattr(c, "label", None)
-                                categories.append(str(label if label is not None else c))
-                    except Exception:
-                        categories = []
-
-                    # Build header: Category + each series name
-                    headers = ['Category']
-                    for series in chart.series:
-                        headers.append(series.name if series.name is not None else 'Series')
-
-                    markdown_content.append('| ' + ' | '.join(headers) + ' |')
-                    markdown_content.append('| ' + ' | '.join(['---'] * len(headers)) + ' |')
-
-                    # Build rows
-                    num_points = 0
-                    if chart.series:
-                        num_points = len(chart.series[0].values)
-
-                    for idx in range(num_points):
-                        if categories and idx < len(categories):
-                            row = [categories[idx]]
-                        else:
-                            row = [f'Point {idx + 1}']
-
-                        for series in chart.series:
-                            try:
-                                val = series.values[idx]
-                            except Exception:
-                                val = ''
-                            row.append(str(val))
-
-                        markdown_content.append('| ' + ' | '.join(row) + ' |')
-
-                    markdown_content.append('')
-                    # Skip generic text handling for chart shapes
-                    continue
-
-                # Export picture shapes as images
-                if image_dir_path is not None and hasattr(shape, "image"):
-                    image = shape.image
-                    if image is not None:
-                        image_dir_path.mkdir(parents=True, exist_ok=True)
-                        image_counter += 1
-                        ext = image.ext or "png"
-                        filename = f"slide{slide_num}_image{image_counter}.{ext}"
-                        image_path = image_dir_path / filename
-                        with open(image_path, "wb") as f:
-                            f.write(image.blob)
-                        rel_path = f"{image_dir_path.name}/{filename}"
-                        markdown_content.append(f"![Slide {slide_num} Image {image_counter}]({rel_path})")
-
-                # Text handling
-                if hasattr(shape, "text") and shape.text.strip():
-                    text = shape.text.strip()
-                    
-                    # Check if it's a title (usually first shape or specific shape type)
-                    if shape == slide.shapes[0] or (hasattr(shape, 'is_placeholder') and 
-                                                     shape.is_placeholder and 
-                                                     shape.placeholder_format.idx == 0):
-                        markdown_content.append('### ' + text)
-                    else:
-                        # Check for bullet points
-                        if hasattr(shape, 'text_frame'):
-                            for paragraph in shape.text_frame.paragraphs:
-                                para_text = paragraph.text.strip()
-                                if para_text:
-                                    # Check if it's a bullet point
-                                    if paragraph.level > 0 or para_text.startswith('•') or para_text.startswith('-'):
-                                        indent = '  ' * paragraph.level
-                                        markdown_content.append(indent + '- ' + para_text.lstrip('•- '))
-                                    else:
-                                        markdown_content.append(para_text)
-                        else:
-                            markdown_content.append(text)
+            if blocks is None:
+                start = len(document.blocks)
+                image_counter = _add_pptx_slide(document, next(slides), slide_num, image_dir_path, image_counter, limits)
+                document.units_converted += 1
+                if key is not None:
+                    unit_cache.put(key, document.blocks[start:])
+            else:
+                document.blocks.extend(blocks)
+                document.units_reused += 1
             
-            markdown_content.append('')  # Add blank line between slides
+            document.add(ir.BLANK, page=slide_num)  # Add blank line between slides
         
-        return '\n'.join(markdown_content)
+        limits.check(output=document.blocks)
+        return document
     
+    except ConversionLimitExceeded:
+        raise
     except ImportError:
         raise ImportError("python-pptx is required for .pptx files. Install it with: pip install python-pptx")
     except Exception as e:
         raise Exception(f"Error converting PPTX file: {str(e)}")
 
 
-def convert_ppt_to_markdown(file_path, image_dir=None):
-    """Convert a legacy PowerPoint presentation (.ppt) to Markdown.
+def _add_pptx_slide(document, slide, slide_num, image_dir_path, image_counter, limits):
+    """Append the blocks of one slide's shapes to document; returns the updated image counter."""
+    for shape in slide.shapes:
+        limits.check(output=document.blocks)
+        # Tables -> table blocks
+        if hasattr(shape, "has_table") and shape.has_table:
+            rows = [[cell.text.replace('\n', ' ').strip() for cell in row.cells] for row in shape.table.rows]
+            document.add(ir.BLANK, page=slide_num)
+            document.add(ir.TABLE, page=slide_num, ref=rows)
+            document.add(ir.BLANK, page=slide_num)
+            # Skip generic text handling for table shapes
+            continue
+
+        # Charts -> tables of chart data (best effort)
+        if hasattr(shape, "has_chart") and shape.has_chart:
+            chart = shape.chart
+
+            # Get categories if available
+            categories = []
+            try:
+                plot = chart.plots[0]
+                if plot.categories is not None:
+                    for c in plot.categories:
+                        # category objects may have .label or be basic types
+                        label = getattr(c, "label", None)
+                        categories.append(str(label if label is not None else c))
+            except Exception:
+                categories = []
+
+            # Header: Category + each series name
+            headers = ['Category']
+            for series in chart.series:
+                headers.append(series.name if series.name is not None else 'Series')
+            rows = [headers]
+
+            # Build rows
+            num_points = 0
+            if chart.series:
+                num_points = len(chart.series[0].values)
+
+            for idx in range(num_points):
+                if categories and idx < len(categories):
+                    row = [categories[idx]]
+                else:
+                    row = [f'Point {idx + 1}']
+
+                for series in chart.series:
+                    try:
+                        val = series.values[idx]
+                    except Exception:
+                        val = ''
+                    row.append(str(val))
+
+                rows.append(row)
+
+            document.add(ir.BLANK, page=slide_num)
+            document.add(ir.TABLE, page=slide_num, ref=rows)
+            document.add(ir.BLANK, page=slide_num)
+            # Skip generic text handling for chart shapes
+            continue
+
+        # Export picture shapes as images
+        if image_dir_path is not None and hasattr(shape, "image"):
+            image = shape.image
+            if image is not None:
+                image_dir_path.mkdir(parents=True, exist_ok=True)
+                image_counter += 1
+                ext = image.ext or "png"
+                filename = f"slide{slide_num}_image{image_counter}.{ext}"
+                image_path = image_dir_path / filename
+                with open(image_path, "wb") as f:
+                    f.write(image.blob)
+                rel_path = f"{image_dir_path.name}/{filename}"
+                document.add(ir.IMAGE, f"Slide {slide_num} Image {image_counter}", page=slide_num, ref=rel_path)
+
+        # Text handling
+        if hasattr(shape, "text") and shape.text.strip():
+            text = shape.text.strip()
+
+            # Check if it's a title (usually first shape or specific shape type)
+            if shape == slide.shapes[0] or (hasattr(shape, 'is_placeholder') and 
+                                             shape.is_placeholder and 
+                                             shape.placeholder_format.idx == 0):
+                document.add(ir.HEADING, text, level=3, page=slide_num)
+            else:
+                # Check for bullet points
+                if hasattr(shape, 'text_frame'):
+                    for paragraph in shape.text_frame.paragraphs:
+                        para_text = paragraph.text.strip()
+                        if para_text:
+                            # Check if it's a bullet point
+                            if paragraph.level > 0 or para_text.startswith('•') or para_text.startswith('-'):
+                                document.add(ir.LIST_ITEM, para_text.lstrip('•- '),
+                                             level=paragraph.level, page=slide_num)
+                            else:
+                                document.add(ir.PARAGRAPH, para_text, page=slide_num)
+                else:
+                    document.add(ir.PARAGRAPH, text, page=slide_num)
+
+    return image_counter
+
+
+_PPTX_SLIDE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide"
+_PPTX_NOTES_SLIDE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/notesSlide"
+_PPTX_SLIDE_ID = "{http://schemas.openxmlformats.org/presentationml/2006/main}sldId"
+_PPTX_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_PPTX_PRESENTATION = "ppt/presentation.xml"
+
+
+def _rels_name(part_name):
+    directory, name = posixpath.split(part_name)
+    return posixpath.join(directory, '_rels', name + '.rels')
+
+
+def _package_rels(package, part_name):
+    """Relationships of a package part as (id, type, target, is_external), with internal targets as part names."""
+    from lxml import etree
+
+    rels_name = _rels_name(part_name)
+    if rels_name not in package.NameToInfo:
+        return []
+    rels = []
+    for rel in etree.fromstring(package.read(rels_name)):
+        target = rel.get('Target')
+        is_external = rel.get('TargetMode') == 'External'
+        if not is_external:
+            if target.startswith('/'):
+                target = target.lstrip('/')
+            else:
+                target = posixpath.normpath(posixpath.join(posixpath.dirname(part_name), target))
+        rels.append((rel.get('Id'), rel.get('Type'), target, is_external))
+    return rels
+
+
+def _pptx_slide_parts(package):
+    """Part names of the slides of a .pptx package, in presentation order."""
+    from lxml import etree
+
+    targets = {rel_id: target for rel_id, rel_type, target, _ in _package_rels(package, _PPTX_PRESENTATION)
+               if rel_type == _PPTX_SLIDE}
+    presentation = etree.fromstring(package.read(_PPTX_PRESENTATION))
+    return [targets[slide_id.get(_PPTX_REL_ID)] for slide_id in presentation.iter(_PPTX_SLIDE_ID)]
+
+
+def _pptx_slide_key(package, part_name, part_digests):
+    """Unit cache key of a slide: its XML part and the parts it relates to (layout, images, charts).
+
+    part_digests memoizes related parts, such as layouts, that many slides share.
+    """
+    digest = hashlib.sha256(package.read(part_name))
+    for rel_id, rel_type, target, is_external in sorted(_package_rels(package, part_name)):
+        if rel_type == _PPTX_NOTES_SLIDE:
+            # Notes are not converted, and they repeat the slide number, which shifts when slides are inserted.
+            continue
+        if is_external:
+            digest.update(f"{rel_id}:{target}".encode('utf-8'))
+            continue
+        if target not in part_digests:
+            part_digests[target] = hashlib.sha256(package.read(target)).digest()
+        digest.update(rel_id.encode('utf-8') + part_digests[target])
+    return f"pptx{ir.FORMAT_VERSION}-{digest.hexdigest()}"
+
+
+def _pptx_subset(package, slide_parts, keep):
+    """An in-memory copy of a .pptx package that only lists the slides in keep, in their original order.
+
+    python-pptx loads every part reachable from the presentation when it opens
+    a file, so this is what lets an incremental run parse just the changed slides.
+    """
+    from lxml import etree
+
+    dropped = set(slide_parts) - set(keep)
+    dropped_ids = {rel_id for rel_id, rel_type, target, _ in _package_rels(package, _PPTX_PRESENTATION)
+                   if rel_type == _PPTX_SLIDE and target in dropped}
+    skipped = dropped | {_rels_name(part) for part in dropped}
+
+    rels_name = _rels_name(_PPTX_PRESENTATION)
+    rels = etree.fromstring(package.read(rels_name))
+    for rel in list(rels):
+        if rel.get('Id') in dropped_ids:
+            rels.remove(rel)
+    presentation = etree.fromstring(package.read(_PPTX_PRESENTATION))
+    for slide_id in list(presentation.iter(_PPTX_SLIDE_ID)):
+        if slide_id.get(_PPTX_REL_ID) in dropped_ids:
+            slide_id.getparent().remove(slide_id)
+    replaced = {
+        rels_name: etree.tostring(rels, xml_declaration=True, encoding='UTF-8', standalone=True),
+        _PPTX_PRESENTATION: etree.tostring(presentation, xml_declaration=True, encoding='UTF-8', standalone=True),
+    }
+
+    subset = io.BytesIO()
+    with zipfile.ZipFile(subset, 'w', zipfile.ZIP_STORED) as out:
+        for info in package.infolist():
+            if info.filename not in skipped:
+                out.writestr(info.filename, replaced.get(info.filename) or package.read(info.filename))
+    subset.seek(0)
+    return subset
+
+
+def ppt_to_document(file_path, image_dir=None, limits=None, unit_cache=None):
+    """Parse a legacy PowerPoint presentation (.ppt) into a Document.
 
     This uses Microsoft PowerPoint via COM automation to first convert the
-    .ppt file to .pptx, then reuses the existing .pptx conversion logic.
+    .ppt file to .pptx, then reuses the existing .pptx parsing logic.
     """
     try:
         import win32com.client
@@ -317,7 +584,8 @@ def convert_ppt_to_markdown(file_path, image_dir=None):
                 presentation.Close()
 
             # Reuse the existing .pptx converter
-            markdown_content = convert_pptx_to_markdown(temp_pptx_path, image_dir=image_dir)
+            document = pptx_to_document(temp_pptx_path, image_dir=image_dir, limits=limits, unit_cache=unit_cache)
+            document.format = 'ppt'
         finally:
             ppt_app.Quit()
             pythoncom.CoUninitialize()
@@ -328,8 +596,10 @@ def convert_ppt_to_markdown(file_path, image_dir=None):
                     # If cleanup fails, it's not critical for the conversion result
                     pass
 
-        return markdown_content
+        return document
 
+    except ConversionLimitExceeded:
+        raise
     except ImportError:
         raise ImportError(
             "pywin32 is required for .ppt files, or convert the file to .pptx manually. "
@@ -342,7 +612,50 @@ def convert_ppt_to_markdown(file_path, image_dir=None):
         )
 
 
-def convert_file_to_markdown(input_file, output_file=None):
+DOCUMENT_PARSERS = {
+    '.docx': docx_to_document,
+    '.pdf': pdf_to_document,
+    '.pptx': pptx_to_document,
+    '.ppt': ppt_to_document,
+}
+
+
+def convert_to_document(file_path, image_dir=None, limits=None, unit_cache=None):
+    """Parse any supported file into a Document, by its extension.
+
+    unit_cache (document_ir.UnitCache) enables incremental conversion of the
+    pages of a PDF or the slides of a presentation; .docx files have no pages
+    and are always converted whole.
+    """
+    ext = Path(file_path).suffix.lower()
+    if ext not in DOCUMENT_PARSERS:
+        raise ValueError(f"Unsupported file type: {ext}. Supported formats: .docx, .pdf, .ppt, .pptx")
+    if ext == '.docx':
+        return docx_to_document(file_path, image_dir=image_dir, limits=limits)
+    return DOCUMENT_PARSERS[ext](file_path, image_dir=image_dir, limits=limits, unit_cache=unit_cache)
+
+
+def convert_docx_to_markdown(file_path, image_dir=None, limits=None):
+    """Convert a Word document (.docx) to Markdown (see docx_to_document)."""
+    return docx_to_document(file_path, image_dir=image_dir, limits=limits).to_markdown()
+
+
+def convert_pdf_to_markdown(file_path, image_dir=None, limits=None, unit_cache=None):
+    """Convert a PDF file (.pdf) to Markdown (see pdf_to_document)."""
+    return pdf_to_document(file_path, image_dir=image_dir, limits=limits, unit_cache=unit_cache).to_markdown()
+
+
+def convert_pptx_to_markdown(file_path, image_dir=None, limits=None, unit_cache=None):
+    """Convert a PowerPoint presentation (.pptx) to Markdown (see pptx_to_document)."""
+    return pptx_to_document(file_path, image_dir=image_dir, limits=limits, unit_cache=unit_cache).to_markdown()
+
+
+def convert_ppt_to_markdown(file_path, image_dir=None, limits=None, unit_cache=None):
+    """Convert a legacy PowerPoint presentation (.ppt) to Markdown (see ppt_to_document)."""
+    return ppt_to_document(file_path, image_dir=image_dir, limits=limits, unit_cache=unit_cache).to_markdown()
+
+
+def convert_file_to_markdown(input_file, output_file=None, unit_cache_dir=None):
     """
     Convert a file to Markdown format.
     
@@ -350,6 +663,9 @@ def convert_file_to_markdown(input_file, output_file=None):
         input_file: Path to the input file
         output_file: Optional path to the output file. If not provided, 
                      output will be saved as input_file.md
+        unit_cache_dir: Optional directory of converted pages and slides; pages
+                        or slides unchanged since an earlier conversion are
+                        reused from it instead of converted again
     
     Returns:
         Path to the output markdown file
@@ -368,22 +684,14 @@ def convert_file_to_markdown(input_file, output_file=None):
     # Directory where extracted images will be stored (next to the markdown file)
     image_dir = output_path.parent / f"{output_path.stem}_images"
     
-    # Get file extension
-    ext = input_path.suffix.lower()
-    
     # Convert based on file type
     print(f"Converting {input_path.name} to Markdown...")
-    
-    if ext == '.docx':
-        markdown_content = convert_docx_to_markdown(input_path, image_dir=image_dir)
-    elif ext == '.pdf':
-        markdown_content = convert_pdf_to_markdown(input_path, image_dir=image_dir)
-    elif ext == '.pptx':
-        markdown_content = convert_pptx_to_markdown(input_path, image_dir=image_dir)
-    elif ext == '.ppt':
-        markdown_content = convert_ppt_to_markdown(input_path, image_dir=image_dir)
-    else:
-        raise ValueError(f"Unsupported file type: {ext}. Supported formats: .docx, .pdf, .ppt, .pptx")
+    unit_cache = UnitCache(unit_cache_dir) if unit_cache_dir is not None else None
+    document = convert_to_document(input_path, image_dir=image_dir, unit_cache=unit_cache)
+    markdown_content = document.to_markdown()
+    if unit_cache is not None and document.format != 'docx':
+        total = document.units_reused + document.units_converted
+        print(f"Reused {document.units_reused} of {total} pages/slides, converted {document.units_converted}")
     
     # Write markdown file
     with open(output_path, 'w', encoding='utf-8') as f:
@@ -409,11 +717,14 @@ Examples:
     parser.add_argument('input_file', help='Path to the input file (.docx, .pdf, or .pptx)')
     parser.add_argument('-o', '--output', dest='output_file', 
                        help='Path to the output markdown file (default: input_file.md)')
+    parser.add_argument('--unit-cache', dest='unit_cache_dir',
+                       help='Directory caching converted pages and slides, so re-converting an edited '
+                            'version of a file only converts what changed')
     
     args = parser.parse_args()
     
     try:
-        convert_file_to_markdown(args.input_file, args.output_file)
+        convert_file_to_markdown(args.input_file, args.output_file, args.unit_cache_dir)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
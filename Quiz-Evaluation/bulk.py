@@ -0,0 +1,283 @@
+"""
+Bulk grading of many submissions against one quiz.
+
+Submissions are read from a directory of answer JSON files (the file stem is
+the submission id) or from a JSONL file of `{"submission_id", "user_answers"}`
+objects. Each graded submission is appended to the output JSONL as
+`{"submission_id", "results"}` and flushed to disk, so the output doubles as
+the checkpoint: re-running the same command skips everything already graded.
+Failed submissions are reported and retried on the next run.
+
+Backends:
+
+- `online`: `generate_content` calls on one shared async client, at most
+  `concurrency` in flight, with exponential backoff between retries.
+- `batch`: submissions go out as Gemini batch jobs, which are cheaper but
+  finish in minutes to hours. Submitted job names are kept in
+  `<output>.jobs.json`, so a resumed run polls those jobs instead of paying for
+  them twice. Point GOOGLE_GEMINI_BASE_URL at
+  `backend/benchmarks/fake_gemini_server.py` to run it locally.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+from evaluator import (
+    build_evaluation_messages,
+    evaluate_quiz_data_async,
+    generation_config,
+    get_client,
+    parse_evaluation_response,
+)
+from models import BulkSubmission, EvaluationResult
+
+_JOB_DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+def load_submissions(path: Path) -> list[BulkSubmission]:
+    """Read submissions from a directory of `*.json` answer files or a JSONL file."""
+    if path.is_dir():
+        return [
+            BulkSubmission(submission_id=p.stem, user_answers=json.loads(p.read_text(encoding="utf-8")))
+            for p in sorted(path.glob("*.json"))
+        ]
+    submissions = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                submissions.append(BulkSubmission.model_validate_json(line))
+    return submissions
+
+
+def completed_ids(output_path: Path) -> set[str]:
+    """Submission ids already in the output; a line cut short by a crash is ignored."""
+    done = set()
+    if not output_path.exists():
+        return done
+    with output_path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["submission_id"])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def _drop_partial_line(path: Path) -> None:
+    """Cut a trailing line left unfinished by a crash, so the next record starts on its own line."""
+    if not path.exists():
+        return
+    with path.open("rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+class ResultWriter:
+    """Appends one JSON line per graded submission, durable before the next is written."""
+
+    def __init__(self, output_path: Path):
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        _drop_partial_line(output_path)
+        self._file = output_path.open("a", encoding="utf-8")
+        self.written = 0
+
+    def write(self, submission_id: str, result: EvaluationResult) -> None:
+        record = {"submission_id": submission_id, "results": [item.model_dump() for item in result.results]}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.written += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+async def grade_online(
+    quiz_json: str,
+    submissions: list[BulkSubmission],
+    writer: ResultWriter,
+    notes_markdown: str | None = None,
+    prompt_template_path: Path | None = None,
+    model_name: str = "gemini-3-flash-preview",
+    concurrency: int = 8,
+    retries: int = 3,
+) -> list[str]:
+    """Grade concurrently on one client; returns the ids that still failed after `retries`."""
+    client = get_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    failed: list[str] = []
+
+    async def grade(submission: BulkSubmission) -> None:
+        async with semaphore:
+            for attempt in range(retries + 1):
+                try:
+                    result = await evaluate_quiz_data_async(
+                        quiz_json=quiz_json,
+                        user_answers_json=json.dumps(submission.user_answers, ensure_ascii=False, indent=2),
+                        client=client,
+                        notes_markdown=notes_markdown,
+                        prompt_template_path=prompt_template_path,
+                        model_name=model_name,
+                    )
+                except Exception as e:
+                    if attempt == retries:
+                        print(f"{submission.submission_id}: failed after {retries + 1} attempts: {e}")
+                        failed.append(submission.submission_id)
+                        return
+                    # Rate limits and transient server errors usually clear within seconds.
+                    await asyncio.sleep(2**attempt)
+                else:
+                    writer.write(submission.submission_id, result)
+                    return
+
+    try:
+        await asyncio.gather(*(grade(s) for s in submissions))
+    finally:
+        await client.aio.aclose()
+    return failed
+
+
+def _load_jobs(jobs_path: Path) -> dict[str, list[str]]:
+    if not jobs_path.exists():
+        return {}
+    return json.loads(jobs_path.read_text(encoding="utf-8"))
+
+
+def _save_jobs(jobs_path: Path, jobs: dict[str, list[str]]) -> None:
+    if not jobs:
+        jobs_path.unlink(missing_ok=True)
+        return
+    tmp = jobs_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(jobs, indent=2), encoding="utf-8")
+    tmp.replace(jobs_path)
+
+
+def _state(job) -> str:
+    return getattr(job.state, "value", job.state)
+
+
+def grade_batch(
+    quiz_json: str,
+    submissions: list[BulkSubmission],
+    writer: ResultWriter,
+    jobs_path: Path,
+    notes_markdown: str | None = None,
+    prompt_template_path: Path | None = None,
+    model_name: str = "gemini-3-flash-preview",
+    job_size: int = 500,
+    poll_interval: float = 30.0,
+) -> list[str]:
+    """Grade through deferred batch jobs; returns the ids whose job or response failed."""
+    client = get_client()
+    jobs = _load_jobs(jobs_path)
+    submitted = {sid for ids in jobs.values() for sid in ids}
+    pending = [s for s in submissions if s.submission_id not in submitted]
+
+    for start in range(0, len(pending), job_size):
+        chunk = pending[start : start + job_size]
+        requests = [
+            {
+                "contents": build_evaluation_messages(
+                    quiz_json,
+                    json.dumps(s.user_answers, ensure_ascii=False, indent=2),
+                    notes_markdown,
+                    prompt_template_path,
+                ),
+                "config": generation_config(),
+                "metadata": {"submission_id": s.submission_id},
+            }
+            for s in chunk
+        ]
+        job = client.batches.create(
+            model=model_name, src=requests, config={"display_name": f"bulk-grading-{int(time.time())}"}
+        )
+        jobs[job.name] = [s.submission_id for s in chunk]
+        _save_jobs(jobs_path, jobs)
+        print(f"Submitted {job.name} with {len(chunk)} submissions.")
+
+    failed: list[str] = []
+    while jobs:
+        for name in list(jobs):
+            job = client.batches.get(name=name)
+            if _state(job) not in _JOB_DONE_STATES:
+                continue
+            ids = jobs.pop(name)
+            if _state(job) != "JOB_STATE_SUCCEEDED":
+                print(f"{name}: {_state(job)}")
+                failed += ids
+            else:
+                # Responses carry the request metadata; fall back to request order.
+                answered = set()
+                for i, inlined in enumerate(job.dest.inlined_responses or []):
+                    submission_id = (inlined.metadata or {}).get("submission_id", ids[i])
+                    answered.add(submission_id)
+                    try:
+                        if inlined.error:
+                            raise RuntimeError(inlined.error)
+                        writer.write(submission_id, parse_evaluation_response(inlined.response, model_name))
+                    except Exception as e:
+                        print(f"{submission_id}: {e}")
+                        failed.append(submission_id)
+                failed += [sid for sid in ids if sid not in answered]
+            _save_jobs(jobs_path, jobs)
+        if jobs:
+            time.sleep(poll_interval)
+    client.close()
+    return failed
+
+
+def run_bulk(
+    quiz_json_path: Path,
+    submissions_path: Path,
+    output_path: Path,
+    notes_markdown_path: Path | None = None,
+    backend: str = "online",
+    concurrency: int = 8,
+    model_name: str = "gemini-3-flash-preview",
+    prompt_template_path: Path | None = None,
+    poll_interval: float = 30.0,
+) -> int:
+    """Grade every submission not yet in `output_path`; returns the number that failed."""
+    quiz_json = quiz_json_path.read_text(encoding="utf-8")
+    notes_markdown = None
+    if notes_markdown_path is not None and notes_markdown_path.exists():
+        notes_markdown = notes_markdown_path.read_text(encoding="utf-8")
+    if prompt_template_path is None:
+        prompt_template_path = Path(__file__).resolve().parent / "prompt_template.md"
+
+    submissions = load_submissions(submissions_path)
+    done = completed_ids(output_path)
+    todo = [s for s in submissions if s.submission_id not in done]
+    print(f"{len(submissions)} submissions, {len(done)} already graded, {len(todo)} to grade ({backend}).")
+
+    writer = ResultWriter(output_path)
+    start = time.perf_counter()
+    try:
+        if backend == "batch":
+            failed = grade_batch(
+                quiz_json,
+                todo,
+                writer,
+                output_path.with_name(output_path.name + ".jobs.json"),
+                notes_markdown,
+                prompt_template_path,
+                model_name,
+                poll_interval=poll_interval,
+            )
+        else:
+            failed = asyncio.run(
+                grade_online(
+                    quiz_json, todo, writer, notes_markdown, prompt_template_path, model_name, concurrency
+                )
+            )
+    finally:
+        writer.close()
+
+    print(f"Graded {writer.written} submissions in {time.perf_counter() - start:.1f}s; {len(failed)} failed.")
+    return len(failed)
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import contextlib
+import functools
 import json
 import os
 from pathlib import Path
@@ -7,8 +9,16 @@ from typing import List
 
 from dotenv import load_dotenv
 from google import genai
+from google.genai.types import GenerateContentConfig
+from pydantic import ValidationError
 
-from models import ContentInputs, EvaluationItem, EvaluationResult
+from models import EVALUATION_ITEMS_ADAPTER, ContentInputs, EvaluationResult, evaluation_response_schema
+
+# Optional instrumentation hooks, no-ops by default. The backend replaces them:
+# `stage_timer(name)` returns a context manager timing a pipeline stage, and
+# `usage_hook(task, model, usage_metadata)` receives token usage per Gemini call.
+stage_timer = lambda name: contextlib.nullcontext()  # noqa: E731
+usage_hook = None
 
 
 def _load_env_key(env_var: str = "GEMINI_API_KEY") -> str:
@@ -26,6 +36,17 @@ def _read_text(path: Path) -> str:
     return path.read_text(encoding="utf-8")
 
 
+@functools.lru_cache(maxsize=None)
+def _load_template(path: Path) -> str:
+    # Templates ship with the code, so each is read once per process.
+    return path.read_text(encoding="utf-8")
+
+
+def preload_template(path: Path) -> None:
+    """Read a prompt template now (a pre-forking server does this once, before starting workers)."""
+    _load_template(path)
+
+
 def _build_prompt_from_template(
     template_path: Path,
     quiz_json: str,
@@ -36,7 +57,7 @@ def _build_prompt_from_template(
     Builds a messages-style input for Gemini: a single user message containing
     the markdown prompt plus the concrete input data.
     """
-    template = template_path.read_text(encoding="utf-8")
+    template = _load_template(template_path)
 
     # Append the concrete input section to the template.
     input_block_lines = [
@@ -93,10 +114,6 @@ def evaluate_quiz(
     - Builds a strict markdown prompt that requires ONLY the requested JSON output.
     - Calls Gemini and parses/validates the response into `EvaluationResult`.
     """
-    api_key = _load_env_key()
-
-    client = genai.Client(api_key=api_key)
-
     quiz_json_str = _read_text(inputs.quiz_json_path)
     user_answers_json_str = _read_text(inputs.user_answers_json_path)
 
@@ -104,31 +121,107 @@ def evaluate_quiz(
     if inputs.notes_markdown_path is not None and inputs.notes_markdown_path.exists():
         notes_md_str = _read_text(inputs.notes_markdown_path)
 
-    if prompt_template_path is None:
-        prompt_template_path = Path("prompt_template.md")
-
-    messages = _build_prompt_from_template(
-        template_path=prompt_template_path,
+    return evaluate_quiz_data(
         quiz_json=quiz_json_str,
         user_answers_json=user_answers_json_str,
         notes_markdown=notes_md_str,
+        prompt_template_path=prompt_template_path,
+        model_name=model_name,
     )
 
-    # Call Gemini 3 Pro Preview.
-    # Some versions of the google-genai SDK do not support `generation_config`
-    # as a keyword here, so we rely on the prompt to enforce JSON-only output.
-    response = client.models.generate_content(
-        model=model_name,
-        contents=messages,
+
+def get_client() -> genai.Client:
+    """A Gemini client; create one and pass it around to reuse connections across calls."""
+    return genai.Client(api_key=_load_env_key())
+
+
+def generation_config() -> GenerateContentConfig:
+    # Structured output constrains the reply to the evaluation array schema;
+    # the prompt still spells out the format for models that ignore it.
+    return GenerateContentConfig(
+        response_mime_type="application/json",
+        response_json_schema=evaluation_response_schema(),
     )
 
+
+def build_evaluation_messages(
+    quiz_json: str,
+    user_answers_json: str,
+    notes_markdown: str | None = None,
+    prompt_template_path: Path | None = None,
+) -> List[dict]:
+    if prompt_template_path is None:
+        prompt_template_path = Path("prompt_template.md")
+
+    with stage_timer("build_evaluation_prompt"):
+        return _build_prompt_from_template(
+            template_path=prompt_template_path,
+            quiz_json=quiz_json,
+            user_answers_json=user_answers_json,
+            notes_markdown=notes_markdown,
+        )
+
+
+def parse_evaluation_response(response, model_name: str) -> EvaluationResult:
+    """Record usage and validate a `generate_content` response."""
+    if usage_hook is not None:
+        usage_hook("evaluate", model_name, getattr(response, "usage_metadata", None))
+
     # Extract text from the response. For google-genai, the response has .text.
     raw_text = getattr(response, "text", None)
     if raw_text is None:
         raise RuntimeError("Gemini response did not contain text.")
 
-    # The prompt requires a bare JSON array; still, models often wrap it in
-    # ```json fences or add stray text. We try to robustly extract the array.
+    with stage_timer("parse_validate_evaluation"):
+        return _parse_evaluation_response(raw_text)
+
+
+def evaluate_quiz_data(
+    quiz_json: str,
+    user_answers_json: str,
+    notes_markdown: str | None = None,
+    prompt_template_path: Path | None = None,
+    model_name: str = "gemini-3-flash-preview",
+    client: genai.Client | None = None,
+) -> EvaluationResult:
+    """
+    Same as `evaluate_quiz`, but takes the already-serialized inputs in memory.
+
+    Used by the backend so submissions do not round-trip through temp files.
+    """
+    client = client or get_client()
+    messages = build_evaluation_messages(quiz_json, user_answers_json, notes_markdown, prompt_template_path)
+
+    with stage_timer("gemini_evaluate"):
+        response = client.models.generate_content(model=model_name, contents=messages, config=generation_config())
+    return parse_evaluation_response(response, model_name)
+
+
+async def evaluate_quiz_data_async(
+    quiz_json: str,
+    user_answers_json: str,
+    client: genai.Client,
+    notes_markdown: str | None = None,
+    prompt_template_path: Path | None = None,
+    model_name: str = "gemini-3-flash-preview",
+) -> EvaluationResult:
+    """Async `evaluate_quiz_data` on a shared client, for grading many submissions concurrently."""
+    messages = build_evaluation_messages(quiz_json, user_answers_json, notes_markdown, prompt_template_path)
+    response = await client.aio.models.generate_content(
+        model=model_name, contents=messages, config=generation_config()
+    )
+    return parse_evaluation_response(response, model_name)
+
+
+def _parse_evaluation_response(raw_text: str) -> EvaluationResult:
+    """Validate Gemini's reply into `EvaluationResult`, salvaging the JSON array if needed."""
+    try:
+        return EvaluationResult(results=EVALUATION_ITEMS_ADAPTER.validate_json(raw_text))
+    except ValidationError:
+        pass
+
+    # Without structured output, models often wrap the array in ```json fences
+    # or add stray text. We try to robustly extract the array.
     raw_text = raw_text.strip()
 
     def _extract_json_array(text: str) -> str:
@@ -166,21 +259,10 @@ def evaluate_quiz(
 
     if not isinstance(parsed, list):
         raise RuntimeError("Gemini output must be a JSON array of objects.")
+    if not all(isinstance(obj, dict) for obj in parsed):
+        raise RuntimeError("Each element in the array must be an object.")
 
-    # Validate and normalize into Pydantic models.
-    items: List[EvaluationItem] = []
-    for obj in parsed:
-        if not isinstance(obj, dict):
-            raise RuntimeError("Each element in the array must be an object.")
-        # Only keep the allowed keys and enforce types.
-        cleaned = {
-            "question_number": obj.get("question_number"),
-            "score": obj.get("score"),
-        }
-        item = EvaluationItem(**cleaned)
-        items.append(item)
-
-    return EvaluationResult(results=items)
+    return EvaluationResult(results=EVALUATION_ITEMS_ADAPTER.validate_python(parsed))
 
 
 def save_evaluation_to_file(result: EvaluationResult, output_path: Path) -> None:
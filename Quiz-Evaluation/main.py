@@ -5,6 +5,7 @@ from pathlib import Path
 
 from models import ContentInputs
 from evaluator import evaluate_quiz, save_evaluation_to_file
+from bulk import run_bulk
 
 
 def parse_args() -> argparse.Namespace:
@@ -21,9 +22,15 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--user-answers-json",
         type=Path,
-        required=True,
+        required=False,
         help="Path to the user's answers JSON file.",
     )
+    parser.add_argument(
+        "--submissions",
+        type=Path,
+        required=False,
+        help="Bulk mode: a directory of answer JSON files or a JSONL of {submission_id, user_answers}.",
+    )
     parser.add_argument(
         "--notes-markdown",
         type=Path,
@@ -33,16 +40,58 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--output-json",
         type=Path,
-        required=True,
+        required=False,
         help="Path where the evaluation JSON file will be written.",
     )
+    parser.add_argument(
+        "--output-jsonl",
+        type=Path,
+        required=False,
+        help="Bulk mode: results are appended here; re-running resumes after the last graded submission.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=("online", "batch"),
+        default="online",
+        help="Bulk mode: concurrent online calls, or cheaper deferred Gemini batch jobs.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Bulk mode (online): maximum Gemini calls in flight.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=30.0,
+        help="Bulk mode (batch): seconds between job status checks.",
+    )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.submissions is not None:
+        if args.output_jsonl is None:
+            parser.error("--output-jsonl is required with --submissions.")
+    elif args.user_answers_json is None or args.output_json is None:
+        parser.error("--user-answers-json and --output-json are required (or use --submissions for bulk mode).")
+    return args
 
 
 def main() -> None:
     args = parse_args()
 
+    if args.submissions is not None:
+        failed = run_bulk(
+            quiz_json_path=args.quiz_json,
+            submissions_path=args.submissions,
+            output_path=args.output_jsonl,
+            notes_markdown_path=args.notes_markdown,
+            backend=args.backend,
+            concurrency=args.concurrency,
+            poll_interval=args.poll_interval,
+        )
+        raise SystemExit(1 if failed else 0)
+
     content_inputs = ContentInputs(
         notes_markdown_path=args.notes_markdown,
         quiz_json_path=args.quiz_json,
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 
 
 class QuizQuestion(BaseModel):
@@ -29,6 +29,15 @@ class EvaluationItem(BaseModel):
     score: float = Field(..., description="Score for this question (float)")
 
 
+# Compiled once; validates the whole evaluation array in one pass. Extra keys are ignored.
+EVALUATION_ITEMS_ADAPTER = TypeAdapter(List[EvaluationItem])
+
+
+def evaluation_response_schema() -> dict:
+    """JSON schema for Gemini structured output: an array of {question_number, score}."""
+    return {"type": "array", "items": EvaluationItem.model_json_schema()}
+
+
 class EvaluationResult(BaseModel):
     """
     IMPORTANT: This is the ONLY output structure we allow from Gemini.
@@ -57,3 +66,9 @@ class ContentInputs(BaseModel):
     quiz_json_path: Path
     user_answers_json_path: Path
 
+
+class BulkSubmission(BaseModel):
+    """One attempt to grade in bulk mode: an id plus the user's answers JSON."""
+
+    submission_id: str
+    user_answers: Any
@@ -1,24 +1,53 @@
+import contextlib
+import contextvars
+import functools
 import json
+import logging
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 from dotenv import load_dotenv
 from google import genai
 from google.genai.types import GenerateContentConfig
 
-from models import MCQQuestion, BCQQuestion, Quiz, QuizGenerationRequest, QuestionMode, SubjectiveQuestion
+from pydantic import ValidationError
 
+from models import QUIZ_QUESTIONS_ADAPTER, Quiz, QuizGenerationRequest, QuestionMode, quiz_response_schema
+
+logger = logging.getLogger(__name__)
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 PROMPT_PATH = PROJECT_ROOT / "prompt.md"
 PROMPT_AI_PATH = PROJECT_ROOT / "prompt_ai.md"
+DEFAULT_MODEL = "gemini-3-flash-preview"
+
+# Sharded AI generation: questions per shard, retries per failed shard, concurrent shards.
+QUIZ_SHARD_SIZE = int(os.getenv("QUIZ_SHARD_SIZE", "10"))
+QUIZ_SHARD_RETRIES = int(os.getenv("QUIZ_SHARD_RETRIES", "2"))
+QUIZ_SHARD_WORKERS = int(os.getenv("QUIZ_SHARD_WORKERS", "8"))
+
+# Optional instrumentation hooks, no-ops by default. The backend replaces them:
+# `stage_timer(name)` returns a context manager timing a pipeline stage, and
+# `usage_hook(task, model, usage_metadata)` receives token usage per Gemini call.
+stage_timer = lambda name: contextlib.nullcontext()  # noqa: E731
+usage_hook = None
 
 
+@functools.lru_cache(maxsize=None)
 def _load_template(path: Path) -> str:
+    # Templates ship with the code, so each is read once per process.
     with path.open("r", encoding="utf-8") as f:
         return f.read()
 
 
+def preload_templates() -> None:
+    """Read both prompt templates now (a pre-forking server does this once, before starting workers)."""
+    _load_template(PROMPT_PATH)
+    _load_template(PROMPT_AI_PATH)
+
+
 def build_prompt_from_markdown(markdown_content: str, request: QuizGenerationRequest) -> str:
     """
     Build the prompt for mode 1 – generate with user's markdown content.
@@ -72,44 +101,176 @@ def get_gemini_client() -> genai.Client:
     return genai.Client(api_key=api_key)
 
 
-def call_gemini(prompt: str) -> str:
+def call_gemini(prompt: str, model: str = DEFAULT_MODEL) -> str:
     client = get_gemini_client()
 
-    response = client.models.generate_content(
-        model="gemini-3-flash-preview",
-        contents=prompt,
-        config=GenerateContentConfig(
-            temperature=0.2,
-            response_mime_type="application/json",
-        ),
-    )
+    with stage_timer("gemini_generate_quiz"):
+        response = client.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=GenerateContentConfig(
+                temperature=0.2,
+                response_mime_type="application/json",
+                response_json_schema=quiz_response_schema(),
+            ),
+        )
+    if usage_hook is not None:
+        usage_hook("generate_quiz", model, getattr(response, "usage_metadata", None))
 
     # The SDK exposes the main text output as .text
     return response.text
 
 
 def parse_and_validate_quiz(json_text: str) -> Quiz:
-    raw = json.loads(json_text)
+    with stage_timer("parse_validate_quiz"):
+        return _parse_and_validate_quiz(json_text)
+
+
+def _parse_and_validate_quiz(json_text: str) -> Quiz:
+    try:
+        questions = QUIZ_QUESTIONS_ADAPTER.validate_json(json_text)
+    except ValidationError:
+        # Fall back for output without a usable "Question type": infer or fix the tag, then validate again.
+        raw = json.loads(json_text)
+        if not isinstance(raw, list):
+            raise ValueError("Model output must be a JSON array.")
+        if not all(isinstance(item, dict) for item in raw):
+            raise ValueError("Each quiz item must be a JSON object.")
+        questions = QUIZ_QUESTIONS_ADAPTER.validate_python([_with_question_type(item) for item in raw])
 
-    if not isinstance(raw, list):
-        raise ValueError("Model output must be a JSON array.")
+    return Quiz(questions=questions)
 
-    questions = []
-    for item in raw:
-        if not isinstance(item, dict):
-            raise ValueError("Each quiz item must be a JSON object.")
 
-        # Decide which question type based on Question type field or presence of options
-        q_type = item.get("Question type", "")
-        if q_type == "BCQ":
-            q = BCQQuestion.model_validate(item)
-        elif q_type == "MCQ" or "Option 3" in item or "Option 4" in item:
-            q = MCQQuestion.model_validate(item)
-        else:
-            q = SubjectiveQuestion.model_validate(item)
-        questions.append(q)
+_QUESTION_TYPES = {"mcq": "MCQ", "subjective": "Subjective", "bcq": "BCQ"}
 
-    return Quiz(questions=questions)
+
+def _with_question_type(item: dict) -> dict:
+    """
+    Give the item a "Question type" the discriminated union accepts.
+
+    A stated type is kept (case aside) when the options agree with it: only
+    MCQs have Option 3/4. A missing, unknown or mismatched type is inferred
+    from the options instead, so such items are not dropped by validation.
+    """
+    stated = _QUESTION_TYPES.get(str(item.get("Question type", "")).strip().lower())
+    four_options = "Option 3" in item or "Option 4" in item
+    if stated is not None and (stated == "MCQ") == four_options:
+        q_type = stated
+    elif four_options:
+        q_type = "MCQ"
+    elif "Option 1" in item or "Option 2" in item:
+        q_type = "BCQ"
+    else:
+        q_type = "Subjective"
+    return item if item.get("Question type") == q_type else {**item, "Question type": q_type}
+
+
+def plan_shards(
+    sub_topic: str, request: QuizGenerationRequest, shard_size: int = QUIZ_SHARD_SIZE
+) -> list[tuple[str, QuizGenerationRequest]]:
+    """
+    Split a request into single-type shards of at most `shard_size` questions.
+
+    A comma/semicolon separated `sub_topic` is spread round-robin over the shards.
+    """
+    sub_topics = [s.strip() for s in re.split(r"[,;\n]", sub_topic) if s.strip()] or [sub_topic]
+    shards = []
+    for field, mode in (
+        ("num_mcq", QuestionMode.ONLY_MCQ),
+        ("num_subjective", QuestionMode.ONLY_SUBJECTIVE),
+        ("num_bcq", QuestionMode.MIXED),
+    ):
+        remaining = getattr(request, field)
+        while remaining > 0:
+            count = min(shard_size, remaining)
+            counts = {"num_mcq": 0, "num_subjective": 0, "num_bcq": 0, field: count}
+            shards.append(QuizGenerationRequest(mode=mode, **counts))
+            remaining -= count
+    return [(sub_topics[i % len(sub_topics)], shard) for i, shard in enumerate(shards)]
+
+
+def _question_key(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.casefold()).split())
+
+
+def merge_shards(shard_questions: list[list]) -> Quiz:
+    """Concatenate shard results, dropping repeated questions and renumbering from 1."""
+    seen = set()
+    merged = []
+    for questions in shard_questions:
+        for q in questions:
+            key = _question_key(q.question)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(q.model_copy(update={"question_number": len(merged) + 1}))
+    return Quiz(questions=merged)
+
+
+def generate_quiz_sharded(
+    *,
+    topic: str,
+    sub_topic: str,
+    todo_instructions: str | None,
+    to_avoid_instructions: str | None,
+    request: QuizGenerationRequest,
+    shard_size: int = QUIZ_SHARD_SIZE,
+    max_retries: int = QUIZ_SHARD_RETRIES,
+    generate=None,
+) -> Quiz:
+    """
+    Generate a large AI-mode quiz as concurrent shards.
+
+    Shards run in parallel, so latency tracks the slowest shard rather than the
+    total output length. Only failed shards are retried; cross-shard duplicates
+    are removed, so the result can be slightly shorter than requested.
+    `generate(prompt, num_questions) -> Quiz` replaces the default Gemini call.
+    """
+    if generate is None:
+        generate = lambda prompt, _: parse_and_validate_quiz(call_gemini(prompt))  # noqa: E731
+    shards = plan_shards(sub_topic, request, shard_size)
+    shares_sub_topic = len({s for s, _ in shards}) < len(shards)
+
+    def run_shard(i: int) -> list:
+        shard_sub_topic, shard_request = shards[i]
+        todo = todo_instructions or ""
+        if shares_sub_topic:
+            todo = (
+                f"{todo}\nThis is part {i + 1} of {len(shards)} of a larger quiz on the same sub topic; "
+                "favour less common aspects so the parts do not overlap."
+            ).strip()
+        prompt = build_prompt_for_ai(
+            topic=topic,
+            sub_topic=shard_sub_topic,
+            todo_instructions=todo,
+            to_avoid_instructions=to_avoid_instructions,
+            request=shard_request,
+        )
+        count = shard_request.num_mcq + shard_request.num_subjective + shard_request.num_bcq
+        return generate(prompt, count).questions
+
+    results: dict[int, list] = {}
+    pending = list(range(len(shards)))
+    last_error: Exception | None = None
+    with ThreadPoolExecutor(max_workers=min(QUIZ_SHARD_WORKERS, len(shards))) as pool:
+        for attempt in range(max_retries + 1):
+            # Each shard runs in a copy of the caller's context so stage timings stay attributed.
+            futures = {pool.submit(contextvars.copy_context().run, run_shard, i): i for i in pending}
+            pending = []
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    logger.warning("Quiz shard %d/%d failed (attempt %d): %s", i + 1, len(shards), attempt + 1, e)
+                    pending.append(i)
+                    last_error = e
+            if not pending:
+                break
+    if pending:
+        raise RuntimeError(f"{len(pending)} of {len(shards)} quiz shards failed: {last_error}")
+
+    return merge_shards([results[i] for i in range(len(shards))])
 
 
 def save_quiz_to_file(quiz: Quiz, output_path: Path) -> None:
@@ -185,6 +346,12 @@ def main() -> None:
         default=0,
         help="Number of subjective questions (used for 'only_subjective' or 'mixed' modes).",
     )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=0,
+        help="AI mode only: generate in concurrent shards of at most this many questions (0 = one request).",
+    )
     parser.add_argument(
         "--output-path",
         type=Path,
@@ -206,20 +373,29 @@ def main() -> None:
             parser.error("--markdown-path is required when --source=user_content.")
         markdown_content = load_markdown(args.markdown_path)
         prompt = build_prompt_from_markdown(markdown_content, request)
+        quiz = parse_and_validate_quiz(call_gemini(prompt))
     else:
         # AI-based generation requires topic and sub-topic.
         if not args.topic or not args.sub_topic:
             parser.error("--topic and --sub-topic are required when --source=ai.")
-        prompt = build_prompt_for_ai(
-            topic=args.topic,
-            sub_topic=args.sub_topic,
-            todo_instructions=args.todo_instructions,
-            to_avoid_instructions=args.to_avoid_instructions,
-            request=request,
-        )
-
-    raw_json = call_gemini(prompt)
-    quiz = parse_and_validate_quiz(raw_json)
+        if args.shard_size > 0:
+            quiz = generate_quiz_sharded(
+                topic=args.topic,
+                sub_topic=args.sub_topic,
+                todo_instructions=args.todo_instructions,
+                to_avoid_instructions=args.to_avoid_instructions,
+                request=request,
+                shard_size=args.shard_size,
+            )
+        else:
+            prompt = build_prompt_for_ai(
+                topic=args.topic,
+                sub_topic=args.sub_topic,
+                todo_instructions=args.todo_instructions,
+                to_avoid_instructions=args.to_avoid_instructions,
+                request=request,
+            )
+            quiz = parse_and_validate_quiz(call_gemini(prompt))
 
     save_quiz_to_file(quiz, args.output_path)
     print(f"Quiz JSON saved to: {args.output_path}")
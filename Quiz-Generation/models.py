@@ -1,8 +1,8 @@
 from enum import Enum
 from pathlib import Path
-from typing import List, Literal, Optional, Union
+from typing import Annotated, List, Literal, Optional, Union
 
-from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic import BaseModel, Field, TypeAdapter, field_validator, model_validator
 
 
 class QuestionMode(str, Enum):
@@ -56,6 +56,8 @@ class MCQQuestion(BaseQuestion):
     option_2: str = Field(..., alias="Option 2")
     option_3: str = Field(..., alias="Option 3")
     option_4: str = Field(..., alias="Option 4")
+    # Kept server-side to score the answer without a model call; absent from quizzes generated before it.
+    correct_option: Optional[int] = Field(None, alias="Correct option", ge=1, le=4)
 
 
 class SubjectiveQuestion(BaseQuestion):
@@ -66,9 +68,29 @@ class BCQQuestion(BaseQuestion):
     question_type: Literal["BCQ"] = Field("BCQ", alias="Question type")
     option_1: str = Field(..., alias="Option 1")
     option_2: str = Field(..., alias="Option 2")
+    correct_option: Optional[int] = Field(None, alias="Correct option", ge=1, le=2)
 
 
-QuizQuestion = Union[MCQQuestion, SubjectiveQuestion, BCQQuestion]
+# Tagged by "Question type" so validation dispatches straight to the right model.
+QuizQuestion = Annotated[Union[MCQQuestion, SubjectiveQuestion, BCQQuestion], Field(discriminator="question_type")]
+
+# Compiled once; validates a whole model response in one pass.
+QUIZ_QUESTIONS_ADAPTER = TypeAdapter(List[QuizQuestion])
+
+
+def quiz_response_schema() -> dict:
+    """JSON schema for Gemini structured output: an array of MCQ/Subjective/BCQ objects."""
+    variants = []
+    for model in (MCQQuestion, SubjectiveQuestion, BCQQuestion):
+        schema = model.model_json_schema(by_alias=True)
+        # The tag has a default in the models, but the model must always emit it.
+        schema["required"] = ["Question type", *schema["required"]]
+        if "Correct option" in schema["properties"]:
+            # Likewise the answer key, which validation only accepts as optional for older quizzes.
+            schema["properties"]["Correct option"] = schema["properties"]["Correct option"]["anyOf"][0]
+            schema["required"].append("Correct option")
+        variants.append(schema)
+    return {"type": "array", "items": {"anyOf": variants}}
 
 
 class Quiz(BaseModel):
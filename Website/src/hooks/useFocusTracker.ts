@@ -1,6 +1,7 @@
 import { useRef, useState, useCallback, useEffect } from 'react';
 import { FaceLandmarker, FilesetResolver } from '@mediapipe/tasks-vision';
-import type { FocusSnapshot, PerQuestionFocus, SessionFocusSummary } from '@/types/quiz';
+import { api } from '@/lib/api';
+import type { FocusBatch, FocusSnapshot, PerQuestionFocus, SessionFocusSummary } from '@/types/quiz';
 
 // Landmark indices ported from eye-focus-level/focus-level.py
 const LEFT_IRIS = [474, 475, 476, 477];
@@ -12,6 +13,11 @@ const RIGHT_EYE_OUTER = 33;
 
 const HISTORY_SIZE = 30;
 
+// Snapshots are uploaded to the backend in columnar batches this often.
+const TELEMETRY_FLUSH_MS = 5000;
+// Unsent batches kept while the backend is unreachable; older ones are dropped.
+const TELEMETRY_MAX_QUEUED = 20;
+
 // --- Core math functions ported from Python ---
 
 function getIrisCenter(
@@ -60,6 +66,58 @@ function getFocusStatus(focusLevel: number): string {
   return 'NOT FOCUSED';
 }
 
+// --- Telemetry batching ---
+
+interface TelemetryBuffer {
+  sessionId: string;
+  seq: number;
+  startMs: number;
+  lastMs: number;
+  dt: number[];
+  question: number[];
+  focus: number[];
+  left: number[];
+  right: number[];
+}
+
+function newTelemetryBuffer(sessionId: string): TelemetryBuffer {
+  return { sessionId, seq: 0, startMs: 0, lastMs: 0, dt: [], question: [], focus: [], left: [], right: [] };
+}
+
+function appendSnapshot(buffer: TelemetryBuffer, questionNumber: number, snapshot: FocusSnapshot) {
+  if (buffer.dt.length === 0) {
+    buffer.startMs = snapshot.timestamp;
+    buffer.dt.push(0);
+  } else {
+    buffer.dt.push(Math.max(0, snapshot.timestamp - buffer.lastMs));
+  }
+  buffer.lastMs = snapshot.timestamp;
+  buffer.question.push(questionNumber);
+  buffer.focus.push(Math.round(snapshot.focusLevel * 2));
+  buffer.left.push(Math.round(snapshot.leftGazeRatio * 255));
+  buffer.right.push(Math.round(snapshot.rightGazeRatio * 255));
+}
+
+function takeBatch(buffer: TelemetryBuffer): FocusBatch | null {
+  if (buffer.dt.length === 0) return null;
+  const batch: FocusBatch = {
+    session_id: buffer.sessionId,
+    seq: buffer.seq++,
+    start_ms: buffer.startMs,
+    dt_ms: buffer.dt,
+    question: buffer.question,
+    focus: buffer.focus,
+    left_gaze: buffer.left,
+    right_gaze: buffer.right,
+  };
+  buffer.dt = [];
+  buffer.question = [];
+  buffer.focus = [];
+  buffer.left = [];
+  buffer.right = [];
+  return batch;
+}
+
 // --- Hook ---
 
 export interface UseFocusTrackerReturn {
@@ -72,6 +130,8 @@ export interface UseFocusTrackerReturn {
   setCurrentQuestion: (questionNumber: number) => void;
   getSessionSummary: () => SessionFocusSummary;
   getPerQuestionData: () => PerQuestionFocus[];
+  /** Id under which this tracking session's snapshots are sent to the backend. */
+  getTelemetrySessionId: () => string | null;
 }
 
 export function useFocusTracker(): UseFocusTrackerReturn {
@@ -89,6 +149,12 @@ export function useFocusTracker(): UseFocusTrackerReturn {
   // Smoothing buffer (like Python deque(maxlen=30))
   const focusHistoryRef = useRef<number[]>([]);
 
+  // Telemetry upload
+  const telemetryRef = useRef<TelemetryBuffer | null>(null);
+  const telemetryQueueRef = useRef<FocusBatch[]>([]);
+  const telemetrySendingRef = useRef(false);
+  const telemetryTimerRef = useRef<number>(0);
+
   const [isReady, setIsReady] = useState(false);
   const [isTracking, setIsTracking] = useState(false);
   const [currentFocusLevel, setCurrentFocusLevel] = useState(0);
@@ -129,6 +195,7 @@ export function useFocusTracker(): UseFocusTrackerReturn {
 
     return () => {
       cancelled = true;
+      window.clearInterval(telemetryTimerRef.current);
       faceLandmarkerRef.current?.close();
     };
   }, []);
@@ -198,12 +265,14 @@ export function useFocusTracker(): UseFocusTrackerReturn {
               startTime: Date.now(),
             });
           }
-          questionDataRef.current.get(qNum)!.snapshots.push({
+          const snapshot: FocusSnapshot = {
             timestamp: Date.now(),
             focusLevel: smoothed,
             leftGazeRatio: leftRatio,
             rightGazeRatio: rightRatio,
-          });
+          };
+          questionDataRef.current.get(qNum)!.snapshots.push(snapshot);
+          if (telemetryRef.current) appendSnapshot(telemetryRef.current, qNum, snapshot);
         }
       }
     } catch {
@@ -213,6 +282,31 @@ export function useFocusTracker(): UseFocusTrackerReturn {
     animationFrameRef.current = requestAnimationFrame(detectFrame);
   }, []);
 
+  const flushTelemetry = useCallback(async () => {
+    const batch = telemetryRef.current && takeBatch(telemetryRef.current);
+    if (batch) {
+      const queue = telemetryQueueRef.current;
+      queue.push(batch);
+      queue.splice(0, Math.max(0, queue.length - TELEMETRY_MAX_QUEUED));
+    }
+    if (telemetrySendingRef.current) return;
+    telemetrySendingRef.current = true;
+    try {
+      // In order, one at a time; a batch that failed in transit stays queued for the next flush,
+      // one the server rejected is dropped so it cannot hold up the rest.
+      while (telemetryQueueRef.current.length > 0) {
+        if (!(await api.sendFocusBatch(telemetryQueueRef.current[0]))) {
+          console.warn('Focus telemetry batch rejected by the server, dropping it.');
+        }
+        telemetryQueueRef.current.shift();
+      }
+    } catch (err) {
+      console.warn('Focus telemetry upload failed, will retry:', err);
+    } finally {
+      telemetrySendingRef.current = false;
+    }
+  }, []);
+
   const startTracking = useCallback(
     (videoElement: HTMLVideoElement) => {
       videoRef.current = videoElement;
@@ -220,16 +314,22 @@ export function useFocusTracker(): UseFocusTrackerReturn {
       setIsTracking(true);
       focusHistoryRef.current = [];
       questionDataRef.current.clear();
+      telemetryRef.current = newTelemetryBuffer(crypto.randomUUID());
+      telemetryQueueRef.current = [];
+      window.clearInterval(telemetryTimerRef.current);
+      telemetryTimerRef.current = window.setInterval(flushTelemetry, TELEMETRY_FLUSH_MS);
       animationFrameRef.current = requestAnimationFrame(detectFrame);
     },
-    [detectFrame],
+    [detectFrame, flushTelemetry],
   );
 
   const stopTracking = useCallback(() => {
     trackingRef.current = false;
     cancelAnimationFrame(animationFrameRef.current);
+    window.clearInterval(telemetryTimerRef.current);
+    flushTelemetry();
     setIsTracking(false);
-  }, []);
+  }, [flushTelemetry]);
 
   const setCurrentQuestion = useCallback((questionNumber: number) => {
     currentQuestionRef.current = questionNumber;
@@ -289,6 +389,11 @@ export function useFocusTracker(): UseFocusTrackerReturn {
     };
   }, [getPerQuestionData]);
 
+  const getTelemetrySessionId = useCallback(
+    () => telemetryRef.current?.sessionId ?? null,
+    [],
+  );
+
   return {
     isReady,
     isTracking,
@@ -299,5 +404,6 @@ export function useFocusTracker(): UseFocusTrackerReturn {
     setCurrentQuestion,
     getSessionSummary,
     getPerQuestionData,
+    getTelemetrySessionId,
   };
 }
@@ -1,10 +1,12 @@
+import type { FocusBatch } from '@/types/quiz';
+
 const API_BASE = import.meta.env.VITE_API_URL
   || (import.meta.env.PROD
     ? 'https://regular-roslyn-sukkur-iba-1801acae.koyeb.app/api'
     : `http://${window.location.hostname}:8000/api`);
 
 export const api = {
-  async convertFile(file: File): Promise<{ markdown: string }> {
+  async convertFile(file: File): Promise<{ markdown: string; document_id?: string | null }> {
     const formData = new FormData();
     formData.append('file', file);
     const res = await fetch(`${API_BASE}/convert/upload`, {
@@ -13,18 +15,21 @@ export const api = {
     });
     if (!res.ok) {
       const detail = await res.json().catch(() => ({}));
-      throw new Error(detail.detail || `Conversion failed: ${res.statusText}`);
+      // Admission-control rejections carry a structured detail: { code, message, ... }.
+      const message = typeof detail.detail === 'object' ? detail.detail?.message : detail.detail;
+      throw new Error(message || `Conversion failed: ${res.statusText}`);
     }
     return res.json();
   },
 
   async generateQuizFromContent(params: {
     markdown_content: string;
+    document_id?: string | null;
     mode: string;
     num_mcq: number;
     num_subjective: number;
     num_bcq: number;
-  }): Promise<{ questions: any[] }> {
+  }): Promise<{ questions: any[]; quiz_id?: string | null }> {
     const res = await fetch(`${API_BASE}/quiz/generate-from-content`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
@@ -46,7 +51,8 @@ export const api = {
     num_mcq: number;
     num_subjective: number;
     num_bcq: number;
-  }): Promise<{ questions: any[] }> {
+    user_id?: string;
+  }): Promise<{ questions: any[]; quiz_id?: string | null }> {
     const res = await fetch(`${API_BASE}/quiz/generate-from-ai`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
@@ -75,4 +81,85 @@ export const api = {
     }
     return res.json();
   },
+
+  async evaluateQuizById(params: {
+    quiz_id: string;
+    user_answers_json: any[];
+  }): Promise<{ results: { question_number: number; score: number }[] }> {
+    const res = await fetch(`${API_BASE}/evaluate/submit-by-id`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(params),
+    });
+    if (!res.ok) {
+      const detail = await res.json().catch(() => ({}));
+      throw new Error(detail.detail || `Evaluation failed: ${res.statusText}`);
+    }
+    return res.json();
+  },
+
+  /**
+   * Streaming variant of `evaluateQuizById`: `onScores` is called with each
+   * group of scores as the backend grades it; resolves with every score
+   * received and the numbers of the questions whose group failed to grade,
+   * so only those need to be resubmitted.
+   */
+  async evaluateQuizByIdStream(
+    params: { quiz_id: string; user_answers_json: any[] },
+    onScores: (results: { question_number: number; score: number }[]) => void,
+  ): Promise<{ results: { question_number: number; score: number }[]; failed: number[] }> {
+    const res = await fetch(`${API_BASE}/evaluate/submit-by-id-stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: 'application/x-ndjson' },
+      body: JSON.stringify(params),
+    });
+    if (!res.ok || !res.body) {
+      const detail = await res.json().catch(() => ({}));
+      throw new Error(detail.detail || `Evaluation failed: ${res.statusText}`);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    const failed: number[] = [];
+    for (;;) {
+      const { done, value } = await reader.read();
+      buffered += decoder.decode(value, { stream: !done });
+      const lines = buffered.split('\n');
+      buffered = done ? '' : lines.pop() ?? '';
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const event = JSON.parse(line);
+        if (event.event === 'scores') onScores(event.results);
+        else if (event.event === 'error') failed.push(...event.question_numbers);
+        else if (event.event === 'done') return { results: event.results, failed };
+      }
+      if (done) throw new Error('Evaluation stream ended early.');
+    }
+  },
+
+  /**
+   * Upload one batch of focus telemetry, gzip-compressed where the browser supports it.
+   * Resolves false when the server rejects the batch itself (a 4xx other than
+   * 408/429), which resending cannot fix; throws on network errors and 5xx.
+   */
+  async sendFocusBatch(batch: FocusBatch): Promise<boolean> {
+    const json = JSON.stringify(batch);
+    const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+    let body: BodyInit = json;
+    if (typeof CompressionStream !== 'undefined') {
+      const compressed = new Blob([json]).stream().pipeThrough(new CompressionStream('gzip'));
+      body = await new Response(compressed).blob();
+      headers['Content-Encoding'] = 'gzip';
+    }
+    const res = await fetch(`${API_BASE}/telemetry/focus`, {
+      method: 'POST',
+      headers,
+      body,
+      keepalive: true,
+    });
+    if (res.ok) return true;
+    if (res.status >= 400 && res.status < 500 && res.status !== 408 && res.status !== 429) return false;
+    throw new Error(`Telemetry upload failed: ${res.statusText}`);
+  },
 };
@@ -11,10 +11,12 @@ import { QuizFormat, QuizCreationParams } from '@/types/quiz';
 import { Upload, Sparkles, FileText, Brain, ArrowLeft, ArrowRight, CheckCircle, Loader2 } from 'lucide-react';
 import { toast } from 'sonner';
 import { api } from '@/lib/api';
+import { useAuth } from '@/contexts/AuthContext';
 import { backendToFrontend } from '@/lib/quizTransformers';
 
 const CreateQuiz = () => {
   const navigate = useNavigate();
+  const { user } = useAuth();
   const [searchParams] = useSearchParams();
   const initialGen = searchParams.get('type') === 'content' ? 'content' : 'ai';
   const [generationType, setGenerationType] = useState<'content' | 'ai'>(initialGen);
@@ -159,6 +161,8 @@ const CreateQuiz = () => {
 
       let backendQuestions: any[];
       let markdownContent: string | null = null;
+      let documentId: string | null = null;
+      let serverQuizId: string | null = null;
 
       if (generationType === 'content') {
         // Step 1: Convert file to markdown
@@ -171,18 +175,22 @@ const CreateQuiz = () => {
         } else {
           const convertResult = await api.convertFile(uploadedFile!);
           markdownContent = convertResult.markdown;
+          documentId = convertResult.document_id ?? null;
         }
 
         // Step 2: Generate quiz from markdown
         setLoadingMessage('Generating quiz questions...');
         const genResult = await api.generateQuizFromContent({
           markdown_content: markdownContent,
+          // Lets the server index the notes from the parsed document instead of re-splitting the Markdown.
+          document_id: documentId,
           mode,
           num_mcq: numMcq,
           num_subjective: numSubjective,
           num_bcq: numBcq,
         });
         backendQuestions = genResult.questions;
+        serverQuizId = genResult.quiz_id ?? null;
       } else {
         // AI-based generation
         setLoadingMessage('Generating quiz questions with AI...');
@@ -195,8 +203,10 @@ const CreateQuiz = () => {
           num_mcq: numMcq,
           num_subjective: numSubjective,
           num_bcq: numBcq,
+          user_id: user?.id,
         });
         backendQuestions = genResult.questions;
+        serverQuizId = genResult.quiz_id ?? null;
       }
 
       // Transform to frontend format
@@ -215,6 +225,7 @@ const CreateQuiz = () => {
         questions,
         rawBackendQuestions: backendQuestions,
         markdownContent,
+        serverQuizId,
         format,
         timeLimit: formData.timeLimit || 15,
         topic: formData.topic,
@@ -38,6 +38,7 @@ const QuizInterface = () => {
   // Raw backend JSON + optional markdown kept for evaluation
   const rawBackendQuestions: any[] = storedQuiz?.rawBackendQuestions ?? [];
   const notesMarkdown: string | null = storedQuiz?.markdownContent ?? null;
+  const serverQuizId: string | null = storedQuiz?.serverQuizId ?? null;
 
   const webcamRef = useRef<WebcamPreviewHandle>(null);
   const tabSwitchTimeoutRef = useRef<NodeJS.Timeout | null>(null);
@@ -69,6 +70,7 @@ const QuizInterface = () => {
   const [showCameraError, setShowCameraError] = useState(false);
   const cameraStreamRef = useRef<MediaStream | null>(null);
   const [isEvaluating, setIsEvaluating] = useState(false);
+  const [scoredCount, setScoredCount] = useState(0);
 
   // Guards — rendered AFTER all hooks to avoid violating rules of hooks
   if (!id) {
@@ -258,12 +260,36 @@ const QuizInterface = () => {
       // Call evaluation API
       let evaluationResults: { question_number: number; score: number }[] = [];
       try {
-        const evalResponse = await api.evaluateQuiz({
-          quiz_json: rawBackendQuestions,
-          user_answers_json: backendAnswers,
+        // Quizzes stored server-side are graded by id; the full quiz and notes
+        // are only uploaded for older quizzes or if the server lost the quiz.
+        // Scores are streamed so the overlay can show progress on long quizzes.
+        setScoredCount(0);
+        const evaluateUploaded = (numbers?: number[]) => api.evaluateQuiz({
+          quiz_json: numbers
+            ? rawBackendQuestions.filter((q) => numbers.includes(q['Question number']))
+            : rawBackendQuestions,
+          user_answers_json: numbers
+            ? backendAnswers.filter((a) => numbers.includes(a['Question number']))
+            : backendAnswers,
           notes_markdown: notesMarkdown,
         });
-        evaluationResults = evalResponse.results;
+        if (serverQuizId) {
+          const streamed = await api.evaluateQuizByIdStream(
+            { quiz_id: serverQuizId, user_answers_json: backendAnswers },
+            (results) => setScoredCount((count) => count + results.length),
+          ).catch(() => null);
+          if (!streamed) {
+            evaluationResults = (await evaluateUploaded()).results;
+          } else {
+            // Keep the scores already streamed (even if the retry fails); resubmit only the groups that failed.
+            evaluationResults = streamed.results;
+            if (streamed.failed.length > 0) {
+              evaluationResults = [...streamed.results, ...(await evaluateUploaded(streamed.failed)).results];
+            }
+          }
+        } else {
+          evaluationResults = (await evaluateUploaded()).results;
+        }
       } catch (evalErr: any) {
         console.error('Evaluation API failed:', evalErr);
         toast.error('Evaluation failed. Saving results without AI scoring.');
@@ -889,7 +915,11 @@ const QuizInterface = () => {
           <div className="text-center">
             <Loader2 className="h-12 w-12 animate-spin text-primary mx-auto mb-4" />
             <h2 className="text-xl font-bold mb-2">Evaluating Your Answers...</h2>
-            <p className="text-muted-foreground">AI is reviewing your responses. This may take a moment.</p>
+            <p className="text-muted-foreground">
+              {scoredCount > 0
+                ? `Scored ${scoredCount} of ${quizQuestions.length} questions...`
+                : 'AI is reviewing your responses. This may take a moment.'}
+            </p>
           </div>
         </div>
       )}
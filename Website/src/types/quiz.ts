@@ -81,6 +81,22 @@ export interface FocusSnapshot {
   rightGazeRatio: number;
 }
 
+/**
+ * Columnar batch of focus snapshots sent to `/api/telemetry/focus`.
+ * Timestamps are deltas from `start_ms`; focus is in half points (0-200),
+ * gaze ratios are scaled to 0-255.
+ */
+export interface FocusBatch {
+  session_id: string;
+  seq: number;
+  start_ms: number;
+  dt_ms: number[];
+  question: number[];
+  focus: number[];
+  left_gaze: number[];
+  right_gaze: number[];
+}
+
 export interface PerQuestionFocus {
   questionNumber: number;
   averageFocusPercent: number;
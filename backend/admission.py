@@ -0,0 +1,303 @@
+"""
+Admission control for document conversion.
+
+One 2 GB PDF or a pathological PPTX must not pin a worker or exhaust memory
+for every other request, so uploads pass through several cheap gates before
+(and while) a converter runs:
+
+- `UploadLimitMiddleware` rejects an upload over CONVERT_MAX_UPLOAD_BYTES from
+  its Content-Length, or while the body streams in, before anything buffers it;
+- `inspect` sniffs the format from magic bytes (not the file name) and opens
+  just enough of the file to count pages or slides and spot encryption or a
+  zip bomb;
+- `conversion_limits` gives the converters page, wall-time and output budgets
+  that they check between pages, slides and body elements;
+- `budget` is an async semaphore weighted by each conversion's estimated peak
+  memory and sized by CONVERT_MEMORY_BUDGET_MB; a request that cannot get its
+  share within CONVERT_QUEUE_TIMEOUT_S is turned away with 503.
+
+Every rejection is an HTTPException whose detail is `{"code", "message", ...}`,
+so a client can tell a document that is too heavy for the synchronous path
+(413, 503) from one that can never be converted (415, 422).
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import re
+import zipfile
+from dataclasses import dataclass
+
+from fastapi import HTTPException
+
+import metrics
+
+CONVERT_MAX_UPLOAD_BYTES = int(os.getenv("CONVERT_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+CONVERT_MAX_EXPANDED_BYTES = int(os.getenv("CONVERT_MAX_EXPANDED_BYTES", str(400 * 1024 * 1024)))
+CONVERT_MAX_PAGES = int(os.getenv("CONVERT_MAX_PAGES", "300"))
+CONVERT_MAX_SECONDS = float(os.getenv("CONVERT_MAX_SECONDS", "60"))
+CONVERT_MAX_OUTPUT_CHARS = int(os.getenv("CONVERT_MAX_OUTPUT_CHARS", "2000000"))
+CONVERT_MEMORY_BUDGET_MB = float(os.getenv("CONVERT_MEMORY_BUDGET_MB", "1024"))
+# Estimated peak converter memory: a fixed base plus this many MB per MB of (uncompressed) document.
+CONVERT_MEMORY_BASE_MB = float(os.getenv("CONVERT_MEMORY_BASE_MB", "32"))
+CONVERT_MEMORY_FACTOR = float(os.getenv("CONVERT_MEMORY_FACTOR", "4"))
+CONVERT_QUEUE_TIMEOUT_S = float(os.getenv("CONVERT_QUEUE_TIMEOUT_S", "2"))
+
+UPLOAD_PATH = "/api/convert/upload"
+
+_OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+# Office wraps password-protected .docx/.pptx files in an OLE container with this stream.
+_ENCRYPTED_PACKAGE = "EncryptedPackage".encode("utf-16-le")
+_SLIDE_RE = re.compile(r"ppt/slides/slide\d+\.xml")
+_PAGES_RE = re.compile(rb"<Pages>(\d+)</Pages>")
+
+REJECTIONS = metrics.counter(
+    "retina_convert_rejections_total",
+    "Requests turned away by admission control (conversions, and oversized telemetry), by reason.",
+    ("code",),
+)
+
+
+def rejection(status: int, code: str, message: str, headers: dict | None = None, **extra) -> HTTPException:
+    REJECTIONS.inc(code=code)
+    return HTTPException(status_code=status, detail={"code": code, "message": message, **extra}, headers=headers)
+
+
+def limit_rejection(e) -> HTTPException:
+    """Rejection for a converter's `ConversionLimitExceeded`."""
+    code = {"pages": "too_many_pages", "seconds": "too_slow", "output_chars": "output_too_large"}[e.limit]
+    return rejection(413, code, str(e), limit=e.maximum, value=e.value)
+
+
+# ---------------------------------------------------------------------------
+# Upload size
+# ---------------------------------------------------------------------------
+
+
+class _UploadTooLarge(HTTPException):
+    # An HTTPException so FastAPI's form parsing re-raises it instead of turning it into a 400.
+    def __init__(self, max_bytes: int, code: str = "upload_too_large"):
+        super().__init__(
+            status_code=413,
+            detail={
+                "code": code,
+                "message": f"Uploads are limited to {max_bytes} bytes.",
+                "limit": max_bytes,
+            },
+        )
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware capping the request body size of conversion uploads (or,
+    given `path` and `max_bytes`, of another route's requests). Rejections
+    are counted and reported under `code`.
+
+    It must wrap every middleware that reads the body (IdempotencyMiddleware
+    buffers it), or the whole upload is read before the cap applies.
+    """
+
+    def __init__(
+        self,
+        app,
+        path: str = UPLOAD_PATH,
+        max_bytes: int = CONVERT_MAX_UPLOAD_BYTES,
+        code: str = "upload_too_large",
+    ):
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+        self.code = code
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope.get("headers") or ()).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            REJECTIONS.inc(code=self.code)
+            await self._reject(send)
+            return
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    REJECTIONS.inc(code=self.code)
+                    raise _UploadTooLarge(self.max_bytes, self.code)
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _UploadTooLarge:
+            # Raised outside FastAPI's exception handling (e.g. while a middleware buffered the body).
+            if not started:
+                await self._reject(send)
+
+    async def _reject(self, send) -> None:
+        error = _UploadTooLarge(self.max_bytes, self.code)
+        await send_json(send, error.status_code, {"detail": error.detail})
+
+
+async def send_json(send, status: int, payload: dict) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+# ---------------------------------------------------------------------------
+# Format sniffing and pre-inspection
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class Inspection:
+    format: str  # ".pdf", ".docx", ".pptx" or ".ppt", from the content rather than the file name
+    pages: int | None  # pages or slides, when cheaply known
+    expanded_bytes: int  # uncompressed size of an OOXML package, otherwise the upload size
+
+
+def inspect(content: bytes, ext: str) -> Inspection:
+    """Identify and pre-inspect an upload named `*ext`; raises a rejection if it is unsupported, encrypted or too large."""
+    if b"%PDF-" in content[:1024]:
+        inspection = _inspect_pdf(content)
+    elif content.startswith(b"PK\x03\x04"):
+        inspection = _inspect_ooxml(content)
+    elif content.startswith(_OLE_MAGIC):
+        if _ENCRYPTED_PACKAGE in content:
+            raise rejection(422, "encrypted", "Password-protected documents cannot be converted.")
+        if ext != ".ppt":
+            # The OLE container is shared by .doc, .xls and .ppt; only the last has a converter.
+            raise rejection(415, "unsupported_format", "Legacy Office files other than .ppt are not supported.")
+        inspection = Inspection(".ppt", None, len(content))
+    else:
+        raise rejection(415, "unsupported_format", "The file is not a PDF, DOCX, PPTX or PPT document.")
+
+    if inspection.pages is not None and inspection.pages > CONVERT_MAX_PAGES:
+        raise rejection(
+            413,
+            "too_many_pages",
+            f"Documents are limited to {CONVERT_MAX_PAGES} pages or slides.",
+            limit=CONVERT_MAX_PAGES,
+            value=inspection.pages,
+        )
+    if inspection.expanded_bytes > CONVERT_MAX_EXPANDED_BYTES:
+        raise rejection(
+            413,
+            "too_large_uncompressed",
+            f"Documents are limited to {CONVERT_MAX_EXPANDED_BYTES} bytes uncompressed.",
+            limit=CONVERT_MAX_EXPANDED_BYTES,
+            value=inspection.expanded_bytes,
+        )
+    return inspection
+
+
+def _inspect_pdf(content: bytes) -> Inspection:
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        return Inspection(".pdf", None, len(content))
+    try:
+        # Opening reads the trailer and cross-reference table, not page content.
+        with fitz.open(stream=content, filetype="pdf") as doc:
+            if doc.needs_pass:
+                raise rejection(422, "encrypted", "Password-protected documents cannot be converted.")
+            return Inspection(".pdf", doc.page_count, len(content))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise rejection(422, "corrupt", f"The PDF could not be opened: {e}")
+
+
+def _inspect_ooxml(content: bytes) -> Inspection:
+    try:
+        package = zipfile.ZipFile(io.BytesIO(content))
+        infos = package.infolist()
+    except (zipfile.BadZipFile, ValueError) as e:
+        raise rejection(422, "corrupt", f"The document package could not be read: {e}")
+    if any(info.flag_bits & 0x1 for info in infos):
+        raise rejection(422, "encrypted", "Password-protected documents cannot be converted.")
+
+    names = {info.filename for info in infos}
+    expanded = sum(info.file_size for info in infos)
+    if "word/document.xml" in names:
+        pages = None
+        if "docProps/app.xml" in names:
+            # Word records the page count it last laid out; there is no cheaper way to know.
+            match = _PAGES_RE.search(package.read("docProps/app.xml"))
+            pages = int(match.group(1)) if match else None
+        return Inspection(".docx", pages, expanded)
+    if "ppt/presentation.xml" in names:
+        return Inspection(".pptx", sum(1 for name in names if _SLIDE_RE.fullmatch(name)), expanded)
+    raise rejection(415, "unsupported_format", "The ZIP package is not a Word or PowerPoint document.")
+
+
+def conversion_limits(converter):
+    """Fresh cooperative limits for one run of a file_to_markdown converter."""
+    return converter.ConversionLimits(
+        max_pages=CONVERT_MAX_PAGES,
+        max_seconds=CONVERT_MAX_SECONDS,
+        max_output_chars=CONVERT_MAX_OUTPUT_CHARS,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Memory budget
+# ---------------------------------------------------------------------------
+
+
+def estimate_mb(inspection: Inspection) -> float:
+    return CONVERT_MEMORY_BASE_MB + CONVERT_MEMORY_FACTOR * inspection.expanded_bytes / (1024 * 1024)
+
+
+class MemoryBudget:
+    """Async semaphore over estimated megabytes; one conversion larger than the whole budget runs alone."""
+
+    def __init__(self, budget_mb: float):
+        self.budget_mb = budget_mb
+        self.in_use_mb = 0.0
+        self._cond = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def reserve(self, cost_mb: float, timeout: float = CONVERT_QUEUE_TIMEOUT_S):
+        cost = min(cost_mb, self.budget_mb)
+        try:
+            async with self._cond:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self.in_use_mb + cost <= self.budget_mb), timeout)
+                self.in_use_mb += cost
+        except asyncio.TimeoutError:
+            raise rejection(
+                503,
+                "busy",
+                "The converter is at capacity; retry shortly.",
+                headers={"Retry-After": str(max(1, round(CONVERT_QUEUE_TIMEOUT_S)))},
+                estimated_mb=round(cost_mb),
+            )
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.in_use_mb -= cost
+                self._cond.notify_all()
+
+
+budget = MemoryBudget(CONVERT_MEMORY_BUDGET_MB)
@@ -0,0 +1,151 @@
+"""
+Near-duplicate clustering of a cohort's answers for batch grading.
+
+A class's subjective answers to one question usually fall into a handful of
+paraphrase clusters. Answers are embedded as TF-IDF vectors over word tokens
+and character trigrams, and grouped by greedy leader clustering on cosine
+similarity: the most common answer opens a cluster and absorbs every unassigned
+answer at least `threshold` similar to it.
+
+Each cluster is graded once through its representative and the score is fanned
+out to its members. Members below the `confidence` similarity are outliers and
+get graded apart from the cluster, once per distinct answer. MCQ/BCQ answers are only grouped when identical.
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from score_cache import normalize_answer
+
+CLUSTER_SIMILARITY = float(os.getenv("ANSWER_CLUSTER_SIMILARITY", "0.8"))
+CLUSTER_CONFIDENCE = float(os.getenv("ANSWER_CLUSTER_CONFIDENCE", "0.9"))
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass
+class AnswerCluster:
+    representative: int
+    members: list[int]
+    similarities: list[float]
+
+    @property
+    def size(self) -> int:
+        return len(self.members)
+
+
+@dataclass
+class GradingItem:
+    """One answer sent to the grader, standing in for `members` (submission indices)."""
+
+    question: dict
+    answer: str
+    members: list[int] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.members)
+
+
+def _features(text: str) -> list[str]:
+    words = _WORD_RE.findall(text)
+    padded = f" {text} "
+    return words + [padded[i : i + 3] for i in range(len(padded) - 2)]
+
+
+def tfidf_matrix(texts: list[str]) -> np.ndarray:
+    """L2-normalized TF-IDF rows, one per text."""
+    vocab: dict[str, int] = {}
+    rows = []
+    for text in texts:
+        counts: dict[int, int] = {}
+        for feature in _features(text):
+            j = vocab.setdefault(feature, len(vocab))
+            counts[j] = counts.get(j, 0) + 1
+        rows.append(counts)
+
+    matrix = np.zeros((len(texts), max(len(vocab), 1)), dtype=np.float32)
+    for i, counts in enumerate(rows):
+        if counts:
+            matrix[i, list(counts)] = list(counts.values())
+    df = np.count_nonzero(matrix, axis=0)
+    matrix *= np.log((1 + len(texts)) / (1 + df)) + 1
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def cluster_answers(answers: list[str], threshold: float = CLUSTER_SIMILARITY) -> list[AnswerCluster]:
+    """Group `answers` (indices into the list) into near-duplicate clusters."""
+    # Identical normalized answers always share a cluster.
+    distinct: dict[str, list[int]] = {}
+    for i, answer in enumerate(answers):
+        distinct.setdefault(normalize_answer(answer), []).append(i)
+    texts = list(distinct)
+    if not texts:
+        return []
+
+    vectors = tfidf_matrix(texts)
+    sims = vectors @ vectors.T
+    assigned = np.full(len(texts), -1)
+    clusters = []
+    # The most common answers lead, so clusters form around typical phrasings.
+    for leader in sorted(range(len(texts)), key=lambda i: -len(distinct[texts[i]])):
+        if assigned[leader] >= 0:
+            continue
+        joined = np.flatnonzero((assigned < 0) & (sims[leader] >= threshold))
+        joined = np.union1d(joined, [leader])
+        assigned[joined] = len(clusters)
+        members, similarities = [], []
+        for j in joined:
+            members.extend(distinct[texts[j]])
+            similarities.extend([float(sims[leader, j]) if j != leader else 1.0] * len(distinct[texts[j]]))
+        clusters.append(AnswerCluster(distinct[texts[leader]][0], members, similarities))
+    return clusters
+
+
+def _get(obj: dict, *keys):
+    for key in keys:
+        if key in obj:
+            return obj[key]
+    return None
+
+
+def plan_batch(
+    quiz_json: list[dict],
+    submissions: list[list[dict]],
+    threshold: float = CLUSTER_SIMILARITY,
+    confidence: float = CLUSTER_CONFIDENCE,
+) -> list[GradingItem]:
+    """
+    Reduce a cohort's submissions to the distinct answers that need grading.
+
+    `submissions` holds each student's `user_answers_json`; every returned item's
+    `members` are indices into it.
+    """
+    items = []
+    for question in quiz_json:
+        number = _get(question, "Question number", "question_number")
+        answers = []
+        for submission in submissions:
+            answer = next(
+                (_get(a, "Answer", "answer") for a in submission if _get(a, "Question number", "question_number") == number),
+                None,
+            )
+            answers.append("" if answer is None else str(answer))
+
+        subjective = _get(question, "Question type", "question_type") == "Subjective"
+        for cluster in cluster_answers(answers, threshold if subjective else 1.0):
+            confident = [m for m, sim in zip(cluster.members, cluster.similarities) if sim >= confidence]
+            items.append(GradingItem(question, answers[cluster.representative], confident))
+            # Borderline members are graded on their own rather than inheriting the score,
+            # once per distinct answer.
+            outliers: dict[str, list[int]] = {}
+            for member, sim in zip(cluster.members, cluster.similarities):
+                if sim < confidence:
+                    outliers.setdefault(normalize_answer(answers[member]), []).append(member)
+            for members in outliers.values():
+                items.append(GradingItem(question, answers[members[0]], members))
+    return items
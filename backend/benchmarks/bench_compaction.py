@@ -0,0 +1,98 @@
+"""
+Benchmark the effect of notes compaction on (mocked) Gemini latency.
+
+Gemini is replaced by a mock whose latency grows with the prompt size, so the
+numbers show how much of the request time compaction removes without calling
+the real API.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_compaction --pages 200 --runs 5
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+
+import compaction
+import main
+import routers
+
+# Mock latency model: fixed overhead plus per-input-token prefill cost.
+BASE_LATENCY_S = 0.05
+PER_TOKEN_LATENCY_S = 2e-6
+
+_CANNED_QUIZ = json.dumps(
+    [{"Question number": 1, "Question": "What is a palindrome?", "Question type": "Subjective"}]
+)
+
+
+def make_converted_notes(pages: int) -> str:
+    """Build markdown shaped like `file_to_markdown.py` PDF output."""
+    source = (main.QUIZ_GEN_DIR / "Theory of Automata.md").read_text(encoding="utf-8")
+    sections = source.lstrip("# ").split("\n# ")
+    out = []
+    for page in range(pages):
+        if page > 0:
+            out.append("\n---\n")
+        out.append("## LECTURE NOTES - THEORY OF AUTOMATA")
+        out.append("")
+        out.append("# " + sections[page % len(sections)].strip())
+        out.append("")
+        out.append(f"![Page {page + 1} Image 1](notes_images/page{page + 1}_image1.png)")
+        out.append("")
+        out.append(f"{page + 1}")
+        out.append("Department of Computer Science    |    Confidential")
+    return "\n".join(out)
+
+
+def _mock_call_gemini(prompt: str, model: str = "") -> str:
+    time.sleep(BASE_LATENCY_S + compaction.estimate_tokens(prompt) * PER_TOKEN_LATENCY_S)
+    return _CANNED_QUIZ
+
+
+def _run(client: TestClient, notes: str, runs: int) -> dict:
+    latencies = []
+    saved = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        resp = client.post(
+            "/api/quiz/generate-from-content",
+            json={"markdown_content": notes, "mode": "only_subjective", "num_subjective": 1},
+        )
+        latencies.append(time.perf_counter() - start)
+        resp.raise_for_status()
+        saved = int(resp.headers.get("X-Notes-Tokens-Saved", "0"))
+    return {"median_s": statistics.median(latencies), "tokens_saved": saved}
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=compaction.NOTES_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    routers.quiz_gen_main.call_gemini = _mock_call_gemini
+    compaction.NOTES_TOKEN_BUDGET = args.budget
+    notes = make_converted_notes(args.pages)
+    client = TestClient(main.app)
+
+    compaction.NOTES_COMPACTION_ENABLED = False
+    before = _run(client, notes, args.runs)
+    compaction.NOTES_COMPACTION_ENABLED = True
+    after = _run(client, notes, args.runs)
+
+    tokens = compaction.estimate_tokens(notes)
+    print(f"notes: {len(notes)} chars, ~{tokens} tokens, budget {args.budget}")
+    print(f"without compaction: {before['median_s'] * 1000:.1f} ms median")
+    print(
+        f"with compaction:    {after['median_s'] * 1000:.1f} ms median "
+        f"({after['tokens_saved']} tokens saved per request)"
+    )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,149 @@
+"""
+Load test for focus telemetry ingestion.
+
+Starts the backend (as in the load test) and simulates `--sessions` concurrent
+quiz sessions, each posting `--batches` gzip-compressed `FocusBatch`es of
+`--snapshots` snapshots every `--interval` seconds (the browser tracker sends
+about 5 s of 30 fps snapshots per batch). Reports ingest throughput and latency,
+wire size against plain per-snapshot JSON, server peak RSS, bytes on disk, and
+the latency of rollup queries afterwards.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_focus_ingest --sessions 2000 --batches 5 --interval 1
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.loadtest import BackendProcess
+
+
+def make_batch(session_id: str, seq: int, snapshots: int, rng: random.Random) -> dict:
+    start_ms = 1_700_000_000_000 + seq * snapshots * 33
+    focus = [max(0, min(200, int(rng.gauss(140, 30)))) for _ in range(snapshots)]
+    return {
+        "session_id": session_id,
+        "seq": seq,
+        "start_ms": start_ms,
+        "dt_ms": [0] + [rng.choice((33, 34)) for _ in range(snapshots - 1)],
+        "question": [1 + seq // 2] * snapshots,
+        "focus": focus,
+        "left_gaze": [rng.randint(100, 160) for _ in range(snapshots)],
+        "right_gaze": [rng.randint(100, 160) for _ in range(snapshots)],
+    }
+
+
+def naive_size(batch: dict) -> int:
+    """Size of the same snapshots as the tracker's in-memory `FocusSnapshot` objects in JSON."""
+    t = batch["start_ms"]
+    snapshots = []
+    for dt, focus, left, right in zip(batch["dt_ms"], batch["focus"], batch["left_gaze"], batch["right_gaze"]):
+        t += dt
+        snapshots.append(
+            {"timestamp": t, "focusLevel": focus / 2, "leftGazeRatio": left / 255, "rightGazeRatio": right / 255}
+        )
+    return len(json.dumps(snapshots))
+
+
+async def run_session(client, gate, session_id, bodies, args, latencies, errors, rng):
+    await asyncio.sleep(rng.uniform(0, args.interval))  # spread session starts
+    for body in bodies:
+        # Waiting on httpx's own pool queue gets quadratically slow with thousands of tasks.
+        async with gate:
+            start = time.perf_counter()
+            try:
+                res = await client.post(
+                    "/api/telemetry/focus",
+                    content=body,
+                    headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+                )
+                res.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors.append(session_id)
+        await asyncio.sleep(args.interval)
+
+
+async def drive(url: str, args) -> dict:
+    latencies: list[float] = []
+    errors: list[str] = []
+    session_ids = [f"bench-{i:08d}" for i in range(args.sessions)]
+    # Built up front so the (same-machine) client spends its CPU on sending.
+    bodies = {
+        sid: [
+            gzip.compress(json.dumps(make_batch(sid, seq, args.snapshots, random.Random(i * args.batches + seq))).encode())
+            for seq in range(args.batches)
+        ]
+        for i, sid in enumerate(session_ids)
+    }
+    gate = asyncio.Semaphore(args.connections)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(run_session(client, gate, sid, bodies[sid], args, latencies, errors, random.Random(i))
+              for i, sid in enumerate(session_ids))
+        )
+        elapsed = time.perf_counter() - start
+
+        query_latencies = []
+        for sid in random.Random(0).sample(session_ids, min(200, len(session_ids))):
+            q_start = time.perf_counter()
+            (await client.get(f"/api/telemetry/focus/{sid}")).raise_for_status()
+            query_latencies.append(time.perf_counter() - q_start)
+    return {"latencies": latencies, "errors": errors, "elapsed": elapsed, "query_latencies": query_latencies}
+
+
+def _pct(values: list[float], pct: float) -> float:
+    return statistics.quantiles(values, n=100)[pct - 1] if len(values) > 1 else (values[0] if values else 0.0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--batches", type=int, default=5, help="Batches per session.")
+    parser.add_argument("--snapshots", type=int, default=150, help="Snapshots per batch.")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between a session's batches.")
+    parser.add_argument("--connections", type=int, default=256, help="Client connection pool size.")
+    args = parser.parse_args()
+
+    sample = make_batch("bench-sample", 0, args.snapshots, random.Random(0))
+    raw = len(json.dumps(sample))
+    print(
+        f"Wire size per {args.snapshots}-snapshot batch: {naive_size(sample)} B as snapshot objects, "
+        f"{raw} B columnar, {len(gzip.compress(json.dumps(sample).encode()))} B columnar+gzip"
+    )
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        # The gemini URL is unused; nothing here generates or grades.
+        with BackendProcess("http://127.0.0.1:9", env={"FOCUS_STORE_DIR": store_dir}) as backend:
+            result = asyncio.run(drive(backend.url, args))
+            rss = backend.peak_rss_mb()
+        disk = sum(f.stat().st_size for f in Path(store_dir).rglob("*") if f.is_file())
+
+    latencies, queries = result["latencies"], result["query_latencies"]
+    batches = len(latencies)
+    print(f"{args.sessions} sessions x {args.batches} batches in {result['elapsed']:.1f}s, {len(result['errors'])} errors")
+    print(
+        f"ingest: {batches / result['elapsed']:.0f} batches/s, "
+        f"{batches * args.snapshots / result['elapsed']:.0f} snapshots/s, "
+        f"p50 {_pct(latencies, 50) * 1000:.1f} ms  p95 {_pct(latencies, 95) * 1000:.1f} ms  "
+        f"p99 {_pct(latencies, 99) * 1000:.1f} ms"
+    )
+    print(f"session summary query: p50 {_pct(queries, 50) * 1000:.1f} ms  p95 {_pct(queries, 95) * 1000:.1f} ms")
+    if rss is not None:
+        print(f"server peak RSS: {rss:.0f} MB")
+    print(f"on disk after shutdown: {disk / 1024 / 1024:.1f} MB ({disk / max(batches * args.snapshots, 1):.1f} B/snapshot)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Incremental re-conversion of an edited deck or PDF.
+
+Builds a `--units`-slide PPTX and `--units`-page PDF with `benchmarks.corpus`,
+and a second version of each with one slide or page changed (`--edits`). For
+each format it times:
+
+- a full conversion without a unit cache;
+- the first version with an empty unit cache (every unit converted and stored);
+- the edited version against that cache (only the changed units converted);
+- a one-unit file, the floor an incremental run is measured against.
+
+The Markdown of the incremental run is checked against a full conversion of
+the edited file.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_incremental --units 200 --edits 1
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import main  # noqa: F401 - puts Doc-PPT-to-markdown on sys.path
+import routers
+from benchmarks import corpus
+
+
+def edit_pptx(src: Path, dst: Path, slides: list[int]) -> None:
+    from pptx import Presentation
+
+    prs = Presentation(str(src))
+    for index in slides:
+        prs.slides[index].shapes.title.text += " (revised)"
+    prs.save(str(dst))
+
+
+def edit_pdf(src: Path, dst: Path, pages: list[int]) -> None:
+    import fitz
+
+    doc = fitz.open(str(src))
+    for index in pages:
+        doc[index].insert_text((50, 820), "Revised for this week.", fontsize=10)
+    doc.save(str(dst))
+    doc.close()
+
+
+def timed(runs: int, fn):
+    """Median seconds over runs, and the last result."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def bench(converter, label, v1: Path, v2: Path, one: Path, cache_dir: Path, runs: int) -> None:
+    UnitCache = converter.UnitCache
+    full_s, full = timed(runs, lambda: converter.convert_to_document(str(v2)))
+    single_s, _ = timed(runs, lambda: converter.convert_to_document(str(one)))
+
+    cold_s = []
+    incremental_s = []
+    for run in range(runs):
+        cache = UnitCache(cache_dir / f"{label}-{run}")
+        start = time.perf_counter()
+        cold = converter.convert_to_document(str(v1), unit_cache=cache)
+        cold_s.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        incremental = converter.convert_to_document(str(v2), unit_cache=cache)
+        incremental_s.append(time.perf_counter() - start)
+
+    assert incremental.to_markdown() == full.to_markdown(), f"{label}: incremental output differs"
+    total = incremental.units_reused + incremental.units_converted
+    print(f"\n{label} ({total} units)")
+    print(f"  full conversion          {full_s * 1000:8.1f} ms")
+    print(f"  first version, cold cache {statistics.median(cold_s) * 1000:7.1f} ms  "
+          f"({cold.units_converted} converted)")
+    print(f"  edited version, warm cache {statistics.median(incremental_s) * 1000:6.1f} ms  "
+          f"({incremental.units_reused} reused, {incremental.units_converted} converted)")
+    print(f"  one-unit file            {single_s * 1000:8.1f} ms")
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser(description="Incremental page/slide re-conversion benchmark.")
+    parser.add_argument("--units", type=int, default=200, help="Slides in the deck and pages in the PDF.")
+    parser.add_argument("--edits", type=int, default=1, help="Slides or pages changed in the second version.")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    converter = routers.doc_converter
+    edited = [args.units * (i + 1) // (args.edits + 1) for i in range(args.edits)]
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for ext, make, edit in ((".pptx", corpus.make_pptx, edit_pptx), (".pdf", corpus.make_pdf, edit_pdf)):
+            v1 = make(tmp / f"v1{ext}", args.units)
+            v2 = tmp / f"v2{ext}"
+            edit(v1, v2, edited)
+            one = make(tmp / f"one{ext}", 1)
+            bench(converter, ext.lstrip("."), v1, v2, one, tmp / "units", args.runs)
+
+
+if __name__ == "__main__":
+    main_()
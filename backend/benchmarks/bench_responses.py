@@ -0,0 +1,117 @@
+"""
+Serialization CPU and bytes on the wire for large convert and quiz responses.
+
+Serialization compares the previous path with `responses.json_response`:
+
+- convert: `ConvertResponse(markdown=...)` returned through the response model
+  (validated again and rendered by FastAPI's encoder) vs. orjson;
+- quiz: per-question `model_dump`, `QuizGenerateResponse(questions=...)` and
+  response-model re-validation vs. one `TypeAdapter.dump_python` and orjson.
+
+Wire size and compression time are reported for every encoder
+`CompressionMiddleware` can use here (zstd and br only when installed).
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_responses --markdown-mb 4 --questions 5000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import main  # noqa: F401 - loads the Quiz-Generation modules
+import responses
+import routers
+from schemas import ConvertResponse, QuizGenerateResponse
+
+_WORDS = "automaton state transition grammar closure pumping lemma pushdown stack turing tape halting".split()
+
+
+def make_markdown(megabytes: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines, size = [], 0
+    while size < megabytes * 1024 * 1024:
+        line = "## Section" if rng.random() < 0.05 else " ".join(rng.choice(_WORDS) for _ in range(14)) + "."
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def make_quiz(n: int):
+    raw = []
+    for i in range(1, n + 1):
+        item = {"Question number": i, "Question": f"Which statement about {_WORDS[i % len(_WORDS)]} {i} holds?"}
+        if i % 3 == 0:
+            item["Question type"] = "Subjective"
+        else:
+            item["Question type"] = "MCQ"
+            item.update({f"Option {k}": f"Choice {k} for question {i}" for k in range(1, 5)})
+        raw.append(item)
+    return routers.quiz_gen_models.Quiz(
+        questions=routers.quiz_gen_models.QUIZ_QUESTIONS_ADAPTER.validate_python(raw)
+    )
+
+
+def timed(runs: int, fn) -> tuple[float, bytes]:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        body = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), body
+
+
+def through_response_model(adapter: TypeAdapter, value) -> bytes:
+    """What FastAPI does with a returned model: validate it again, encode it, dump it."""
+    return json.dumps(jsonable_encoder(adapter.validate_python(value)), separators=(",", ":")).encode()
+
+
+def report(label: str, old_s: float, new_s: float, body: bytes, runs: int) -> None:
+    print(f"\n{label}: {len(body) / 1024 / 1024:.2f} MB of JSON")
+    print(f"  serialize: previous {old_s * 1000:8.1f} ms | json_response {new_s * 1000:8.1f} ms "
+          f"({old_s / new_s:.1f}x)")
+    print(f"  {'identity':8s} {len(body):>12,d} bytes")
+    for name, encode in responses.ENCODERS.items():
+        seconds, compressed = timed(runs, lambda: encode(body))
+        print(f"  {name:8s} {len(compressed):>12,d} bytes ({len(compressed) / len(body):6.1%})  "
+              f"{seconds * 1000:7.1f} ms to compress")
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser(description="Response serialization and compression benchmark.")
+    parser.add_argument("--markdown-mb", type=float, default=4.0)
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    markdown = make_markdown(args.markdown_mb)
+    convert_adapter = TypeAdapter(ConvertResponse)
+    old_s, old_body = timed(args.runs, lambda: through_response_model(convert_adapter, ConvertResponse(markdown=markdown)))
+    new_s, body = timed(args.runs, lambda: responses.json_response({"markdown": markdown, "document_id": None}).body)
+    assert json.loads(old_body) == json.loads(body)
+    report("convert", old_s, new_s, body, args.runs)
+
+    quiz = make_quiz(args.questions)
+    quiz_adapter = TypeAdapter(QuizGenerateResponse)
+
+    def previous_quiz():
+        questions = [q.model_dump(by_alias=True) for q in quiz.questions]
+        return through_response_model(quiz_adapter, QuizGenerateResponse(questions=questions, quiz_id="x"))
+
+    def current_quiz():
+        questions = routers.quiz_gen_models.QUIZ_QUESTIONS_ADAPTER.dump_python(quiz.questions, by_alias=True)
+        return responses.json_response({"questions": questions, "quiz_id": "x"}).body
+
+    old_s, old_body = timed(args.runs, previous_quiz)
+    new_s, body = timed(args.runs, current_quiz)
+    assert json.loads(old_body) == json.loads(body)
+    report(f"quiz ({args.questions} questions)", old_s, new_s, body, args.runs)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,97 @@
+"""
+Benchmark evaluation prompt size and latency with and without passage retrieval.
+
+"Before" sends the whole (compacted) notes with every evaluation; "after" sends
+only the BM25 top-k passages per subjective question. Gemini is mocked with a
+latency model proportional to prompt size (see `benchmarks.mock_gemini`).
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_retrieval --sections 2000 --questions 10
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+import routers
+from benchmarks.mock_gemini import MockGeminiClient
+from routers import evaluate as evaluate_router
+
+_VOCAB = (
+    "automaton state transition alphabet string language grammar regular expression closure "
+    "kleene concatenation union intersection complement pumping lemma context free pushdown "
+    "stack turing machine tape head halting decidable recognizable reduction nondeterministic "
+    "deterministic epsilon move accepting reject final initial symbol derivation parse tree "
+    "ambiguity normal form chomsky greibach minimization equivalence partition myhill nerode"
+).split()
+
+
+def make_large_notes(sections: int, seed: int = 7) -> tuple[str, list[str]]:
+    """Return synthetic notes and one distinctive term per section."""
+    rng = random.Random(seed)
+    parts, keys = [], []
+    for i in range(sections):
+        key = f"concept{i}"
+        keys.append(key)
+        parts.append(f"# {key.title()} and {rng.choice(_VOCAB)}")
+        for _ in range(3):
+            words = [rng.choice(_VOCAB) for _ in range(40)]
+            words.insert(rng.randrange(len(words)), key)
+            parts.append(" ".join(words) + ".")
+    return "\n\n".join(parts), keys
+
+
+def _payload(notes: str, keys: list[str], questions: int) -> dict:
+    rng = random.Random(11)
+    picked = rng.sample(keys, questions)
+    quiz = [
+        {"Question number": n, "Question": f"Explain {key} and its role.", "Question type": "Subjective"}
+        for n, key in enumerate(picked, 1)
+    ]
+    answers = [{"Question number": n, "Answer": f"{key} is about {rng.choice(_VOCAB)}"} for n, key in enumerate(picked, 1)]
+    return {"quiz_json": quiz, "user_answers_json": answers, "notes_markdown": notes}
+
+
+def _run(client: TestClient, payload: dict, runs: int) -> tuple[float, int]:
+    latencies = []
+    MockGeminiClient.prompt_tokens.clear()
+    for _ in range(runs):
+        start = time.perf_counter()
+        client.post("/api/evaluate/submit", json=payload).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies), MockGeminiClient.prompt_tokens[-1]
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sections", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    routers.quiz_eval_evaluator.genai.Client = MockGeminiClient
+    notes, keys = make_large_notes(args.sections)
+    payload = _payload(notes, keys, args.questions)
+    client = TestClient(main.app)
+    # Every run re-submits the same answers; grade them each time instead of hitting the score cache.
+    evaluate_router.SCORE_CACHE_ENABLED = False
+
+    select_passages = evaluate_router.select_passages
+    evaluate_router.select_passages = lambda index, quiz: "\n\n".join(index.chunks)
+    before_s, before_tokens = _run(client, payload, args.runs)
+    evaluate_router.select_passages = select_passages
+    after_s, after_tokens = _run(client, payload, args.runs)
+
+    print(f"notes: {len(notes)} chars, {args.sections} sections, {args.questions} subjective questions")
+    print(f"full notes:     prompt ~{before_tokens} tokens, {before_s * 1000:.1f} ms median")
+    print(f"top-k passages: prompt ~{after_tokens} tokens, {after_s * 1000:.1f} ms median")
+
+
+if __name__ == "__main__":
+    main_cli()
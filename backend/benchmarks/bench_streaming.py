@@ -0,0 +1,101 @@
+"""
+Benchmark perceived latency of streamed vs. blocking evaluation.
+
+Starts the fake Gemini server and the backend (as in the load test), then grades
+the same quiz through `/api/evaluate/submit` and `/api/evaluate/submit-stream`.
+For each it reports time-to-first-score, perceived latency (the mean time at
+which each question's score reached the client) and total time.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_streaming --subjective 16 --objective 10 --runs 3 \\
+        --latency fixed:0.5 --per-token 0.001
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import httpx
+
+from benchmarks.fake_gemini_server import LatencyModel, serve
+from benchmarks.loadtest import BackendProcess, _free_port
+
+
+def make_quiz(subjective: int, objective: int) -> list[dict]:
+    quiz = []
+    for i in range(1, subjective + objective + 1):
+        if i <= objective:
+            quiz.append(
+                {
+                    "Question number": i,
+                    "Question": f"Which option describes concept {i}?",
+                    "Question type": "MCQ",
+                    **{f"Option {k}": f"Choice {k}" for k in range(1, 5)},
+                }
+            )
+        else:
+            quiz.append({"Question number": i, "Question": f"Explain concept {i}.", "Question type": "Subjective"})
+    return quiz
+
+
+def _answers(quiz: list[dict], run: int) -> list[dict]:
+    # Distinct per run so the score cache never answers for us.
+    return [{"Question number": q["Question number"], "Answer": f"answer {q['Question number']} run {run}"} for q in quiz]
+
+
+def run_blocking(client: httpx.Client, quiz: list[dict], run: int) -> dict:
+    start = time.perf_counter()
+    res = client.post("/api/evaluate/submit", json={"quiz_json": quiz, "user_answers_json": _answers(quiz, run)})
+    res.raise_for_status()
+    total = time.perf_counter() - start
+    # Nothing is shown until the whole response arrives.
+    return {"first_score_s": total, "perceived_s": total, "total_s": total}
+
+
+def run_streaming(client: httpx.Client, quiz: list[dict], run: int) -> dict:
+    arrivals: list[float] = []
+    start = time.perf_counter()
+    body = {"quiz_json": quiz, "user_answers_json": _answers(quiz, run)}
+    with client.stream("POST", "/api/evaluate/submit-stream", json=body) as res:
+        res.raise_for_status()
+        for line in res.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["event"] == "scores":
+                arrivals += [time.perf_counter() - start] * len(event["results"])
+            elif event["event"] == "error":
+                raise RuntimeError(event["detail"])
+    total = time.perf_counter() - start
+    return {"first_score_s": min(arrivals), "perceived_s": statistics.mean(arrivals), "total_s": total}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--subjective", type=int, default=16)
+    parser.add_argument("--objective", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", default="fixed:0.5", help="Fake Gemini latency distribution.")
+    parser.add_argument("--per-token", type=float, default=0.001, help="Extra fake latency per token (s).")
+    args = parser.parse_args()
+
+    fake = serve(_free_port(), LatencyModel(args.latency, args.per_token, seed=1))
+    quiz = make_quiz(args.subjective, args.objective)
+    try:
+        with BackendProcess(f"http://127.0.0.1:{fake.server_address[1]}", env={"SCORE_CACHE_ENABLED": "0"}) as backend:
+            with httpx.Client(base_url=backend.url, timeout=300) as client:
+                print(f"{args.subjective} subjective + {args.objective} objective questions, median of {args.runs} runs")
+                for label, fn in (("blocking", run_blocking), ("streaming", run_streaming)):
+                    runs = [fn(client, quiz, run) for run in range(args.runs)]
+                    stats = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+                    print(
+                        f"{label:10s} first score {stats['first_score_s']:6.2f} s   "
+                        f"perceived {stats['perceived_s']:6.2f} s   total {stats['total_s']:6.2f} s"
+                    )
+    finally:
+        fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
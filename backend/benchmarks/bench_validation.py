@@ -0,0 +1,131 @@
+"""
+Benchmark parsing/validation of large Gemini outputs and the parse-failure rate.
+
+"legacy" re-implements the previous per-item `model_validate` / `EvaluationItem(**cleaned)`
+loops; "adapter" is the current single-pass `TypeAdapter` path. The failure rate is
+measured over a mix of well-formed and typically malformed responses.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_validation --questions 2000 --runs 20
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+import main  # noqa: F401 - loads the Quiz-Generation/Quiz-Evaluation modules
+import routers
+
+
+def make_quiz_output(n: int, seed: int = 3) -> str:
+    rng = random.Random(seed)
+    items = []
+    for i in range(1, n + 1):
+        q_type = rng.choice(("MCQ", "Subjective", "BCQ"))
+        item = {"Question number": i, "Question": f"Question {i} about automata?", "Question type": q_type}
+        if q_type == "MCQ":
+            item.update({f"Option {k}": f"Choice {k} for {i}" for k in range(1, 5)})
+        elif q_type == "BCQ":
+            item.update({"Option 1": "True", "Option 2": "False"})
+        items.append(item)
+    return json.dumps(items)
+
+
+def make_evaluation_output(n: int, seed: int = 5) -> str:
+    rng = random.Random(seed)
+    return json.dumps([{"question_number": i, "score": round(rng.random(), 2)} for i in range(1, n + 1)])
+
+
+def _legacy_parse_quiz(json_text: str):
+    models = routers.quiz_gen_models
+    raw = json.loads(json_text)
+    questions = []
+    for item in raw:
+        q_type = item.get("Question type", "")
+        if q_type == "BCQ":
+            questions.append(models.BCQQuestion.model_validate(item))
+        elif q_type == "MCQ" or "Option 3" in item or "Option 4" in item:
+            questions.append(models.MCQQuestion.model_validate(item))
+        else:
+            questions.append(models.SubjectiveQuestion.model_validate(item))
+    return models.Quiz(questions=questions)
+
+
+def _legacy_parse_evaluation(raw_text: str):
+    models = routers.quiz_eval_models
+    parsed = json.loads(raw_text[raw_text.find("[") : raw_text.rfind("]") + 1])
+    items = [
+        models.EvaluationItem(**{"question_number": obj.get("question_number"), "score": obj.get("score")})
+        for obj in parsed
+    ]
+    return models.EvaluationResult(results=items)
+
+
+def _time(fn, payload: str, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(payload)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def _variants(text: str) -> dict[str, str]:
+    """Typical ways a reply deviates from a bare JSON array."""
+    items = json.loads(text)
+    untagged = [{k: v for k, v in item.items() if k != "Question type"} for item in items]
+    return {
+        "clean": text,
+        "fenced": f"```json\n{text}\n```",
+        "prose": f"Here is the result:\n{text}\nLet me know if you need more.",
+        "extra_keys": json.dumps([{**item, "explanation": "..."} for item in items]),
+        "untagged": json.dumps(untagged),
+        "truncated": text[: len(text) // 2],
+    }
+
+
+def _failure_rate(fn, variants: dict[str, str]) -> tuple[float, list[str]]:
+    failed = []
+    for name, payload in variants.items():
+        try:
+            fn(payload)
+        except (ValueError, RuntimeError):
+            failed.append(name)
+    return len(failed) / len(variants), failed
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    quiz_text = make_quiz_output(args.questions)
+    eval_text = make_evaluation_output(args.questions)
+    parse_quiz = routers.quiz_gen_main.parse_and_validate_quiz
+    parse_evaluation = routers.quiz_eval_evaluator._parse_evaluation_response
+
+    print(f"{args.questions} items, median of {args.runs} runs")
+    for label, legacy, current, payload in (
+        ("quiz", _legacy_parse_quiz, parse_quiz, quiz_text),
+        ("evaluation", _legacy_parse_evaluation, parse_evaluation, eval_text),
+    ):
+        before = _time(legacy, payload, args.runs)
+        after = _time(current, payload, args.runs)
+        print(f"{label:10s} legacy {before * 1000:8.2f} ms   adapter {after * 1000:8.2f} ms   ({before / after:.1f}x)")
+
+    small_quiz, small_eval = make_quiz_output(20), make_evaluation_output(20)
+    for label, fn, payload in (
+        ("quiz legacy", _legacy_parse_quiz, small_quiz),
+        ("quiz adapter", parse_quiz, small_quiz),
+        ("eval legacy", _legacy_parse_evaluation, small_eval),
+        ("eval adapter", parse_evaluation, small_eval),
+    ):
+        rate, failed = _failure_rate(fn, _variants(payload))
+        print(f"{label:13s} parse failures {rate:.0%}  {', '.join(failed) or '-'}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,156 @@
+"""
+Throughput of the pre-forking server (`serve.py`) by worker count.
+
+For each `--workers` count this starts `python serve.py` with SERVE_WORKERS
+set, pointed at the fake Gemini server, and drives two scenarios with
+`--concurrency` clients:
+
+- document: `GET /api/convert/documents/{id}` (gzip accepted) for a PDF
+  converted once up front. It is CPU-bound (IR load, Markdown rendering, JSON,
+  compression) and every worker answers it from the shared document cache;
+- generate: `POST /api/quiz/generate-from-content`, bound by the fake Gemini
+  latency.
+
+It reports throughput, p50/p95 and the speedup over the first worker count,
+and the server's total PSS (proportional set size: pages the workers share
+copy-on-write with the master are split among them). It then checks that
+`/api/metrics`, answered by whichever worker gets the request, counts every
+request of the run.
+
+CPU-bound scaling is bounded by the CPUs available; compare with `nproc`.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_workers --workers 1,2,4 --concurrency 32 --requests 400
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import corpus
+from benchmarks.fake_gemini_server import LatencyModel, serve
+from benchmarks.loadtest import NOTES_PATH, BackendProcess, Scenario, _free_port, run_scenario
+
+_REQUEST_COUNT_RE = re.compile(r'^retina_http_request_duration_seconds_count\{[^}]*route="([^"]+)"[^}]*\} (\d+)$', re.M)
+
+
+class ServeProcess(BackendProcess):
+    """`python serve.py` with its own stores, so runs do not share caches."""
+
+    def __init__(self, gemini_url: str, workers: int, state_dir: Path):
+        super().__init__(
+            gemini_url,
+            env={
+                "PORT": str(_free_port()),
+                "SERVE_HOST": "127.0.0.1",
+                "SERVE_WORKERS": str(workers),
+                "DOCUMENT_CACHE_DIR": str(state_dir / "documents"),
+                "QUIZ_STORE_PATH": str(state_dir / "quizzes.sqlite3"),
+                "SCORE_CACHE_PATH": str(state_dir / "scores.sqlite3"),
+                "NOTES_INDEX_DIR": str(state_dir / "notes_index"),
+                "FOCUS_STORE_DIR": str(state_dir / "focus"),
+                "METRICS_MULTIPROC_DIR": str(state_dir / "metrics"),
+                "METRICS_SYNC_INTERVAL_S": "0.5",
+                "IDEMPOTENCY_STORE_PATH": str(state_dir / "idempotency.sqlite3"),
+            },
+        )
+        self.port = int(self._env["PORT"])
+        self.url = f"http://127.0.0.1:{self.port}"
+
+    def command(self) -> list[str]:
+        return [sys.executable, "serve.py"]
+
+    def total_pss_mb(self) -> float | None:
+        """PSS of the master and its workers (Linux /proc)."""
+        pids = [self.proc.pid]
+        try:
+            pids += [int(p) for p in Path(f"/proc/{self.proc.pid}/task/{self.proc.pid}/children").read_text().split()]
+            total = 0
+            for pid in pids:
+                for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+        return round(total / 1024, 1)
+
+
+class DocumentScenario:
+    name = "document"
+
+    def __init__(self, document_id: str):
+        self.document_id = document_id
+
+    async def request(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.get(f"/api/convert/documents/{self.document_id}", headers={"Accept-Encoding": "gzip"})
+
+
+def counted_requests(metrics_text: str, routes: tuple[str, ...]) -> int:
+    return sum(int(n) for route, n in _REQUEST_COUNT_RE.findall(metrics_text) if route in routes)
+
+
+async def run_workers(workers: int, gemini_url: str, pdf: Path, notes: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as state_dir, ServeProcess(gemini_url, workers, Path(state_dir)) as server:
+        async with httpx.AsyncClient(base_url=server.url, timeout=300) as client:
+            resp = await client.post("/api/convert/upload", files={"file": (pdf.name, pdf.read_bytes())})
+            resp.raise_for_status()
+            document_id = resp.json()["document_id"]
+
+        results = {"workers": workers}
+        scenarios = (DocumentScenario(document_id), Scenario("generate", notes, []))
+        for scenario in scenarios:
+            results[scenario.name] = await run_scenario(server.url, scenario, args.concurrency, args.requests)
+        results["pss_mb"] = server.total_pss_mb()
+
+        # Let every worker publish its snapshot, then ask any one of them for the total.
+        time.sleep(1.5)
+        metrics_text = httpx.get(f"{server.url}/api/metrics").text
+        results["counted"] = counted_requests(
+            metrics_text, ("/api/convert/documents/{document_id}", "/api/quiz/generate-from-content")
+        )
+        results["sent"] = 2 * args.requests
+    return results
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser(description="Pre-fork server throughput by worker count.")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=400, help="Requests per scenario.")
+    parser.add_argument("--pages", type=int, default=100, help="Pages of the PDF served by the document scenario.")
+    parser.add_argument("--latency", default="fixed:0.2", help="Fake Gemini latency distribution.")
+    args = parser.parse_args()
+
+    fake = serve(_free_port(), LatencyModel(args.latency, 0.0, seed=1))
+    gemini_url = f"http://127.0.0.1:{fake.server_address[1]}"
+    notes = NOTES_PATH.read_text(encoding="utf-8")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            pdf = corpus.make_pdf(Path(tmp) / "notes.pdf", args.pages)
+            runs = [asyncio.run(run_workers(int(n), gemini_url, pdf, notes, args)) for n in args.workers.split(",")]
+    finally:
+        fake.shutdown()
+
+    base = runs[0]
+    print(f"\n{'workers':>7s} {'scenario':9s} {'req/s':>8s} {'speedup':>8s} "
+          f"{'p50 ms':>8s} {'p95 ms':>8s} {'errors':>6s}")
+    for run in runs:
+        for name in ("document", "generate"):
+            stats = run[name]
+            speedup = stats["throughput_rps"] / base[name]["throughput_rps"]
+            print(f"{run['workers']:>7d} {name:9s} {stats['throughput_rps']:>8.1f} {speedup:>7.2f}x "
+                  f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['errors']:>6d}")
+    print()
+    for run in runs:
+        print(f"{run['workers']} workers: total PSS {run['pss_mb']} MB; "
+              f"/api/metrics counted {run['counted']} of {run['sent']} requests")
+
+
+if __name__ == "__main__":
+    main_()
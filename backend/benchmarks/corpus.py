@@ -0,0 +1,108 @@
+"""
+Generate a benchmark corpus of PDF, DOCX and PPTX files of varying sizes.
+
+Files are deterministic for a given seed so runs are comparable. Sizes are
+expressed in pages (PDF), paragraphs-per-heading sections (DOCX) and slides
+(PPTX).
+
+Usage (from the backend directory):
+    python -m benchmarks.corpus --out benchmarks/corpus --sizes 5,50,300
+"""
+
+import argparse
+import random
+from pathlib import Path
+
+DEFAULT_SIZES = (5, 50, 300)
+
+_WORDS = (
+    "automaton state transition alphabet string language grammar regular expression closure "
+    "kleene concatenation union intersection complement pumping lemma context free pushdown "
+    "stack turing machine tape head halting decidable recognizable reduction nondeterministic "
+    "deterministic epsilon move accepting reject final initial symbol derivation parse tree"
+).split()
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_pdf(path: Path, pages: int, seed: int = 0) -> Path:
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = [f"SECTION {page_num + 1}"] + [_sentence(rng) for _ in range(30)]
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), "\n".join(text), fontsize=10)
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+def make_docx(path: Path, sections: int, seed: int = 0) -> Path:
+    from docx import Document
+
+    rng = random.Random(seed)
+    doc = Document()
+    for i in range(sections):
+        doc.add_heading(f"Section {i + 1}", level=1)
+        for _ in range(6):
+            doc.add_paragraph(_sentence(rng, 30))
+        doc.add_paragraph(_sentence(rng, 6), style="List Bullet")
+        if i % 5 == 0:
+            table = doc.add_table(rows=4, cols=3)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = rng.choice(_WORDS)
+    doc.save(str(path))
+    return path
+
+
+def make_pptx(path: Path, slides: int, seed: int = 0) -> Path:
+    from pptx import Presentation
+
+    rng = random.Random(seed)
+    prs = Presentation()
+    layout = prs.slide_layouts[1]  # Title and Content
+    for i in range(slides):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide topic {i + 1}"
+        body = slide.placeholders[1].text_frame
+        body.text = _sentence(rng, 8)
+        for level in (1, 1, 2, 1):
+            para = body.add_paragraph()
+            para.text = _sentence(rng, 8)
+            para.level = level
+    prs.save(str(path))
+    return path
+
+
+def generate(out_dir: Path, sizes=DEFAULT_SIZES, seed: int = 0) -> list[Path]:
+    """Create one file per format and size; existing files are reused."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    makers = {".pdf": make_pdf, ".docx": make_docx, ".pptx": make_pptx}
+    paths = []
+    for size in sizes:
+        for ext, make in makers.items():
+            path = out_dir / f"corpus_{size}{ext}"
+            if not path.exists():
+                make(path, size, seed)
+            paths.append(path)
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate the benchmark document corpus.")
+    parser.add_argument("--out", type=Path, default=Path(__file__).resolve().parent / "corpus")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for path in generate(args.out, [int(s) for s in args.sizes.split(",")], args.seed):
+        print(f"{path}  {path.stat().st_size / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
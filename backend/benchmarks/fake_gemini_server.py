@@ -0,0 +1,207 @@
+"""
+Local fake of the Gemini `generateContent` REST endpoint.
+
+Serves canned quiz and evaluation responses with a configurable latency
+distribution so the backend can be load-tested without the real API. Point the
+backend at it with `GOOGLE_GEMINI_BASE_URL=http://127.0.0.1:<port>`. Batch jobs
+(`batchGenerateContent`, `batches/<id>`) succeed `--batch-delay` seconds after
+they are created.
+
+Usage (from the backend directory):
+    python -m benchmarks.fake_gemini_server --port 8099 --latency lognormal:-0.7,0.4
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHARS_PER_TOKEN = 4
+
+_COUNT_RES = {
+    "MCQ": re.compile(r"Number of MCQs:\s*`(\d+)`"),
+    "Subjective": re.compile(r"Number of Subjective questions:\s*`(\d+)`"),
+    "BCQ": re.compile(r"Number of BCQ \(True/False\) questions:\s*`(\d+)`"),
+}
+_QUESTION_NUMBER_RE = re.compile(r'"Question number"\s*:\s*(\d+)')
+_MODEL_PATH_RE = re.compile(r"/models/([^/:]+):generateContent")
+_BATCH_CREATE_RE = re.compile(r"/models/([^/:]+):batchGenerateContent")
+_BATCH_GET_RE = re.compile(r"/batches/([^/?]+)")
+
+
+class LatencyModel:
+    """
+    Latency distribution parsed from a spec string, in seconds.
+
+    `fixed:S`, `uniform:LO,HI`, `normal:MEAN,STD`, `lognormal:MU,SIGMA`; an
+    optional `per_token` cost is added for every prompt and output token.
+    """
+
+    def __init__(self, spec: str = "fixed:0.2", per_token: float = 0.0, seed: int | None = None):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",")] if params else []
+        self.per_token = per_token
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, tokens: int) -> float:
+        with self._lock:
+            if self.kind == "fixed":
+                base = self.params[0]
+            elif self.kind == "uniform":
+                base = self._rng.uniform(*self.params)
+            elif self.kind == "normal":
+                base = self._rng.gauss(*self.params)
+            elif self.kind == "lognormal":
+                base = self._rng.lognormvariate(*self.params)
+            else:
+                raise ValueError(f"Unknown latency distribution: {self.kind}")
+        return max(0.0, base) + tokens * self.per_token
+
+
+def canned_quiz(prompt: str) -> list[dict]:
+    # Distinct text per prompt, so merged shards do not look like duplicates.
+    tag = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:6]
+    questions = []
+    for q_type, pattern in _COUNT_RES.items():
+        match = pattern.search(prompt)
+        for _ in range(int(match.group(1)) if match else 0):
+            n = len(questions) + 1
+            item = {"Question number": n, "Question": f"Benchmark question {tag}-{n}?", "Question type": q_type}
+            if q_type == "MCQ":
+                item.update({f"Option {i}": f"Choice {i}" for i in range(1, 5)})
+            elif q_type == "BCQ":
+                item.update({"Option 1": "True", "Option 2": "False"})
+            questions.append(item)
+    return questions
+
+
+def canned_evaluation(prompt: str) -> list[dict]:
+    quiz_block = prompt.split("QUIZ_JSON:", 1)[-1].split("USER_ANSWERS_JSON:", 1)[0]
+    numbers = sorted({int(n) for n in _QUESTION_NUMBER_RE.findall(quiz_block)})
+    return [{"question_number": n, "score": round(0.5 + (n % 5) / 10, 2)} for n in numbers]
+
+
+def _prompt_text(body: dict) -> str:
+    return "\n".join(
+        part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+    )
+
+
+def _generate_response(prompt: str, model: str) -> tuple[dict, int]:
+    """A canned `generateContent` response and its total token count."""
+    payload = canned_evaluation(prompt) if "QUIZ_JSON:" in prompt else canned_quiz(prompt)
+    text = json.dumps(payload)
+    prompt_tokens = len(prompt) // CHARS_PER_TOKEN
+    output_tokens = len(text) // CHARS_PER_TOKEN
+    response = {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+        "modelVersion": model,
+    }
+    return response, prompt_tokens + output_tokens
+
+
+def make_handler(latency: LatencyModel, batch_delay: float = 2.0):
+    # Batch jobs by id: (created_at, model, inlined requests). A job completes batch_delay seconds after creation.
+    batches: dict[str, tuple[float, str, list]] = {}
+    batches_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+            pass
+
+        def _send_json(self, payload: dict) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            match = _BATCH_CREATE_RE.search(self.path)
+            if match:
+                requests = body.get("batch", {}).get("inputConfig", {}).get("requests", {}).get("requests", [])
+                batch_id = uuid.uuid4().hex[:12]
+                with batches_lock:
+                    batches[batch_id] = (time.monotonic(), match.group(1), requests)
+                self._send_json(self._batch(batch_id))
+                return
+
+            match = _MODEL_PATH_RE.search(self.path)
+            if not match:
+                self.send_error(404)
+                return
+            response, tokens = _generate_response(_prompt_text(body), match.group(1))
+            time.sleep(latency.sample(tokens))
+            self._send_json(response)
+
+        def do_GET(self):
+            match = _BATCH_GET_RE.search(self.path)
+            if not match or match.group(1) not in batches:
+                self.send_error(404)
+                return
+            self._send_json(self._batch(match.group(1)))
+
+        def _batch(self, batch_id: str) -> dict:
+            created, model, requests = batches[batch_id]
+            metadata = {"model": f"models/{model}", "state": "BATCH_STATE_RUNNING"}
+            if time.monotonic() - created >= batch_delay:
+                metadata["state"] = "BATCH_STATE_SUCCEEDED"
+                responses = [
+                    {
+                        "response": _generate_response(_prompt_text(r.get("request", {})), model)[0],
+                        "metadata": r.get("metadata"),
+                    }
+                    for r in requests
+                ]
+                metadata["output"] = {"inlinedResponses": {"inlinedResponses": responses}}
+            return {"name": f"batches/{batch_id}", "metadata": metadata}
+
+    return Handler
+
+
+def serve(port: int, latency: LatencyModel, batch_delay: float = 2.0) -> ThreadingHTTPServer:
+    """Start the fake server on a background thread and return it."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency, batch_delay))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Gemini generateContent server.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", default="fixed:0.2", help="fixed:S | uniform:LO,HI | normal:MEAN,STD | lognormal:MU,SIGMA")
+    parser.add_argument("--per-token", type=float, default=0.0, help="Extra seconds per prompt/output token.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="Seconds until a batch job completes.")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", args.port), make_handler(LatencyModel(args.latency, args.per_token, args.seed), args.batch_delay)
+    )
+    server.daemon_threads = True
+    print(f"Fake Gemini listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+End-to-end load test for the backend against the fake Gemini server.
+
+By default this starts the fake Gemini server in-process and the backend as a
+uvicorn subprocess pointed at it, drives each scenario with a fixed number of
+concurrent clients, and reports throughput, p50/p95/p99 latency and the
+server's peak RSS during each scenario. Results can be saved as a baseline JSON
+and later runs compared against it; `benchmarks/baselines/reference.json` is
+the committed one.
+
+Usage (from the backend directory):
+    python -m benchmarks.loadtest --scenario all --concurrency 16 --requests 200 \\
+        --latency lognormal:-1.2,0.4 --save-baseline benchmarks/baselines/local.json
+    python -m benchmarks.loadtest --scenario all --concurrency 16 --requests 200 \\
+        --latency lognormal:-1.2,0.4 --baseline benchmarks/baselines/reference.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import corpus
+from benchmarks.fake_gemini_server import LatencyModel, serve
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+NOTES_PATH = BACKEND_DIR.parent / "Quiz-Generation" / "Theory of Automata.md"
+SCENARIOS = ("convert", "generate", "evaluate")
+
+# Metrics where a larger value is worse, used when comparing against a baseline.
+_LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+_HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _quiz(n: int = 10) -> list[dict]:
+    quiz = []
+    for i in range(1, n + 1):
+        if i % 3 == 0:
+            quiz.append({"Question number": i, "Question": f"Explain concept {i}.", "Question type": "Subjective"})
+        else:
+            quiz.append(
+                {
+                    "Question number": i,
+                    "Question": f"Which option describes concept {i}?",
+                    "Question type": "MCQ",
+                    **{f"Option {k}": f"Choice {k}" for k in range(1, 5)},
+                }
+            )
+    return quiz
+
+
+class Scenario:
+    def __init__(self, name: str, notes: str, files: list[Path]):
+        self.name = name
+        self.notes = notes
+        self.files = files
+        self._file_bytes = [(p.name, p.read_bytes()) for p in files]
+
+    async def request(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        if self.name == "convert":
+            name, data = self._file_bytes[i % len(self._file_bytes)]
+            return await client.post("/api/convert/upload", files={"file": (name, data)})
+        if self.name == "generate":
+            return await client.post(
+                "/api/quiz/generate-from-content",
+                json={"markdown_content": self.notes, "mode": "mixed", "num_mcq": 5, "num_subjective": 3, "num_bcq": 2},
+            )
+        quiz = _quiz()
+        answers = [{"Question number": q["Question number"], "Answer": f"answer {i}"} for q in quiz]
+        return await client.post(
+            "/api/evaluate/submit",
+            json={"quiz_json": quiz, "user_answers_json": answers, "notes_markdown": self.notes},
+        )
+
+
+async def run_scenario(base_url: str, scenario: Scenario, concurrency: int, total: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                resp = await scenario.request(client, i)
+                ok = resp.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def _reset_peak_rss(pid: int) -> bool:
+    """Reset a live process's VmHWM to its current RSS (Linux /proc); False where that is not possible."""
+    try:
+        Path(f"/proc/{pid}/clear_refs").write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb(pid: int) -> float | None:
+    """Peak resident set size of a live process (Linux /proc), in MiB."""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class BackendProcess:
+    """Runs `uvicorn main:app` as a subprocess pointed at the fake Gemini server."""
+
+    def __init__(self, gemini_url: str, extra_args: list[str] | None = None, env: dict | None = None):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._env = {
+            **os.environ,
+            "GOOGLE_GEMINI_BASE_URL": gemini_url,
+            "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "benchmark"),
+            "LOG_LEVEL": "WARNING",
+            **(env or {}),
+        }
+        self._args = extra_args or []
+        self.proc: subprocess.Popen | None = None
+
+    def command(self) -> list[str]:
+        return [sys.executable, "-m", "uvicorn", "main:app", "--port", str(self.port), "--log-level", "warning"]
+
+    def __enter__(self) -> "BackendProcess":
+        self.proc = subprocess.Popen(self.command() + self._args, cwd=BACKEND_DIR, env=self._env)
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            try:
+                if httpx.get(f"{self.url}/api/health", timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError("Backend did not become healthy within 60s.")
+
+    def peak_rss_mb(self) -> float | None:
+        return _peak_rss_mb(self.proc.pid) if self.proc else None
+
+    def reset_peak_rss(self) -> bool:
+        return _reset_peak_rss(self.proc.pid) if self.proc else False
+
+    def __exit__(self, *exc) -> None:
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+
+
+def _children_peak_rss_mb() -> float:
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return maxrss / (1024 * 1024) if platform.system() == "Darwin" else maxrss / 1024
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return human-readable regressions of `results` relative to `baseline`."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for key in _LOWER_IS_BETTER + _HIGHER_IS_BETTER:
+            if not base.get(key) or current.get(key) is None:
+                continue
+            change = (current[key] - base[key]) / base[key]
+            worse = change > tolerance if key in _LOWER_IS_BETTER else change < -tolerance
+            marker = "REGRESSION" if worse else "ok"
+            print(f"  {name:9s} {key:15s} {base[key]:>10} -> {current[key]:>10}  ({change:+.1%}) {marker}")
+            if worse:
+                regressions.append(f"{name}.{key} {change:+.1%}")
+    return regressions
+
+
+async def run_all(args) -> dict:
+    fake = serve(_free_port(), LatencyModel(args.latency, args.per_token, seed=1))
+    gemini_url = f"http://127.0.0.1:{fake.server_address[1]}"
+    notes = NOTES_PATH.read_text(encoding="utf-8")
+    files = corpus.generate(Path(args.corpus_dir), [args.corpus_size])
+    names = SCENARIOS if args.scenario == "all" else (args.scenario,)
+
+    results = {
+        "config": {
+            "latency": args.latency,
+            "per_token": args.per_token,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "corpus_size": args.corpus_size,
+            "server_args": args.server_args,
+        },
+        "machine": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "scenarios": {},
+    }
+    try:
+        with BackendProcess(gemini_url, args.server_args.split() if args.server_args else None) as backend:
+            for name in names:
+                scenario = Scenario(name, notes, files)
+                # VmHWM is a lifetime peak; reset it so each scenario reports its own.
+                per_scenario = backend.reset_peak_rss()
+                stats = await run_scenario(backend.url, scenario, args.concurrency, args.requests)
+                stats["peak_rss_mb"] = backend.peak_rss_mb() if per_scenario else None
+                results["scenarios"][name] = stats
+                print(f"{name:9s} {json.dumps(stats)}")
+        for stats in results["scenarios"].values():
+            if stats["peak_rss_mb"] is None:
+                # Without /proc only the peak of the whole run is known.
+                stats["peak_rss_mb"] = round(_children_peak_rss_mb(), 1)
+    finally:
+        fake.shutdown()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backend load test with a fake Gemini server.")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency", default="fixed:0.3", help="Fake Gemini latency distribution.")
+    parser.add_argument("--per-token", type=float, default=0.0)
+    parser.add_argument("--corpus-dir", default=str(Path(__file__).resolve().parent / "corpus"))
+    parser.add_argument("--corpus-size", type=int, default=50)
+    parser.add_argument("--server-args", default="", help="Extra arguments passed to uvicorn.")
+    parser.add_argument("--out", type=Path, help="Write results JSON here.")
+    parser.add_argument("--save-baseline", type=Path, help="Write results as the new baseline.")
+    parser.add_argument("--baseline", type=Path, help="Compare results against this baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression.")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_all(args))
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        print(f"Comparing against {args.baseline}:")
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print("Regressions: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
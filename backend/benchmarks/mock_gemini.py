@@ -0,0 +1,61 @@
+"""
+In-process stand-in for `google.genai.Client` used by the benchmarks.
+
+Latency is modelled as a fixed overhead plus a per-input-token prefill cost, so
+prompt-size optimizations show up in the measured wall-clock time.
+"""
+
+import json
+import re
+import time
+from types import SimpleNamespace
+
+BASE_LATENCY_S = 0.05
+PER_TOKEN_LATENCY_S = 2e-6
+CHARS_PER_TOKEN = 4
+
+_QUESTION_NUMBER_RE = re.compile(r'"(?:Question number|question_number)"\s*:\s*(\d+)')
+
+
+def _prompt_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for message in contents:
+        for part in message.get("parts", []):
+            parts.append(part.get("text", ""))
+    return "\n".join(parts)
+
+
+def _evaluation_for(prompt: str) -> str:
+    numbers = sorted({int(n) for n in _QUESTION_NUMBER_RE.findall(prompt)})
+    return json.dumps([{"question_number": n, "score": 1.0} for n in numbers])
+
+
+class _Models:
+    def __init__(self, client: "MockGeminiClient"):
+        self._client = client
+
+    def generate_content(self, *, model, contents, config=None):
+        prompt = _prompt_text(contents)
+        tokens = len(prompt) // CHARS_PER_TOKEN
+        self._client.prompt_tokens.append(tokens)
+        time.sleep(BASE_LATENCY_S + tokens * PER_TOKEN_LATENCY_S)
+        text = self._client.response_text or _evaluation_for(prompt)
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=tokens,
+                candidates_token_count=len(text) // CHARS_PER_TOKEN,
+            ),
+        )
+
+
+class MockGeminiClient:
+    """Records prompt sizes; answers with `response_text` or an all-correct evaluation."""
+
+    prompt_tokens: list[int] = []
+    response_text: str | None = None
+
+    def __init__(self, *args, **kwargs):
+        self.models = _Models(self)
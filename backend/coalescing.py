@@ -0,0 +1,382 @@
+"""
+In-flight deduplication of identical work, and idempotent POST retries.
+
+When a teacher shares a link, many students request the same AI topic or
+upload the same file within a second, before any result cache is warm.
+`SingleFlight.do` runs the blocking call once in the thread pool and lets every
+concurrent caller with the same key await that one result:
+
+- the shared call is shielded, so a caller that disconnects or times out does
+  not cancel it for the others;
+- each caller waits at most `timeout` seconds, and a flight older than that is
+  no longer joined, so one stuck call cannot wedge its key.
+
+`IdempotencyMiddleware` honours client `Idempotency-Key` headers on POSTs: the
+first response is kept for IDEMPOTENCY_TTL_S and replayed to retries from the
+same caller with the same key and body; concurrent retries share the in-flight
+request. Responses are kept in process memory, or with IDEMPOTENCY_STORE_PATH
+set (as `serve.py` does for several workers) in SQLite, where a retry that
+reaches another worker process waits for the original request instead of
+running it again.
+
+Keys are scoped to the caller (its credentials if it sends any, else its
+address), so one client cannot replay another's response by reusing its key.
+Streamed responses (SSE and NDJSON) pass straight through and are not kept; a
+retry of one runs again.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+
+SINGLEFLIGHT_TIMEOUT_S = float(os.getenv("SINGLEFLIGHT_TIMEOUT_S", "180"))
+IDEMPOTENCY_TTL_S = float(os.getenv("IDEMPOTENCY_TTL_S", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "1000"))
+IDEMPOTENCY_STORE_PATH = os.getenv("IDEMPOTENCY_STORE_PATH", "")
+# How often a retry checks on an original request running in another worker process.
+IDEMPOTENCY_POLL_S = float(os.getenv("IDEMPOTENCY_POLL_S", "0.25"))
+
+# Responses delivered incrementally; buffering them would hold every event until the end.
+_STREAMING_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+_IDEMPOTENCY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    expires REAL NOT NULL,
+    status INTEGER,  -- NULL while the original request is in flight
+    headers TEXT,
+    body BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_responses_expires ON responses(expires);
+"""
+
+
+def make_key(*parts) -> str:
+    """Stable hash of JSON-serializable key parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, name: str, timeout: float = SINGLEFLIGHT_TIMEOUT_S):
+        self.name = name
+        self.timeout = timeout
+        self._inflight: dict[str, tuple[asyncio.Future, float]] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def _start(self, key: str, make_awaitable) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = asyncio.ensure_future(make_awaitable())
+        self._inflight[key] = (future, loop.time() + self.timeout)
+
+        def _done(f: asyncio.Future) -> None:
+            if self._inflight.get(key, (None,))[0] is f:
+                del self._inflight[key]
+            # Mark the exception retrieved even if every waiter already gave up.
+            if not f.cancelled():
+                f.exception()
+
+        future.add_done_callback(_done)
+        return future
+
+    async def join(self, key: str, make_awaitable, timeout: float | None = None):
+        """Await `make_awaitable()`, sharing it with concurrent callers of the same key."""
+        entry = self._inflight.get(key)
+        joined = entry is not None and asyncio.get_running_loop().time() < entry[1]
+        metrics.record_cache(f"inflight_{self.name}", hit=joined)
+        future = entry[0] if joined else self._start(key, make_awaitable)
+        return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+
+    async def do(self, key: str, fn, *args, timeout: float | None = None):
+        """Run blocking `fn(*args)` in the thread pool, once per concurrent `key`."""
+        return await self.join(key, lambda: run_in_threadpool(fn, *args), timeout)
+
+
+generation = SingleFlight("generation")
+evaluation = SingleFlight("evaluation")
+conversion = SingleFlight("conversion")
+
+
+class MemoryResponses:
+    """Stored responses of this process; concurrent retries are joined by the middleware's SingleFlight."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_S, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._responses: OrderedDict[str, tuple[float, str, list]] = OrderedDict()
+
+    def claim(self, key: str, fingerprint: str):
+        """`(fingerprint, messages)` stored for `key`, or None when the caller should run the request."""
+        entry = self._responses.get(key)
+        if entry is None:
+            return None
+        expires, stored_fingerprint, messages = entry
+        if expires < time.monotonic():
+            self._responses.pop(key, None)
+            return None
+        return stored_fingerprint, messages
+
+    def put(self, key: str, fingerprint: str, messages: list) -> None:
+        self._responses[key] = (time.monotonic() + self.ttl, fingerprint, messages)
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.max_entries:
+            self._responses.popitem(last=False)
+
+    def release(self, key: str) -> None:
+        pass
+
+
+class SharedResponses:
+    """
+    Stored responses in SQLite, shared by the worker processes of one server.
+
+    `claim` records an in-flight row for a new key; until it is replaced by
+    the response (or released on failure) other callers get `messages=None`
+    and poll. An in-flight row expires after SINGLEFLIGHT_TIMEOUT_S, so a
+    worker killed mid-request cannot wedge its key.
+    """
+
+    def __init__(self, path: Path, ttl: float = IDEMPOTENCY_TTL_S, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._schema_ready = False
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads; keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                conn.executescript(_IDEMPOTENCY_SCHEMA)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def claim(self, key: str, fingerprint: str):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM responses WHERE key = ? AND expires < ?", (key, now))
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO responses (key, fingerprint, expires) VALUES (?, ?, ?)",
+                (key, fingerprint, now + SINGLEFLIGHT_TIMEOUT_S),
+            ).rowcount
+            if inserted:
+                return None
+            stored_fingerprint, status, headers, body = conn.execute(
+                "SELECT fingerprint, status, headers, body FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if status is None:
+            return stored_fingerprint, None
+        start = {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in json.loads(headers)],
+        }
+        return stored_fingerprint, [start, {"type": "http.response.body", "body": body}]
+
+    def put(self, key: str, fingerprint: str, messages: list) -> None:
+        start = next(m for m in messages if m["type"] == "http.response.start")
+        headers = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in start.get("headers", [])]
+        body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, fingerprint, expires, status, headers, body) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, fingerprint, now + self.ttl, start["status"], json.dumps(headers), body),
+            )
+            conn.execute("DELETE FROM responses WHERE expires < ?", (now,))
+            (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY expires LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def release(self, key: str) -> None:
+        """Drop an in-flight claim whose request failed, so a retry runs it again."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM responses WHERE key = ? AND status IS NULL", (key,))
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware replaying stored responses to POSTs retried with an `Idempotency-Key`."""
+
+    def __init__(self, app, ttl: float = IDEMPOTENCY_TTL_S, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.app = app
+        if IDEMPOTENCY_STORE_PATH:
+            self.store = SharedResponses(Path(IDEMPOTENCY_STORE_PATH), ttl, max_entries)
+        else:
+            self.store = MemoryResponses(ttl, max_entries)
+        self._flight = SingleFlight("idempotency")
+
+    async def _call(self, fn, *args):
+        # SQLite calls block; the in-memory store is only safe on the event loop thread.
+        if isinstance(self.store, MemoryResponses):
+            return fn(*args)
+        return await run_in_threadpool(fn, *args)
+
+    async def __call__(self, scope, receive, send):
+        header = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            header = dict(scope.get("headers") or ()).get(b"idempotency-key")
+        if not header:
+            await self.app(scope, receive, send)
+            return
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        key = make_key(scope["path"], _caller(scope), header.decode("latin-1"))
+        fingerprint = hashlib.sha256(bytes(body)).hexdigest()
+
+        deadline = time.monotonic() + self._flight.timeout
+        while True:
+            stored = await self._call(self.store.claim, key, fingerprint)
+            if stored is None:
+                break
+            if stored[0] != fingerprint:
+                await _send_json(send, 422, {"detail": "Idempotency-Key was reused with a different request body."})
+                return
+            if stored[1] is not None:
+                await _replay(send, stored[1], replayed=True)
+                return
+            # The original request is in flight in another worker process.
+            if time.monotonic() >= deadline:
+                await _send_json(send, 504, {"detail": "Timed out waiting for the original request."})
+                return
+            await asyncio.sleep(IDEMPOTENCY_POLL_S)
+
+        flight = None
+        streaming = asyncio.Event()
+
+        def start():
+            nonlocal flight
+            flight = asyncio.ensure_future(self._capture(scope, bytes(body), receive, send, streaming))
+            return flight
+
+        try:
+            try:
+                status, messages = await self._flight.join(key, start)
+            except asyncio.TimeoutError:
+                if flight is None or not streaming.is_set():
+                    raise
+                # This request's own response is still streaming out; it may outlast the timeout.
+                status, messages = await asyncio.shield(flight)
+        except asyncio.TimeoutError:
+            await self._call(self.store.release, key)
+            await _send_json(send, 504, {"detail": "Timed out waiting for the original request."})
+            return
+        except BaseException:
+            await self._call(self.store.release, key)
+            raise
+        if messages is None:
+            # The response was streamed straight to the caller that started it; it is not kept.
+            await self._call(self.store.release, key)
+            if flight is None:
+                await self.app(scope, _replay_receive(bytes(body), receive), send)
+            return
+        if status < 500:
+            await self._call(self.store.put, key, fingerprint, messages)
+        else:
+            await self._call(self.store.release, key)
+        await _replay(send, messages, replayed=False)
+
+    async def _capture(self, scope, body: bytes, receive, send, streaming: asyncio.Event) -> tuple[int, list | None]:
+        """
+        Run the request through the app and buffer its response messages.
+
+        A streaming response is passed through to `send` as it is produced
+        instead (setting `streaming`), and `(status, None)` returned.
+        """
+        messages: list = []
+        status = 500
+
+        async def capture_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers") or ()).get(b"content-type", b"")
+                if content_type.split(b";")[0].strip() in _STREAMING_TYPES:
+                    streaming.set()
+            if streaming.is_set():
+                await send(message)
+            else:
+                messages.append(message)
+
+        await self.app(scope, _replay_receive(body, receive), capture_send)
+        return status, None if streaming.is_set() else messages
+
+
+def _caller(scope) -> str:
+    """
+    Who sent a request: a hash of its credentials (Authorization or Cookie)
+    when it carries any, else its address. Behind a proxy the address is the
+    last X-Forwarded-For hop, the one the proxy itself appended.
+    """
+    headers = dict(scope.get("headers") or ())
+    for name in (b"authorization", b"cookie"):
+        if headers.get(name):
+            return hashlib.sha256(name + b":" + headers[name]).hexdigest()
+    forwarded = headers.get(b"x-forwarded-for", b"").split(b",")[-1].strip()
+    if forwarded:
+        return forwarded.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else ""
+
+
+def _replay_receive(body: bytes, receive):
+    """An ASGI `receive` that yields the already-read request body, then defers to `receive`."""
+    sent_body = False
+
+    async def replay_receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay_receive
+
+
+async def _replay(send, messages: list, replayed: bool) -> None:
+    for message in messages:
+        if message["type"] == "http.response.start" and replayed:
+            message = {**message, "headers": [*message.get("headers", []), (b"idempotent-replayed", b"true")]}
+        await send(message)
+
+
+async def _send_json(send, status: int, payload: dict) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
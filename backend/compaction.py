@@ -0,0 +1,244 @@
+import logging
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Rough chars-per-token ratio for Gemini on English prose; good enough for budgeting.
+CHARS_PER_TOKEN = 4
+
+NOTES_COMPACTION_ENABLED = os.getenv("NOTES_COMPACTION_ENABLED", "1") != "0"
+NOTES_TOKEN_BUDGET = int(os.getenv("NOTES_TOKEN_BUDGET", "60000"))
+
+_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_TABLE_SEPARATOR_RE = re.compile(r"^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$")
+_HORIZONTAL_RULE_RE = re.compile(r"^(-{3,}|\*{3,}|_{3,})$")
+_PAGE_NUMBER_RE = re.compile(r"^(page\s+)?\d+(\s*(/|of)\s*\d+)?$", re.IGNORECASE)
+_HEADING_RE = re.compile(r"^#{1,6}\s+\S")
+_INLINE_SPACE_RE = re.compile(r"[ \t ]+")
+_WORD_RE = re.compile(r"\w+")
+_FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+
+_RUNNING_HEADER_MIN_REPEATS = 3
+
+# Headings the converters emit around content that compaction strips.
+_BOILERPLATE_HEADINGS = {"## images"}
+
+
+@dataclass
+class CompactionResult:
+    text: str
+    tokens_before: int
+    tokens_after: int
+    sections_dropped: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_before - self.tokens_after)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for budgeting (no tokenizer round-trip)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _next_fence(line: str, fence: str | None) -> str | None:
+    """The code fence open after `line`, given the one open before it (None outside code)."""
+    match = _FENCE_RE.match(line)
+    if fence is None:
+        return match.group(1) if match else None
+    closing = match.group(1) if match else ""
+    if closing[:1] == fence[0] and len(closing) >= len(fence) and not line[match.end():].strip():
+        return None
+    return fence
+
+
+def _split_paragraphs(lines: list[str]) -> list[list[str]]:
+    paragraphs: list[list[str]] = []
+    current: list[str] = []
+    for line in lines:
+        # A fenced code block arrives as one multi-line entry and stays a paragraph of its own.
+        if _FENCE_RE.match(line):
+            if current:
+                paragraphs.append(current)
+                current = []
+            paragraphs.append([line])
+            continue
+        if not line:
+            if current:
+                paragraphs.append(current)
+                current = []
+            continue
+        # Headings always start their own paragraph so they survive deduplication.
+        if _HEADING_RE.match(line) and current:
+            paragraphs.append(current)
+            current = []
+        current.append(line)
+        if _HEADING_RE.match(line):
+            paragraphs.append(current)
+            current = []
+    if current:
+        paragraphs.append(current)
+    return paragraphs
+
+
+def normalize_notes(markdown: str) -> str:
+    """
+    Strip converter noise from markdown notes.
+
+    Removes image references, table separator rows, horizontal rules, bare page
+    numbers and empty boilerplate headings, collapses runs of whitespace and
+    drops paragraphs that repeat an earlier one (headers/footers, copied slides).
+    Fenced code blocks are kept verbatim: indentation, blank lines and lines
+    holding only a number are content there.
+    """
+    lines: list[str] = []
+    fence = None
+    for raw_line in markdown.splitlines():
+        if fence is not None:
+            lines[-1] += "\n" + raw_line
+            fence = _next_fence(raw_line, fence)
+            continue
+        fence = _next_fence(raw_line, None)
+        if fence is not None:
+            lines.append(raw_line)
+            continue
+        line = _IMAGE_RE.sub("", raw_line)
+        line = _INLINE_SPACE_RE.sub(" ", line).strip()
+        if not line:
+            lines.append("")
+            continue
+        if _TABLE_SEPARATOR_RE.match(line) or _HORIZONTAL_RULE_RE.match(line):
+            continue
+        if _PAGE_NUMBER_RE.match(line):
+            continue
+        if line.lower() in _BOILERPLATE_HEADINGS:
+            continue
+        lines.append(line)
+
+    paragraphs = _split_paragraphs(lines)
+    # A heading that repeats on many pages is a running header, not structure.
+    heading_counts = Counter(p[0].casefold() for p in paragraphs if _HEADING_RE.match(p[0]))
+
+    seen: set[str] = set()
+    kept: list[str] = []
+    for paragraph in paragraphs:
+        if _FENCE_RE.match(paragraph[0]):
+            kept.append(paragraph[0])
+            continue
+        key = " ".join(paragraph).casefold()
+        is_heading = bool(_HEADING_RE.match(paragraph[0]))
+        if not is_heading or heading_counts[key] >= _RUNNING_HEADER_MIN_REPEATS:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append("\n".join(paragraph))
+
+    return "\n\n".join(_drop_empty_headings(kept))
+
+
+def _heading_level(paragraph: str) -> int:
+    return len(paragraph) - len(paragraph.lstrip("#"))
+
+
+def _drop_empty_headings(paragraphs: list[str]) -> list[str]:
+    """Drop headings left with no body once duplicate paragraphs are removed."""
+    kept: list[str] = []
+    # has_content[level]: body text follows before the next heading at or above `level`.
+    has_content = [False] * 7
+    for paragraph in reversed(paragraphs):
+        if not _HEADING_RE.match(paragraph):
+            kept.append(paragraph)
+            has_content = [True] * 7
+            continue
+        level = min(_heading_level(paragraph), 6)
+        if has_content[level]:
+            kept.append(paragraph)
+        for deeper in range(level, 7):
+            has_content[deeper] = False
+    return kept[::-1]
+
+
+def split_sections(markdown: str) -> list[str]:
+    """Split markdown into sections that each start at a heading line (outside code blocks)."""
+    sections: list[str] = []
+    current: list[str] = []
+    fence = None
+    for line in markdown.split("\n"):
+        if fence is None and _HEADING_RE.match(line) and current:
+            sections.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+        fence = _next_fence(line, fence)
+    if current:
+        sections.append("\n".join(current).strip())
+    return [s for s in sections if s]
+
+
+def select_sections(markdown: str, token_budget: int) -> tuple[str, int]:
+    """
+    Extractively select heading-delimited sections that fit in `token_budget`.
+
+    Sections are ranked by how many salient terms they carry per token (terms
+    weighted by inverse section frequency, log(N / df), so words that most
+    sections use count for little), picked greedily, and emitted in their
+    original order. Returns the selected text and the number of sections that
+    were dropped.
+    """
+    sections = split_sections(markdown)
+    if not sections:
+        return markdown, 0
+
+    section_terms = [Counter(w.casefold() for w in _WORD_RE.findall(s)) for s in sections]
+    section_freq: Counter = Counter()
+    for terms in section_terms:
+        section_freq.update(terms.keys())
+    idf = {t: math.log(len(sections) / df) for t, df in section_freq.items()}
+
+    def density(idx: int) -> float:
+        terms = section_terms[idx]
+        weight = sum(idf[t] * min(c, 3) for t, c in terms.items())
+        return weight / max(1, estimate_tokens(sections[idx]))
+
+    ranked = sorted(range(len(sections)), key=density, reverse=True)
+    chosen: set[int] = set()
+    used = 0
+    for idx in ranked:
+        cost = estimate_tokens(sections[idx]) + 1
+        if used + cost <= token_budget:
+            chosen.add(idx)
+            used += cost
+
+    if not chosen:
+        # Even the densest section is over budget; keep its leading part.
+        best = ranked[0]
+        return sections[best][: token_budget * CHARS_PER_TOKEN], len(sections) - 1
+
+    selected = [sections[i] for i in sorted(chosen)]
+    return "\n\n".join(selected), len(sections) - len(chosen)
+
+
+def compact_notes(markdown: str, token_budget: int | None = None) -> CompactionResult:
+    """Normalize notes and enforce the token budget before prompting."""
+    tokens_before = estimate_tokens(markdown)
+    if not NOTES_COMPACTION_ENABLED:
+        return CompactionResult(markdown, tokens_before, tokens_before)
+
+    budget = NOTES_TOKEN_BUDGET if token_budget is None else token_budget
+    text = normalize_notes(markdown)
+    dropped = 0
+    if budget > 0 and estimate_tokens(text) > budget:
+        text, dropped = select_sections(text, budget)
+
+    result = CompactionResult(text, tokens_before, estimate_tokens(text), dropped)
+    logger.info(
+        "notes compacted: %d -> %d tokens (saved %d, %d sections dropped)",
+        result.tokens_before,
+        result.tokens_after,
+        result.tokens_saved,
+        result.sections_dropped,
+    )
+    return result
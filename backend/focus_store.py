@@ -0,0 +1,543 @@
+"""
+Columnar, append-only store for browser focus telemetry.
+
+Each quiz session's snapshots are kept as NumPy rows of `ROW` (9 bytes: time
+offset, question number, quantized focus level and gaze ratios). A resident
+session appends into one open segment; when the segment reaches
+FOCUS_SEGMENT_ROWS, or the session is idle for FOCUS_IDLE_S, it is written out
+as `seg-NNNNNN.npy` under the session directory and never rewritten.
+
+Rollups are updated at write time, so queries never read raw rows:
+
+- per question: snapshot count, focus and gaze-deviation sums, focused
+  (>= 60) count, first and last timestamp;
+- per session: a timeline of focus sums and counts in FOCUS_ROLLUP_MS buckets.
+
+They are saved as `rollup.npz` next to the segments whenever a segment is
+written, and loaded from there for sessions that are no longer resident.
+Batches carry a per-session sequence number; a batch at or below the last one
+applied is acknowledged without being applied again, so client retries are
+safe.
+
+With FOCUS_STORE_SHARED=1 (set by `serve.py` when it runs several worker
+processes) a session's batches may reach any worker. Each append then holds an
+exclusive `flock` on the session directory and appends just the batch's rows to
+the open segment's journal, `journal-NNNNNN.bin`; a worker first replays the
+journal records other workers appended since it last read it. When a batch
+closes a segment, the rows left in the open segment go to `open-NNNNNN.npy`
+and the rollups to `rollup.npz` instead, which records how many of those rows
+and how much of the journal it includes. A worker whose resident copy is older
+than `rollup.npz` reloads the session from it and replays the rest of the
+journal.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FOCUS_STORE_DIR = Path(os.getenv("FOCUS_STORE_DIR", Path(__file__).resolve().parent / ".cache" / "focus"))
+FOCUS_SEGMENT_ROWS = int(os.getenv("FOCUS_SEGMENT_ROWS", "4096"))
+FOCUS_ROLLUP_MS = int(os.getenv("FOCUS_ROLLUP_MS", "1000"))
+FOCUS_IDLE_S = float(os.getenv("FOCUS_IDLE_S", "300"))
+FOCUS_FLUSH_INTERVAL_S = float(os.getenv("FOCUS_FLUSH_INTERVAL_S", "30"))
+# Snapshots later than this after a session's first one are rejected; bounds the timeline rollup.
+FOCUS_MAX_SESSION_S = float(os.getenv("FOCUS_MAX_SESSION_S", "86400"))
+FOCUS_STORE_SHARED = os.getenv("FOCUS_STORE_SHARED", "0") == "1"
+
+# Wire quantization: focus level 0-100 in half points, gaze ratios 0-1 in 1/255 steps.
+FOCUS_SCALE = 2
+GAZE_SCALE = 255
+FOCUSED_LEVEL = 60
+
+ROW = np.dtype([("t_ms", "<u4"), ("question", "<u2"), ("focus", "u1"), ("left", "u1"), ("right", "u1")])
+# Per-question rollup row.
+QUESTION_ROLLUP = np.dtype(
+    [
+        ("question", "<u2"),
+        ("count", "<i8"),
+        ("focus_sum", "<i8"),  # quantized units
+        ("deviation_sum", "<f8"),
+        ("focused", "<i8"),
+        ("first_ms", "<i8"),
+        ("last_ms", "<i8"),
+    ]
+)
+# Journal record header; `rows` ROW-encoded rows follow it.
+JOURNAL_HEADER = np.dtype([("seq", "<i8"), ("rows", "<i8"), ("start_ms", "<i8")])
+_INITIAL_ROWS = 256
+# Same as FocusBatch.session_id; ids are used as directory names.
+_SESSION_ID_RE = re.compile(r"[A-Za-z0-9_-]{8,64}")
+
+SNAPSHOTS_INGESTED = metrics.counter(
+    "retina_focus_snapshots_total",
+    "Focus telemetry snapshots appended to the store.",
+)
+BATCHES_INGESTED = metrics.counter(
+    "retina_focus_batches_total",
+    "Focus telemetry batches by outcome (applied/duplicate).",
+    ("outcome",),
+)
+SEGMENTS_WRITTEN = metrics.counter(
+    "retina_focus_segments_written_total",
+    "Focus telemetry segments written to disk.",
+)
+
+
+@dataclass(frozen=True)
+class QuestionRollup:
+    question_number: int
+    snapshots: int
+    average_focus: float
+    gaze_deviation_avg: float
+    focused_fraction: float
+    time_spent_ms: int
+
+
+@dataclass(frozen=True)
+class SessionRollup:
+    session_id: str
+    start_ms: int
+    snapshots: int
+    duration_ms: int
+    average_focus: float
+    focused_fraction: float
+    questions: list[QuestionRollup]
+
+
+def _file_version(path: Path) -> tuple[int, int, int] | None:
+    """Identity of a file written by replace-on-write; None if it does not exist."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _question_rollup(row) -> QuestionRollup:
+    count = int(row["count"])
+    return QuestionRollup(
+        question_number=int(row["question"]),
+        snapshots=count,
+        average_focus=float(row["focus_sum"]) / FOCUS_SCALE / count if count else 0.0,
+        gaze_deviation_avg=float(row["deviation_sum"]) / count if count else 0.0,
+        focused_fraction=float(row["focused"]) / count if count else 0.0,
+        time_spent_ms=int(row["last_ms"] - row["first_ms"]),
+    )
+
+
+class _Session:
+    """One session's open segment and rollups; callers hold `lock`."""
+
+    def __init__(self, session_id: str, directory: Path):
+        self.session_id = session_id
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.start_ms = -1
+        self.last_seq = -1
+        self.segments = 0
+        self.rows = np.empty(min(_INITIAL_ROWS, FOCUS_SEGMENT_ROWS), dtype=ROW)
+        self.size = 0
+        self.questions = np.zeros(0, dtype=QUESTION_ROLLUP)
+        self.bucket_sum = np.zeros(0, dtype=np.int64)
+        self.bucket_count = np.zeros(0, dtype=np.int32)
+        self.last_used = time.monotonic()
+        self.dirty = False  # rollups changed since rollup.npz was written
+        self.version = None  # _file_version of the rollup.npz this copy was loaded from or wrote
+        self.journal_offset = 0  # bytes of the open segment's journal applied to this copy
+        self._committed_segments = 0  # segments when rollup.npz was last loaded or written
+
+    # -- persistence --------------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, session_id: str, directory: Path) -> "_Session":
+        session = cls(session_id, directory)
+        path = directory / "rollup.npz"
+        session.version = _file_version(path)
+        if session.version is not None:
+            with np.load(path, allow_pickle=False) as data:
+                meta = [int(v) for v in data["meta"]]
+                session.questions = data["questions"]
+                session.bucket_sum = data["bucket_sum"]
+                session.bucket_count = data["bucket_count"]
+            session.start_ms, session.last_seq, session.segments = meta[:3]
+            session._committed_segments = session.segments
+            # Rows of the open segment committed by a checkpoint (rollups written before shared mode have none).
+            open_rows = meta[3] if len(meta) > 3 else 0
+            if open_rows:
+                rows = np.load(session._open_path(), allow_pickle=False)[:open_rows]
+                session.rows = np.empty(max(len(session.rows), open_rows), dtype=ROW)
+                session.rows[:open_rows] = rows
+                session.size = open_rows
+            session.journal_offset = meta[4] if len(meta) > 4 else 0
+        session.replay_journal()
+        return session
+
+    def _open_path(self) -> Path:
+        return self.directory / f"open-{self.segments:06d}.npy"
+
+    def _journal_path(self) -> Path:
+        return self.directory / f"journal-{self.segments:06d}.bin"
+
+    def flush(self) -> None:
+        """Write the open segment (if any) and the rollups."""
+        if self.size:
+            self._close_segment()
+        if self.dirty:
+            self._write_rollup()
+
+    def checkpoint(self) -> None:
+        """Write the open segment's rows and the rollups, so another process can carry on from them."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.size:
+            tmp = self.directory / "open.tmp.npy"
+            np.save(tmp, self.rows[: self.size])
+            tmp.replace(self._open_path())
+        self._write_rollup(open_rows=self.size)
+
+    def _close_segment(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        np.save(self.directory / f"seg-{self.segments:06d}.npy", self.rows[: self.size])
+        self.segments += 1
+        self.size = 0
+        self.rows = np.empty(min(_INITIAL_ROWS, FOCUS_SEGMENT_ROWS), dtype=ROW)
+        self.journal_offset = 0
+        SEGMENTS_WRITTEN.inc()
+        self.dirty = True
+
+    def _write_rollup(self, open_rows: int = 0) -> None:
+        """Write the rollups; `open_rows` of the open segment are in its `open-NNNNNN.npy`."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.directory / "rollup.tmp.npz"
+        np.savez(
+            tmp,
+            meta=np.array(
+                [self.start_ms, self.last_seq, self.segments, open_rows, self.journal_offset], dtype=np.int64
+            ),
+            questions=self.questions,
+            bucket_sum=self.bucket_sum,
+            bucket_count=self.bucket_count,
+        )
+        path = self.directory / "rollup.npz"
+        tmp.replace(path)
+        self.version = _file_version(path)
+        self.dirty = False
+        # The closed segments' open rows and journals are now in their segment files and the rollups.
+        for segment in range(self._committed_segments, self.segments):
+            (self.directory / f"open-{segment:06d}.npy").unlink(missing_ok=True)
+            (self.directory / f"journal-{segment:06d}.bin").unlink(missing_ok=True)
+        self._committed_segments = self.segments
+
+    def stale(self) -> bool:
+        """Whether another process has written this session since this copy was loaded or written."""
+        return _file_version(self.directory / "rollup.npz") != self.version
+
+    def replay_journal(self) -> None:
+        """Apply the journal records appended (by other processes) since this copy last read the journal."""
+        try:
+            with open(self._journal_path(), "rb") as f:
+                f.seek(self.journal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        position = 0
+        while position + JOURNAL_HEADER.itemsize <= len(data):
+            header = np.frombuffer(data, dtype=JOURNAL_HEADER, count=1, offset=position)[0]
+            end = position + JOURNAL_HEADER.itemsize + int(header["rows"]) * ROW.itemsize
+            if end > len(data):
+                break  # a record cut short by a crash; the next append overwrites it
+            if int(header["seq"]) > self.last_seq:
+                rows = np.frombuffer(
+                    data, dtype=ROW, count=int(header["rows"]), offset=position + JOURNAL_HEADER.itemsize
+                )
+                if self.start_ms < 0:
+                    self.start_ms = int(header["start_ms"])
+                self.last_seq = int(header["seq"])
+                self._apply(rows["t_ms"].astype(np.int64), rows["question"], rows["focus"], rows["left"], rows["right"])
+            position = end
+        self.journal_offset += position
+
+    def _journal(self, seq: int, offset, question, focus, left, right) -> None:
+        """Append one applied batch to the open segment's journal; callers hold the session's file lock."""
+        header = np.array([(seq, len(offset), self.start_ms)], dtype=JOURNAL_HEADER)
+        rows = np.empty(len(offset), dtype=ROW)
+        rows["t_ms"], rows["question"], rows["focus"] = offset, question, focus
+        rows["left"], rows["right"] = left, right
+        data = header.tobytes() + rows.tobytes()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self._journal_path(), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            # Written at the end of what was replayed, over any record a crash cut short.
+            if os.pwrite(fd, data, self.journal_offset) != len(data):
+                raise OSError(f"Short write to {self._journal_path()}")
+        finally:
+            os.close(fd)
+        self.journal_offset += len(data)
+
+    # -- writes -------------------------------------------------------------------------------
+
+    def append(self, seq: int, t_ms, question, focus, left, right, journal: bool = False) -> None:
+        """
+        Apply batch `seq` (absolute epoch-ms timestamps, quantized values).
+
+        A batch that closes a segment writes the rollups. With `journal` (shared
+        mode) it checkpoints the open rows with them, and any other batch is
+        appended to the journal, so another process can carry on from the files.
+        """
+        start_ms = self.start_ms if self.start_ms >= 0 else int(t_ms[0])
+        offset = np.maximum(t_ms - start_ms, 0)
+        if int(offset[-1]) > FOCUS_MAX_SESSION_S * 1000:
+            raise ValueError("Snapshot timestamps exceed the maximum session length.")
+        self.start_ms = start_ms
+        self.last_seq = seq
+        segments = self.segments
+        self._apply(offset, question, focus, left, right)
+        if self.segments != segments:
+            if journal:
+                self.checkpoint()
+            else:
+                self._write_rollup()
+        elif journal:
+            self._journal(seq, offset, question, focus, left, right)
+
+    def _apply(self, offset, question, focus, left, right) -> None:
+        n = len(offset)
+
+        self._update_questions(offset, question, focus, left, right)
+        self._update_timeline(offset, focus)
+
+        written = 0
+        while written < n:
+            if self.size == len(self.rows) and len(self.rows) < FOCUS_SEGMENT_ROWS:
+                grown = np.empty(min(len(self.rows) * 2, FOCUS_SEGMENT_ROWS), dtype=ROW)
+                grown[: self.size] = self.rows[: self.size]
+                self.rows = grown
+            take = min(n - written, len(self.rows) - self.size)
+            block = self.rows[self.size : self.size + take]
+            block["t_ms"] = offset[written : written + take]
+            block["question"] = question[written : written + take]
+            block["focus"] = focus[written : written + take]
+            block["left"] = left[written : written + take]
+            block["right"] = right[written : written + take]
+            self.size += take
+            written += take
+            if self.size == FOCUS_SEGMENT_ROWS:
+                self._close_segment()
+        self.dirty = True
+
+    def _update_questions(self, offset, question, focus, left, right) -> None:
+        numbers, inverse = np.unique(question, return_inverse=True)
+        deviation = (np.abs(left / GAZE_SCALE - 0.5) + np.abs(right / GAZE_SCALE - 0.5)) / 2
+        count = np.bincount(inverse, minlength=len(numbers))
+        focus_sum = np.bincount(inverse, weights=focus, minlength=len(numbers)).astype(np.int64)
+        deviation_sum = np.bincount(inverse, weights=deviation, minlength=len(numbers))
+        focused = np.bincount(inverse, weights=(focus >= FOCUSED_LEVEL * FOCUS_SCALE).astype(np.float64),
+                              minlength=len(numbers))
+        first = np.full(len(numbers), np.iinfo(np.int64).max)
+        last = np.full(len(numbers), -1, dtype=np.int64)
+        np.minimum.at(first, inverse, offset)
+        np.maximum.at(last, inverse, offset)
+
+        positions = np.searchsorted(self.questions["question"], numbers)
+        known = np.zeros(len(numbers), dtype=bool)
+        inside = positions < len(self.questions)
+        known[inside] = self.questions["question"][positions[inside]] == numbers[inside]
+        if not known.all():
+            added = np.zeros(int(np.count_nonzero(~known)), dtype=QUESTION_ROLLUP)
+            added["question"] = numbers[~known]
+            added["first_ms"] = np.iinfo(np.int64).max
+            self.questions = np.sort(np.concatenate([self.questions, added]), order="question")
+            positions = np.searchsorted(self.questions["question"], numbers)
+
+        rollup = self.questions
+        rollup["count"][positions] += count
+        rollup["focus_sum"][positions] += focus_sum
+        rollup["deviation_sum"][positions] += deviation_sum
+        rollup["focused"][positions] += focused.astype(np.int64)
+        rollup["first_ms"][positions] = np.minimum(rollup["first_ms"][positions], first)
+        rollup["last_ms"][positions] = np.maximum(rollup["last_ms"][positions], last)
+
+    def _update_timeline(self, offset, focus) -> None:
+        buckets = offset // FOCUS_ROLLUP_MS
+        needed = int(buckets.max()) + 1
+        if needed > len(self.bucket_sum):
+            size = max(needed, len(self.bucket_sum) * 2)
+            self.bucket_sum = np.concatenate([self.bucket_sum, np.zeros(size - len(self.bucket_sum), np.int64)])
+            self.bucket_count = np.concatenate([self.bucket_count, np.zeros(size - len(self.bucket_count), np.int32)])
+        self.bucket_sum[:needed] += np.bincount(buckets, weights=focus, minlength=needed).astype(np.int64)
+        self.bucket_count[:needed] += np.bincount(buckets, minlength=needed).astype(np.int32)
+
+    # -- reads --------------------------------------------------------------------------------
+
+    def rollup(self) -> SessionRollup:
+        questions = [_question_rollup(row) for row in self.questions]
+        count = int(self.questions["count"].sum())
+        duration = int(self.questions["last_ms"].max() - self.questions["first_ms"].min()) if count else 0
+        return SessionRollup(
+            session_id=self.session_id,
+            start_ms=max(self.start_ms, 0),
+            snapshots=count,
+            duration_ms=duration,
+            average_focus=float(self.questions["focus_sum"].sum()) / FOCUS_SCALE / count if count else 0.0,
+            focused_fraction=float(self.questions["focused"].sum()) / count if count else 0.0,
+            questions=questions,
+        )
+
+    def timeline(self, resolution_ms: int) -> tuple[int, list[float | None]]:
+        """Average focus per `resolution_ms` window (a multiple of FOCUS_ROLLUP_MS); None where empty."""
+        factor = max(1, resolution_ms // FOCUS_ROLLUP_MS)
+        used = int(np.flatnonzero(self.bucket_count)[-1]) + 1 if self.bucket_count.any() else 0
+        padded = -(-used // factor) * factor
+        sums = np.zeros(padded, np.int64)
+        counts = np.zeros(padded, np.int64)
+        sums[:used] = self.bucket_sum[:used]
+        counts[:used] = self.bucket_count[:used]
+        sums = sums.reshape(-1, factor).sum(axis=1)
+        counts = counts.reshape(-1, factor).sum(axis=1)
+        averages = [round(s / FOCUS_SCALE / c, 2) if c else None for s, c in zip(sums.tolist(), counts.tolist())]
+        return factor * FOCUS_ROLLUP_MS, averages
+
+
+class FocusStore:
+    def __init__(self, root: Path = FOCUS_STORE_DIR):
+        self.root = root
+        self._sessions: dict[str, _Session] = {}
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    def _directory(self, session_id: str) -> Path:
+        # Two-level fan-out keeps directories small with many sessions.
+        return self.root / session_id[:2] / session_id
+
+    @contextlib.contextmanager
+    def _file_lock(self, session_id: str, exclusive: bool):
+        """Hold a `flock` on the session directory in shared mode; a no-op otherwise."""
+        directory = self._directory(session_id)
+        if not FOCUS_STORE_SHARED or (not exclusive and not directory.exists()):
+            yield
+            return
+        import fcntl  # POSIX only, like the pre-forked server that sets FOCUS_STORE_SHARED
+
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _resident(self, session_id: str) -> _Session:
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None or (FOCUS_STORE_SHARED and session.stale()):
+            # Load outside the store lock; a concurrent first batch for the same session keeps the first copy.
+            loaded = _Session.load(session_id, self._directory(session_id))
+            with self._lock:
+                if FOCUS_STORE_SHARED:
+                    # Callers hold the session's file lock, so the copy just loaded is current.
+                    self._sessions[session_id] = session = loaded
+                else:
+                    session = self._sessions.setdefault(session_id, loaded)
+        session.last_used = time.monotonic()
+        return session
+
+    def append(self, session_id: str, seq: int, t_ms, question, focus, left, right) -> bool:
+        """Apply one decoded batch; False when `seq` was already applied."""
+        with self._file_lock(session_id, exclusive=True):
+            session = self._resident(session_id)
+            with session.lock:
+                if FOCUS_STORE_SHARED:
+                    session.replay_journal()
+                if seq <= session.last_seq:
+                    BATCHES_INGESTED.inc(outcome="duplicate")
+                    return False
+                session.append(seq, t_ms, question, focus, left, right, journal=FOCUS_STORE_SHARED)
+        BATCHES_INGESTED.inc(outcome="applied")
+        SNAPSHOTS_INGESTED.inc(len(t_ms))
+        return True
+
+    def _session(self, session_id: str) -> _Session | None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None or (FOCUS_STORE_SHARED and session.stale()):
+            directory = self._directory(session_id)
+            # Until its first segment closes, a shared-mode session may only have a journal.
+            if not ((directory / "rollup.npz").exists() or (directory / "journal-000000.bin").exists()):
+                return None
+            session = _Session.load(session_id, directory)
+        return session
+
+    def _read(self, session_id: str, read):
+        if not _SESSION_ID_RE.fullmatch(session_id):
+            return None
+        with self._file_lock(session_id, exclusive=False):
+            session = self._session(session_id)
+            if session is None:
+                return None
+            with session.lock:
+                if FOCUS_STORE_SHARED:
+                    session.replay_journal()
+                return read(session)
+
+    def session_rollup(self, session_id: str) -> SessionRollup | None:
+        return self._read(session_id, lambda session: session.rollup())
+
+    def timeline(self, session_id: str, resolution_ms: int) -> tuple[int, list[float | None]] | None:
+        return self._read(session_id, lambda session: session.timeline(resolution_ms))
+
+    @property
+    def resident(self) -> int:
+        return len(self._sessions)
+
+    def flush_idle(self, idle_s: float = FOCUS_IDLE_S) -> int:
+        """Write out and release sessions idle for `idle_s`; returns how many were released."""
+        cutoff = time.monotonic() - idle_s
+        with self._lock:
+            idle = [s for s in self._sessions.values() if s.last_used <= cutoff]
+        for session in idle:
+            with self._file_lock(session.session_id, exclusive=True), session.lock:
+                # In shared mode a stale copy is simply dropped: the files hold every batch applied since.
+                if not (FOCUS_STORE_SHARED and session.stale()):
+                    if FOCUS_STORE_SHARED:
+                        session.replay_journal()
+                    session.flush()
+            with self._lock:
+                if session.last_used <= cutoff:
+                    self._sessions.pop(session.session_id, None)
+        return len(idle)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(FOCUS_FLUSH_INTERVAL_S)
+            try:
+                await asyncio.to_thread(self.flush_idle)
+            except Exception:
+                logger.exception("Focus telemetry flush failed")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush_idle, 0)
+
+
+store = FocusStore()
@@ -1,4 +1,6 @@
+import contextlib
 import importlib.util
+import logging
 import os
 import sys
 from pathlib import Path
@@ -6,6 +8,17 @@ from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+import admission
+import coalescing
+import focus_store
+import metrics
+import model_routing
+import profiling
+import responses
+import warm_pool
 
 # Resolve project paths
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -47,6 +60,11 @@ sys.modules.pop("models", None)
 sys.path.insert(0, str(DOC_CONVERT_DIR))
 import file_to_markdown as doc_converter  # noqa: E402
 
+# Route the standalone modules' instrumentation hooks into the backend metrics.
+for _mod in (quiz_gen_main, quiz_eval_evaluator):
+    _mod.stage_timer = metrics.stage
+    _mod.usage_hook = model_routing.router.record_usage
+
 # Store module references on the routers package so router files can access them
 import routers as _routers_pkg  # noqa: E402
 
@@ -57,9 +75,36 @@ _routers_pkg.quiz_eval_models = quiz_eval_models
 _routers_pkg.doc_converter = doc_converter
 _routers_pkg.QUIZ_EVAL_DIR = QUIZ_EVAL_DIR
 
-from routers import convert, quiz, evaluate  # noqa: E402
+from routers import convert, quiz, evaluate, telemetry, profiling as profiling_router, routing as routing_router  # noqa: E402
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_pool.pool.start(quiz.generate_for_pool)
+    focus_store.store.start()
+    metrics.REGISTRY.start()
+    yield
+    await warm_pool.pool.stop()
+    await focus_store.store.stop()
+    await metrics.REGISTRY.stop()
+
 
-app = FastAPI(title="Quiz Platform API", version="1.0.0")
+app = FastAPI(title="Quiz Platform API", version="1.0.0", lifespan=lifespan)
+
+app.add_middleware(coalescing.IdempotencyMiddleware)
+# Outside IdempotencyMiddleware, which buffers request bodies, so oversized uploads are cut off first.
+app.add_middleware(admission.UploadLimitMiddleware)
+app.add_middleware(
+    admission.UploadLimitMiddleware,
+    path=telemetry.FOCUS_PATH,
+    max_bytes=telemetry.FOCUS_MAX_BODY_BYTES,
+    code="telemetry_too_large",
+)
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(responses.CompressionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -72,8 +117,19 @@ app.add_middleware(
 app.include_router(convert.router, prefix="/api/convert", tags=["convert"])
 app.include_router(quiz.router, prefix="/api/quiz", tags=["quiz"])
 app.include_router(evaluate.router, prefix="/api/evaluate", tags=["evaluate"])
+app.include_router(telemetry.router, prefix="/api/telemetry", tags=["telemetry"])
+app.include_router(profiling_router.router, prefix="/api/admin/profiling", tags=["admin"])
+app.include_router(routing_router.router, prefix="/api/admin/routing", tags=["admin"])
 
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok"}
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Expose pipeline metrics in Prometheus text format."""
+    # Merging the other workers' snapshots reads files under a lock, so keep it off the event loop.
+    text = await run_in_threadpool(metrics.REGISTRY.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
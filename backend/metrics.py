@@ -0,0 +1,448 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Deliberately dependency-free: counters and histograms live in this process and
+are rendered on demand by `/api/metrics`, so no external collector or client
+library is required.
+
+Under a pre-forking server (`serve.py`) each worker process has its own
+registry. With METRICS_MULTIPROC_DIR set, every worker writes a snapshot of its
+values to `worker-<pid>.json` there every METRICS_SYNC_INTERVAL_S, and
+`/api/metrics` adds the other workers' snapshots to its own live values, so any
+worker answers for the whole server. Snapshots of exited workers are folded
+into `archive.json` by the master, so counters never go backwards.
+"""
+
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMING_LOG = os.getenv("REQUEST_TIMING_LOG", "0") == "1"
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_SYNC_INTERVAL_S = float(os.getenv("METRICS_SYNC_INTERVAL_S", "5"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# USD per million tokens (input, output); override with GEMINI_PRICE_<MODEL>="in,out".
+_DEFAULT_PRICES = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-3-flash-preview": (0.50, 3.00),
+    "gemini-3-pro-preview": (2.00, 12.00),
+}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self, others: list[dict] = ()) -> list[str]:
+        """Exposition lines; `others` are snapshots of this metric from other processes, added to ours."""
+        values = self.snapshot()
+        for snapshot in others:
+            _combine_into(values, snapshot, self._combine)
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples(values))
+        return lines
+
+    def snapshot(self) -> dict:
+        """A copy of the values by label tuple."""
+        raise NotImplementedError
+
+    @staticmethod
+    def _combine(a, b):
+        raise NotImplementedError
+
+    def _samples(self, values: dict) -> list[str]:
+        raise NotImplementedError
+
+
+def _samples_to_json(values: dict) -> list:
+    return [[list(key), value] for key, value in values.items()]
+
+
+def _combine_into(values: dict, snapshot: dict, combine) -> None:
+    for key, value in snapshot.items():
+        values[key] = combine(values[key], value) if key in values else value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def _combine(a, b):
+        return a + b
+
+    def _samples(self, values: dict) -> list[str]:
+        items = sorted(values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[idx] += 1
+            total[0] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {k: (list(c), t[0]) for k, (c, t) in self._values.items()}
+
+    @staticmethod
+    def _combine(a, b):
+        return [x + y for x, y in zip(a[0], b[0])], a[1] + b[1]
+
+    def _samples(self, values: dict) -> list[str]:
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self, multiproc_dir: str = METRICS_MULTIPROC_DIR):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self.multiproc_dir = Path(multiproc_dir) if multiproc_dir else None
+        self._task: asyncio.Task | None = None
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        others = self._read_snapshots() if self.multiproc_dir else {}
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.render(others.get(metric.name, ())))
+        return "\n".join(lines) + "\n"
+
+    # -- multiprocess mode ----------------------------------------------------------------------
+
+    def _snapshot_path(self, pid: int) -> Path:
+        return self.multiproc_dir / f"worker-{pid}.json"
+
+    def _dump(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: _samples_to_json(m.snapshot()) for m in metrics}
+
+    @staticmethod
+    def _parse(path: Path) -> dict:
+        """{metric name: {label tuple: value}} from a snapshot file; empty if it is missing or torn."""
+        try:
+            data = json.loads(path.read_bytes())
+        except (OSError, ValueError):
+            return {}
+        return {name: {tuple(k): v for k, v in samples} for name, samples in data.items()}
+
+    def _write(self, path: Path, data: dict) -> None:
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+        tmp.replace(path)
+
+    @contextlib.contextmanager
+    def _dir_lock(self, exclusive: bool):
+        # Readers take it shared; folding an exited worker into the archive takes it exclusive,
+        # so a render never sees the worker's values twice or not at all.
+        import fcntl  # POSIX only, like the pre-forked server that sets METRICS_MULTIPROC_DIR
+
+        with open(self.multiproc_dir / ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def write_snapshot(self) -> None:
+        """Publish this process's values for the other workers."""
+        self.multiproc_dir.mkdir(parents=True, exist_ok=True)
+        self._write(self._snapshot_path(os.getpid()), self._dump())
+
+    def _read_snapshots(self) -> dict[str, list[dict]]:
+        own = self._snapshot_path(os.getpid())
+        others: dict[str, list[dict]] = {}
+        self.multiproc_dir.mkdir(parents=True, exist_ok=True)
+        with self._dir_lock(exclusive=False):
+            for path in sorted(self.multiproc_dir.glob("*.json")):
+                if path == own:
+                    continue
+                for name, values in self._parse(path).items():
+                    others.setdefault(name, []).append(values)
+        return others
+
+    def archive(self, pid: int) -> None:
+        """Fold an exited worker's last snapshot into `archive.json` (called by the master)."""
+        path = self._snapshot_path(pid)
+        if not path.exists():
+            return
+        archive_path = self.multiproc_dir / "archive.json"
+        with self._dir_lock(exclusive=True):
+            archived = self._parse(archive_path)
+            for name, values in self._parse(path).items():
+                metric = self._metrics.get(name)
+                if metric is not None:
+                    _combine_into(archived.setdefault(name, {}), values, metric._combine)
+            self._write(archive_path, {name: _samples_to_json(values) for name, values in archived.items()})
+            path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """Remove snapshots of a previous server run (called by the master before forking)."""
+        if self.multiproc_dir is None:
+            return
+        self.multiproc_dir.mkdir(parents=True, exist_ok=True)
+        for path in self.multiproc_dir.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(METRICS_SYNC_INTERVAL_S)
+            try:
+                await asyncio.to_thread(self.write_snapshot)
+            except Exception:
+                logger.exception("Metrics snapshot failed")
+
+    def start(self) -> None:
+        if self.multiproc_dir is not None and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await asyncio.to_thread(self.write_snapshot)
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: tuple[str, ...] = (), **kwargs) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, **kwargs))
+
+
+HTTP_REQUEST_SECONDS = histogram(
+    "retina_http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ("method", "route", "status"),
+)
+STAGE_SECONDS = histogram(
+    "retina_stage_duration_seconds",
+    "Time spent in each pipeline stage.",
+    ("stage",),
+)
+LLM_TOKENS = counter(
+    "retina_llm_tokens_total",
+    "Gemini tokens by direction (in/out), as reported in response usage metadata.",
+    ("task", "model", "direction"),
+)
+LLM_COST = counter(
+    "retina_llm_cost_usd_total",
+    "Estimated Gemini spend in USD from token usage and the configured price table.",
+    ("task", "model"),
+)
+CACHE_REQUESTS = counter(
+    "retina_cache_requests_total",
+    "Cache lookups by cache name and result (hit/miss).",
+    ("cache", "result"),
+)
+ERRORS = counter(
+    "retina_errors_total",
+    "Errors by stage and exception class.",
+    ("stage", "error_class"),
+)
+NOTES_TOKENS_SAVED = counter(
+    "retina_notes_tokens_saved_total",
+    "Estimated prompt tokens removed from notes by compaction and retrieval.",
+    ("route",),
+)
+EVALUATE_FIRST_SCORE_SECONDS = histogram(
+    "retina_evaluate_first_score_seconds",
+    "Time from a streamed evaluation request to its first emitted score.",
+)
+
+# Per-request stage timings, collected when a request is being tracked.
+_request_stages: contextvars.ContextVar[list | None] = contextvars.ContextVar("request_stages", default=None)
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """Time a pipeline stage; failures are counted by exception class."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        ERRORS.inc(stage=name, error_class=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((name, elapsed))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _price(model: str) -> tuple[float, float]:
+    override = os.getenv("GEMINI_PRICE_" + model.upper().replace("-", "_").replace(".", "_"))
+    if override:
+        price_in, price_out = (float(p) for p in override.split(","))
+        return price_in, price_out
+    return _DEFAULT_PRICES.get(model, (0.0, 0.0))
+
+
+def record_usage(task: str, model: str, usage) -> float:
+    """Record token counts from a google-genai `usage_metadata` object; returns the estimated cost."""
+    if usage is None:
+        return 0.0
+    tokens_in = getattr(usage, "prompt_token_count", None) or 0
+    tokens_out = (getattr(usage, "candidates_token_count", None) or 0) + (
+        getattr(usage, "thoughts_token_count", None) or 0
+    )
+    LLM_TOKENS.inc(tokens_in, task=task, model=model, direction="in")
+    LLM_TOKENS.inc(tokens_out, task=task, model=model, direction="out")
+    price_in, price_out = _price(model)
+    cost = (tokens_in * price_in + tokens_out * price_out) / 1_000_000
+    LLM_COST.inc(cost, task=task, model=model)
+    return cost
+
+
+def _route_label(scope) -> str:
+    """Route template with its include prefix, e.g. `/api/quiz/{quiz_id}`."""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    # Depending on the FastAPI version the include prefix may be missing from
+    # the route template; recover it from the concrete request path.
+    template_parts = template.strip("/").split("/")
+    path_parts = scope["path"].strip("/").split("/")
+    prefix = path_parts[: max(0, len(path_parts) - len(template_parts))]
+    return "/" + "/".join(prefix + template_parts)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and the optional timing log."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stages: list = []
+        token = _request_stages.set(stages)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stages.reset(token)
+            route = _route_label(scope)
+            HTTP_REQUEST_SECONDS.observe(
+                elapsed, method=scope["method"], route=route, status=str(status["code"])
+            )
+            if REQUEST_TIMING_LOG:
+                logger.info(
+                    json.dumps(
+                        {
+                            "event": "request_timing",
+                            "method": scope["method"],
+                            "route": route,
+                            "status": status["code"],
+                            "duration_ms": round(elapsed * 1000, 2),
+                            "stages": [{"stage": n, "ms": round(s * 1000, 2)} for n, s in stages],
+                        }
+                    )
+                )
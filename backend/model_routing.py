@@ -0,0 +1,251 @@
+"""
+Model tier routing for Gemini calls.
+
+Each generation or grading call is routed to a model tier by a `RoutingPolicy`:
+the first rule matching the task, estimated input tokens and item count picks
+the tier, otherwise `default_tier`. If the task has a latency SLO and that
+tier's recent latency (EWMA) exceeds it, the call steps down to the strongest
+lighter tier still within the SLO. A demoted tier's latency is only measured
+by calls that reach it, so every ROUTING_SLO_PROBE_EVERY-th call it would have
+taken goes to it anyway as a probe, and a latency older than
+ROUTING_LATENCY_TTL_S is forgotten. When a reply fails to parse or validate,
+the call is retried on up to `max_fallbacks` stronger tiers.
+
+The policy is loaded from MODEL_ROUTING_PATH (JSON) when set, and can be
+replaced at runtime through `/api/admin/routing` (enabled by setting
+ROUTING_ADMIN_TOKEN), which also reports per-tier latency and cost. A
+replaced policy is written back to MODEL_ROUTING_PATH, and every router
+reloads the file when it changes, so with several workers (`serve.py` points
+them all at one file) a change made through any of them reaches the others
+on their next call. Without MODEL_ROUTING_PATH a change only reaches the
+worker that received it.
+"""
+
+import hmac
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import metrics
+from schemas import RoutingPolicy, TierStats
+
+logger = logging.getLogger(__name__)
+
+MODEL_ROUTING_PATH = os.getenv("MODEL_ROUTING_PATH", "")
+ROUTING_ADMIN_TOKEN = os.getenv("ROUTING_ADMIN_TOKEN", "")
+# One in this many calls stepped down for the SLO is sent to the slow tier to re-measure it; 0 never does.
+ROUTING_SLO_PROBE_EVERY = int(os.getenv("ROUTING_SLO_PROBE_EVERY", "20"))
+# A tier's latency not updated for this long no longer counts against the SLO.
+ROUTING_LATENCY_TTL_S = float(os.getenv("ROUTING_LATENCY_TTL_S", "600"))
+_LATENCY_EWMA_ALPHA = 0.2
+
+DEFAULT_POLICY = RoutingPolicy(
+    tiers=[
+        {"name": "lite", "model": "gemini-2.5-flash-lite"},
+        {"name": "standard", "model": "gemini-3-flash-preview"},
+        {"name": "strong", "model": "gemini-3-pro-preview"},
+    ],
+    # Short grading calls (e.g. a streamed group of subjective answers) do not need the standard model.
+    rules=[{"task": "evaluate", "tier": "lite", "max_prompt_tokens": 4000, "max_items": 4}],
+    default_tier="standard",
+)
+
+MODEL_CALL_SECONDS = metrics.histogram(
+    "retina_model_call_duration_seconds",
+    "Gemini call latency by task, routed tier and outcome (ok/invalid/error).",
+    ("task", "tier", "outcome"),
+)
+MODEL_ROUTES = metrics.counter(
+    "retina_model_routes_total",
+    "Routing decisions by task, tier and reason (rule/default/slo/probe/fallback).",
+    ("task", "tier", "reason"),
+)
+MODEL_COST = metrics.counter(
+    "retina_model_tier_cost_usd_total",
+    "Estimated Gemini spend in USD by task and tier.",
+    ("task", "tier"),
+)
+
+
+def _file_version(path: Path) -> tuple[int, int, int] | None:
+    """Identity of a file written by replace-on-write; None if it does not exist."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def check_token(token: str | None) -> bool:
+    return bool(ROUTING_ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ROUTING_ADMIN_TOKEN)
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        policy: RoutingPolicy = DEFAULT_POLICY,
+        path: str = MODEL_ROUTING_PATH,
+        probe_every: int = ROUTING_SLO_PROBE_EVERY,
+        latency_ttl_s: float = ROUTING_LATENCY_TTL_S,
+    ):
+        self._path = Path(path) if path else None
+        self._version = None  # _file_version of the policy file last read or written
+        if self._path is not None and self._path.exists():
+            self._version = _file_version(self._path)
+            policy = RoutingPolicy.model_validate_json(self._path.read_text(encoding="utf-8"))
+        self._policy = policy
+        self._lock = threading.Lock()
+        self._latency: dict[tuple[str, str], float] = {}
+        self._latency_at: dict[tuple[str, str], float] = {}
+        self._step_downs: dict[tuple[str, str], int] = {}
+        self.probe_every = probe_every
+        self.latency_ttl_s = latency_ttl_s
+        self._calls: dict[str, list[int]] = {}  # tier -> [calls, failures, fallbacks]
+        self._cost: dict[str, float] = {}
+
+    @property
+    def policy(self) -> RoutingPolicy:
+        self._reload()
+        return self._policy
+
+    def set_policy(self, policy: RoutingPolicy) -> None:
+        """Replace the policy; it is also written to MODEL_ROUTING_PATH when set."""
+        self._policy = policy
+        if self._path is not None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self._path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(policy.model_dump_json(indent=2), encoding="utf-8")
+            tmp.replace(self._path)
+            self._version = _file_version(self._path)
+
+    def _reload(self) -> None:
+        """Pick up a policy another worker wrote to MODEL_ROUTING_PATH since this one last read it."""
+        if self._path is None:
+            return
+        version = _file_version(self._path)
+        if version is None or version == self._version:
+            return
+        self._version = version
+        try:
+            self._policy = RoutingPolicy.model_validate_json(self._path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            logger.exception("Keeping the current routing policy; %s could not be loaded", self._path)
+
+    def _tier_for_model(self, model: str) -> str:
+        return next((t.name for t in self._policy.tiers if t.model == model), model)
+
+    def route(self, task: str, prompt_tokens: int, items: int) -> list[tuple[str, str, str]]:
+        """`(tier, model, reason)` to try in order: the routed tier, then its fallbacks."""
+        self._reload()
+        policy = self._policy
+        names = [t.name for t in policy.tiers]
+        tier, reason = policy.default_tier, "default"
+        for rule in policy.rules:
+            if (
+                rule.task == task
+                and (rule.max_prompt_tokens is None or prompt_tokens <= rule.max_prompt_tokens)
+                and (rule.max_items is None or items <= rule.max_items)
+            ):
+                tier, reason = rule.tier, "rule"
+                break
+
+        index = names.index(tier)
+        slo = policy.slo_seconds.get(task)
+        if slo is not None:
+            # Step down while the chosen tier is known to miss the SLO.
+            while index > 0 and self._recent_latency(task, names[index]) > slo:
+                if self._probe(task, names[index]):
+                    reason = "probe"
+                    break
+                index -= 1
+                reason = "slo"
+
+        chain = [(names[index], reason)]
+        chain += [(name, "fallback") for name in names[index + 1 : index + 1 + policy.max_fallbacks]]
+        models = {t.name: t.model for t in policy.tiers}
+        return [(name, models[name], why) for name, why in chain]
+
+    def _recent_latency(self, task: str, tier: str) -> float:
+        """The tier's latency EWMA, or 0 if it has not been measured within `latency_ttl_s`."""
+        with self._lock:
+            measured_at = self._latency_at.get((task, tier))
+            if measured_at is None or time.monotonic() - measured_at > self.latency_ttl_s:
+                return 0.0
+            return self._latency[(task, tier)]
+
+    def _probe(self, task: str, tier: str) -> bool:
+        """Whether this call, about to step down from `tier`, goes to it anyway to re-measure it."""
+        if self.probe_every <= 0:
+            return False
+        with self._lock:
+            count = self._step_downs.get((task, tier), 0) + 1
+            self._step_downs[(task, tier)] = count
+        return count % self.probe_every == 0
+
+    def call(self, task: str, prompt_tokens: int, items: int, attempt, chain: list[tuple[str, str, str]] | None = None):
+        """
+        Run `attempt(model)` on the routed tier, retrying stronger tiers when it
+        raises ValueError/RuntimeError (unparseable or invalid output). A
+        `chain` from an earlier `route` is used as is.
+        """
+        chain = chain or self.route(task, prompt_tokens, items)
+        for i, (tier, model, reason) in enumerate(chain):
+            MODEL_ROUTES.inc(task=task, tier=tier, reason=reason)
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = attempt(model)
+                outcome = "ok"
+                return result
+            except (ValueError, RuntimeError) as e:
+                outcome = "invalid"
+                if i == len(chain) - 1:
+                    raise
+                logger.warning("%s output from tier %s failed validation, falling back: %s", task, tier, e)
+            finally:
+                self._observe(task, tier, time.perf_counter() - start, outcome, fallback=reason == "fallback")
+
+    def _observe(self, task: str, tier: str, seconds: float, outcome: str, fallback: bool) -> None:
+        MODEL_CALL_SECONDS.observe(seconds, task=task, tier=tier, outcome=outcome)
+        with self._lock:
+            if outcome != "error":
+                previous = self._latency.get((task, tier))
+                if previous is None or time.monotonic() - self._latency_at[(task, tier)] > self.latency_ttl_s:
+                    previous = seconds  # start afresh rather than from a forgotten latency
+                self._latency[(task, tier)] = previous + _LATENCY_EWMA_ALPHA * (seconds - previous)
+                self._latency_at[(task, tier)] = time.monotonic()
+            stats = self._calls.setdefault(tier, [0, 0, 0])
+            stats[0] += 1
+            stats[1] += outcome != "ok"
+            stats[2] += fallback
+
+    def record_usage(self, task: str, model: str, usage) -> None:
+        """`usage_hook` for the Gemini modules: token metrics plus per-tier cost."""
+        cost = metrics.record_usage(task, model, usage)
+        tier = self._tier_for_model(model)
+        MODEL_COST.inc(cost, task=task, tier=tier)
+        with self._lock:
+            self._cost[tier] = self._cost.get(tier, 0.0) + cost
+
+    def stats(self) -> list[TierStats]:
+        result = []
+        with self._lock:
+            for t in self._policy.tiers:
+                calls, failures, fallbacks = self._calls.get(t.name, (0, 0, 0))
+                result.append(
+                    TierStats(
+                        tier=t.name,
+                        model=t.model,
+                        calls=calls,
+                        failures=failures,
+                        fallbacks=fallbacks,
+                        latency_ewma_s={task: round(s, 4) for (task, tier), s in self._latency.items() if tier == t.name},
+                        cost_usd=round(self._cost.get(t.name, 0.0), 6),
+                    )
+                )
+        return result
+
+
+router = ModelRouter()
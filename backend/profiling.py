@@ -0,0 +1,394 @@
+"""
+Opt-in request profiling for production workers.
+
+Profiling is off unless PROFILING_ADMIN_TOKEN is set. An admin can then arm the
+profiler for the next N requests (optionally only for one route) through
+`/api/admin/profiling/arm`, or profile a single request by sending the token in
+an `X-Profile` header. Results are written to PROFILE_DIR as `.pstats`
+(cProfile), `.collapsed` (stack samples, flamegraph.pl/speedscope input) and
+`.tracemalloc` (allocation snapshots of the converter paths).
+
+`cprofile` mode traces the event-loop thread, plus each converter call in the
+thread pool into a `.pstats` of its own (`thread_profile`); use `sampling` to
+see any other work that runs in the thread pool. Allocation tracing is
+process-wide: concurrent traced conversions share one tracemalloc session and
+their snapshots include each other's allocations. When nothing is armed and no
+token is configured the middleware costs one attribute check per request.
+
+With PROFILE_ARM_PATH set (`serve.py` sets it when it runs several workers)
+the armed state lives in that file: arming through any worker arms them all
+within PROFILE_ARM_POLL_S, and the workers claim requests from one shared
+count under a `flock`.
+"""
+
+import cProfile
+import contextlib
+import contextvars
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", Path(__file__).resolve().parent / ".cache" / "profiles"))
+SAMPLE_INTERVAL_S = float(os.getenv("PROFILE_SAMPLE_INTERVAL_S", "0.005"))
+MAX_PROFILE_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+# Armed state shared by the workers of one server; unset, arming only affects the process that received it.
+PROFILE_ARM_PATH = os.getenv("PROFILE_ARM_PATH", "")
+# How often a worker looks for arming done through another worker.
+PROFILE_ARM_POLL_S = float(os.getenv("PROFILE_ARM_POLL_S", "1"))
+
+MODES = ("cprofile", "sampling")
+
+
+@dataclass
+class ArmState:
+    remaining: int = 0
+    route: str | None = None
+    mode: str = "cprofile"
+    trace_allocations: bool = False
+
+
+@dataclass
+class ProfileSession:
+    request_id: str
+    path: str
+    mode: str
+    trace_allocations: bool
+    files: list[str] = field(default_factory=list)
+    # The event-loop thread, which the middleware's own cProfile covers.
+    thread_id: int = field(default_factory=threading.get_ident)
+
+
+_lock = threading.Lock()
+_arm = ArmState()
+# Cheap flag read on every request; only touched under `_lock`.
+_armed = False
+# When the arm file was last looked at, and the version of it last read.
+_arm_checked = 0.0
+_arm_version = None
+
+# tracemalloc is process-global: the first traced conversion starts it and the last one stops it.
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+_current_session: contextvars.ContextVar[ProfileSession | None] = contextvars.ContextVar(
+    "profile_session", default=None
+)
+
+
+def enabled() -> bool:
+    return bool(PROFILING_ADMIN_TOKEN)
+
+
+def check_token(token: str | None) -> bool:
+    return enabled() and token is not None and hmac.compare_digest(token, PROFILING_ADMIN_TOKEN)
+
+
+def _set_arm(state: ArmState) -> None:
+    """Make `state` this process's armed state; callers hold `_lock`."""
+    global _armed, _arm
+    _arm = state
+    _armed = state.remaining > 0
+
+
+@contextlib.contextmanager
+def _arm_file():
+    """Hold the lock on PROFILE_ARM_PATH, yielding its path."""
+    import fcntl  # POSIX only, like the pre-forked server that sets PROFILE_ARM_PATH
+
+    path = Path(PROFILE_ARM_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_suffix(".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield path
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_arm(path: Path) -> ArmState:
+    try:
+        return ArmState(**json.loads(path.read_text(encoding="utf-8")))
+    except (OSError, ValueError, TypeError):
+        return ArmState()
+
+
+def _write_arm(path: Path, state: ArmState) -> None:
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(asdict(state)), encoding="utf-8")
+    tmp.replace(path)
+
+
+def arm(requests: int, route: str | None = None, mode: str = "cprofile", trace_allocations: bool = False) -> ArmState:
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode: {mode}. Supported: {', '.join(MODES)}")
+    state = ArmState(max(0, requests), route, mode, trace_allocations)
+    with _lock:
+        if PROFILE_ARM_PATH:
+            with _arm_file() as path:
+                _write_arm(path, state)
+        _set_arm(state)
+        return state
+
+
+def disarm() -> None:
+    arm(0)
+
+
+def status() -> ArmState:
+    if PROFILE_ARM_PATH:
+        return _read_arm(Path(PROFILE_ARM_PATH))
+    with _lock:
+        return ArmState(_arm.remaining, _arm.route, _arm.mode, _arm.trace_allocations)
+
+
+def _refresh() -> None:
+    """Pick up arming done through another worker, looking at the arm file at most every PROFILE_ARM_POLL_S."""
+    global _arm_checked, _arm_version
+    now = time.monotonic()
+    if not PROFILE_ARM_PATH or now - _arm_checked < PROFILE_ARM_POLL_S:
+        return
+    _arm_checked = now
+    try:
+        st = os.stat(PROFILE_ARM_PATH)
+    except OSError:
+        return
+    version = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if version != _arm_version:
+        _arm_version = version
+        state = _read_arm(Path(PROFILE_ARM_PATH))
+        with _lock:
+            _set_arm(state)
+
+
+def _claim(path: str) -> ArmState | None:
+    """Consume one armed slot if `path` matches, returning the settings to use."""
+    with _lock:
+        if _arm.remaining <= 0 or (_arm.route and not path.startswith(_arm.route)):
+            return None
+        if PROFILE_ARM_PATH:
+            # Other workers may have used up the shared count since this one last read it.
+            with _arm_file() as arm_path:
+                state = _read_arm(arm_path)
+                claimed = state.remaining > 0 and (not state.route or path.startswith(state.route))
+                if claimed:
+                    state.remaining -= 1
+                    _write_arm(arm_path, state)
+            _set_arm(state)
+            if not claimed:
+                return None
+        else:
+            _arm.remaining -= 1
+            _set_arm(_arm)
+        return ArmState(1, _arm.route, _arm.mode, _arm.trace_allocations)
+
+
+def list_profiles() -> list[dict]:
+    if not PROFILE_DIR.exists():
+        return []
+    files = sorted(PROFILE_DIR.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [{"name": p.name, "bytes": p.stat().st_size, "created": p.stat().st_mtime} for p in files if p.is_file()]
+
+
+def profile_path(name: str) -> Path | None:
+    """Resolve a downloadable profile by file name, refusing path traversal."""
+    path = (PROFILE_DIR / name).resolve()
+    if path.parent != PROFILE_DIR.resolve() or not path.is_file():
+        return None
+    return path
+
+
+def _output_path(session: ProfileSession, suffix: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    route = session.path.strip("/").replace("/", "_") or "root"
+    path = PROFILE_DIR / f"{time.strftime('%Y%m%dT%H%M%S')}_{route}_{session.request_id}{suffix}"
+    session.files.append(path.name)
+    return path
+
+
+def _prune() -> None:
+    profiles = list_profiles()
+    for stale in profiles[MAX_PROFILE_FILES:]:
+        (PROFILE_DIR / stale["name"]).unlink(missing_ok=True)
+
+
+class _StackSampler:
+    """Samples every thread's stack on a timer and aggregates collapsed stacks."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({Path(code.co_filename).name})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def write(self, path: Path) -> None:
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in self.stacks.items()), encoding="utf-8")
+
+
+def _acquire_tracing() -> None:
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                _tracing_started = True
+            tracemalloc.reset_peak()
+        _tracing_users += 1
+
+
+def _release_tracing() -> None:
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users -= 1
+        # Tracing started outside this module (PYTHONTRACEMALLOC) is left running.
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+def _write_allocations(session: ProfileSession, label: str) -> None:
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot.dump(str(_output_path(session, f"_{label}.tracemalloc")))
+    top = snapshot.statistics("lineno")[:25]
+    summary = [f"peak traced memory: {peak / (1024 * 1024):.1f} MiB"] + [str(stat) for stat in top]
+    _output_path(session, f"_{label}.tracemalloc.txt").write_text("\n".join(summary), encoding="utf-8")
+
+
+@contextlib.contextmanager
+def allocation_snapshot(label: str):
+    """
+    Record a tracemalloc snapshot around a converter call.
+
+    No-op unless the current request is being profiled with allocation tracing.
+    A failed snapshot is logged; it never fails the conversion.
+    """
+    session = _current_session.get()
+    if session is None or not session.trace_allocations:
+        yield
+        return
+    _acquire_tracing()
+    try:
+        yield
+    finally:
+        try:
+            _write_allocations(session, label)
+        except Exception:
+            logger.warning("allocation snapshot %s failed", label, exc_info=True)
+        finally:
+            _release_tracing()
+
+
+@contextlib.contextmanager
+def thread_profile(label: str):
+    """
+    cProfile a converter call running in a thread-pool thread.
+
+    The middleware's profiler only sees the event-loop thread, so work handed
+    to `run_in_threadpool` is written to a `_<label>.pstats` of its own. No-op
+    unless the current request is profiled in `cprofile` mode.
+    """
+    session = _current_session.get()
+    if session is None or session.mode != "cprofile" or threading.get_ident() == session.thread_id:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # This thread is already under cProfile.
+        profiler = None
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            try:
+                profiler.dump_stats(str(_output_path(session, f"_{label}.pstats")))
+            except OSError:
+                logger.warning("thread profile %s failed", label, exc_info=True)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles armed or explicitly requested requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (_armed or PROFILING_ADMIN_TOKEN):
+            await self.app(scope, receive, send)
+            return
+
+        _refresh()
+        settings = _claim(scope["path"]) if _armed else None
+        if settings is None:
+            header = dict(scope.get("headers") or ()).get(b"x-profile")
+            if header is None or not check_token(header.decode("latin-1")):
+                await self.app(scope, receive, send)
+                return
+            settings = ArmState(1, None, "cprofile", trace_allocations=True)
+
+        session = ProfileSession(uuid.uuid4().hex[:12], scope["path"], settings.mode, settings.trace_allocations)
+        token = _current_session.set(session)
+        profiler = cProfile.Profile() if session.mode == "cprofile" else None
+        sampler = _StackSampler(SAMPLE_INTERVAL_S) if session.mode == "sampling" else None
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers") or [])
+                headers.append((b"x-profile-id", session.request_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        if profiler:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another request in this thread is already under cProfile.
+                profiler = None
+        if sampler:
+            sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(str(_output_path(session, ".pstats")))
+            if sampler:
+                sampler.stop()
+                sampler.write(_output_path(session, ".collapsed"))
+            _current_session.reset(token)
+            _prune()
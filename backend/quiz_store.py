@@ -0,0 +1,135 @@
+"""
+Persistent store for generated quizzes and the notes they were generated from.
+
+Quizzes live in SQLite so evaluation can reference them by `quiz_id` instead of
+the browser re-uploading the quiz and notes. Notes are stored once per content
+hash and shared between quizzes. Recently used quizzes are kept in an
+in-process LRU so active quizzes never touch the database.
+
+Stored MCQ/BCQ questions keep their answer key (`Correct option`) so grading
+can score them without a model call; `public_questions` is what clients get.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import metrics
+
+QUIZ_STORE_PATH = Path(
+    os.getenv("QUIZ_STORE_PATH", Path(__file__).resolve().parent / ".cache" / "quizzes.sqlite3")
+)
+QUIZ_CACHE_SIZE = int(os.getenv("QUIZ_CACHE_SIZE", "256"))
+ANSWER_KEY = "Correct option"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    notes_hash TEXT PRIMARY KEY,
+    markdown TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quizzes (
+    quiz_id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    notes_hash TEXT REFERENCES notes(notes_hash),
+    questions_json TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_quizzes_notes_hash ON quizzes(notes_hash);
+CREATE INDEX IF NOT EXISTS idx_quizzes_created_at ON quizzes(created_at);
+"""
+
+
+def public_questions(questions: list[dict]) -> list[dict]:
+    """The questions without their answer keys, as sent to (or accepted from) clients."""
+    return [{k: v for k, v in q.items() if k != ANSWER_KEY} for q in questions]
+
+
+@dataclass(frozen=True)
+class StoredQuiz:
+    quiz_id: str
+    source: str
+    questions: list[dict]
+    notes_markdown: str | None
+    notes_hash: str | None
+
+
+class QuizStore:
+    def __init__(self, path: Path = QUIZ_STORE_PATH, cache_size: int = QUIZ_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._cache: OrderedDict[str, StoredQuiz] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads; keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                conn.executescript(_SCHEMA)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, quiz: StoredQuiz) -> None:
+        with self._cache_lock:
+            self._cache[quiz.quiz_id] = quiz
+            self._cache.move_to_end(quiz.quiz_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def save(self, questions: list[dict], notes_markdown: str | None, source: str) -> str:
+        """Persist a generated quiz and return its new `quiz_id`."""
+        quiz_id = uuid.uuid4().hex
+        notes_hash = hashlib.sha256(notes_markdown.encode("utf-8")).hexdigest() if notes_markdown else None
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            if notes_hash:
+                conn.execute(
+                    "INSERT OR IGNORE INTO notes (notes_hash, markdown, created_at) VALUES (?, ?, ?)",
+                    (notes_hash, notes_markdown, now),
+                )
+            conn.execute(
+                "INSERT INTO quizzes (quiz_id, source, notes_hash, questions_json, created_at) VALUES (?, ?, ?, ?, ?)",
+                (quiz_id, source, notes_hash, json.dumps(questions, ensure_ascii=False), now),
+            )
+        self._remember(StoredQuiz(quiz_id, source, questions, notes_markdown, notes_hash))
+        return quiz_id
+
+    def get(self, quiz_id: str) -> StoredQuiz | None:
+        with self._cache_lock:
+            quiz = self._cache.get(quiz_id)
+            if quiz is not None:
+                self._cache.move_to_end(quiz_id)
+        metrics.record_cache("quiz_store", hit=quiz is not None)
+        if quiz is not None:
+            return quiz
+
+        row = self._conn().execute(
+            "SELECT q.source, q.questions_json, q.notes_hash, n.markdown "
+            "FROM quizzes q LEFT JOIN notes n ON n.notes_hash = q.notes_hash WHERE q.quiz_id = ?",
+            (quiz_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        source, questions_json, notes_hash, markdown = row
+        quiz = StoredQuiz(quiz_id, source, json.loads(questions_json), markdown, notes_hash)
+        self._remember(quiz)
+        return quiz
+
+
+store = QuizStore()
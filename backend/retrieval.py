@@ -0,0 +1,226 @@
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter
+from pathlib import Path
+
+import metrics
+from compaction import estimate_tokens, split_sections
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = Path(os.getenv("NOTES_INDEX_DIR", Path(__file__).resolve().parent / ".cache" / "notes_index"))
+NOTES_TOP_K = int(os.getenv("NOTES_TOP_K", "3"))
+# Stored indexes past this total size are pruned, least recently used first.
+NOTES_INDEX_MAX_MB = float(os.getenv("NOTES_INDEX_MAX_MB", "512"))
+CHUNK_TOKEN_LIMIT = 400
+
+_INDEX_VERSION = 1
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this "
+    "to was were what when where which who why will with".split()
+)
+
+
+def notes_hash(notes_markdown: str) -> str:
+    return hashlib.sha256(notes_markdown.encode("utf-8")).hexdigest()
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in (w.casefold() for w in _TOKEN_RE.findall(text)) if t not in _STOPWORDS]
+
+
+def chunk_notes(notes_markdown: str) -> list[str]:
+    """
+    Split notes into heading-delimited chunks.
+
+    Sections longer than CHUNK_TOKEN_LIMIT are split on paragraph boundaries,
+    and each piece keeps the section heading so it still reads in isolation.
+    """
+    chunks: list[str] = []
+    for section in split_sections(notes_markdown):
+        if estimate_tokens(section) <= CHUNK_TOKEN_LIMIT:
+            chunks.append(section)
+            continue
+        heading, _, rest = section.partition("\n")
+        if not heading.startswith("#"):
+            heading, rest = "", section
+        body = [p for p in rest.strip("\n").split("\n\n") if p.strip()]
+        current: list[str] = []
+        size = 0
+        for paragraph in body:
+            cost = estimate_tokens(paragraph)
+            if current and size + cost > CHUNK_TOKEN_LIMIT:
+                chunks.append("\n\n".join(([heading] if heading else []) + current))
+                current, size = [], 0
+            current.append(paragraph)
+            size += cost
+        if current:
+            chunks.append("\n\n".join(([heading] if heading else []) + current))
+    return chunks
+
+
+class NotesIndex:
+    """Okapi BM25 index over heading-delimited chunks of a notes document."""
+
+    def __init__(self, chunks: list[str], term_freqs: list[dict[str, int]], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.term_freqs = term_freqs
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = [sum(tf.values()) for tf in term_freqs]
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+        # Inverted postings so a query only touches chunks that contain its terms.
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        for i, tf in enumerate(term_freqs):
+            for term, freq in tf.items():
+                self.postings.setdefault(term, []).append((i, freq))
+        n = len(chunks)
+        self.idf = {
+            t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for t, p in self.postings.items()
+        }
+
+    @classmethod
+    def build(cls, notes_markdown: str) -> "NotesIndex":
+        return cls.from_chunks(chunk_notes(notes_markdown))
+
+    @classmethod
+    def from_chunks(cls, chunks: list[str]) -> "NotesIndex":
+        return cls(chunks, [dict(Counter(tokenize(c))) for c in chunks])
+
+    def search(self, query: str, k: int = NOTES_TOP_K) -> list[int]:
+        """Return the indices of the top-k chunks for `query`, best first."""
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        if not terms or not self.chunks:
+            return []
+        avg_length = self.avg_length or 1
+        scores: dict[int, float] = {}
+        for t in terms:
+            idf = self.idf[t]
+            for i, f in self.postings[t]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[i] / avg_length)
+                scores[i] = scores.get(i, 0.0) + idf * f * (self.k1 + 1) / (f + norm)
+        return heapq.nlargest(k, scores, key=scores.__getitem__)
+
+    def to_dict(self) -> dict:
+        return {"version": _INDEX_VERSION, "chunks": self.chunks, "term_freqs": self.term_freqs}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "NotesIndex":
+        return cls(data["chunks"], data["term_freqs"])
+
+
+def _index_path(digest: str) -> Path:
+    return INDEX_DIR / f"{digest}.json"
+
+
+def prune_indexes(max_bytes: float | None = None) -> int:
+    """
+    Delete the least recently used stored indexes until the rest fit in
+    `max_bytes` (NOTES_INDEX_MAX_MB by default). Returns the number deleted.
+
+    Loading an index touches its mtime, so mtime order is use order. A pruned
+    index is rebuilt from the quiz's stored notes the next time it is needed.
+    """
+    limit = NOTES_INDEX_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    entries = []
+    for path in INDEX_DIR.glob("*.json"):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries, key=lambda e: e[0]):
+        if total <= limit:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    if removed:
+        logger.info("pruned %d notes indexes", removed)
+    return removed
+
+
+def store_index(notes_markdown: str, chunks: list[str] | None = None) -> NotesIndex:
+    """
+    Build the index for `notes_markdown` and persist it next to the quiz cache.
+
+    `chunks` are the notes already split into passages (a converted upload's
+    `Document.chunks()`); without them the Markdown is split by `chunk_notes`.
+    """
+    index = NotesIndex.build(notes_markdown) if chunks is None else NotesIndex.from_chunks(chunks)
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    path = _index_path(notes_hash(notes_markdown))
+    # Per-process temp name: workers of a pre-forking server may index the same notes at once.
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(index.to_dict(), ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)
+    prune_indexes()
+    return index
+
+
+def load_index(notes_markdown: str) -> NotesIndex:
+    """Load the stored index for these notes, building it if it is missing."""
+    path = _index_path(notes_hash(notes_markdown))
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") == _INDEX_VERSION:
+            index = NotesIndex.from_dict(data)
+            metrics.record_cache("notes_index", hit=True)
+            _touch(path)
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+    metrics.record_cache("notes_index", hit=False)
+    logger.info("notes index missing for %s, rebuilding", path.name)
+    return store_index(notes_markdown)
+
+
+def _touch(path: Path) -> None:
+    """Mark a stored index as recently used for `prune_indexes`."""
+    try:
+        now = time.time()
+        os.utime(path, (now, now))
+    except OSError:
+        pass
+
+
+def _get(item: dict, *keys: str):
+    for key in keys:
+        if key in item:
+            return item[key]
+    return None
+
+
+def select_passages(index: NotesIndex, quiz_json: list[dict], k: int = NOTES_TOP_K) -> str | None:
+    """
+    Build the reference notes for grading from the top-k passages per subjective question.
+
+    The query is the question text only, never the student's answer, so an
+    answer cannot steer which passages it is graded against. Returns None when
+    the quiz has no subjective questions, so no notes are sent.
+    """
+    questions_by_chunk: dict[int, list] = {}
+    for question in quiz_json:
+        if _get(question, "Question type", "question_type") != "Subjective":
+            continue
+        number = _get(question, "Question number", "question_number")
+        for i in index.search(_get(question, "Question", "question") or "", k):
+            questions_by_chunk.setdefault(i, []).append(number)
+
+    if not questions_by_chunk:
+        return None
+    # Emit each passage once, in document order, tagged with the questions it serves.
+    return "\n\n".join(
+        f"<!-- Reference for question(s): {', '.join(str(n) for n in numbers)} -->\n{index.chunks[i]}"
+        for i, numbers in sorted(questions_by_chunk.items())
+    )
@@ -1,14 +1,68 @@
+import asyncio
+import hashlib
+import os
+import re
 import tempfile
 from pathlib import Path
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File
+from starlette.concurrency import run_in_threadpool
 
+import admission
+import coalescing
+import metrics
+import profiling
+import responses
 from schemas import ConvertResponse
 import routers
 
 router = APIRouter()
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".pptx", ".ppt"}
+_DOCUMENT_ID = re.compile(r"[0-9a-f]{64}")
+
+# Parsed documents (file_to_markdown's intermediate representation) by the SHA-256 of the upload.
+DOCUMENT_CACHE_DIR = Path(
+    os.getenv("DOCUMENT_CACHE_DIR", Path(__file__).resolve().parent.parent / ".cache" / "documents")
+)
+
+# Converted pages and slides by a hash of their content, shared by every upload.
+UNIT_CACHE_DIR = DOCUMENT_CACHE_DIR / "units"
+# Past these sizes the least recently used documents and units are deleted.
+DOCUMENT_CACHE_MAX_MB = float(os.getenv("DOCUMENT_CACHE_MAX_MB", "512"))
+UNIT_CACHE_MAX_MB = float(os.getenv("UNIT_CACHE_MAX_MB", "512"))
+
+CONVERTED_UNITS = metrics.counter(
+    "retina_convert_units_total",
+    "Pages and slides of uploads reused from the unit cache or converted.",
+    ("result",),
+)
+
+_document_cache = None
+_unit_cache = None
+
+
+def document_cache():
+    global _document_cache
+    if _document_cache is None:
+        _document_cache = routers.doc_converter.DocumentCache(
+            DOCUMENT_CACHE_DIR, max_bytes=DOCUMENT_CACHE_MAX_MB * 1024 * 1024
+        )
+    return _document_cache
+
+
+def unit_cache():
+    global _unit_cache
+    if _unit_cache is None:
+        _unit_cache = routers.doc_converter.UnitCache(UNIT_CACHE_DIR, max_bytes=UNIT_CACHE_MAX_MB * 1024 * 1024)
+    return _unit_cache
+
+
+def cached_document(document_id: str):
+    """The parsed document of an earlier upload by its `document_id`, or None."""
+    if not _DOCUMENT_ID.fullmatch(document_id):
+        return None
+    return document_cache().get(document_id)
 
 
 @router.post("/upload", response_model=ConvertResponse)
@@ -25,30 +79,88 @@ async def convert_file(file: UploadFile = File(...)):
             detail=f"Unsupported file type: {ext}. Supported: {', '.join(SUPPORTED_EXTENSIONS)}",
         )
 
+    # The body size is capped by admission.UploadLimitMiddleware before it gets here.
     content = await file.read()
-    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-        tmp.write(content)
-        tmp_path = Path(tmp.name)
+    digest = hashlib.sha256(content).hexdigest()
 
-    try:
-        converter = routers.doc_converter
+    # A file converted before is rendered from its cached document without opening it again.
+    document = await run_in_threadpool(document_cache().get, digest)
+    metrics.record_cache("document_ir", document is not None)
+    if document is not None:
+        return _document_response(document, digest)
 
-        if ext == ".pdf":
-            markdown = converter.convert_pdf_to_markdown(str(tmp_path))
-        elif ext == ".docx":
-            markdown = converter.convert_docx_to_markdown(str(tmp_path))
-        elif ext == ".pptx":
-            markdown = converter.convert_pptx_to_markdown(str(tmp_path))
-        elif ext == ".ppt":
-            markdown = converter.convert_ppt_to_markdown(str(tmp_path))
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported extension: {ext}")
+    inspection = await run_in_threadpool(admission.inspect, content, ext)
+    key = coalescing.make_key(inspection.format, digest)
 
-        return ConvertResponse(markdown=markdown)
+    try:
+        # Identical uploads arriving together are converted once, and share one memory reservation.
+        document = await coalescing.conversion.join(key, lambda: _admit_and_convert(inspection, content, digest))
+        return _document_response(document, digest)
 
+    except HTTPException:
+        raise
+    except routers.doc_converter.ConversionLimitExceeded as e:
+        raise admission.limit_rejection(e)
     except ImportError as e:
         raise HTTPException(status_code=500, detail=f"Missing dependency: {e}")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Conversion timed out.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Conversion error: {e}")
+
+
+@router.get("/documents/{document_id}", response_model=ConvertResponse)
+async def get_document(document_id: str, request: Request):
+    """
+    The Markdown of a previously converted upload, by the `document_id` the
+    upload returned. Conversions are content-addressed and never change, so
+    clients revalidate with `If-None-Match` and get a 304 without a body.
+    """
+    if not _DOCUMENT_ID.fullmatch(document_id) or not document_cache().path(document_id).exists():
+        raise HTTPException(status_code=404, detail=f"Document not found: {document_id}")
+    tag = _document_etag(document_id)
+    cached = responses.not_modified(request, tag, "document")
+    if cached is not None:
+        return cached
+    document = await run_in_threadpool(document_cache().get, document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"Document not found: {document_id}")
+    return _document_response(document, document_id, responses.cache_headers(tag))
+
+
+def _document_etag(document_id: str) -> str:
+    return responses.etag("document", document_id, routers.doc_converter.ir.FORMAT_VERSION)
+
+
+def _document_response(document, document_id: str, headers: dict | None = None):
+    # A large document is megabytes of Markdown in one string: render it with orjson, not the response model.
+    return responses.json_response({"markdown": document.to_markdown(), "document_id": document_id}, headers=headers)
+
+
+async def _admit_and_convert(inspection: admission.Inspection, content: bytes, digest: str):
+    async with admission.budget.reserve(admission.estimate_mb(inspection)):
+        document = await run_in_threadpool(_convert, inspection.format, content)
+    await run_in_threadpool(document_cache().put, digest, document)
+    return document
+
+
+def _convert(ext: str, content: bytes):
+    """Parse an upload into a file_to_markdown Document."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
+        tmp.write(content)
+        tmp_path = Path(tmp.name)
+
+    try:
+        converter = routers.doc_converter
+        limits = admission.conversion_limits(converter)
+
+        stage = f"convert_{ext.lstrip('.')}"
+        with metrics.stage(stage), profiling.thread_profile(stage), profiling.allocation_snapshot(stage):
+            # A re-upload of an edited deck or PDF only converts the pages and slides that changed.
+            document = converter.convert_to_document(str(tmp_path), limits=limits, unit_cache=unit_cache())
+        if document.format != "docx":
+            CONVERTED_UNITS.inc(document.units_reused, result="reused")
+            CONVERTED_UNITS.inc(document.units_converted, result="converted")
+        return document
     finally:
         tmp_path.unlink(missing_ok=True)
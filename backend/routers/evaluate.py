@@ -1,72 +1,417 @@
+import asyncio
 import json
-import tempfile
-from pathlib import Path
+import os
+import time
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
-from schemas import EvaluateRequest, EvaluateResponse, EvaluationResultItem
+import coalescing
+import metrics
+import responses
+from answer_clustering import CLUSTER_CONFIDENCE, CLUSTER_SIMILARITY, plan_batch
+from compaction import compact_notes, estimate_tokens
+from model_routing import router as model_router
+from quiz_store import ANSWER_KEY, public_questions, store as quiz_store
+from retrieval import load_index, notes_hash, select_passages
+from score_cache import (
+    SCORE_CACHE_ENABLED,
+    cache as score_cache,
+    filter_questions,
+    normalize_answer,
+    score_keys,
+    split_cached,
+)
+from schemas import (
+    BatchEvaluateRequest,
+    BatchEvaluateResponse,
+    EvaluateByIdRequest,
+    EvaluateRequest,
+    EvaluateResponse,
+)
 import routers
 
 router = APIRouter()
 
+# Distinct answers graded per Gemini call in batch mode.
+BATCH_ITEMS_PER_CALL = int(os.getenv("BATCH_ITEMS_PER_CALL", "40"))
+# Streaming mode: subjective questions per Gemini call, and calls in flight per submission.
+STREAM_GROUP_SIZE = int(os.getenv("STREAM_GROUP_SIZE", "4"))
+STREAM_CONCURRENCY = int(os.getenv("STREAM_CONCURRENCY", "4"))
+
+_OBJECTIVE_TYPES = ("MCQ", "BCQ")
+
+
+def _score_keyed(quiz_json: list[dict], user_answers_json: list[dict]) -> tuple[dict[int, float], list, list]:
+    """
+    Score the MCQ/BCQ questions that carry an answer key, without a model call.
+
+    Only stored quizzes have keys (clients never see or send them). Returns the
+    scores and the questions and answers still left for the model: subjective
+    ones, and objective ones from quizzes generated before keys existed.
+    """
+    answers = {_question_number(a): a.get("Answer", a.get("answer")) for a in user_answers_json}
+    scores = {}
+    for question in quiz_json:
+        correct = question.get(f"Option {question.get(ANSWER_KEY)}")
+        if question.get("Question type") in _OBJECTIVE_TYPES and correct is not None:
+            number = _question_number(question)
+            # Same rule the grading prompt gives the model: the chosen option must match exactly.
+            scores[number] = float(normalize_answer(answers.get(number)) == normalize_answer(correct))
+    if not scores:
+        return scores, quiz_json, user_answers_json
+    rest = [q for q in quiz_json if _question_number(q) not in scores]
+    return scores, rest, [a for a in user_answers_json if _question_number(a) not in scores]
+
+
+def _route(quiz_json: list[dict], user_answers_json: list[dict]) -> list[tuple[str, str, str]]:
+    """Model tiers to grade these answers with, decided on the questions and answers alone."""
+    tokens = estimate_tokens(json.dumps(quiz_json, ensure_ascii=False, indent=2)) + estimate_tokens(
+        json.dumps(user_answers_json, ensure_ascii=False, indent=2)
+    )
+    return model_router.route("evaluate", tokens, len(quiz_json))
+
+
+def _grade(
+    quiz_json: list[dict],
+    user_answers_json: list[dict],
+    notes_text: str | None,
+    chain: list[tuple[str, str, str]] | None = None,
+    misses: dict[int, str] | None = None,
+) -> tuple[dict[int, float], str | None]:
+    """
+    Grade answers against already-compacted notes; returns scores by question and the passages sent.
+
+    Keyed objective questions are scored locally first. The model is routed
+    on the rest of the submission (or given as `chain`) before the score
+    cache lookup, so each answer is looked up, graded and cached
+    under the model that grades it. A caller that has already looked the
+    answers up passes the cache keys of the misses as `misses`, and the
+    lookup is not repeated.
+    """
+    scores, quiz_json, user_answers_json = _score_keyed(quiz_json, user_answers_json)
+    if not quiz_json:
+        return scores, None
+    chain = chain or _route(quiz_json, user_answers_json)
+    notes_digest = notes_hash(notes_text) if notes_text else None
+    if SCORE_CACHE_ENABLED and misses is None:
+        # Identical answers to the same question are graded once; only misses go to Gemini.
+        with metrics.stage("score_cache_lookup"):
+            cached, misses = split_cached(score_cache, quiz_json, user_answers_json, notes_digest, chain[0][1])
+        scores.update(cached)
+        quiz_json = filter_questions(quiz_json, misses)
+        user_answers_json = filter_questions(user_answers_json, misses)
+    if not quiz_json:
+        return scores, None
+
+    passages = None
+    if notes_text:
+        # Only the passages relevant to the subjective questions are graded against.
+        with metrics.stage("retrieve_passages"):
+            passages = select_passages(load_index(notes_text), quiz_json)
+
+    quiz_text = json.dumps(quiz_json, ensure_ascii=False, indent=2)
+    answers_text = json.dumps(user_answers_json, ensure_ascii=False, indent=2)
+    models_tried: list[str] = []
+
+    def attempt(model: str):
+        models_tried.append(model)
+        return routers.quiz_eval_evaluator.evaluate_quiz_data(
+            quiz_json=quiz_text,
+            user_answers_json=answers_text,
+            notes_markdown=passages,
+            prompt_template_path=routers.QUIZ_EVAL_DIR / "prompt_template.md",
+            model_name=model,
+        )
+
+    result = model_router.call("evaluate", 0, len(quiz_json), attempt, chain=chain)
+    graded = {item.question_number: item.score for item in result.results}
+    scores.update(graded)
+    if SCORE_CACHE_ENABLED:
+        # A fallback tier's scores are cached under that tier's model.
+        model = models_tried[-1]
+        keys = misses if model == chain[0][1] else score_keys(quiz_json, user_answers_json, notes_digest, model)
+        score_cache.put_many({keys[n]: score for n, score in graded.items() if n in keys})
+    return scores, passages
+
+
+async def _grade_shared(
+    quiz_json: list[dict],
+    user_answers_json: list[dict],
+    notes_text: str | None,
+    chain: list[tuple[str, str, str]] | None = None,
+    misses: dict[int, str] | None = None,
+) -> tuple[dict[int, float], str | None]:
+    """`_grade` in the thread pool, shared by concurrent identical submissions."""
+    key = coalescing.make_key(quiz_json, user_answers_json, notes_hash(notes_text) if notes_text else None)
+    return await coalescing.evaluation.do(key, _grade, quiz_json, user_answers_json, notes_text, chain, misses)
+
+
+def _result_items(scores: dict[int, float]) -> list[dict]:
+    """`EvaluationResultItem`-shaped dicts, in question order."""
+    return [{"question_number": number, "score": float(score)} for number, score in sorted(scores.items())]
+
+
+async def _evaluate(
+    quiz_json: list[dict],
+    user_answers_json: list[dict],
+    notes_text: str | None,
+    notes_tokens: int,
+) -> Response:
+    scores, passages = await _grade_shared(quiz_json, user_answers_json, notes_text)
+    headers = {}
+    if notes_text:
+        tokens_saved = notes_tokens - (estimate_tokens(passages) if passages else 0)
+        metrics.NOTES_TOKENS_SAVED.inc(tokens_saved, route="evaluate")
+        headers["X-Notes-Tokens-Saved"] = str(tokens_saved)
+
+    return responses.json_response({"results": _result_items(scores)}, headers=headers)
+
+
+def _stream_groups(quiz_json: list[dict]) -> list[list[dict]]:
+    """Objective questions without an answer key as one (fast) group first, then subjective ones in small groups."""
+    objective = [q for q in quiz_json if q.get("Question type") in _OBJECTIVE_TYPES]
+    subjective = [q for q in quiz_json if q.get("Question type") not in _OBJECTIVE_TYPES]
+    groups = [objective] if objective else []
+    groups += [subjective[i : i + STREAM_GROUP_SIZE] for i in range(0, len(subjective), STREAM_GROUP_SIZE)]
+    return groups
+
+
+def _question_number(item: dict):
+    return item.get("Question number", item.get("question_number"))
+
+
+def _question_numbers(items: list[dict]) -> set:
+    return {_question_number(item) for item in items}
+
+
+def _split_groups(routed: list[tuple], notes_digest: str | None) -> list[tuple[dict[int, float], dict[int, str]]]:
+    """`split_cached` for each routed (group, answers, chain), in one call so it can run off the event loop."""
+    return [split_cached(score_cache, group, answers, notes_digest, chain[0][1]) for group, answers, chain in routed]
+
+
+async def _stream_evaluation(
+    quiz_json: list[dict],
+    user_answers_json: list[dict],
+    notes_text: str | None,
+    sse: bool,
+):
+    """
+    Yield score events as soon as they are known, then a final `done` event.
+
+    Objective questions with an answer key are scored locally and go out
+    before anything else, then cached scores (every group is looked up in one
+    trip to the thread pool); the remaining questions are split into groups of
+    at most STREAM_GROUP_SIZE and each group's uncached ones are graded,
+    STREAM_CONCURRENCY groups at a time, its scores emitted as it finishes. A
+    failed group yields an `error` event for its questions and the rest carry
+    on. `done` carries the `EvaluateResponse` body.
+    """
+    started = time.perf_counter()
+    first_score = True
+
+    def event(name: str, payload: dict) -> str:
+        nonlocal first_score
+        if name == "scores" and first_score:
+            first_score = False
+            metrics.EVALUATE_FIRST_SCORE_SECONDS.observe(time.perf_counter() - started)
+        if sse:
+            return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+        return json.dumps({"event": name, **payload}) + "\n"
+
+    scores, quiz_json, user_answers_json = _score_keyed(quiz_json, user_answers_json)
+    if scores:
+        yield event("scores", {"results": _result_items(scores), "cached": False})
+
+    # Each group is routed on its own questions, and its answers are looked up under that model.
+    routed = []
+    for group in _stream_groups(quiz_json):
+        answers = filter_questions(user_answers_json, _question_numbers(group))
+        routed.append((group, answers, _route(group, answers)))
+    lookups = [({}, None)] * len(routed)
+    if SCORE_CACHE_ENABLED and routed:
+        with metrics.stage("score_cache_lookup"):
+            lookups = await run_in_threadpool(_split_groups, routed, notes_hash(notes_text) if notes_text else None)
+    cached_scores: dict[int, float] = {}
+    groups = []
+    for (group, _, chain), (cached, misses) in zip(routed, lookups):
+        cached_scores.update(cached)
+        if misses is not None:
+            group = filter_questions(group, misses)
+        if group:
+            groups.append((group, chain, misses))
+    if cached_scores:
+        scores.update(cached_scores)
+        yield event("scores", {"results": _result_items(cached_scores), "cached": True})
+
+    semaphore = asyncio.Semaphore(STREAM_CONCURRENCY)
+
+    async def grade(group: list[dict], chain, misses):
+        # Already looked up above; `_grade` goes straight to the model.
+        async with semaphore:
+            answers = filter_questions(user_answers_json, _question_numbers(group))
+            return await _grade_shared(group, answers, notes_text, chain, misses)
+
+    pending = {asyncio.ensure_future(grade(*entry)): _question_numbers(entry[0]) for entry in groups}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                numbers = pending.pop(task)
+                try:
+                    group_scores, _ = task.result()
+                except Exception as e:
+                    detail = "Evaluation timed out." if isinstance(e, asyncio.TimeoutError) else f"Evaluation failed: {e}"
+                    yield event("error", {"question_numbers": sorted(numbers), "detail": detail})
+                    continue
+                scores.update(group_scores)
+                yield event("scores", {"results": _result_items(group_scores), "cached": False})
+    finally:
+        # The client went away; shared grading calls keep running for other waiters.
+        for task in pending:
+            task.cancel()
+
+    yield event("done", {"results": _result_items(scores)})
+
+
+def _streaming_response(request: Request, events) -> StreamingResponse:
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    return StreamingResponse(
+        events(sse),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _load_quiz(quiz_id: str):
+    with metrics.stage("load_quiz"):
+        quiz = quiz_store.get(quiz_id)
+    if quiz is None:
+        raise HTTPException(status_code=404, detail=f"Quiz not found: {quiz_id}")
+    return quiz
+
 
 @router.post("/submit", response_model=EvaluateResponse)
 async def evaluate_submission(req: EvaluateRequest):
     """Evaluate a user's quiz answers using Gemini."""
     try:
-        evaluate_quiz = routers.quiz_eval_evaluator.evaluate_quiz
-        ContentInputs = routers.quiz_eval_models.ContentInputs
-        prompt_template_path = routers.QUIZ_EVAL_DIR / "prompt_template.md"
+        notes_text, notes_tokens = None, 0
+        if req.notes_markdown:
+            with metrics.stage("compact_notes"):
+                notes = compact_notes(req.notes_markdown)
+            notes_text, notes_tokens = notes.text, notes.tokens_before
 
-        # Write quiz JSON, user answers, and optional notes to temp files
-        quiz_tmp = tempfile.NamedTemporaryFile(
-            mode="w", suffix=".json", delete=False, encoding="utf-8"
-        )
-        quiz_tmp.write(json.dumps(req.quiz_json, ensure_ascii=False, indent=2))
-        quiz_tmp.close()
+        return await _evaluate(public_questions(req.quiz_json), req.user_answers_json, notes_text, notes_tokens)
+
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Evaluation timed out.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Evaluation failed: {e}")
 
-        answers_tmp = tempfile.NamedTemporaryFile(
-            mode="w", suffix=".json", delete=False, encoding="utf-8"
-        )
-        answers_tmp.write(json.dumps(req.user_answers_json, ensure_ascii=False, indent=2))
-        answers_tmp.close()
 
-        notes_path = None
-        notes_tmp = None
+@router.post("/submit-by-id", response_model=EvaluateResponse)
+async def evaluate_submission_by_id(req: EvaluateByIdRequest):
+    """Evaluate answers for a quiz previously stored by the generate endpoints."""
+    quiz = _load_quiz(req.quiz_id)
+    try:
+        # Stored notes were compacted at generation time.
+        notes_tokens = estimate_tokens(quiz.notes_markdown) if quiz.notes_markdown else 0
+        return await _evaluate(quiz.questions, req.user_answers_json, quiz.notes_markdown, notes_tokens)
+
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Evaluation timed out.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Evaluation failed: {e}")
+
+
+@router.post("/submit-stream")
+async def evaluate_submission_stream(req: EvaluateRequest, request: Request):
+    """
+    Streaming variant of `/submit`: scores are pushed as NDJSON lines (or SSE
+    events when the client accepts `text/event-stream`) as each group is graded.
+    """
+    notes_text = None
+    if req.notes_markdown:
+        with metrics.stage("compact_notes"):
+            notes_text = compact_notes(req.notes_markdown).text
+    return _streaming_response(
+        request, lambda sse: _stream_evaluation(public_questions(req.quiz_json), req.user_answers_json, notes_text, sse)
+    )
+
+
+@router.post("/submit-by-id-stream")
+async def evaluate_submission_by_id_stream(req: EvaluateByIdRequest, request: Request):
+    """Streaming variant of `/submit-by-id`."""
+    quiz = _load_quiz(req.quiz_id)
+    return _streaming_response(
+        request, lambda sse: _stream_evaluation(quiz.questions, req.user_answers_json, quiz.notes_markdown, sse)
+    )
+
+
+@router.post("/batch", response_model=BatchEvaluateResponse)
+async def evaluate_batch(req: BatchEvaluateRequest):
+    """
+    Grade a whole cohort's submissions for one quiz.
+
+    Answers to each question are clustered; one representative per cluster is
+    graded and its score is shared with the cluster's members.
+    `similarity_threshold` decides who joins a cluster and `confidence_threshold`
+    who shares its score (default `ANSWER_CLUSTER_CONFIDENCE`); the rest are
+    graded on their own.
+    """
+    if req.quiz_id:
+        quiz = _load_quiz(req.quiz_id)
+        quiz_json, notes_text = quiz.questions, quiz.notes_markdown
+    elif req.quiz_json:
+        quiz_json, notes_text = public_questions(req.quiz_json), None
         if req.notes_markdown:
-            notes_tmp = tempfile.NamedTemporaryFile(
-                mode="w", suffix=".md", delete=False, encoding="utf-8"
-            )
-            notes_tmp.write(req.notes_markdown)
-            notes_tmp.close()
-            notes_path = Path(notes_tmp.name)
-
-        try:
-            content_inputs = ContentInputs(
-                quiz_json_path=Path(quiz_tmp.name),
-                user_answers_json_path=Path(answers_tmp.name),
-                notes_markdown_path=notes_path,
-            )
+            with metrics.stage("compact_notes"):
+                notes_text = compact_notes(req.notes_markdown).text
+    else:
+        raise HTTPException(status_code=400, detail="Either quiz_id or quiz_json is required.")
 
-            result = evaluate_quiz(
-                inputs=content_inputs,
-                prompt_template_path=prompt_template_path,
+    try:
+        with metrics.stage("cluster_answers"):
+            items = plan_batch(
+                quiz_json,
+                [s.user_answers_json for s in req.submissions],
+                threshold=req.similarity_threshold or CLUSTER_SIMILARITY,
+                # Set on its own: a confidence below the threshold lets every member share its cluster's score.
+                confidence=CLUSTER_CONFIDENCE if req.confidence_threshold is None else req.confidence_threshold,
             )
 
-            return EvaluateResponse(
-                results=[
-                    EvaluationResultItem(
-                        question_number=item.question_number,
-                        score=item.score,
-                    )
-                    for item in result.results
-                ]
+        # Grade the distinct answers as synthetic quizzes numbered by item index.
+        per_student: list[dict[int, float]] = [{} for _ in req.submissions]
+        for start in range(0, len(items), BATCH_ITEMS_PER_CALL):
+            chunk = items[start : start + BATCH_ITEMS_PER_CALL]
+            scores, _ = await _grade_shared(
+                [{**item.question, "Question number": k} for k, item in enumerate(chunk, 1)],
+                [
+                    {"Question number": k, "Answer": item.answer, "Answer count": item.count}
+                    for k, item in enumerate(chunk, 1)
+                ],
+                notes_text,
             )
-        finally:
-            Path(quiz_tmp.name).unlink(missing_ok=True)
-            Path(answers_tmp.name).unlink(missing_ok=True)
-            if notes_tmp:
-                Path(notes_tmp.name).unlink(missing_ok=True)
+            for k, item in enumerate(chunk, 1):
+                if k not in scores:
+                    continue
+                number = item.question.get("Question number", item.question.get("question_number"))
+                for member in item.members:
+                    per_student[member][number] = scores[k]
+
+        return responses.json_response(
+            {
+                "results": [
+                    {"student_id": submission.student_id, "results": _result_items(scores)}
+                    for submission, scores in zip(req.submissions, per_student)
+                ],
+                "answers": len(req.submissions) * len(quiz_json),
+                "graded_answers": len(items),
+            }
+        )
 
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Batch evaluation timed out.")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Evaluation failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Batch evaluation failed: {e}")
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+
+import profiling
+from schemas import ProfileFile, ProfilingArmRequest, ProfilingStatusResponse
+
+router = APIRouter()
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    """Reject the request unless profiling is enabled and the admin token matches."""
+    if not profiling.enabled():
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    if not profiling.check_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+def _status() -> ProfilingStatusResponse:
+    state = profiling.status()
+    return ProfilingStatusResponse(
+        remaining=state.remaining,
+        route=state.route,
+        mode=state.mode,
+        trace_allocations=state.trace_allocations,
+    )
+
+
+@router.post("/arm", response_model=ProfilingStatusResponse, dependencies=[Depends(require_admin)])
+async def arm_profiler(req: ProfilingArmRequest):
+    """Profile the next `requests` requests, optionally only those under `route`."""
+    try:
+        profiling.arm(req.requests, req.route, req.mode, req.trace_allocations)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _status()
+
+
+@router.post("/disarm", response_model=ProfilingStatusResponse, dependencies=[Depends(require_admin)])
+async def disarm_profiler():
+    profiling.disarm()
+    return _status()
+
+
+@router.get("/status", response_model=ProfilingStatusResponse, dependencies=[Depends(require_admin)])
+async def profiler_status():
+    return _status()
+
+
+@router.get("/profiles", response_model=list[ProfileFile], dependencies=[Depends(require_admin)])
+async def list_profiles():
+    return [ProfileFile(**p) for p in profiling.list_profiles()]
+
+
+@router.get("/profiles/{name}", dependencies=[Depends(require_admin)])
+async def download_profile(name: str):
+    """Download a `.pstats`, `.collapsed` or `.tracemalloc` file."""
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return FileResponse(path, filename=path.name, media_type="application/octet-stream")
@@ -1,21 +1,74 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+import os
 
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+import coalescing
+import metrics
+import responses
+from compaction import CHARS_PER_TOKEN, compact_notes, estimate_tokens
+from model_routing import router as model_router
+from quiz_store import public_questions, store as quiz_store
+from retrieval import CHUNK_TOKEN_LIMIT, store_index
+from warm_pool import pool as warm_pool
 from schemas import (
     QuizGenerateFromContentRequest,
     QuizGenerateFromAIRequest,
     QuizGenerateResponse,
 )
 import routers
+from routers.convert import cached_document
 
 router = APIRouter()
 
+# AI-mode quizzes with more questions than this are generated as concurrent shards.
+QUIZ_SHARD_THRESHOLD = int(os.getenv("QUIZ_SHARD_THRESHOLD", "20"))
+
 
-def _generate_quiz(prompt: str) -> list[dict]:
-    """Call Gemini and parse/validate the quiz output."""
+def _routed_quiz(prompt: str, num_questions: int):
+    """Call Gemini on the routed model tier and parse/validate the quiz output."""
     main_mod = routers.quiz_gen_main
-    raw_json = main_mod.call_gemini(prompt)
-    quiz = main_mod.parse_and_validate_quiz(raw_json)
-    return [q.model_dump(by_alias=True) for q in quiz.questions]
+    return model_router.call(
+        "generate_quiz",
+        estimate_tokens(prompt),
+        num_questions,
+        lambda model: main_mod.parse_and_validate_quiz(main_mod.call_gemini(prompt, model=model)),
+    )
+
+
+def _dump_questions(quiz) -> list[dict]:
+    """The validated questions as plain dicts, in one pass; they are stored and returned as is, never re-validated."""
+    return routers.quiz_gen_models.QUIZ_QUESTIONS_ADAPTER.dump_python(quiz.questions, by_alias=True)
+
+
+def _generate_quiz(prompt: str, num_questions: int) -> list[dict]:
+    return _dump_questions(_routed_quiz(prompt, num_questions))
+
+
+def _question_count(request) -> int:
+    return request.num_mcq + request.num_subjective + request.num_bcq
+
+
+def _normalize(text: str | None) -> str:
+    return " ".join((text or "").split()).casefold()
+
+
+def _index_notes(notes_text: str, markdown: str, document_id: str | None) -> None:
+    """
+    Index the compacted notes for grading. When they come from a converted
+    upload whose parsed document is still cached, its heading- and page-aware
+    chunks are indexed instead of re-splitting the Markdown.
+    """
+    chunks = None
+    if document_id:
+        document = cached_document(document_id)
+        # Only if the client sent that document's Markdown unedited.
+        if document is not None and document.to_markdown() == markdown:
+            chunks = [c.text for c in document.chunks(max_chars=CHUNK_TOKEN_LIMIT * CHARS_PER_TOKEN)]
+        metrics.record_cache("document_chunks", hit=chunks is not None)
+    store_index(notes_text, chunks)
 
 
 @router.post("/generate-from-content", response_model=QuizGenerateResponse)
@@ -32,21 +85,81 @@ async def generate_from_content(req: QuizGenerateFromContentRequest):
             num_bcq=req.num_bcq,
         )
 
-        prompt = main_mod.build_prompt_from_markdown(req.markdown_content, gen_request)
-        questions = _generate_quiz(prompt)
-        return QuizGenerateResponse(questions=questions)
+        with metrics.stage("compact_notes"):
+            notes = compact_notes(req.markdown_content)
+        metrics.NOTES_TOKENS_SAVED.inc(notes.tokens_saved, route="generate-from-content")
+
+        with metrics.stage("build_prompt"):
+            prompt = main_mod.build_prompt_from_markdown(notes.text, gen_request)
+        questions = await coalescing.generation.do(
+            coalescing.make_key("content", prompt), _generate_quiz, prompt, _question_count(gen_request)
+        )
+        # Index the notes now so grading can retrieve per-question passages.
+        with metrics.stage("index_notes"):
+            await run_in_threadpool(_index_notes, notes.text, req.markdown_content, req.document_id)
+        # Keep the compacted notes with the quiz so grading can load them by id.
+        with metrics.stage("store_quiz"):
+            quiz_id = await run_in_threadpool(quiz_store.save, questions, notes.text, source="content")
+        return responses.json_response(
+            {"questions": public_questions(questions), "quiz_id": quiz_id},
+            headers={"X-Notes-Tokens-Saved": str(notes.tokens_saved)},
+        )
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Quiz generation timed out.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Quiz generation failed: {e}")
 
 
+def _ai_prompt(spec: dict) -> str:
+    main_mod = routers.quiz_gen_main
+    return main_mod.build_prompt_for_ai(
+        topic=spec["topic"],
+        sub_topic=spec["sub_topic"],
+        todo_instructions=spec["todo"] or None,
+        to_avoid_instructions=spec["to_avoid"] or None,
+        request=routers.quiz_gen_models.QuizGenerationRequest(**spec["request"]),
+    )
+
+
+def _is_sharded(request) -> bool:
+    return _question_count(request) > QUIZ_SHARD_THRESHOLD
+
+
+def _generate_ai(spec: dict) -> list[dict]:
+    """Generate an AI-mode quiz, in concurrent shards when it is large."""
+    request = routers.quiz_gen_models.QuizGenerationRequest(**spec["request"])
+    if not _is_sharded(request):
+        with metrics.stage("build_prompt"):
+            prompt = _ai_prompt(spec)
+        return _generate_quiz(prompt, _question_count(request))
+
+    with metrics.stage("gemini_generate_sharded"):
+        quiz = routers.quiz_gen_main.generate_quiz_sharded(
+            topic=spec["topic"],
+            sub_topic=spec["sub_topic"],
+            todo_instructions=spec["todo"] or None,
+            to_avoid_instructions=spec["to_avoid"] or None,
+            request=request,
+            generate=_routed_quiz,
+        )
+    return _dump_questions(quiz)
+
+
+def generate_for_pool(spec: dict) -> tuple[list[dict], int]:
+    """Background warm-pool generation; returns the questions and the estimated tokens spent."""
+    questions = _generate_ai(spec)
+    request = routers.quiz_gen_models.QuizGenerationRequest(**spec["request"])
+    calls = len(routers.quiz_gen_main.plan_shards(spec["sub_topic"], request)) if _is_sharded(request) else 1
+    return questions, estimate_tokens(_ai_prompt(spec)) * calls + estimate_tokens(json.dumps(questions))
+
+
 @router.post("/generate-from-ai", response_model=QuizGenerateResponse)
 async def generate_from_ai(req: QuizGenerateFromAIRequest):
     """Generate a quiz from a topic using AI knowledge."""
     try:
-        main_mod = routers.quiz_gen_main
         models_mod = routers.quiz_gen_models
 
         gen_request = models_mod.QuizGenerationRequest(
@@ -55,18 +168,45 @@ async def generate_from_ai(req: QuizGenerateFromAIRequest):
             num_subjective=req.num_subjective,
             num_bcq=req.num_bcq,
         )
-
-        prompt = main_mod.build_prompt_for_ai(
-            topic=req.topic,
-            sub_topic=req.sub_topic,
-            todo_instructions=req.todo or None,
-            to_avoid_instructions=req.to_avoid or None,
-            request=gen_request,
+        spec = {
+            "topic": req.topic,
+            "sub_topic": req.sub_topic,
+            "todo": req.todo,
+            "to_avoid": req.to_avoid,
+            "request": gen_request.model_dump(mode="json"),
+        }
+        key = coalescing.make_key(
+            "ai",
+            [_normalize(v) for v in (req.topic, req.sub_topic, req.todo, req.to_avoid)],
+            spec["request"],
         )
-        questions = _generate_quiz(prompt)
-        return QuizGenerateResponse(questions=questions)
+
+        # Popular topics are pre-generated in the background; serve a spare one if available.
+        warm_pool.record(key, spec)
+        questions = warm_pool.take(key, req.user_id)
+        if questions is None:
+            # Students opening a shared link request the same topic at once; generate it once.
+            questions = await coalescing.generation.do(key, _generate_ai, spec)
+        with metrics.stage("store_quiz"):
+            quiz_id = await run_in_threadpool(quiz_store.save, questions, None, source="ai")
+        return responses.json_response({"questions": public_questions(questions), "quiz_id": quiz_id})
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Quiz generation timed out.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Quiz generation failed: {e}")
+
+
+@router.get("/{quiz_id}", response_model=QuizGenerateResponse)
+async def get_quiz(quiz_id: str, request: Request):
+    """A stored quiz; stored quizzes never change, so clients revalidate with `If-None-Match`."""
+    with metrics.stage("load_quiz"):
+        quiz = quiz_store.get(quiz_id)
+    if quiz is None:
+        raise HTTPException(status_code=404, detail=f"Quiz not found: {quiz_id}")
+    tag = responses.etag("quiz", quiz_id)
+    return responses.not_modified(request, tag, "quiz") or responses.json_response(
+        {"questions": public_questions(quiz.questions), "quiz_id": quiz_id}, headers=responses.cache_headers(tag)
+    )
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+import model_routing
+from schemas import RoutingPolicy, RoutingStatusResponse
+
+router = APIRouter()
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    """Reject the request unless the routing admin token is configured and matches."""
+    if not model_routing.ROUTING_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Routing admin is disabled.")
+    if not model_routing.check_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+def _status() -> RoutingStatusResponse:
+    return RoutingStatusResponse(policy=model_routing.router.policy, tiers=model_routing.router.stats())
+
+
+@router.get("", response_model=RoutingStatusResponse, dependencies=[Depends(require_admin)])
+async def routing_status():
+    """Current routing policy with per-tier call counts, latency and cost."""
+    return _status()
+
+
+@router.put("", response_model=RoutingStatusResponse, dependencies=[Depends(require_admin)])
+async def update_routing(policy: RoutingPolicy):
+    """Replace the routing policy; takes effect for the next Gemini call."""
+    model_routing.router.set_policy(policy)
+    return _status()
@@ -0,0 +1,139 @@
+"""
+Focus telemetry from the browser tracker.
+
+Clients POST `FocusBatch` JSON, optionally gzip-compressed (`Content-Encoding:
+gzip`), every few seconds per quiz session. Batches are appended to
+`focus_store`; the GET routes answer from its write-time rollups.
+
+The request body is capped at FOCUS_MAX_BODY_BYTES while it streams in, by an
+`admission.UploadLimitMiddleware` on FOCUS_PATH (see main.py); the decompressed
+body is capped again here.
+"""
+
+import os
+import zlib
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from focus_store import FOCUS_ROLLUP_MS, FOCUS_SCALE, GAZE_SCALE, store as focus_store
+from schemas import FocusBatch, FocusIngestResponse, FocusQuestionSummary, FocusSessionSummary, FocusTimeline
+
+router = APIRouter()
+
+FOCUS_MAX_BODY_BYTES = int(os.getenv("FOCUS_MAX_BODY_BYTES", str(1024 * 1024)))
+FOCUS_MAX_BATCH = int(os.getenv("FOCUS_MAX_BATCH", "5000"))
+FOCUS_PATH = "/api/telemetry/focus"
+
+
+def _decompress(raw: bytes, encoding: str) -> bytes:
+    if len(raw) > FOCUS_MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="Telemetry batch too large.")
+    if encoding in ("", "identity"):
+        return raw
+    if encoding != "gzip":
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    try:
+        body = decompressor.decompress(raw, FOCUS_MAX_BODY_BYTES)
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    if decompressor.unconsumed_tail:
+        raise HTTPException(status_code=413, detail="Telemetry batch too large.")
+    return body
+
+
+def _columns(batch: FocusBatch) -> tuple[np.ndarray, ...]:
+    """Absolute timestamps and range-checked quantized columns."""
+    if len(batch.dt_ms) > FOCUS_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {FOCUS_MAX_BATCH} snapshots per batch.")
+    dt = np.asarray(batch.dt_ms, dtype=np.int64)
+    question = np.asarray(batch.question, dtype=np.int64)
+    focus = np.asarray(batch.focus, dtype=np.int64)
+    left = np.asarray(batch.left_gaze, dtype=np.int64)
+    right = np.asarray(batch.right_gaze, dtype=np.int64)
+    for name, column, high in (
+        ("dt_ms", dt, np.iinfo(np.int32).max),
+        ("question", question, np.iinfo(np.uint16).max),
+        ("focus", focus, 100 * FOCUS_SCALE),
+        ("left_gaze", left, GAZE_SCALE),
+        ("right_gaze", right, GAZE_SCALE),
+    ):
+        if column.min() < 0 or column.max() > high:
+            raise HTTPException(status_code=400, detail=f"{name} values must be within 0-{high}.")
+    return (
+        batch.start_ms + np.cumsum(dt),
+        question.astype(np.uint16),
+        focus.astype(np.uint8),
+        left.astype(np.uint8),
+        right.astype(np.uint8),
+    )
+
+
+@router.post("/focus", response_model=FocusIngestResponse)
+async def ingest_focus(request: Request):
+    """Append one batch of focus snapshots to its session."""
+    body = _decompress(await request.body(), request.headers.get("content-encoding", "").strip().lower())
+    try:
+        batch = FocusBatch.model_validate_json(body)
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_context=False, include_input=False)
+        raise HTTPException(status_code=422, detail=errors)
+    columns = _columns(batch)
+    try:
+        applied = await run_in_threadpool(focus_store.append, batch.session_id, batch.seq, *columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FocusIngestResponse(accepted=len(batch.dt_ms) if applied else 0, duplicate=not applied)
+
+
+def _question_summary(q) -> FocusQuestionSummary:
+    return FocusQuestionSummary(
+        question_number=q.question_number,
+        snapshots=q.snapshots,
+        average_focus_percent=round(q.average_focus, 1),
+        gaze_deviation_avg=round(q.gaze_deviation_avg, 3),
+        focused_fraction=round(q.focused_fraction, 3),
+        time_spent_ms=q.time_spent_ms,
+    )
+
+
+async def _rollup(session_id: str):
+    rollup = await run_in_threadpool(focus_store.session_rollup, session_id)
+    if rollup is None:
+        raise HTTPException(status_code=404, detail=f"No focus telemetry for session: {session_id}")
+    return rollup
+
+
+@router.get("/focus/{session_id}", response_model=FocusSessionSummary)
+async def focus_session(session_id: str):
+    """Session-level focus summary with per-question breakdown."""
+    rollup = await _rollup(session_id)
+    return FocusSessionSummary(
+        session_id=rollup.session_id,
+        start_ms=rollup.start_ms,
+        snapshots=rollup.snapshots,
+        duration_ms=rollup.duration_ms,
+        average_focus_percent=round(rollup.average_focus, 1),
+        focused_fraction=round(rollup.focused_fraction, 3),
+        per_question=[_question_summary(q) for q in rollup.questions],
+    )
+
+
+@router.get("/focus/{session_id}/questions/{question_number}", response_model=FocusQuestionSummary)
+async def focus_question(session_id: str, question_number: int):
+    rollup = await _rollup(session_id)
+    for q in rollup.questions:
+        if q.question_number == question_number:
+            return _question_summary(q)
+    raise HTTPException(status_code=404, detail=f"No focus telemetry for question {question_number}.")
+
+
+@router.get("/focus/{session_id}/timeline", response_model=FocusTimeline)
+async def focus_timeline(session_id: str, resolution_ms: int = Query(default=5000, ge=FOCUS_ROLLUP_MS)):
+    """Average focus per `resolution_ms` window, rounded down to a multiple of the rollup bucket."""
+    rollup = await _rollup(session_id)
+    resolution, focus = await run_in_threadpool(focus_store.timeline, session_id, resolution_ms)
+    return FocusTimeline(session_id=session_id, start_ms=rollup.start_ms, resolution_ms=resolution, focus=focus)
@@ -1,13 +1,15 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import Annotated, List, Optional
 
 
 class ConvertResponse(BaseModel):
     markdown: str
+    document_id: Optional[str] = None  # fetch it again from /api/convert/documents/{document_id}
 
 
 class QuizGenerateFromContentRequest(BaseModel):
     markdown_content: str
+    document_id: Optional[str] = None  # from /api/convert/upload, when markdown_content is that upload's Markdown
     mode: str  # "only_mcq", "only_subjective", "mixed"
     num_mcq: int = 0
     num_subjective: int = 0
@@ -23,10 +25,12 @@ class QuizGenerateFromAIRequest(BaseModel):
     num_mcq: int = 0
     num_subjective: int = 0
     num_bcq: int = 0
+    user_id: Optional[str] = None  # lets the warm pool avoid serving a user the same quiz twice
 
 
 class QuizGenerateResponse(BaseModel):
     questions: List[dict]
+    quiz_id: Optional[str] = None
 
 
 class EvaluateRequest(BaseModel):
@@ -35,6 +39,11 @@ class EvaluateRequest(BaseModel):
     notes_markdown: Optional[str] = None
 
 
+class EvaluateByIdRequest(BaseModel):
+    quiz_id: str
+    user_answers_json: List[dict]
+
+
 class EvaluationResultItem(BaseModel):
     question_number: int
     score: float
@@ -42,3 +51,157 @@ class EvaluationResultItem(BaseModel):
 
 class EvaluateResponse(BaseModel):
     results: List[EvaluationResultItem]
+
+
+class BatchSubmission(BaseModel):
+    student_id: str
+    user_answers_json: List[dict]
+
+
+class BatchEvaluateRequest(BaseModel):
+    quiz_id: Optional[str] = None
+    quiz_json: Optional[List[dict]] = None
+    notes_markdown: Optional[str] = None
+    submissions: List[BatchSubmission]
+    similarity_threshold: Optional[float] = None  # cosine similarity for clustering subjective answers
+    confidence_threshold: Optional[float] = None  # similarity a member needs to share its cluster's score
+
+
+class BatchStudentResult(BaseModel):
+    student_id: str
+    results: List[EvaluationResultItem]
+
+
+class BatchEvaluateResponse(BaseModel):
+    results: List[BatchStudentResult]
+    answers: int
+    graded_answers: int  # distinct answers actually graded after clustering
+
+
+class ProfilingArmRequest(BaseModel):
+    requests: int = 1
+    route: Optional[str] = None  # path prefix, e.g. "/api/convert/upload"
+    mode: str = "cprofile"  # "cprofile" or "sampling"
+    trace_allocations: bool = False
+
+
+class ProfilingStatusResponse(BaseModel):
+    remaining: int
+    route: Optional[str] = None
+    mode: str
+    trace_allocations: bool
+
+
+class ProfileFile(BaseModel):
+    name: str
+    bytes: int
+    created: float
+
+
+class ModelTier(BaseModel):
+    name: str
+    model: str
+
+
+class RoutingRule(BaseModel):
+    """Send `task` calls within these limits to `tier`; the first matching rule wins."""
+
+    task: str  # "generate_quiz" or "evaluate"
+    tier: str
+    max_prompt_tokens: Optional[int] = None  # estimated input tokens (notes, quiz, answers)
+    max_items: Optional[int] = None  # questions generated or graded in the call
+
+
+class RoutingPolicy(BaseModel):
+    tiers: List[ModelTier]  # weakest to strongest
+    rules: List[RoutingRule] = []
+    default_tier: str
+    slo_seconds: dict[str, float] = {}  # per task; a tier slower than this is stepped down from
+    max_fallbacks: int = 1  # stronger tiers tried after a parse/validation failure
+
+    @model_validator(mode="after")
+    def check_tier_names(self) -> "RoutingPolicy":
+        names = [t.name for t in self.tiers]
+        if not names or len(set(names)) != len(names):
+            raise ValueError("Tier names must be non-empty and unique.")
+        unknown = {self.default_tier, *(r.tier for r in self.rules)} - set(names)
+        if unknown:
+            raise ValueError(f"Unknown tiers: {', '.join(sorted(unknown))}")
+        return self
+
+
+class TierStats(BaseModel):
+    tier: str
+    model: str
+    calls: int
+    failures: int
+    fallbacks: int
+    latency_ewma_s: dict[str, float]  # by task
+    cost_usd: float
+
+
+class RoutingStatusResponse(BaseModel):
+    policy: RoutingPolicy
+    tiers: List[TierStats]
+
+
+# Snapshot column values fit int32, so the columns (and start_ms plus their sum) convert to int64 arrays;
+# the ingest route checks each column's own range.
+_ColumnValue = Annotated[int, Field(ge=0, le=2**31 - 1)]
+
+
+class FocusBatch(BaseModel):
+    """
+    A batch of focus snapshots in columnar form.
+
+    Timestamps are delta-encoded: snapshot i was taken at
+    `start_ms + sum(dt_ms[:i + 1])`, so `dt_ms[0]` is usually 0. Focus levels are
+    quantized to half points (0-200) and gaze ratios to 0-255.
+    """
+
+    session_id: str = Field(pattern=r"^[A-Za-z0-9_-]{8,64}$")
+    seq: int = Field(ge=0, le=2**31 - 1)  # batch number within the session; repeats are ignored
+    start_ms: int = Field(ge=0, le=2**53)  # epoch milliseconds
+    dt_ms: List[_ColumnValue]
+    question: List[_ColumnValue]
+    focus: List[_ColumnValue]
+    left_gaze: List[_ColumnValue]
+    right_gaze: List[_ColumnValue]
+
+    @model_validator(mode="after")
+    def check_columns(self) -> "FocusBatch":
+        n = len(self.dt_ms)
+        if n == 0 or any(len(c) != n for c in (self.question, self.focus, self.left_gaze, self.right_gaze)):
+            raise ValueError("Snapshot columns must be non-empty and of equal length.")
+        return self
+
+
+class FocusIngestResponse(BaseModel):
+    accepted: int  # snapshots applied; 0 for a repeated batch
+    duplicate: bool = False
+
+
+class FocusQuestionSummary(BaseModel):
+    question_number: int
+    snapshots: int
+    average_focus_percent: float
+    gaze_deviation_avg: float
+    focused_fraction: float
+    time_spent_ms: int
+
+
+class FocusSessionSummary(BaseModel):
+    session_id: str
+    start_ms: int
+    snapshots: int
+    duration_ms: int
+    average_focus_percent: float
+    focused_fraction: float
+    per_question: List[FocusQuestionSummary]
+
+
+class FocusTimeline(BaseModel):
+    session_id: str
+    start_ms: int
+    resolution_ms: int
+    focus: List[Optional[float]]  # average focus per window, null where no snapshots
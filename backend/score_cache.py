@@ -0,0 +1,190 @@
+"""
+Persistent memo of per-question grading scores.
+
+Many students submit the same answer to the same question ("i don't know",
+one-word answers, a copied definition). Scores are cached under a key built
+from the question content, the normalized answer, the hash of the reference
+notes and the grading model, so identical answers graded by the same model are
+graded once and always receive the same score; a lite-tier score is never
+served where the standard tier grades.
+
+Entries live in SQLite and are evicted least-recently-used once the table grows
+past SCORE_CACHE_MAX_ENTRIES, checked after every SCORE_CACHE_PRUNE_EVERY
+writes rather than counted on each one. Hits and misses are reported to the
+`score` cache metric.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import metrics
+
+SCORE_CACHE_ENABLED = os.getenv("SCORE_CACHE_ENABLED", "1") != "0"
+SCORE_CACHE_PATH = Path(
+    os.getenv("SCORE_CACHE_PATH", Path(__file__).resolve().parent / ".cache" / "scores.sqlite3")
+)
+SCORE_CACHE_MAX_ENTRIES = int(os.getenv("SCORE_CACHE_MAX_ENTRIES", "100000"))
+# Scores written (by this process) between two size checks; the table may overshoot by about this much.
+SCORE_CACHE_PRUNE_EVERY = int(os.getenv("SCORE_CACHE_PRUNE_EVERY", "1000"))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    key TEXT PRIMARY KEY,
+    score REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scores_last_used ON scores(last_used);
+"""
+
+
+def _get(obj: dict, *keys):
+    for key in keys:
+        if key in obj:
+            return obj[key]
+    return None
+
+
+def normalize_answer(answer) -> str:
+    """Case- and whitespace-insensitive form of an answer."""
+    return _WHITESPACE_RE.sub(" ", str(answer or "")).strip().casefold()
+
+
+def question_hash(question: dict) -> str:
+    """Hash of a question's content; the question number is ignored so renumbering does not matter."""
+    content = {k: v for k, v in question.items() if k not in ("Question number", "question_number")}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def score_key(question: dict, answer, notes_hash: str | None, model: str) -> str:
+    parts = (question_hash(question), normalize_answer(answer), notes_hash or "", model)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    def __init__(
+        self,
+        path: Path = SCORE_CACHE_PATH,
+        max_entries: int = SCORE_CACHE_MAX_ENTRIES,
+        prune_every: int = SCORE_CACHE_PRUNE_EVERY,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._schema_ready = False
+        self._lock = threading.Lock()
+        # Writes since the last size check; the first write of a process checks.
+        self._unchecked = prune_every
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads; keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                conn.executescript(_SCHEMA)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: list[str]) -> dict[str, float]:
+        """Return cached scores for `keys`, refreshing their LRU position."""
+        if not keys:
+            return {}
+        conn = self._conn()
+        placeholders = ",".join("?" * len(keys))
+        rows = conn.execute(f"SELECT key, score FROM scores WHERE key IN ({placeholders})", keys).fetchall()
+        found = dict(rows)
+        if found:
+            with conn:
+                conn.executemany(
+                    "UPDATE scores SET last_used = ? WHERE key = ?", [(time.time(), k) for k in found]
+                )
+        for key in keys:
+            metrics.record_cache("score", hit=key in found)
+        return found
+
+    def put_many(self, scores: dict[str, float]) -> None:
+        if not scores:
+            return
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO scores (key, score, last_used) VALUES (?, ?, ?)",
+                [(k, s, now) for k, s in scores.items()],
+            )
+        with self._lock:
+            self._unchecked += len(scores)
+            due = self._unchecked >= self.prune_every
+            if due:
+                self._unchecked = 0
+        if due:
+            self.prune()
+
+    def prune(self) -> int:
+        """Evict least-recently-used scores past `max_entries`; returns the number evicted."""
+        conn = self._conn()
+        with conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM scores").fetchone()
+            if count <= self.max_entries:
+                return 0
+            conn.execute(
+                "DELETE FROM scores WHERE key IN (SELECT key FROM scores ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        return count - self.max_entries
+
+
+def score_keys(
+    quiz_json: list[dict], user_answers_json: list[dict], notes_hash: str | None, model: str
+) -> dict[int, str]:
+    """Cache key of every question's answer, by question number."""
+    answers = {
+        _get(a, "Question number", "question_number"): _get(a, "Answer", "answer")
+        for a in user_answers_json
+    }
+    keys = {}
+    for question in quiz_json:
+        number = _get(question, "Question number", "question_number")
+        keys[number] = score_key(question, answers.get(number), notes_hash, model)
+    return keys
+
+
+def split_cached(
+    cache: ScoreCache,
+    quiz_json: list[dict],
+    user_answers_json: list[dict],
+    notes_hash: str | None,
+    model: str,
+) -> tuple[dict[int, float], dict[int, str]]:
+    """
+    Look up every answered question's score from `model` in the cache.
+
+    Returns `(cached, misses)`: scores already known by question number, and the
+    cache keys of the questions that still need grading.
+    """
+    keys = score_keys(quiz_json, user_answers_json, notes_hash, model)
+    found = cache.get_many(list(keys.values()))
+    cached = {n: found[k] for n, k in keys.items() if k in found}
+    misses = {n: k for n, k in keys.items() if k not in found}
+    return cached, misses
+
+
+def filter_questions(items: list[dict], numbers) -> list[dict]:
+    """Keep the quiz questions or answers whose question number is in `numbers`."""
+    return [item for item in items if _get(item, "Question number", "question_number") in numbers]
+
+
+cache = ScoreCache()
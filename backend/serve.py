@@ -0,0 +1,219 @@
+"""
+Production server: a pre-forking gunicorn master with uvicorn workers.
+
+    python serve.py    # from the backend directory; binds 0.0.0.0:$PORT
+
+The master imports the app once (`preload_app`), reads the prompt templates and
+imports the document converter libraries, then `gc.freeze()`s its heap and
+forks the workers, which share those pages copy-on-write instead of each
+loading them on its first request. The worker count is the smaller of the CPUs
+available (cgroup quota included) and what the memory limit leaves for
+SERVE_WORKER_MEMORY_MB per worker; SERVE_WORKERS (or WEB_CONCURRENCY) sets it
+explicitly.
+
+With more than one worker:
+
+- the quiz store, score cache, notes indexes and document/unit caches are
+  already shared on disk (SQLite in WAL mode, or files replaced atomically);
+- idempotent POST responses are kept in SQLite (IDEMPOTENCY_STORE_PATH);
+- `/api/metrics` merges per-worker snapshots (METRICS_MULTIPROC_DIR);
+- focus telemetry sessions are locked and journaled per batch (FOCUS_STORE_SHARED);
+- a routing policy set through `/api/admin/routing` is written to one file that
+  every worker reloads when it changes (MODEL_ROUTING_PATH);
+- `/api/admin/profiling/arm` arms every worker from one shared count of
+  requests (PROFILE_ARM_PATH), picked up within PROFILE_ARM_POLL_S;
+- CONVERT_MEMORY_BUDGET_MB and WARM_POOL_TOKENS_PER_HOUR are instance-wide and
+  split evenly among the workers.
+
+In-flight deduplication, warm pool entries and model routing statistics stay
+per worker.
+
+On SIGTERM (a deploy or scale-down) the master closes its listening socket and
+gives the workers SERVE_GRACEFUL_TIMEOUT_S to finish in-flight requests,
+Gemini calls and streamed evaluations included, before killing them. SIGHUP
+replaces the workers one generation at a time with the same preloaded code; to
+load new code in place, send SIGUSR2 (a new master starts beside the old one),
+then SIGTERM to the old master.
+"""
+
+import gc
+import importlib
+import math
+import os
+from pathlib import Path
+
+from gunicorn.app.base import BaseApplication
+
+BACKEND_DIR = Path(__file__).resolve().parent
+CACHE_DIR = BACKEND_DIR / ".cache"
+
+SERVE_HOST = os.getenv("SERVE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.getenv("PORT", "8000"))
+# Memory a worker adds beyond the pages it shares with the master (about 50 MB once warm, per
+# benchmarks/bench_workers.py), with headroom for its conversions; and the master's own footprint.
+SERVE_WORKER_MEMORY_MB = float(os.getenv("SERVE_WORKER_MEMORY_MB", "250"))
+SERVE_MASTER_MEMORY_MB = float(os.getenv("SERVE_MASTER_MEMORY_MB", "150"))
+# Time in-flight requests get to finish on shutdown. Keep it below the platform's shutdown delay
+# (render.yaml allows 180 s); a Gemini generation may take up to SINGLEFLIGHT_TIMEOUT_S.
+SERVE_GRACEFUL_TIMEOUT_S = int(os.getenv("SERVE_GRACEFUL_TIMEOUT_S", "170"))
+# A worker whose event loop stops reporting for this long is killed and replaced.
+SERVE_TIMEOUT_S = int(os.getenv("SERVE_TIMEOUT_S", "120"))
+SERVE_KEEPALIVE_S = int(os.getenv("SERVE_KEEPALIVE_S", "5"))
+# Recycle a worker after this many requests (with 10% jitter); 0 never does.
+SERVE_MAX_REQUESTS = int(os.getenv("SERVE_MAX_REQUESTS", "0"))
+
+# Imported by the converters on first use; importing them in the master shares them with every worker.
+_CONVERTER_MODULES = ("fitz", "docx", "pptx", "lxml.etree")
+
+
+def _read(path: str) -> str | None:
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+def cpu_limit() -> float:
+    """CPUs this process may use: its affinity mask, capped by a cgroup v2 or v1 quota."""
+    cpus = float(len(os.sched_getaffinity(0)))
+    quota = period = None
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")  # "max 100000" or "50000 100000"
+    if cpu_max and not cpu_max.startswith("max"):
+        quota, period = (int(v) for v in cpu_max.split())
+    else:
+        v1_quota = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+        v1_period = _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        if v1_quota and v1_period and int(v1_quota) > 0:
+            quota, period = int(v1_quota), int(v1_period)
+    if quota and period:
+        cpus = min(cpus, quota / period)
+    return cpus
+
+
+def memory_limit_mb() -> float:
+    """Memory this process may use: the cgroup limit if there is one, else physical memory."""
+    physical = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    limit = physical
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        value = _read(path)
+        if value and value.isdigit():
+            limit = min(limit, int(value))  # an unlimited v1 group reports a huge number
+            break
+    return limit / (1024 * 1024)
+
+
+def worker_count() -> int:
+    configured = os.getenv("SERVE_WORKERS") or os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    by_cpu = math.ceil(cpu_limit())
+    by_memory = int((memory_limit_mb() - SERVE_MASTER_MEMORY_MB) // SERVE_WORKER_MEMORY_MB)
+    return max(1, min(by_cpu, by_memory))
+
+
+def configure_shared_state(workers: int) -> None:
+    """Point the per-process stores at shared backends; must run before the app is imported."""
+    if workers > 1:
+        os.environ.setdefault("METRICS_MULTIPROC_DIR", str(CACHE_DIR / "metrics"))
+        os.environ.setdefault("IDEMPOTENCY_STORE_PATH", str(CACHE_DIR / "idempotency.sqlite3"))
+        os.environ.setdefault("FOCUS_STORE_SHARED", "1")
+        os.environ.setdefault("MODEL_ROUTING_PATH", str(CACHE_DIR / "routing.json"))
+        os.environ.setdefault("PROFILE_ARM_PATH", str(CACHE_DIR / "profiling-arm.json"))
+
+
+def preload(workers: int):
+    """Import the app and everything workers would load lazily, then freeze the heap for copy-on-write."""
+    import admission
+    import main
+    import routers
+    import warm_pool
+
+    for name in _CONVERTER_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    routers.quiz_gen_main.preload_templates()
+    routers.quiz_eval_evaluator.preload_template(routers.QUIZ_EVAL_DIR / "prompt_template.md")
+
+    admission.budget.budget_mb = admission.CONVERT_MEMORY_BUDGET_MB / workers
+    warm_pool.pool.share(workers)
+
+    # Objects that survive this collection are never scanned again, so the collector does not
+    # touch (and copy) the pages they live on in the workers.
+    gc.collect()
+    gc.freeze()
+    return main.app
+
+
+def _worker_class() -> str:
+    try:
+        importlib.import_module("uvicorn_worker")
+        return "uvicorn_worker.UvicornWorker"
+    except ImportError:
+        return "uvicorn.workers.UvicornWorker"
+
+
+def _on_starting(server) -> None:
+    import metrics
+    import profiling
+
+    # A master started by SIGUSR2 inherits the old master's socket (GUNICORN_FD); the old
+    # workers are still serving and their snapshots must stay.
+    if "GUNICORN_FD" not in os.environ:
+        metrics.REGISTRY.clear()
+        if profiling.PROFILE_ARM_PATH:
+            profiling.disarm()  # requests armed in a previous server run
+
+
+def _child_exit(server, worker) -> None:
+    import metrics
+
+    if metrics.REGISTRY.multiproc_dir is not None:
+        metrics.REGISTRY.archive(worker.pid)
+
+
+def _when_ready(server) -> None:
+    server.log.info("Serving with %d workers (%s)", server.num_workers, server.cfg.worker_class_str)
+
+
+class Server(BaseApplication):
+    def __init__(self, workers: int, options: dict):
+        self.workers = workers
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return preload(self.workers)
+
+
+def options(workers: int) -> dict:
+    return {
+        "bind": f"{SERVE_HOST}:{SERVE_PORT}",
+        "workers": workers,
+        "worker_class": _worker_class(),
+        "preload_app": True,
+        "timeout": SERVE_TIMEOUT_S,
+        "graceful_timeout": SERVE_GRACEFUL_TIMEOUT_S,
+        "keepalive": SERVE_KEEPALIVE_S,
+        "max_requests": SERVE_MAX_REQUESTS,
+        "max_requests_jitter": SERVE_MAX_REQUESTS // 10,
+        "accesslog": "-",
+        "on_starting": _on_starting,
+        "child_exit": _child_exit,
+        "when_ready": _when_ready,
+    }
+
+
+def main_() -> None:
+    workers = worker_count()
+    configure_shared_state(workers)
+    Server(workers, options(workers)).run()
+
+
+if __name__ == "__main__":
+    main_()
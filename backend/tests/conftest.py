@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Tests import the backend's top-level modules the way main.py does, from the backend directory.
+sys.path.insert(0, str(BACKEND_DIR))
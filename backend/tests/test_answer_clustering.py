@@ -0,0 +1,46 @@
+from answer_clustering import plan_batch, tfidf_matrix
+
+QUESTION = {"Question number": 1, "Question": "What is a regular language?", "Question type": "Subjective"}
+ANSWER_A = "A regular language is accepted by a finite automaton"
+ANSWER_B = "A regular language is accepted by some finite automaton"
+
+
+def _submissions(answers: list[str]) -> list[list[dict]]:
+    return [[{"Question number": 1, "Answer": answer}] for answer in answers]
+
+
+def test_identical_outliers_are_graded_once():
+    vectors = tfidf_matrix([ANSWER_A.lower(), ANSWER_B.lower()])
+    # B joins A's cluster but is below the confidence needed to inherit its score.
+    assert 0.8 <= float(vectors[0] @ vectors[1]) < 0.9
+
+    items = plan_batch([QUESTION], _submissions([ANSWER_A] * 60 + [ANSWER_B] * 40), threshold=0.8, confidence=0.9)
+
+    assert len(items) == 2
+    assert items[0].answer == ANSWER_A and items[0].members == list(range(60))
+    assert items[1].answer == ANSWER_B and items[1].members == list(range(60, 100))
+
+
+def test_outliers_differing_in_case_and_spacing_share_an_item():
+    answers = [ANSWER_A] * 3 + [ANSWER_B, ANSWER_B.upper(), f"  {ANSWER_B}  "]
+
+    items = plan_batch([QUESTION], _submissions(answers), threshold=0.8, confidence=0.9)
+
+    assert [item.members for item in items] == [[0, 1, 2], [3, 4, 5]]
+
+
+def test_every_member_is_planned_exactly_once():
+    answers = [ANSWER_A] * 5 + [ANSWER_B] * 3 + ["I don't know"] * 2 + ["Pumping lemma"]
+
+    items = plan_batch([QUESTION], _submissions(answers), threshold=0.8, confidence=0.9)
+
+    assert sorted(m for item in items for m in item.members) == list(range(len(answers)))
+    assert sum(item.count for item in items) == len(answers)
+
+
+def test_objective_answers_are_grouped_only_when_identical():
+    question = {"Question number": 1, "Question": "Pick one", "Question type": "MCQ"}
+
+    items = plan_batch([question], _submissions(["Option 1", "option 1", "Option 2"]))
+
+    assert sorted(item.members for item in items) == [[0, 1], [2]]
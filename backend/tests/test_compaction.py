@@ -0,0 +1,50 @@
+from compaction import estimate_tokens, select_sections
+
+FILLER = "the notes cover this topic " * 6
+
+
+def _notes() -> str:
+    return "\n\n".join(
+        [
+            f"# Introduction\n\n{FILLER}",
+            "# Automata\n\nDeterministic automata accept regular languages; minimization merges equivalent states.",
+            f"# Recap\n\n{FILLER}{FILLER}",
+            "# Grammars\n\nContext-free grammars generate pushdown-recognizable languages via derivations.",
+        ]
+    )
+
+
+def test_densest_sections_are_kept_in_their_original_order():
+    notes = _notes()
+    budget = estimate_tokens(notes) // 2
+
+    text, dropped = select_sections(notes, budget)
+
+    assert dropped == 2
+    assert text.startswith("# Automata") and "# Grammars" in text
+    assert text.index("# Automata") < text.index("# Grammars")
+    assert estimate_tokens(text) <= budget
+
+
+def test_everything_fits_in_a_large_budget():
+    text, dropped = select_sections(_notes(), 10_000)
+
+    assert dropped == 0
+    assert [line for line in text.split("\n") if line.startswith("#")] == [
+        "# Introduction",
+        "# Automata",
+        "# Recap",
+        "# Grammars",
+    ]
+
+
+def test_section_over_budget_is_cut_to_its_leading_part():
+    text, dropped = select_sections(f"# Only\n\n{FILLER * 20}\n\n# Other\n\n{FILLER * 20}", 10)
+
+    assert dropped == 1
+    assert text.startswith("# Only") or text.startswith("# Other")
+    assert estimate_tokens(text) <= 10
+
+
+def test_markdown_without_text_is_returned_unchanged():
+    assert select_sections("", 10) == ("", 0)
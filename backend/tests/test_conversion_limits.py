@@ -0,0 +1,64 @@
+import pytest
+
+import admission
+import main  # noqa: F401  (puts the converter package on sys.path)
+import file_to_markdown
+from document_ir import PARAGRAPH, Document
+from file_to_markdown import ConversionLimitExceeded, ConversionLimits
+
+fitz = pytest.importorskip("fitz")
+
+
+def _pdf(path, pages):
+    with fitz.open() as doc:
+        for number in range(1, pages + 1):
+            doc.new_page().insert_text((72, 72), f"Page {number} text")
+        doc.save(path)
+    return str(path)
+
+
+def test_pages_past_the_limit_are_rejected(tmp_path):
+    path = _pdf(tmp_path / "long.pdf", 3)
+
+    document = file_to_markdown.pdf_to_document(path, limits=ConversionLimits(max_pages=3))
+    assert "Page 3 text" in document.to_markdown()
+    with pytest.raises(ConversionLimitExceeded) as exc:
+        file_to_markdown.pdf_to_document(path, limits=ConversionLimits(max_pages=2))
+
+    assert (exc.value.limit, exc.value.value, exc.value.maximum) == ("pages", 3, 2)
+    assert admission.limit_rejection(exc.value).detail["code"] == "too_many_pages"
+
+
+def test_output_is_counted_once_per_block():
+    limits = ConversionLimits(max_output_chars=40)
+    document = Document("pdf")
+    document.add(PARAGRAPH, "x" * 15)
+    limits.check(output=document.blocks)
+    limits.check(output=document.blocks)  # blocks already counted are not counted again
+    document.add(PARAGRAPH, "y" * 15)
+    limits.check(output=document.blocks)
+
+    document.add(PARAGRAPH, "z" * 15)
+    with pytest.raises(ConversionLimitExceeded) as exc:
+        limits.check(output=document.blocks)
+    assert exc.value.limit == "output_chars"
+
+
+def test_clock_starts_when_the_limits_are_created(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(file_to_markdown.time, "monotonic", lambda: now[0])
+    limits = ConversionLimits(max_seconds=5)
+    now[0] += 5
+    limits.check()
+
+    now[0] += 1
+    with pytest.raises(ConversionLimitExceeded) as exc:
+        limits.check()
+    assert (exc.value.limit, exc.value.maximum) == ("seconds", 5)
+
+
+def test_limits_left_unset_are_not_enforced():
+    document = Document("pdf")
+    document.add(PARAGRAPH, "x" * 10_000)
+
+    ConversionLimits().check(page=10_000, output=document.blocks)
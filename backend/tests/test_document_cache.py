@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+import main  # noqa: F401  (puts the converter package on sys.path)
+import retrieval
+from document_ir import HEADING, PAGE_BREAK, PARAGRAPH, Document, DocumentCache, UnitCache
+from routers import convert, quiz
+
+DIGEST_A, DIGEST_B, DIGEST_C = ("a" * 64, "b" * 64, "c" * 64)
+
+
+def _document() -> Document:
+    document = Document("pdf")
+    document.add(HEADING, "Regular languages", 1, 1)
+    document.add(PARAGRAPH, "A regular language is accepted by a finite automaton.", page=1)
+    document.add(PAGE_BREAK, page=1)
+    document.add(HEADING, "Pumping lemma", 1, 2)
+    document.add(PARAGRAPH, "Every regular language satisfies the pumping lemma.", page=2)
+    return document
+
+
+def _age(path, seconds):
+    st = path.stat()
+    os.utime(path, (st.st_atime - seconds, st.st_mtime - seconds))
+
+
+def test_unit_cache_evicts_least_recently_used(tmp_path):
+    units = UnitCache(tmp_path, max_bytes=None)
+    blocks = _document().blocks[:2]
+    for key, age in (("old", 30), ("used", 20), ("new", 10)):
+        units.put(key, blocks)
+        _age(units.path(key), age)
+    assert units.get("used", page=4)[0].page == 4  # reading an entry makes it recent
+
+    size = units.path("new").stat().st_size
+    assert units.prune(max_bytes=2 * size) == 1
+
+    assert units.get("old") is None
+    assert units.get("used") is not None and units.get("new") is not None
+
+
+def test_unit_cache_checks_its_size_every_prune_every_writes(tmp_path):
+    units = UnitCache(tmp_path, max_bytes=1, prune_every=3)
+    blocks = _document().blocks[:2]
+
+    units.put("first", blocks)  # the first write checks
+    assert list(tmp_path.glob("*.json")) == []
+    units.put("second", blocks)
+    units.put("third", blocks)
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    units.put("fourth", blocks)
+    assert list(tmp_path.glob("*.json")) == []
+
+
+def test_document_cache_keeps_the_newest_documents_within_its_size(tmp_path):
+    documents = DocumentCache(tmp_path, max_bytes=None)
+    documents.put(DIGEST_A, _document())
+    documents.max_bytes = 2 * documents.path(DIGEST_A).stat().st_size
+    _age(documents.path(DIGEST_A), 10)
+
+    documents.put(DIGEST_B, _document())
+    documents.put(DIGEST_C, _document())
+
+    assert documents.get(DIGEST_A) is None
+    assert documents.get(DIGEST_B).to_markdown() == _document().to_markdown()
+    # The units directory next to the documents is not counted or pruned.
+    assert UnitCache(tmp_path / "units").prune(max_bytes=0) == 0
+
+
+@pytest.fixture
+def cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(convert, "_document_cache", DocumentCache(tmp_path / "documents"))
+    monkeypatch.setattr(retrieval, "INDEX_DIR", tmp_path / "notes_index")
+    document = _document()
+    convert.document_cache().put(DIGEST_A, document)
+    return document
+
+
+def test_notes_are_indexed_from_the_cached_document_chunks(cached):
+    markdown = cached.to_markdown()
+
+    quiz._index_notes("compacted notes", markdown, DIGEST_A)
+
+    index = retrieval.load_index("compacted notes")
+    assert index.chunks == [c.text for c in cached.chunks()]
+    assert index.chunks[1].startswith("# Pumping lemma")
+
+
+@pytest.mark.parametrize("document_id", [None, DIGEST_B, "not-a-digest"])
+def test_notes_without_a_cached_document_are_split_from_markdown(cached, document_id):
+    quiz._index_notes("# Notes\n\nSome text.", cached.to_markdown(), document_id)
+
+    assert retrieval.load_index("# Notes\n\nSome text.").chunks == ["# Notes\n\nSome text."]
+
+
+def test_edited_markdown_is_not_indexed_from_the_document(cached):
+    quiz._index_notes("# Notes\n\nEdited.", cached.to_markdown() + "\n\nEdited.", DIGEST_A)
+
+    assert retrieval.load_index("# Notes\n\nEdited.").chunks == ["# Notes\n\nEdited."]
@@ -0,0 +1,107 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import main  # noqa: F401  (loads routers.quiz_eval_evaluator)
+import routers
+from routers import evaluate
+from score_cache import ScoreCache
+
+
+def _quiz(n: int) -> tuple[list[dict], list[dict]]:
+    quiz = [
+        {"Question number": i, "Question": f"Explain topic {i}.", "Question type": "Subjective"}
+        for i in range(1, n + 1)
+    ]
+    answers = [{"Question number": i, "Answer": f"answer {i}"} for i in range(1, n + 1)]
+    return quiz, answers
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ScoreCache(tmp_path / "scores.sqlite3")
+    looked_up: list[str] = []
+    get_many = cache.get_many
+
+    def counting_get_many(keys):
+        looked_up.extend(keys)
+        return get_many(keys)
+
+    monkeypatch.setattr(cache, "get_many", counting_get_many)
+    monkeypatch.setattr(evaluate, "score_cache", cache)
+    monkeypatch.setattr(evaluate, "SCORE_CACHE_ENABLED", True)
+    cache.looked_up = looked_up
+    return cache
+
+
+@pytest.fixture
+def graded(monkeypatch):
+    graded: list[int] = []
+
+    def evaluate_quiz_data(quiz_json, user_answers_json, **kwargs):
+        numbers = [q["Question number"] for q in json.loads(quiz_json)]
+        graded.extend(numbers)
+        return SimpleNamespace(results=[SimpleNamespace(question_number=n, score=0.5) for n in numbers])
+
+    monkeypatch.setattr(routers.quiz_eval_evaluator, "evaluate_quiz_data", evaluate_quiz_data)
+    return graded
+
+
+async def _events(quiz, answers) -> list[dict]:
+    return [json.loads(line) async for line in evaluate._stream_evaluation(quiz, answers, None, sse=False)]
+
+
+def test_stream_looks_each_answer_up_once(cache, graded):
+    quiz, answers = _quiz(6)
+
+    events = asyncio.run(_events(quiz, answers))
+
+    assert sorted(cache.looked_up) == sorted(set(cache.looked_up))
+    assert len(cache.looked_up) == 6
+    assert sorted(graded) == [1, 2, 3, 4, 5, 6]
+    assert len(events[-1]["results"]) == 6
+
+
+def test_stream_serves_cached_scores_without_grading(cache, graded):
+    quiz, answers = _quiz(3)
+    asyncio.run(_events(quiz, answers))
+    graded.clear()
+
+    events = asyncio.run(_events(quiz, answers))
+
+    assert graded == []
+    assert events[0] == {"event": "scores", "results": events[-1]["results"], "cached": True}
+
+
+def test_stream_scores_keyed_objective_answers_before_any_grading(cache, graded):
+    quiz, answers = _quiz(1)
+    quiz += [
+        {"Question number": 2, "Question": "Pick one.", "Question type": "MCQ", "Option 1": "Red",
+         "Option 2": "Blue", "Option 3": "Green", "Option 4": "Black", "Correct option": 3},
+        {"Question number": 3, "Question": "True or false?", "Question type": "BCQ", "Option 1": "True",
+         "Option 2": "False", "Correct option": 1},
+        {"Question number": 4, "Question": "Pick one.", "Question type": "MCQ", "Option 1": "A", "Option 2": "B",
+         "Option 3": "C", "Option 4": "D"},
+    ]
+    answers += [
+        {"Question number": 2, "Answer": " green"},
+        {"Question number": 3, "Answer": "False"},
+        {"Question number": 4, "Answer": "A"},
+    ]
+
+    events = asyncio.run(_events(quiz, answers))
+
+    assert events[0]["cached"] is False
+    assert {r["question_number"]: r["score"] for r in events[0]["results"]} == {2: 1.0, 3: 0.0}
+    assert sorted(graded) == [1, 4]  # the unkeyed MCQ still goes to the model
+    assert len(cache.looked_up) == 2
+    assert len(events[-1]["results"]) == 4
+
+
+def test_client_quizzes_are_graded_without_their_answer_keys():
+    quiz = [{"Question number": 1, "Question type": "MCQ", "Option 1": "A", "Correct option": 1}]
+
+    assert evaluate._score_keyed(evaluate.public_questions(quiz), [{"Question number": 1, "Answer": "A"}])[0] == {}
+    assert quiz[0]["Correct option"] == 1
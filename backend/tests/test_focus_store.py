@@ -0,0 +1,103 @@
+import sys
+
+import numpy as np
+import pytest
+
+import focus_store
+from focus_store import FocusStore, _file_version
+
+SESSION = "session-0001"
+START_MS = 1_700_000_000_000
+
+
+def _batch(seq: int, n: int = 5) -> tuple:
+    t_ms = START_MS + (seq * n + np.arange(n, dtype=np.int64)) * 250
+    question = np.full(n, 1 + seq % 3, dtype=np.uint16)
+    focus = ((seq * 37 + np.arange(n) * 11) % 201).astype(np.uint8)
+    left = np.full(n, 100 + seq, dtype=np.uint8)
+    right = np.full(n, 150 - seq, dtype=np.uint8)
+    return seq, t_ms, question, focus, left, right
+
+
+def _fill(store: FocusStore, batches: range) -> None:
+    for seq in batches:
+        assert store.append(SESSION, *_batch(seq))
+
+
+@pytest.fixture
+def small_segments(monkeypatch):
+    monkeypatch.setattr(focus_store, "FOCUS_SEGMENT_ROWS", 12)
+
+
+def test_appends_are_rolled_up_and_survive_a_restart(tmp_path, small_segments):
+    store = FocusStore(tmp_path)
+    _fill(store, range(6))
+
+    assert not store.append(SESSION, *_batch(3))  # a retried batch
+    rollup = store.session_rollup(SESSION)
+    assert rollup.snapshots == 30 and rollup.start_ms == START_MS
+    assert [q.snapshots for q in rollup.questions] == [10, 10, 10]
+    assert rollup.duration_ms == 29 * 250
+
+    assert store.flush_idle(idle_s=0) == 1
+    assert sorted(p.name for p in tmp_path.joinpath(SESSION[:2], SESSION).glob("seg-*.npy")) == [
+        "seg-000000.npy",
+        "seg-000001.npy",
+        "seg-000002.npy",
+    ]
+    restarted = FocusStore(tmp_path)
+    assert restarted.session_rollup(SESSION) == rollup
+    assert restarted.timeline(SESSION, 1000) == store.timeline(SESSION, 1000)
+    assert not restarted.append(SESSION, *_batch(5))
+
+
+@pytest.fixture
+def shared(monkeypatch, small_segments):
+    monkeypatch.setattr(focus_store, "FOCUS_STORE_SHARED", True)
+
+
+def test_workers_sharing_a_session_journal_each_batch(tmp_path, monkeypatch, small_segments):
+    reference = FocusStore(tmp_path / "single")
+    _fill(reference, range(9))
+    monkeypatch.setattr(focus_store, "FOCUS_STORE_SHARED", True)
+    workers = [FocusStore(tmp_path / "shared"), FocusStore(tmp_path / "shared")]
+    directory = tmp_path / "shared" / SESSION[:2] / SESSION
+
+    for seq in range(9):
+        rollup_version = _file_version(directory / "rollup.npz")
+        assert workers[seq % 2].append(SESSION, *_batch(seq))
+        # 5-row batches into 12-row segments: only batches 2, 4 and 7 close one and write the rollups.
+        assert (_file_version(directory / "rollup.npz") != rollup_version) == (seq in (2, 4, 7))
+        assert not workers[(seq + 1) % 2].append(SESSION, *_batch(seq))
+
+    expected = reference.session_rollup(SESSION)
+    assert [w.session_rollup(SESSION) for w in workers] == [expected, expected]
+    assert FocusStore(tmp_path / "shared").session_rollup(SESSION) == expected
+    assert FocusStore(tmp_path / "shared").timeline(SESSION, 2000) == reference.timeline(SESSION, 2000)
+
+    workers[1].flush_idle(idle_s=0)
+    workers[0].flush_idle(idle_s=0)  # stale by now, so only dropped
+    assert sorted(p.name for p in directory.iterdir() if not p.name.startswith("seg-")) == [".lock", "rollup.npz"]
+    assert FocusStore(tmp_path / "shared").session_rollup(SESSION) == expected
+
+
+def test_record_cut_short_by_a_crash_is_overwritten(tmp_path, shared):
+    store = FocusStore(tmp_path)
+    _fill(store, range(2))
+    journal = tmp_path / SESSION[:2] / SESSION / "journal-000000.bin"
+    with open(journal, "ab") as f:
+        f.write(b"\x07" * 30)
+
+    other = FocusStore(tmp_path)
+    assert other.session_rollup(SESSION).snapshots == 10
+    assert other.append(SESSION, *_batch(2))  # written over the partial record
+    assert FocusStore(tmp_path).session_rollup(SESSION).snapshots == 15
+
+
+def test_single_process_store_does_not_need_fcntl(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "fcntl", None)  # as on Windows
+    store = FocusStore(tmp_path)
+    _fill(store, range(2))
+
+    assert store.session_rollup(SESSION).snapshots == 10
+    assert store.flush_idle(idle_s=0) == 1
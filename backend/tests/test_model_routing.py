@@ -0,0 +1,52 @@
+from model_routing import DEFAULT_POLICY, ModelRouter
+
+POLICY = DEFAULT_POLICY.model_copy(update={"rules": [], "slo_seconds": {"generate": 5.0}})
+
+
+def _router(**kwargs) -> ModelRouter:
+    router = ModelRouter(POLICY, path="", **kwargs)
+    # One slow call demotes the standard tier.
+    router._observe("generate", "standard", 30.0, "ok", fallback=False)
+    return router
+
+
+def _tier(router: ModelRouter) -> str:
+    return router.route("generate", 100, 1)[0][0]
+
+
+def test_slow_tier_is_stepped_down_from():
+    router = _router(probe_every=0)
+
+    assert router.route("generate", 100, 1)[0] == ("lite", "gemini-2.5-flash-lite", "slo")
+
+
+def test_demoted_tier_is_probed_and_recovers():
+    router = _router(probe_every=5)
+
+    tiers = [_tier(router) for _ in range(5)]
+    assert tiers == ["lite"] * 4 + ["standard"]
+    assert router.route("generate", 100, 1)[0][2] == "slo"
+
+    # Fast probes bring the EWMA back under the SLO.
+    for _ in range(10):
+        router._observe("generate", "standard", 1.0, "ok", fallback=False)
+    assert router.route("generate", 100, 1)[0] == ("standard", "gemini-3-flash-preview", "default")
+
+
+def test_stale_latency_is_forgotten():
+    router = _router(probe_every=0, latency_ttl_s=0.0)
+
+    assert _tier(router) == "standard"
+
+
+def test_policy_set_through_one_worker_reaches_the_others(tmp_path):
+    path = tmp_path / "routing.json"
+    workers = [ModelRouter(POLICY, path=str(path)), ModelRouter(POLICY, path=str(path))]
+    assert _tier(workers[1]) == "standard"
+
+    workers[0].set_policy(POLICY.model_copy(update={"default_tier": "strong"}))
+
+    assert _tier(workers[1]) == "strong"
+    assert workers[1].policy.default_tier == "strong"
+    path.write_text("not json")  # a broken file keeps the last good policy
+    assert _tier(workers[1]) == "strong"
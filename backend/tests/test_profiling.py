@@ -0,0 +1,43 @@
+import pytest
+
+import profiling
+
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ARM_PATH", str(tmp_path / "profiling-arm.json"))
+    monkeypatch.setattr(profiling, "PROFILE_ARM_POLL_S", 0.0)
+    yield
+    profiling.disarm()
+
+
+def _as_another_worker() -> None:
+    """Forget this process's armed state, as a worker that did not receive the arm request."""
+    with profiling._lock:
+        profiling._set_arm(profiling.ArmState())
+    profiling._arm_version = None
+
+
+def test_arming_through_one_worker_arms_the_others(shared):
+    profiling.arm(2, route="/api/convert")
+    _as_another_worker()
+    assert profiling._claim("/api/convert/upload") is None  # not seen yet
+
+    profiling._refresh()
+
+    assert profiling._claim("/api/quiz") is None
+    assert profiling._claim("/api/convert/upload").mode == "cprofile"
+    assert profiling.status().remaining == 1
+
+
+def test_workers_share_one_count(shared):
+    profiling.arm(1)
+    _as_another_worker()
+    profiling._refresh()
+    assert profiling._claim("/api/quiz") is not None
+
+    # The worker that armed still believes a request is left; the shared count says otherwise.
+    with profiling._lock:
+        profiling._set_arm(profiling.ArmState(1))
+    assert profiling._claim("/api/quiz") is None
+    assert not profiling._armed
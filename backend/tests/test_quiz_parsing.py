@@ -0,0 +1,28 @@
+import json
+
+import main  # noqa: F401  (loads routers.quiz_gen_main)
+import routers
+
+MCQ_OPTIONS = {"Option 1": "A", "Option 2": "B", "Option 3": "C", "Option 4": "D"}
+BCQ_OPTIONS = {"Option 1": "True", "Option 2": "False"}
+
+
+def _types(items: list[dict]) -> list[str]:
+    quiz = routers.quiz_gen_main.parse_and_validate_quiz(json.dumps(items))
+    return [q.question_type for q in quiz.questions]
+
+
+def test_missing_invalid_or_mismatched_types_are_inferred_from_the_options():
+    items = [
+        {"Question type": "MCQ", **MCQ_OPTIONS},
+        {**MCQ_OPTIONS},
+        {"Question type": "Multiple choice", **MCQ_OPTIONS},
+        {"Question type": "Subjective", **MCQ_OPTIONS},
+        {"Question type": "True/False", **BCQ_OPTIONS},
+        {"Question type": "MCQ", **BCQ_OPTIONS},
+        {"Question type": "bcq", **BCQ_OPTIONS},
+        {"Question type": None},
+    ]
+    items = [{"Question number": i, "Question": f"Question {i}?", **item} for i, item in enumerate(items, 1)]
+
+    assert _types(items) == ["MCQ", "MCQ", "MCQ", "MCQ", "BCQ", "BCQ", "BCQ", "Subjective"]
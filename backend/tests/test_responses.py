@@ -0,0 +1,36 @@
+import pytest
+
+import responses
+from responses import negotiate
+
+
+@pytest.fixture
+def encoders(monkeypatch):
+    # Whichever optional codecs are installed, negotiate over all three.
+    monkeypatch.setattr(responses, "ENCODERS", {"zstd": None, "br": None, "gzip": None})
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip, deflate, br, zstd", "zstd"),
+        ("gzip;q=1.0, br;q=0.5", "gzip"),
+        ("br;q=0.8, zstd;q=0.2, gzip;q=0.9", "gzip"),
+        ("zstd;q=0, *", "br"),
+        ("*;q=0.1, gzip;q=0", "zstd"),
+        ("GZIP", "gzip"),
+        ("gzip;q=bogus, br", "br"),
+        ("identity", None),
+        ("gzip;q=0", None),
+        ("", None),
+    ],
+)
+def test_negotiate_picks_the_highest_ranked_available_encoding(encoders, accept_encoding, expected):
+    assert negotiate(accept_encoding) == expected
+
+
+def test_unavailable_encodings_are_never_chosen(monkeypatch):
+    monkeypatch.setattr(responses, "ENCODERS", {"gzip": None})
+
+    assert negotiate("zstd, br") is None
+    assert negotiate("zstd, br, gzip;q=0.1") == "gzip"
@@ -0,0 +1,66 @@
+import pytest
+
+from score_cache import ScoreCache, filter_questions, score_key, split_cached
+
+QUIZ = [
+    {"Question number": 1, "Question": "Define a regular language.", "Marks": 2},
+    {"Question number": 2, "Question": "State the pumping lemma.", "Marks": 3},
+]
+ANSWERS = [
+    {"Question number": 1, "Answer": "Accepted by a  DFA"},
+    {"Question number": 2, "Answer": "I don't know"},
+]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ScoreCache(tmp_path / "scores.sqlite3", max_entries=2, prune_every=1000)
+
+
+def test_key_ignores_numbering_case_and_whitespace():
+    question = QUIZ[0]
+    renumbered = {**question, "Question number": 7}
+
+    assert score_key(question, "Accepted by a  DFA", "notes", "standard") == score_key(
+        renumbered, " accepted by a dfa ", "notes", "standard"
+    )
+    assert score_key(question, "x", "notes", "standard") != score_key(question, "x", "notes", "lite")
+    assert score_key(question, "x", "notes", "standard") != score_key(question, "x", "other notes", "standard")
+    assert score_key(question, "x", "notes", "standard") != score_key(QUIZ[1], "x", "notes", "standard")
+
+
+def test_split_cached_returns_known_scores_and_the_misses(cache):
+    cached, misses = split_cached(cache, QUIZ, ANSWERS, "notes", "standard")
+    assert cached == {} and set(misses) == {1, 2}
+
+    cache.put_many({misses[1]: 1.5})
+    cached, misses = split_cached(cache, QUIZ, ANSWERS, "notes", "standard")
+
+    assert cached == {1: 1.5}
+    assert list(misses) == [2]
+    assert filter_questions(QUIZ, misses) == [QUIZ[1]]
+    # Another grading model never sees the score.
+    assert split_cached(cache, QUIZ, ANSWERS, "notes", "lite")[0] == {}
+
+
+def test_least_recently_used_scores_are_pruned(cache, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr("score_cache.time.time", lambda: next(clock))
+    cache.put_many({"old": 1.0})
+    cache.put_many({"used": 2.0})
+    cache.put_many({"new": 3.0})
+    cache.get_many(["old"])  # reading an entry makes it recent
+
+    assert cache.prune() == 1
+    assert cache.get_many(["old", "used", "new"]) == {"old": 1.0, "new": 3.0}
+
+
+def test_size_is_checked_every_prune_every_writes(tmp_path):
+    cache = ScoreCache(tmp_path / "scores.sqlite3", max_entries=1, prune_every=3)
+
+    cache.put_many({"a": 1.0})  # the first write checks, with nothing over the limit yet
+    cache.put_many({"b": 1.0})
+    cache.put_many({"c": 1.0})
+    assert len(cache.get_many(["a", "b", "c"])) == 3
+    cache.put_many({"d": 1.0})  # the third write since the check
+    assert len(cache.get_many(["a", "b", "c", "d"])) == 1
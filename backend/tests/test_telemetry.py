@@ -0,0 +1,69 @@
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+import main
+from routers import telemetry
+from schemas import FocusBatch
+
+
+def _batch(**overrides) -> dict:
+    batch = {
+        "session_id": "session-0001",
+        "seq": 0,
+        "start_ms": 1_700_000_000_000,
+        "dt_ms": [0, 500],
+        "question": [1, 1],
+        "focus": [180, 160],
+        "left_gaze": [128, 130],
+        "right_gaze": [127, 129],
+    }
+    return {**batch, **overrides}
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [{"dt_ms": [10**30, 0]}, {"start_ms": 2**63 - 5}, {"question": [2**63, 1]}, {"seq": 2**63}],
+)
+def test_out_of_range_values_are_rejected(client, overrides):
+    with pytest.raises(ValidationError):
+        FocusBatch.model_validate(_batch(**overrides))
+
+    resp = client.post("/api/telemetry/focus", json=_batch(**overrides))
+
+    assert resp.status_code == 422
+
+
+def test_oversized_body_is_cut_off_while_streaming(client, monkeypatch):
+    received = []
+    monkeypatch.setattr(telemetry, "_decompress", lambda raw, encoding: received.append(raw))
+    chunk = b" " * 64 * 1024
+
+    def body():
+        # No Content-Length: the cap has to apply while the body streams in.
+        for _ in range(telemetry.FOCUS_MAX_BODY_BYTES // len(chunk) + 2):
+            yield chunk
+
+    resp = client.post("/api/telemetry/focus", content=body(), headers={"Content-Type": "application/json"})
+
+    assert resp.status_code == 413
+    assert resp.json()["detail"]["code"] == "telemetry_too_large"
+    assert received == []
+
+
+def test_oversized_gzip_body_is_rejected(client):
+    body = gzip.compress(json.dumps(_batch(padding="x" * 2 * telemetry.FOCUS_MAX_BODY_BYTES)).encode())
+
+    resp = client.post(
+        "/api/telemetry/focus", content=body, headers={"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    )
+
+    assert resp.status_code == 413
@@ -0,0 +1,94 @@
+import pytest
+
+import main  # noqa: F401  (puts the converter package on sys.path)
+import file_to_markdown
+
+fitz = pytest.importorskip("fitz")
+
+
+def _pdf_drawn_through_form(path, text):
+    """A one-page PDF whose text is drawn by a form XObject, as `show_pdf_page` does."""
+    source = fitz.open()
+    source.new_page().insert_text((72, 72), text)
+    target = fitz.open()
+    page = target.new_page()
+    page.show_pdf_page(page.rect, source, 0)
+    target.save(path)
+    return path
+
+
+def test_pages_drawing_different_forms_do_not_share_units(tmp_path):
+    units = file_to_markdown.UnitCache(tmp_path / "units")
+    first = _pdf_drawn_through_form(tmp_path / "first.pdf", "Answer is FORTY TWO")
+    second = _pdf_drawn_through_form(tmp_path / "second.pdf", "Answer is SEVENTEEN")
+    # Both pages' own content streams are just ` q /fzFrm0 Do Q `.
+    assert fitz.open(first)[0].read_contents() == fitz.open(second)[0].read_contents()
+
+    file_to_markdown.pdf_to_document(str(first), unit_cache=units)
+    document = file_to_markdown.pdf_to_document(str(second), unit_cache=units)
+
+    assert document.to_markdown().strip() == "Answer is SEVENTEEN"
+    assert document.units_reused == 0
+
+
+def test_renumbered_pdf_reuses_its_units(tmp_path):
+    units = file_to_markdown.UnitCache(tmp_path / "units")
+    original = _pdf_drawn_through_form(tmp_path / "original.pdf", "Answer is FORTY TWO")
+    with fitz.open(original) as doc:
+        doc.save(tmp_path / "renumbered.pdf", garbage=4)  # drops and renumbers objects
+
+    file_to_markdown.pdf_to_document(str(original), unit_cache=units)
+    document = file_to_markdown.pdf_to_document(str(tmp_path / "renumbered.pdf"), unit_cache=units)
+
+    assert document.units_reused == 1
+    assert document.to_markdown().strip() == "Answer is FORTY TWO"
+
+
+def _pptx(path, titles, image=None):
+    """A deck with one title slide per entry of titles; image (a file path) is added to every slide."""
+    pptx = pytest.importorskip("pptx")
+    deck = pptx.Presentation()
+    for title in titles:
+        slide = deck.slides.add_slide(deck.slide_layouts[5])
+        slide.shapes.title.text = title
+        if image is not None:
+            slide.shapes.add_picture(str(image), 0, 0)
+    deck.save(path)
+    return str(path)
+
+
+def _png(directory, color):
+    # Always figure.png: python-pptx writes the file name into the slide XML.
+    directory.mkdir()
+    path = directory / "figure.png"
+    with fitz.open() as doc:
+        page = doc.new_page(width=8, height=8)
+        page.draw_rect(page.rect, color=color, fill=color)
+        page.get_pixmap().save(path)
+    return path
+
+
+def test_inserted_slide_leaves_the_others_reused(tmp_path):
+    units = file_to_markdown.UnitCache(tmp_path / "units")
+    file_to_markdown.pptx_to_document(_pptx(tmp_path / "first.pptx", ["Automata", "Grammars"]), unit_cache=units)
+
+    document = file_to_markdown.pptx_to_document(
+        _pptx(tmp_path / "second.pptx", ["Overview", "Automata", "Grammars"]), unit_cache=units
+    )
+
+    assert (document.units_converted, document.units_reused) == (1, 2)
+    assert document.to_markdown() == file_to_markdown.pptx_to_document(str(tmp_path / "second.pptx")).to_markdown()
+    assert [b.page for b in document.blocks if b.text == "Grammars"] == [3]
+
+
+def test_slides_with_different_images_do_not_share_units(tmp_path):
+    units = file_to_markdown.UnitCache(tmp_path / "units")
+    red = _png(tmp_path / "red", (1, 0, 0))
+    blue = _png(tmp_path / "blue", (0, 0, 1))
+    first = _pptx(tmp_path / "first.pptx", ["Figure"], image=red)
+    second = _pptx(tmp_path / "second.pptx", ["Figure"], image=blue)
+
+    file_to_markdown.pptx_to_document(first, unit_cache=units)
+
+    assert file_to_markdown.pptx_to_document(second, unit_cache=units).units_reused == 0
+    assert file_to_markdown.pptx_to_document(first, unit_cache=units).units_reused == 1
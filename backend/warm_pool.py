@@ -0,0 +1,204 @@
+"""
+Warm pool of pre-generated quizzes for popular AI-mode requests.
+
+Every `generate-from-ai` request bumps an exponentially decayed frequency for
+its normalized (topic, sub topic, instructions, mode, counts) key. While the
+backend is idle, a background task tops up a few spare quizzes for keys that
+are requested often enough, spending at most WARM_POOL_TOKENS_PER_HOUR
+(estimated prompt + output tokens). A matching request is then answered from
+the pool without waiting for Gemini, and the pool is refilled asynchronously.
+
+A pooled quiz is never served twice to the same user; with WARM_POOL_MAX_SERVES
+above 1 it can be handed to that many different users. Entries older than
+WARM_POOL_MAX_AGE_S are dropped. The pool is disabled while the token budget is 0.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from starlette.concurrency import run_in_threadpool
+
+import coalescing
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WARM_POOL_TOKENS_PER_HOUR = int(os.getenv("WARM_POOL_TOKENS_PER_HOUR", "0"))
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "2"))
+WARM_POOL_MIN_FREQUENCY = float(os.getenv("WARM_POOL_MIN_FREQUENCY", "3"))
+WARM_POOL_HALF_LIFE_S = float(os.getenv("WARM_POOL_HALF_LIFE_S", "3600"))
+WARM_POOL_MAX_AGE_S = float(os.getenv("WARM_POOL_MAX_AGE_S", "86400"))
+WARM_POOL_MAX_SERVES = int(os.getenv("WARM_POOL_MAX_SERVES", "1"))
+WARM_POOL_INTERVAL_S = float(os.getenv("WARM_POOL_INTERVAL_S", "30"))
+WARM_POOL_MAX_KEYS = int(os.getenv("WARM_POOL_MAX_KEYS", "1000"))
+# Served-variant history kept per user to avoid repeats.
+_SERVED_HISTORY = 10000
+
+POOL_ENTRY_AGE_SECONDS = metrics.histogram(
+    "retina_warm_pool_entry_age_seconds",
+    "Age of pooled quizzes when served.",
+    buckets=(60, 300, 900, 1800, 3600, 7200, 21600, 43200, 86400),
+)
+POOL_EXPIRED = metrics.counter(
+    "retina_warm_pool_expired_total",
+    "Pooled quizzes discarded for exceeding WARM_POOL_MAX_AGE_S.",
+)
+POOL_TOKENS = metrics.counter(
+    "retina_warm_pool_tokens_total",
+    "Estimated tokens spent on background pre-generation.",
+)
+
+
+@dataclass
+class PoolEntry:
+    questions: list[dict]
+    created_at: float = field(default_factory=time.time)
+    variant_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    serves: int = 0
+
+
+@dataclass
+class _KeyState:
+    spec: dict
+    frequency: float = 0.0
+    updated_at: float = field(default_factory=time.time)
+    entries: list[PoolEntry] = field(default_factory=list)
+
+    def decayed_frequency(self, now: float) -> float:
+        return self.frequency * math.pow(0.5, (now - self.updated_at) / WARM_POOL_HALF_LIFE_S)
+
+
+class WarmPool:
+    def __init__(self, tokens_per_hour: int = WARM_POOL_TOKENS_PER_HOUR, size: int = WARM_POOL_SIZE):
+        self.tokens_per_hour = tokens_per_hour
+        self.size = size
+        self._keys: OrderedDict[str, _KeyState] = OrderedDict()
+        self._served: OrderedDict[tuple[str, str], None] = OrderedDict()
+        self._tokens = float(tokens_per_hour)
+        self._tokens_at = time.monotonic()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.tokens_per_hour > 0
+
+    def share(self, workers: int) -> None:
+        """Keep this pool to its share of the token budget when `workers` processes each run one."""
+        self.tokens_per_hour = self.tokens_per_hour / workers
+        self._tokens = float(self.tokens_per_hour)
+
+    def record(self, key: str, spec: dict) -> None:
+        """Count one request for `key`; `spec` holds what is needed to regenerate it."""
+        now = time.time()
+        state = self._keys.get(key)
+        if state is None:
+            state = self._keys[key] = _KeyState(spec)
+        state.frequency = state.decayed_frequency(now) + 1
+        state.updated_at = now
+        state.spec = spec
+        self._keys.move_to_end(key)
+        while len(self._keys) > WARM_POOL_MAX_KEYS:
+            self._keys.popitem(last=False)
+
+    def take(self, key: str, user_id: str | None) -> list[dict] | None:
+        """Serve a pooled quiz this user has not seen, or None."""
+        if not self.enabled:
+            return None
+        state = self._keys.get(key)
+        entry = None
+        if state is not None:
+            self._expire(state)
+            entry = next(
+                (e for e in state.entries if user_id is None or (user_id, e.variant_id) not in self._served),
+                None,
+            )
+        metrics.record_cache("warm_pool", hit=entry is not None)
+        if entry is None:
+            return None
+
+        POOL_ENTRY_AGE_SECONDS.observe(time.time() - entry.created_at)
+        entry.serves += 1
+        if user_id is not None:
+            self._served[(user_id, entry.variant_id)] = None
+            while len(self._served) > _SERVED_HISTORY:
+                self._served.popitem(last=False)
+        if user_id is None or entry.serves >= WARM_POOL_MAX_SERVES:
+            state.entries.remove(entry)
+            self._wakeup.set()
+        return entry.questions
+
+    def _expire(self, state: _KeyState) -> None:
+        cutoff = time.time() - WARM_POOL_MAX_AGE_S
+        fresh = [e for e in state.entries if e.created_at >= cutoff]
+        POOL_EXPIRED.inc(len(state.entries) - len(fresh))
+        state.entries = fresh
+
+    def _refill_candidates(self) -> list[tuple[str, _KeyState]]:
+        now = time.time()
+        hot = []
+        for key, state in self._keys.items():
+            self._expire(state)
+            if len(state.entries) < self.size and state.decayed_frequency(now) >= WARM_POOL_MIN_FREQUENCY:
+                hot.append((key, state))
+        return sorted(hot, key=lambda item: -item[1].decayed_frequency(now))
+
+    def _refill_tokens(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.tokens_per_hour, self._tokens + (now - self._tokens_at) * self.tokens_per_hour / 3600
+        )
+        self._tokens_at = now
+
+    async def _refill_once(self, generate) -> None:
+        for key, state in self._refill_candidates():
+            # Foreground work always wins; try again on the next tick.
+            if coalescing.generation.in_flight or coalescing.evaluation.in_flight:
+                return
+            self._refill_tokens()
+            if self._tokens <= 0:
+                return
+            with metrics.stage("warm_pool_generate"):
+                questions, spent = await run_in_threadpool(generate, state.spec)
+            self._tokens -= spent
+            POOL_TOKENS.inc(spent)
+            state.entries.append(PoolEntry(questions))
+
+    async def run(self, generate) -> None:
+        """
+        Background refill loop.
+
+        `generate(spec)` is a blocking callable returning `(questions, tokens_spent)`.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), WARM_POOL_INTERVAL_S)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._refill_once(generate)
+            except Exception:
+                logger.exception("Warm pool refill failed")
+
+    def start(self, generate) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run(generate))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+pool = WarmPool()
@@ -0,0 +1,147 @@
+"""
+Adaptive face landmark detection for the focus tracker.
+
+Running the landmarker on the full 640x480 frame every time is wasteful while
+the head barely moves. `AdaptiveDetector` instead:
+
+- crops to the last face bounding box, padded by `roi_padding` (a fraction of
+  the box size) on each side, and shrinks the crop so its longer side is at
+  most `input_size` pixels;
+- skips detection and reuses the last landmarks while the mean frame
+  difference inside that box stays under `motion_threshold` grey levels, for at
+  most `max_skip` frames in a row;
+- falls back to full-frame detection when there is no previous face or the
+  crop loses it.
+
+Landmarks found in a crop are mapped back to full-frame normalized coordinates,
+so callers get the same result shape as from full-frame detection.
+"""
+
+import time
+
+import cv2
+import mediapipe as mp
+from mediapipe.tasks.python import vision
+
+from pipeline import Detection, InferenceThread, RgbBuffers
+
+FULL, ROI, SKIP = "full", "roi", "skip"
+
+# Frame-difference motion is measured on a grey thumbnail of this size.
+_MOTION_SIZE = (160, 120)
+
+
+class AdaptiveDetector:
+    def __init__(self, pool, roi_padding=0.25, input_size=256, motion_threshold=2.0, max_skip=3):
+        # IMAGE mode: crops move and change size between calls, so MediaPipe's own tracking would mislead it.
+        self.pool = pool
+        self.detector = pool.acquire(vision.RunningMode.IMAGE)
+        self.roi_padding = roi_padding
+        self.input_size = input_size
+        self.motion_threshold = motion_threshold
+        self.max_skip = max_skip
+        self.counts = {FULL: 0, ROI: 0, SKIP: 0}
+        self.lost = 0  # crops that lost the face and needed a full-frame retry
+        self._result = None
+        self._box = None  # normalized (x0, y0, x1, y1) around the last face
+        self._reference = None  # motion thumbnail of the frame the landmarks came from
+        self._skipped = 0
+        # Full frames share one buffer; crops change size, so theirs is reallocated as needed.
+        self._full_rgb = RgbBuffers(1)
+        self._crop_rgb = RgbBuffers(1)
+
+    def detect(self, image):
+        """Landmarks for a BGR frame, as `(FaceLandmarkerResult, mode)` with mode full, roi or skip."""
+        thumb = cv2.cvtColor(cv2.resize(image, _MOTION_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        if self._box is not None:
+            if self._skipped < self.max_skip and self._motion(thumb) < self.motion_threshold:
+                self._skipped += 1
+                self.counts[SKIP] += 1
+                return self._result, SKIP
+            result = self._detect_roi(image)
+            if result.face_landmarks:
+                return self._accept(result, thumb, ROI)
+            self.lost += 1
+        return self._accept(self.detector.detect(self._mp_image(image, self._full_rgb)), thumb, FULL)
+
+    @staticmethod
+    def _mp_image(image, buffers):
+        return mp.Image(image_format=mp.ImageFormat.SRGB, data=buffers.convert(image))
+
+    def _motion(self, thumb):
+        """Mean absolute grey-level difference inside the face box since the last detection."""
+        x0, y0, x1, y1 = self._box
+        tw, th = _MOTION_SIZE
+        rows = slice(int(y0 * th), max(int(y1 * th), int(y0 * th) + 1))
+        cols = slice(int(x0 * tw), max(int(x1 * tw), int(x0 * tw) + 1))
+        return float(cv2.absdiff(thumb[rows, cols], self._reference[rows, cols]).mean())
+
+    def _detect_roi(self, image):
+        img_h, img_w = image.shape[:2]
+        x0, y0, x1, y1 = self._box
+        px0, py0, px1, py1 = int(x0 * img_w), int(y0 * img_h), int(x1 * img_w), int(y1 * img_h)
+        crop = image[py0:py1, px0:px1]
+        scale = self.input_size / max(crop.shape[:2])
+        if scale < 1:
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        result = self.detector.detect(self._mp_image(crop, self._crop_rgb))
+        left, top = px0 / img_w, py0 / img_h
+        width, height = (px1 - px0) / img_w, (py1 - py0) / img_h
+        for face in result.face_landmarks:
+            for landmark in face:
+                landmark.x = left + landmark.x * width
+                landmark.y = top + landmark.y * height
+                landmark.z *= width  # z shares the x scale
+        return result
+
+    def _accept(self, result, thumb, mode):
+        self.counts[mode] += 1
+        self._result = result
+        self._reference = thumb
+        self._skipped = 0
+        self._box = self._face_box(result.face_landmarks[0]) if result.face_landmarks else None
+        return result, mode
+
+    def _face_box(self, landmarks):
+        xs = [landmark.x for landmark in landmarks]
+        ys = [landmark.y for landmark in landmarks]
+        pad_x = (max(xs) - min(xs)) * self.roi_padding
+        pad_y = (max(ys) - min(ys)) * self.roi_padding
+        box = (
+            max(0.0, min(xs) - pad_x),
+            max(0.0, min(ys) - pad_y),
+            min(1.0, max(xs) + pad_x),
+            min(1.0, max(ys) + pad_y),
+        )
+        # A face at the frame edge can leave an empty crop; detect on the full frame instead.
+        return box if box[2] - box[0] > 0.02 and box[3] - box[1] > 0.02 else None
+
+    def close(self):
+        self.pool.release(self.detector)
+
+
+class AdaptiveInferenceThread(InferenceThread):
+    """`InferenceThread` variant that runs an `AdaptiveDetector` synchronously on the newest frame."""
+
+    def __init__(self, pool, ring, meter, **adaptive_options):
+        self._adaptive_options = adaptive_options
+        super().__init__(pool, ring, meter)
+
+    def _create_detector(self, pool):
+        return AdaptiveDetector(pool, **self._adaptive_options)
+
+    def _release_detector(self):
+        self.detector.close()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            frame = self.ring.get(timeout=0.1)
+            if frame is None:
+                if self.ring.closed:
+                    break
+                continue
+            result, _ = self.detector.detect(frame.image)
+            with self._cond:
+                self._latest = Detection(frame, result, time.monotonic())
+            self.meter.tick()
@@ -0,0 +1,107 @@
+"""
+Model load and detector initialization cost, and what the detector pool saves.
+
+For each running mode, creates `--detectors` landmarkers:
+
+- from the model path, as before (MediaPipe reads the file for every detector);
+- from the shared buffer of a `ModelManager`.
+
+It reports the time each creation takes and the resident memory each adds.
+It then compares the first detection on a cold detector with one warmed by
+`DetectorPool.warmup`, and times leasing an idle detector from the pool, which
+is what a second clip or session now pays instead of a new detector.
+
+Needs the model (downloaded into the cache on first run unless `--offline`).
+
+Usage:
+    python bench_models.py --detectors 4
+"""
+
+import argparse
+import os
+import resource
+import time
+
+import mediapipe as mp
+import numpy as np
+from mediapipe.tasks.python import vision
+
+from models import DetectorPool, ModelManager
+from pipeline import create_landmarker
+
+MODES = {
+    "image": vision.RunningMode.IMAGE,
+    "video": vision.RunningMode.VIDEO,
+    "live_stream": vision.RunningMode.LIVE_STREAM,
+}
+
+
+def rss_mb():
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def create_many(model, mode, count):
+    """Returns the detectors, ms per creation and MB of RSS added per detector."""
+    callback = (lambda *_: None) if mode == vision.RunningMode.LIVE_STREAM else None
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    detectors = [create_landmarker(model, mode, result_callback=callback) for _ in range(count)]
+    elapsed = time.perf_counter() - start
+    return detectors, elapsed / count * 1000, (rss_mb() - rss_start) / count
+
+
+def first_detect_ms(detector, image):
+    start = time.perf_counter()
+    detector.detect(image)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--detectors", type=int, default=4, help="Detectors created per running mode and source.")
+    parser.add_argument("--model-dir", help="Model cache directory.")
+    parser.add_argument("--offline", action="store_true", default=None)
+    args = parser.parse_args()
+
+    manager = ModelManager(cache_dir=args.model_dir, offline=args.offline)
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    buffer = manager.load()
+    print(f"Model: {manager.path} ({len(buffer) / 1024 / 1024:.1f} MB)")
+    print(f"Load and verify: {(time.perf_counter() - start) * 1000:.1f} ms, +{rss_mb() - rss_start:.1f} MB RSS (once)")
+
+    print(f"\nCreating {args.detectors} detectors per mode:")
+    for name, mode in MODES.items():
+        for source, model in (("path", manager.path), ("buffer", buffer)):
+            detectors, ms, mb = create_many(model, mode, args.detectors)
+            print(f"  {name:11s} from {source:6s}: {ms:7.1f} ms and +{mb:5.1f} MB RSS per detector")
+            for detector in detectors:
+                detector.close()
+
+    frame = np.random.default_rng(0).integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+    image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame)
+    cold = create_landmarker(buffer, vision.RunningMode.IMAGE)
+    cold_ms = first_detect_ms(cold, image)
+    cold.close()
+
+    pool = DetectorPool(manager)
+    pool.warmup(vision.RunningMode.IMAGE)
+    start = time.perf_counter()
+    warm = pool.acquire(vision.RunningMode.IMAGE)
+    lease_us = (time.perf_counter() - start) * 1e6
+    warm_ms = first_detect_ms(warm, image)
+    pool.release(warm)
+    pool.close()
+
+    print(f"\nFirst detection (640x480): cold {cold_ms:.1f} ms | after warmup {warm_ms:.1f} ms")
+    print(f"Leasing an idle pooled detector: {lease_us:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
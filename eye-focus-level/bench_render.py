@@ -0,0 +1,185 @@
+"""
+Per-frame render cost of the focus tracker, before and after the allocation-free path.
+
+Renders a synthetic 640x480 frame with synthetic face landmarks (no camera or
+model needed) through:
+
+- before: a copy of the previous loop body, with a new RGB buffer per frame,
+  per-landmark lists and arrays, a full-frame copy and `addWeighted` for the
+  panel, and the focus average re-summed twice;
+- after: `render_frame` from focus-level.py with reused buffers.
+
+Prints milliseconds per stage from a timed pass, and the peak memory
+allocated within a frame (tracemalloc, in a separate pass since tracing slows
+everything down).
+
+Usage:
+    python bench_render.py --frames 2000
+"""
+
+import argparse
+import importlib
+import tracemalloc
+from collections import deque
+
+import cv2
+import numpy as np
+
+from pipeline import RgbBuffers, StageTimer
+
+focus = importlib.import_module("focus-level")
+
+
+class _Landmark:
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x, y):
+        self.x, self.y, self.z = x, y, 0.0
+
+
+def synthetic_landmarks(seed=0):
+    """478 landmarks spread over a face-sized box, irises inside their eyes."""
+    rng = np.random.default_rng(seed)
+    landmarks = [_Landmark(x, y) for x, y in rng.uniform(0.35, 0.65, size=(478, 2))]
+    for iris, (cx, cy) in ((focus.LEFT_IRIS, (0.58, 0.45)), (focus.RIGHT_IRIS, (0.42, 0.45))):
+        for i, idx in enumerate(iris):
+            landmarks[idx] = _Landmark(cx + 0.01 * np.cos(i * np.pi / 2), cy + 0.01 * np.sin(i * np.pi / 2))
+    return landmarks
+
+
+# --- previous render path, for comparison -------------------------------------------------------
+
+def _point(landmarks, idx, img_w, img_h):
+    return np.array([int(landmarks[idx].x * img_w), int(landmarks[idx].y * img_h)])
+
+
+def _iris_center(landmarks, iris_indices, img_w, img_h):
+    return np.array([_point(landmarks, idx, img_w, img_h) for idx in iris_indices]).mean(axis=0).astype(int)
+
+
+def _gaze_ratio(iris_center, inner_corner, outer_corner):
+    eye_width = np.linalg.norm(outer_corner - inner_corner)
+    if eye_width == 0:
+        return 0.5
+    return np.clip(np.linalg.norm(iris_center - inner_corner) / eye_width, 0, 1)
+
+
+def _draw_eye(frame, landmarks, eye_indices, iris_indices, img_w, img_h):
+    eye_points = np.array([[int(landmarks[i].x * img_w), int(landmarks[i].y * img_h)] for i in eye_indices],
+                          dtype=np.int32)
+    cv2.polylines(frame, [eye_points], True, (0, 255, 0), 1)
+    iris_points = np.array([[int(landmarks[i].x * img_w), int(landmarks[i].y * img_h)] for i in iris_indices],
+                           dtype=np.int32)
+    iris_center = iris_points.mean(axis=0).astype(int)
+    iris_radius = int(np.linalg.norm(iris_points[0] - iris_points[2]) / 2)
+    cv2.circle(frame, tuple(iris_center), iris_radius, (255, 0, 255), 1)
+    cv2.circle(frame, tuple(iris_center), 2, (255, 0, 255), -1)
+
+
+def legacy_frame(frame, landmarks, tracker, history, stats_text, timer):
+    img_h, img_w = frame.shape[:2]
+    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    timer.mark("convert")
+
+    left_iris = _iris_center(landmarks, focus.LEFT_IRIS, img_w, img_h)
+    right_iris = _iris_center(landmarks, focus.RIGHT_IRIS, img_w, img_h)
+    left_inner = _point(landmarks, focus.LEFT_EYE_INNER, img_w, img_h)
+    left_outer = _point(landmarks, focus.LEFT_EYE_OUTER, img_w, img_h)
+    right_inner = _point(landmarks, focus.RIGHT_EYE_INNER, img_w, img_h)
+    right_outer = _point(landmarks, focus.RIGHT_EYE_OUTER, img_w, img_h)
+    left_ratio = _gaze_ratio(left_iris, left_inner, left_outer)
+    right_ratio = _gaze_ratio(right_iris, right_inner, right_outer)
+    history.append(tracker.calculate_focus_level(left_ratio, right_ratio))
+    status, status_color = tracker.get_focus_status(sum(history) / len(history))
+    timer.mark("measure")
+
+    _draw_eye(frame, landmarks, focus.LEFT_EYE, focus.LEFT_IRIS, img_w, img_h)
+    _draw_eye(frame, landmarks, focus.RIGHT_EYE, focus.RIGHT_IRIS, img_w, img_h)
+    cv2.line(frame, tuple(left_inner), tuple(left_outer), (255, 255, 0), 1)
+    cv2.line(frame, tuple(right_inner), tuple(right_outer), (255, 255, 0), 1)
+    timer.mark("draw")
+
+    overlay = frame.copy()
+    cv2.rectangle(overlay, (10, 10), (300, 200), (0, 0, 0), -1)
+    frame = cv2.addWeighted(overlay, 0.7, frame, 0.3, 0)
+    timer.mark("panel")
+
+    avg_focus = sum(history) / len(history)
+    cv2.putText(frame, "EYE FOCUS TRACKER", (20, 35), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    cv2.putText(frame, f"Focus Level: {avg_focus:.1f}%", (20, 65), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    focus.draw_focus_bar(frame, avg_focus, 20, 75, 260, 20)
+    cv2.putText(frame, f"Status: {status}", (20, 115), cv2.FONT_HERSHEY_SIMPLEX, 0.5, status_color, 2)
+    session_duration, session_focus = tracker.get_session_stats()
+    cv2.putText(frame, f"Session: {session_duration:.0f}s | Focused: {session_focus:.1f}%", (20, 145),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+    cv2.putText(frame, stats_text[0], (20, 170), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+    cv2.putText(frame, stats_text[1], (20, 190), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+    cv2.putText(frame, "Press 'q' to quit", (img_w - 150, img_h - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                (200, 200, 200), 1)
+    timer.mark("text")
+    return frame
+
+
+# -------------------------------------------------------------------------------------------------
+
+def make_renderers(landmarks, stats_text):
+    history = deque(maxlen=30)
+    legacy_tracker = focus.FocusTracker()
+    tracker = focus.FocusTracker()
+    points = focus.EyePoints()
+    black = focus.panel_buffer()
+    rgb = RgbBuffers(2)
+
+    def before(frame, timer):
+        legacy_frame(frame, landmarks, legacy_tracker, history, stats_text, timer)
+
+    def after(frame, timer):
+        rgb.convert(frame)
+        timer.mark("convert")
+        focus.render_frame(frame, landmarks, tracker, points, black, stats_text, timer)
+
+    return {"before": before, "after": after}
+
+
+def run(render, source, frames, trace):
+    """Returns `(StageTimer, peak bytes allocated within a frame)`."""
+    frame = np.empty_like(source)
+    timer = StageTimer(enabled=not trace)
+    peak = 0
+    if trace:
+        tracemalloc.start()
+    for _ in range(frames):
+        np.copyto(frame, source)  # a fresh camera frame
+        if trace:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        timer.start()
+        render(frame, timer)
+        timer.finish()
+        if trace:
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    if trace:
+        tracemalloc.stop()
+    return timer, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+
+    source = np.random.default_rng(0).integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+    stats_text = ("FPS cap 30 | infer 30 | disp 30", "Latency: 40 ms | Dropped: 0")
+    renderers = make_renderers(synthetic_landmarks(), stats_text)
+
+    for name, render in renderers.items():
+        run(render, source, 50, trace=False)  # warm up
+        timer, _ = run(render, source, args.frames, trace=False)
+        _, peak = run(render, source, min(args.frames, 200), trace=True)
+        print(f"{name}: {args.frames} frames, peak allocation within a frame {peak / 1024:.1f} KiB")
+        for line in timer.report():
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
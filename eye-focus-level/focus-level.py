@@ -1,23 +1,26 @@
+import argparse
 import cv2
+import math
 import numpy as np
+import operator
 from collections import deque
 import time
-import urllib.request
-import os
-
-# Download the face landmarker model if not present
-MODEL_PATH = "face_landmarker.task"
-MODEL_URL = "https://storage.googleapis.com/mediapipe-models/face_landmarker/face_landmarker/float16/1/face_landmarker.task"
-
-if not os.path.exists(MODEL_PATH):
-    print("Downloading face landmarker model...")
-    urllib.request.urlretrieve(MODEL_URL, MODEL_PATH)
-    print("Download complete!")
 
 import mediapipe as mp
-from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
 
+from adaptive import AdaptiveDetector, AdaptiveInferenceThread
+from models import DetectorPool, ModelError, ModelManager
+from pipeline import (
+    CaptureThread,
+    FrameRing,
+    InferenceThread,
+    LatencyStats,
+    RateMeter,
+    RgbBuffers,
+    StageTimer,
+)
+
 # Eye landmark indices for MediaPipe Face Landmarker
 # Left eye
 LEFT_EYE = [362, 382, 381, 380, 374, 373, 390, 249, 263, 466, 388, 387, 386, 385, 384, 398]
@@ -33,6 +36,14 @@ LEFT_EYE_OUTER = 263
 RIGHT_EYE_INNER = 133
 RIGHT_EYE_OUTER = 33
 
+# Rows of EyePoints.pixels: both eye contours, both irises, then the four eye corners.
+EYE_LANDMARKS = LEFT_EYE + RIGHT_EYE + LEFT_IRIS + RIGHT_IRIS + [
+    LEFT_EYE_INNER, LEFT_EYE_OUTER, RIGHT_EYE_INNER, RIGHT_EYE_OUTER
+]
+
+# Stats panel corners (inclusive), darkened behind the overlay text.
+PANEL = (10, 10, 300, 200)
+
 
 class FocusTracker:
     def __init__(self, history_size=30):
@@ -41,32 +52,16 @@ class FocusTracker:
         self.last_focus_time = time.time()
         self.total_focused_time = 0
         self.session_start = time.time()
-
-    def get_landmark_point(self, landmarks, idx, img_w, img_h):
-        """Get a landmark point as numpy array."""
-        return np.array([
-            int(landmarks[idx].x * img_w),
-            int(landmarks[idx].y * img_h)
-        ])
-
-    def get_iris_center(self, landmarks, iris_indices, img_w, img_h):
-        """Calculate the center of the iris."""
-        iris_points = []
-        for idx in iris_indices:
-            point = self.get_landmark_point(landmarks, idx, img_w, img_h)
-            iris_points.append(point)
-        iris_points = np.array(iris_points)
-        center = iris_points.mean(axis=0).astype(int)
-        return center
+        self._focus_sum = 0.0
 
     def calculate_gaze_ratio(self, iris_center, inner_corner, outer_corner):
         """Calculate gaze ratio (0-1)."""
-        eye_width = np.linalg.norm(outer_corner - inner_corner)
+        eye_width = math.hypot(outer_corner[0] - inner_corner[0], outer_corner[1] - inner_corner[1])
         if eye_width == 0:
             return 0.5
-        iris_to_inner = np.linalg.norm(iris_center - inner_corner)
+        iris_to_inner = math.hypot(iris_center[0] - inner_corner[0], iris_center[1] - inner_corner[1])
         ratio = iris_to_inner / eye_width
-        return np.clip(ratio, 0, 1)
+        return min(max(ratio, 0.0), 1.0)
 
     def calculate_focus_level(self, left_ratio, right_ratio):
         """Calculate focus level based on gaze ratios."""
@@ -93,16 +88,20 @@ class FocusTracker:
     def update(self, focus_level):
         """Update focus tracking history."""
         current_time = time.time()
+        if len(self.focus_history) == self.focus_history.maxlen:
+            self._focus_sum -= self.focus_history[0]
         self.focus_history.append(focus_level)
+        self._focus_sum += focus_level
         if focus_level >= 60:
             self.total_focused_time += current_time - self.last_focus_time
         self.last_focus_time = current_time
 
     def get_average_focus(self):
-        """Get average focus over recent history."""
+        """Get average focus over recent history (kept as a running sum)."""
         if len(self.focus_history) == 0:
             return 0
-        return sum(self.focus_history) / len(self.focus_history)
+        # Clamp away float residue from the subtractions.
+        return max(0.0, self._focus_sum / len(self.focus_history))
 
     def get_session_stats(self):
         """Get session statistics."""
@@ -111,30 +110,71 @@ class FocusTracker:
         return session_duration, focus_percentage
 
 
-def draw_eye_landmarks(frame, landmarks, eye_indices, iris_indices, img_w, img_h, color=(0, 255, 0)):
+class EyePoints:
+    """Pixel coordinates of the eye landmarks, gathered into preallocated arrays once per frame."""
+
+    _pick = operator.itemgetter(*EYE_LANDMARKS)
+
+    def __init__(self):
+        self._normalized = np.empty((len(EYE_LANDMARKS), 2), dtype=np.float64)
+        self._size = np.empty(2, dtype=np.float64)
+        self._iris_mean = np.empty((2, 2), dtype=np.float64)
+        self.pixels = np.empty((len(EYE_LANDMARKS), 2), dtype=np.int32)
+        self.iris_centers = np.empty((2, 2), dtype=np.int32)  # left, right
+
+        # Views into `pixels`, in EYE_LANDMARKS order.
+        eye, iris = len(LEFT_EYE), len(LEFT_IRIS)
+        self.left_eye = self.pixels[:eye]
+        self.right_eye = self.pixels[eye:2 * eye]
+        irises = self.pixels[2 * eye:2 * eye + 2 * iris]
+        self.left_iris, self.right_iris = irises[:iris], irises[iris:]
+        self._irises = irises.reshape(2, iris, 2)
+        self.left_inner, self.left_outer, self.right_inner, self.right_outer = self.pixels[2 * eye + 2 * iris:]
+
+    def gather(self, landmarks, img_w, img_h):
+        """Fill the arrays from one face's landmarks; False when the iris landmarks are missing."""
+        if len(landmarks) <= max(LEFT_IRIS + RIGHT_IRIS):
+            return False
+        normalized = self._normalized
+        for row, landmark in enumerate(self._pick(landmarks)):
+            normalized[row, 0] = landmark.x
+            normalized[row, 1] = landmark.y
+        self._size[0], self._size[1] = img_w, img_h
+        np.multiply(normalized, self._size, out=normalized)
+        np.copyto(self.pixels, normalized, casting="unsafe")  # truncates, like int()
+        np.mean(self._irises, axis=1, out=self._iris_mean)
+        np.copyto(self.iris_centers, self._iris_mean, casting="unsafe")
+        return True
+
+
+def measure_focus(tracker, points):
+    """Focus level from gathered `EyePoints`."""
+    left_ratio = tracker.calculate_gaze_ratio(points.iris_centers[0], points.left_inner, points.left_outer)
+    right_ratio = tracker.calculate_gaze_ratio(points.iris_centers[1], points.right_inner, points.right_outer)
+    return tracker.calculate_focus_level(left_ratio, right_ratio)
+
+
+def draw_eye_landmarks(frame, eye_points, iris_points, iris_center, color=(0, 255, 0)):
     """Draw eye contour and iris."""
-    eye_points = []
-    for idx in eye_indices:
-        x = int(landmarks[idx].x * img_w)
-        y = int(landmarks[idx].y * img_h)
-        eye_points.append([x, y])
-    eye_points = np.array(eye_points, dtype=np.int32)
     cv2.polylines(frame, [eye_points], True, color, 1)
 
-    iris_points = []
-    for idx in iris_indices:
-        x = int(landmarks[idx].x * img_w)
-        y = int(landmarks[idx].y * img_h)
-        iris_points.append([x, y])
-    iris_points = np.array(iris_points, dtype=np.int32)
+    center = (int(iris_center[0]), int(iris_center[1]))
+    iris_radius = int(math.hypot(iris_points[0, 0] - iris_points[2, 0], iris_points[0, 1] - iris_points[2, 1]) / 2)
+
+    cv2.circle(frame, center, iris_radius, (255, 0, 255), 1)
+    cv2.circle(frame, center, 2, (255, 0, 255), -1)
 
-    iris_center = iris_points.mean(axis=0).astype(int)
-    iris_radius = int(np.linalg.norm(iris_points[0] - iris_points[2]) / 2)
 
-    cv2.circle(frame, tuple(iris_center), iris_radius, (255, 0, 255), 1)
-    cv2.circle(frame, tuple(iris_center), 2, (255, 0, 255), -1)
+def darken_panel(frame, black):
+    """Blend the stats panel 70% toward black in place; `black` is a preallocated zero image of the panel's size."""
+    x0, y0, x1, y1 = PANEL
+    roi = frame[y0:y1 + 1, x0:x1 + 1]
+    cv2.addWeighted(black, 0.7, roi, 0.3, 0, dst=roi)
 
-    return iris_center
+
+def panel_buffer():
+    x0, y0, x1, y1 = PANEL
+    return np.zeros((y1 - y0 + 1, x1 - x0 + 1, 3), dtype=np.uint8)
 
 
 def draw_focus_bar(frame, focus_level, x, y, width, height):
@@ -159,109 +199,204 @@ def draw_focus_bar(frame, focus_level, x, y, width, height):
         cv2.rectangle(frame, (x, y), (x + fill_width, y + height), color, -1)
 
 
-def main():
-    # Create face landmarker
-    base_options = python.BaseOptions(model_asset_path=MODEL_PATH)
-    options = vision.FaceLandmarkerOptions(
-        base_options=base_options,
-        output_face_blendshapes=False,
-        output_facial_transformation_matrixes=False,
-        num_faces=1
-    )
-    detector = vision.FaceLandmarker.create_from_options(options)
-
-    # Initialize webcam
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-    if not cap.isOpened():
-        print("Error: Could not open webcam")
-        return
-
-    tracker = FocusTracker()
-
-    print("Eye Focus Tracker Started")
-    print("Press 'q' to quit")
-    print("-" * 40)
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Could not read frame")
-            break
+def render_frame(frame, landmarks, tracker, points, black, stats_text, timer):
+    """
+    Draw eye landmarks and the stats panel onto `frame` in place.
 
-        frame = cv2.flip(frame, 1)
-        img_h, img_w = frame.shape[:2]
+    `landmarks` is one face's landmarks or None, `stats_text` the two pipeline
+    lines at the bottom of the panel. Timings go to `timer` stages measure,
+    draw, panel and text.
+    """
+    img_h, img_w = frame.shape[:2]
+    status = "NO FACE DETECTED"
+    status_color = (128, 128, 128)
 
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
+    found = landmarks is not None and points.gather(landmarks, img_w, img_h)
+    if found:
+        tracker.update(measure_focus(tracker, points))
+    avg_focus = tracker.get_average_focus()
+    if found:
+        status, status_color = tracker.get_focus_status(avg_focus)
+    timer.mark("measure")
 
-        results = detector.detect(mp_image)
+    if found:
+        draw_eye_landmarks(frame, points.left_eye, points.left_iris, points.iris_centers[0])
+        draw_eye_landmarks(frame, points.right_eye, points.right_iris, points.iris_centers[1])
 
-        focus_level = 0
-        status = "NO FACE DETECTED"
-        status_color = (128, 128, 128)
+        cv2.line(frame, (int(points.left_inner[0]), int(points.left_inner[1])),
+                 (int(points.left_outer[0]), int(points.left_outer[1])), (255, 255, 0), 1)
+        cv2.line(frame, (int(points.right_inner[0]), int(points.right_inner[1])),
+                 (int(points.right_outer[0]), int(points.right_outer[1])), (255, 255, 0), 1)
+    timer.mark("draw")
 
-        if results.face_landmarks and len(results.face_landmarks) > 0:
-            landmarks = results.face_landmarks[0]
+    # Darken only the panel; blending the whole frame would leave the rest unchanged anyway.
+    darken_panel(frame, black)
+    timer.mark("panel")
 
-            # Check if we have enough landmarks (need iris landmarks)
-            if len(landmarks) > max(LEFT_IRIS + RIGHT_IRIS):
-                left_iris_center = tracker.get_iris_center(landmarks, LEFT_IRIS, img_w, img_h)
-                right_iris_center = tracker.get_iris_center(landmarks, RIGHT_IRIS, img_w, img_h)
+    cv2.putText(frame, "EYE FOCUS TRACKER", (20, 35),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
 
-                left_inner = tracker.get_landmark_point(landmarks, LEFT_EYE_INNER, img_w, img_h)
-                left_outer = tracker.get_landmark_point(landmarks, LEFT_EYE_OUTER, img_w, img_h)
-                right_inner = tracker.get_landmark_point(landmarks, RIGHT_EYE_INNER, img_w, img_h)
-                right_outer = tracker.get_landmark_point(landmarks, RIGHT_EYE_OUTER, img_w, img_h)
+    cv2.putText(frame, f"Focus Level: {avg_focus:.1f}%", (20, 65),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
 
-                left_ratio = tracker.calculate_gaze_ratio(left_iris_center, left_inner, left_outer)
-                right_ratio = tracker.calculate_gaze_ratio(right_iris_center, right_inner, right_outer)
+    draw_focus_bar(frame, avg_focus, 20, 75, 260, 20)
 
-                focus_level = tracker.calculate_focus_level(left_ratio, right_ratio)
-                tracker.update(focus_level)
+    cv2.putText(frame, f"Status: {status}", (20, 115),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, status_color, 2)
 
-                smoothed_focus = tracker.get_average_focus()
-                status, status_color = tracker.get_focus_status(smoothed_focus)
-
-                draw_eye_landmarks(frame, landmarks, LEFT_EYE, LEFT_IRIS, img_w, img_h)
-                draw_eye_landmarks(frame, landmarks, RIGHT_EYE, RIGHT_IRIS, img_w, img_h)
-
-                cv2.line(frame, tuple(left_inner), tuple(left_outer), (255, 255, 0), 1)
-                cv2.line(frame, tuple(right_inner), tuple(right_outer), (255, 255, 0), 1)
-
-        # Create overlay panel
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (10, 10), (300, 160), (0, 0, 0), -1)
-        frame = cv2.addWeighted(overlay, 0.7, frame, 0.3, 0)
+    session_duration, session_focus = tracker.get_session_stats()
+    cv2.putText(frame, f"Session: {session_duration:.0f}s | Focused: {session_focus:.1f}%",
+                (20, 145), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
 
-        cv2.putText(frame, "EYE FOCUS TRACKER", (20, 35),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    cv2.putText(frame, stats_text[0], (20, 170), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+    cv2.putText(frame, stats_text[1], (20, 190), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
 
-        avg_focus = tracker.get_average_focus()
-        cv2.putText(frame, f"Focus Level: {avg_focus:.1f}%", (20, 65),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    cv2.putText(frame, "Press 'q' to quit", (img_w - 150, img_h - 20),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+    timer.mark("text")
 
-        draw_focus_bar(frame, avg_focus, 20, 75, 260, 20)
 
-        cv2.putText(frame, f"Status: {status}", (20, 115),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, status_color, 2)
+def clip_focus(path, detect):
+    """
+    Run `detect(bgr_image, index, fps)` on every frame of a clip.
 
-        session_duration, session_focus = tracker.get_session_stats()
-        cv2.putText(frame, f"Session: {session_duration:.0f}s | Focused: {session_focus:.1f}%",
-                    (20, 145), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+    Returns the per-frame focus levels (None where no face was found) and the
+    wall and CPU seconds spent inside `detect`; CPU time covers MediaPipe's own
+    worker threads too.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Could not open {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    tracker = FocusTracker()
+    points = EyePoints()
+    levels, wall, cpu = [], 0.0, 0.0
+    index = 0
+    while True:
+        ret, image = cap.read()
+        if not ret:
+            break
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        results = detect(image, index, fps)
+        wall += time.perf_counter() - wall_start
+        cpu += time.process_time() - cpu_start
+
+        found = bool(results.face_landmarks) and points.gather(
+            results.face_landmarks[0], image.shape[1], image.shape[0]
+        )
+        levels.append(measure_focus(tracker, points) if found else None)
+        index += 1
+    cap.release()
+    return levels, wall, cpu
+
+
+def benchmark(pool, paths, adaptive_options):
+    """Compare full-frame detection on every frame (the live path) with the adaptive detector on recorded clips."""
+    rgb_buffers = RgbBuffers(1)
+    for path in paths:
+        # Leased per clip, so every clip after the first reuses the same initialized detectors.
+        baseline = pool.acquire(vision.RunningMode.VIDEO)
+
+        def detect_full(image, index, fps):
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_buffers.convert(image))
+            return baseline.detect_for_video(mp_image, int(index * 1000 / fps))
+
+        adaptive = AdaptiveDetector(pool, **adaptive_options)
+        full_levels, full_wall, full_cpu = clip_focus(path, detect_full)
+        adaptive_levels, adaptive_wall, adaptive_cpu = clip_focus(path, lambda image, *_: adaptive.detect(image)[0])
+        pool.release(baseline)
+        adaptive.close()
+
+        frames = len(full_levels)
+        if frames == 0:
+            print(f"{path}: no frames")
+            continue
+        errors = np.array([abs(a - b) for a, b in zip(full_levels, adaptive_levels) if a is not None and b is not None])
+        presence_mismatch = sum((a is None) != (b is None) for a, b in zip(full_levels, adaptive_levels))
+
+        print("\n" + "=" * 40)
+        print(f"BENCHMARK: {path} ({frames} frames)")
+        print("=" * 40)
+        for label, wall, cpu in (("Full frame", full_wall, full_cpu), ("Adaptive", adaptive_wall, adaptive_cpu)):
+            print(f"{label:10s}  {frames / wall:6.1f} FPS | CPU {cpu / frames * 1000:5.1f} ms/frame "
+                  f"({cpu / wall * 100:.0f}% of a core)")
+        counts = adaptive.counts
+        print(f"Adaptive modes: full {counts['full']} | roi {counts['roi']} | skip {counts['skip']} | "
+              f"lost {adaptive.lost}")
+        if errors.size:
+            print(f"Focus error (points): mean {errors.mean():.2f} | p95 {np.percentile(errors, 95):.2f} | "
+                  f"max {errors.max():.2f}")
+        print(f"Face found by only one path: {presence_mismatch} frames")
+        print("=" * 40)
+
+
+def main(pool, adaptive=False, adaptive_options=None, profile=False):
+    # Initialize webcam
+    cap = cv2.VideoCapture(0)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 
-        cv2.putText(frame, "Press 'q' to quit", (img_w - 150, img_h - 20),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+    if not cap.isOpened():
+        print("Error: Could not open webcam")
+        return
 
-        cv2.imshow("Eye Focus Tracker", frame)
+    tracker = FocusTracker()
+    # Reused every frame; the render loop allocates no frame-sized buffers.
+    points = EyePoints()
+    black = panel_buffer()
+    timer = StageTimer(enabled=profile)
+
+    # Capture and inference run on their own threads; this loop only renders.
+    ring = FrameRing(capacity=2)
+    capture_meter, inference_meter, display_meter = RateMeter(), RateMeter(), RateMeter()
+    latency = LatencyStats()
+    capture = CaptureThread(cap, ring, capture_meter)
+    if adaptive:
+        inference = AdaptiveInferenceThread(pool, ring, inference_meter, **adaptive_options)
+    else:
+        inference = InferenceThread(pool, ring, inference_meter)
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+    print("Eye Focus Tracker Started")
+    print("Press 'q' to quit")
+    print("-" * 40)
 
-    cap.release()
-    cv2.destroyAllWindows()
+    capture.start()
+    inference.start()
+    try:
+        while True:
+            detection = inference.take_latest()
+            if detection is None:
+                if not inference.is_alive():
+                    break
+                if cv2.waitKey(2) & 0xFF == ord('q'):
+                    break
+                continue
+
+            timer.start()
+            frame = detection.frame.image
+            landmarks = detection.result.face_landmarks[0] if detection.result.face_landmarks else None
+            stats_text = (
+                f"FPS cap {capture_meter.rate:.0f} | infer {inference_meter.rate:.0f} | disp {display_meter.rate:.0f}",
+                f"Latency: {latency.recent() * 1000:.0f} ms | Dropped: {ring.dropped}",
+            )
+            render_frame(frame, landmarks, tracker, points, black, stats_text, timer)
+
+            cv2.imshow("Eye Focus Tracker", frame)
+            display_meter.tick()
+            latency.add(time.monotonic() - detection.frame.captured_at)
+            timer.mark("show")
+            timer.finish()
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        capture.stop()
+        inference.stop()
+        cap.release()
+        cv2.destroyAllWindows()
+
+    if capture.error:
+        print(f"Error: {capture.error}")
 
     session_duration, session_focus = tracker.get_session_stats()
     print("\n" + "=" * 40)
@@ -270,11 +405,60 @@ def main():
     print(f"Total Duration: {session_duration:.1f} seconds")
     print(f"Time Focused: {tracker.total_focused_time:.1f} seconds")
     print(f"Focus Percentage: {session_focus:.1f}%")
+    print("-" * 40)
+    print(f"Capture FPS: {capture_meter.average():.1f}")
+    print(f"Inference FPS: {inference_meter.average():.1f}")
+    print(f"Display FPS: {display_meter.average():.1f}")
+    print(f"Frames Dropped: {ring.dropped}")
+    print(f"End-to-end Latency: p50 {latency.percentile(50) * 1000:.0f} ms | "
+          f"p95 {latency.percentile(95) * 1000:.0f} ms")
+    if adaptive:
+        counts = inference.detector.counts
+        print(f"Detections: full {counts['full']} | roi {counts['roi']} | skipped {counts['skip']}")
+    if profile:
+        print("-" * 40)
+        print("Render time per frame:")
+        for line in timer.report():
+            print(f"  {line}")
     print("=" * 40)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Real-time eye focus tracker.")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Detect on a crop around the last face and skip still frames.")
+    parser.add_argument("--benchmark", nargs="+", metavar="CLIP",
+                        help="Compare full-frame and adaptive detection on recorded clips instead of running live.")
+    parser.add_argument("--roi-padding", type=float, default=0.25, help="Face box padding, as a fraction of its size.")
+    parser.add_argument("--input-size", type=int, default=256, help="Longest side of the crop given to the model.")
+    parser.add_argument("--motion-threshold", type=float, default=2.0,
+                        help="Mean grey-level change in the face box below which detection is skipped.")
+    parser.add_argument("--max-skip", type=int, default=3, help="Most consecutive frames to skip.")
+    parser.add_argument("--profile", action="store_true", help="Print a per-stage render time breakdown on exit.")
+    parser.add_argument("--model-dir", help="Model cache directory (default: $FOCUS_MODEL_DIR or ~/.cache/eye-focus-level).")
+    parser.add_argument("--offline", action="store_true", default=None,
+                        help="Never download the model; fail if it is not already cached.")
+    args = parser.parse_args()
+
+    options = {
+        "roi_padding": args.roi_padding,
+        "input_size": args.input_size,
+        "motion_threshold": args.motion_threshold,
+        "max_skip": args.max_skip,
+    }
+    pool = DetectorPool(ModelManager(cache_dir=args.model_dir, offline=args.offline))
+    try:
+        pool.manager.load()
+        if args.benchmark:
+            benchmark(pool, args.benchmark, options)
+        else:
+            # Warm up now so the first camera frames are not stuck behind graph initialization.
+            pool.warmup(vision.RunningMode.IMAGE if args.adaptive else vision.RunningMode.LIVE_STREAM)
+            main(pool, args.adaptive, options, args.profile)
+    except ModelError as e:
+        raise SystemExit(f"Error: {e}")
+    finally:
+        pool.close()
 
 
 #source venv/bin/activate && python focus-level.py
@@ -0,0 +1,218 @@
+"""
+Face landmarker model management: load the model once, reuse detectors.
+
+`ModelManager` finds `face_landmarker.task` in a cache directory
+(`FOCUS_MODEL_DIR`, default `~/.cache/eye-focus-level`) rather than the
+working directory, and only touches the network when the file is missing and
+offline mode (`FOCUS_MODEL_OFFLINE=1`) is off. The file's SHA-256 is checked
+against `FOCUS_MODEL_SHA256` when set, otherwise against the digest recorded
+next to it when it was first fetched. The model is read through a memory map
+and kept as one shared buffer, so however many detectors are created, the file
+is read and hashed once per process.
+
+`DetectorPool` keeps initialized landmarkers per running mode. Clips in a batch
+or successive sessions lease a warm detector instead of paying model load and
+graph setup each time.
+"""
+
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+
+import mediapipe as mp
+import numpy as np
+from mediapipe.tasks.python import vision
+
+from pipeline import create_landmarker
+
+MODEL_NAME = "face_landmarker.task"
+MODEL_URL = "https://storage.googleapis.com/mediapipe-models/face_landmarker/face_landmarker/float16/1/face_landmarker.task"
+DEFAULT_CACHE_DIR = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "eye-focus-level")
+
+
+class ModelError(RuntimeError):
+    """The model is missing (offline) or does not match its checksum."""
+
+
+class ModelManager:
+    def __init__(self, cache_dir=None, url=MODEL_URL, sha256=None, offline=None):
+        self.cache_dir = cache_dir or os.getenv("FOCUS_MODEL_DIR") or DEFAULT_CACHE_DIR
+        self.url = url
+        self.sha256 = (sha256 or os.getenv("FOCUS_MODEL_SHA256") or "").lower() or None
+        self.offline = offline if offline is not None else os.getenv("FOCUS_MODEL_OFFLINE", "") == "1"
+        self._lock = threading.Lock()
+        self._buffer = None
+
+    @property
+    def path(self):
+        return os.path.join(self.cache_dir, MODEL_NAME)
+
+    @property
+    def _digest_path(self):
+        return self.path + ".sha256"
+
+    def load(self):
+        """The verified model bytes, shared by every detector created from this manager."""
+        with self._lock:
+            if self._buffer is None:
+                self._fetch()
+                self._buffer = self._read_verified()
+            return self._buffer
+
+    def resolve(self):
+        """Path of the verified model file, for callers that want MediaPipe to read it themselves."""
+        self.load()
+        return self.path
+
+    def _fetch(self):
+        if os.path.exists(self.path):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Earlier versions downloaded into the working directory; adopt that copy instead of fetching again.
+        if os.path.exists(MODEL_NAME):
+            shutil.copyfile(MODEL_NAME, self.path)
+            return
+        self._download()
+
+    def _download(self):
+        if self.offline:
+            raise ModelError(
+                f"{self.path} is missing and offline mode is on; copy {MODEL_NAME} there or unset FOCUS_MODEL_OFFLINE."
+            )
+        print("Downloading face landmarker model...")
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        os.close(fd)
+        try:
+            urllib.request.urlretrieve(self.url, tmp_path)
+            os.replace(tmp_path, self.path)  # never leave a half-written model behind
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if os.path.exists(self._digest_path):
+            os.remove(self._digest_path)
+        print("Download complete!")
+
+    def _read_verified(self):
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            digest = hashlib.sha256(mapped).hexdigest()
+            expected = self.sha256 or self._recorded_digest()
+            if expected is None:
+                with open(self._digest_path, "w") as out:
+                    out.write(digest + "\n")
+            elif digest != expected:
+                raise ModelError(
+                    f"{self.path} has SHA-256 {digest}, expected {expected}; delete it to download it again."
+                )
+            # MediaPipe takes the buffer as `bytes`, so the mapping is copied once here, not per detector.
+            return mapped[:]
+
+    def _recorded_digest(self):
+        if not os.path.exists(self._digest_path):
+            return None
+        with open(self._digest_path) as f:
+            return f.read().strip().lower() or None
+
+
+class PooledLandmarker:
+    """
+    A FaceLandmarker that outlives one clip or session.
+
+    VIDEO and LIVE_STREAM landmarkers require strictly increasing timestamps
+    over their whole life; each lease starts its own timeline at 0 and is
+    shifted past the previous one. LIVE_STREAM results go to `on_result`, which
+    the current holder sets.
+    """
+
+    def __init__(self, model, running_mode, num_faces=1):
+        self.running_mode = running_mode
+        self.on_result = None
+        self._offset = 0
+        self._last = -1
+        callback = self._dispatch if running_mode == vision.RunningMode.LIVE_STREAM else None
+        self._landmarker = create_landmarker(model, running_mode, num_faces=num_faces, result_callback=callback)
+
+    def _dispatch(self, result, output_image, timestamp_ms):
+        on_result = self.on_result
+        if on_result is not None and timestamp_ms >= self._offset:
+            on_result(result, output_image, timestamp_ms - self._offset)
+
+    def detect(self, image):
+        return self._landmarker.detect(image)
+
+    def detect_for_video(self, image, timestamp_ms):
+        self._last = self._offset + timestamp_ms
+        return self._landmarker.detect_for_video(image, self._last)
+
+    def detect_async(self, image, timestamp_ms):
+        self._last = self._offset + timestamp_ms
+        self._landmarker.detect_async(image, self._last)
+
+    def reset(self):
+        self.on_result = None
+        self._offset = self._last + 1
+
+    def close(self):
+        self._landmarker.close()
+
+
+class DetectorPool:
+    """Initialized landmarkers by running mode; at most `max_idle` per mode are kept between leases."""
+
+    def __init__(self, manager, num_faces=1, max_idle=2):
+        self.manager = manager
+        self.num_faces = num_faces
+        self.max_idle = max_idle
+        self.created = 0
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def acquire(self, running_mode):
+        with self._lock:
+            if self._idle[running_mode]:
+                return self._idle[running_mode].pop()
+            self.created += 1
+        return PooledLandmarker(self.manager.load(), running_mode, self.num_faces)
+
+    def release(self, detector):
+        detector.reset()
+        with self._lock:
+            idle = self._idle[detector.running_mode]
+            if len(idle) < self.max_idle:
+                idle.append(detector)
+                return
+        detector.close()
+
+    @contextmanager
+    def lease(self, running_mode):
+        detector = self.acquire(running_mode)
+        try:
+            yield detector
+        finally:
+            self.release(detector)
+
+    def warmup(self, running_mode, count=1):
+        """Create `count` idle detectors and run a blank frame through each, so the first real frame is not slow."""
+        blank = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.zeros((256, 256, 3), dtype=np.uint8))
+        detectors = [self.acquire(running_mode) for _ in range(count)]
+        for detector in detectors:
+            if running_mode == vision.RunningMode.IMAGE:
+                detector.detect(blank)
+            elif running_mode == vision.RunningMode.VIDEO:
+                detector.detect_for_video(blank, 0)
+            else:
+                detector.detect_async(blank, 0)
+        for detector in detectors:
+            self.release(detector)
+
+    def close(self):
+        with self._lock:
+            idle = [detector for detectors in self._idle.values() for detector in detectors]
+            self._idle.clear()
+        for detector in idle:
+            detector.close()
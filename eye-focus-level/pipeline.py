@@ -0,0 +1,302 @@
+"""
+Pipelined capture -> inference -> render engine for the live focus tracker.
+
+Camera reads and window rendering no longer stall inference:
+
+- a capture thread reads the webcam into a small drop-oldest ring buffer;
+- an inference thread feeds the newest frame to MediaPipe's LIVE_STREAM face
+  landmarker (`detect_async`), keeping at most `max_in_flight` frames queued;
+- the main thread renders whichever result arrived last (OpenCV windows must
+  stay on the main thread on macOS).
+
+Each stage has a `RateMeter`; `LatencyStats` tracks capture-to-display latency.
+"""
+
+import threading
+import time
+from collections import deque
+from itertools import islice
+from dataclasses import dataclass
+
+import cv2
+import mediapipe as mp
+import numpy as np
+from mediapipe.tasks import python
+from mediapipe.tasks.python import vision
+
+
+@dataclass
+class Frame:
+    index: int
+    image: np.ndarray  # BGR, mirrored
+    captured_at: float  # time.monotonic()
+
+
+@dataclass
+class Detection:
+    frame: Frame
+    result: object  # FaceLandmarkerResult
+    inferred_at: float
+
+
+def create_landmarker(model, running_mode, num_faces=1, result_callback=None):
+    """`model` is a path to the .task file or its contents (see `models.ModelManager.load`)."""
+    if isinstance(model, bytes):
+        base_options = python.BaseOptions(model_asset_buffer=model)
+    else:
+        base_options = python.BaseOptions(model_asset_path=model)
+    options = vision.FaceLandmarkerOptions(
+        base_options=base_options,
+        running_mode=running_mode,
+        output_face_blendshapes=False,
+        output_facial_transformation_matrixes=False,
+        num_faces=num_faces,
+        result_callback=result_callback,
+    )
+    return vision.FaceLandmarker.create_from_options(options)
+
+
+class FrameRing:
+    """Fixed-size frame buffer: a full ring drops its oldest frame, and readers take the newest."""
+
+    def __init__(self, capacity=2):
+        self._items = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(frame)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Newest frame (older ones are dropped), or None on timeout or once closed and empty."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed, timeout)
+            if not self._items:
+                return None
+            frame = self._items.pop()
+            self.dropped += len(self._items)
+            self._items.clear()
+            return frame
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class RateMeter:
+    """Events per second over a sliding window, plus the average over the whole run."""
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self.count = 0
+        self.started = None
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        now = time.monotonic()
+        with self._lock:
+            if self.started is None:
+                self.started = now
+            self.count += 1
+            self._times.append(now)
+            while self._times[0] < now - self.window:
+                self._times.popleft()
+
+    @property
+    def rate(self):
+        with self._lock:
+            if len(self._times) < 2 or time.monotonic() - self._times[-1] > self.window:
+                return 0.0
+            return (len(self._times) - 1) / (self._times[-1] - self._times[0])
+
+    def average(self):
+        if self.started is None:
+            return 0.0
+        elapsed = time.monotonic() - self.started
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+
+class LatencyStats:
+    """Recent capture-to-display latencies in seconds."""
+
+    def __init__(self, maxlen=10000):
+        self._values = deque(maxlen=maxlen)
+
+    def add(self, seconds):
+        self._values.append(seconds)
+
+    def recent(self, n=30):
+        n = min(n, len(self._values))
+        return sum(islice(reversed(self._values), n)) / n if n else 0.0
+
+    def percentile(self, pct):
+        if not self._values:
+            return 0.0
+        return float(np.percentile(np.fromiter(self._values, dtype=np.float64), pct))
+
+
+class StageTimer:
+    """Per-frame wall time by stage: `start()`, `mark(stage)` after each stage, `finish()`. Disabled, it does nothing."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.frames = 0
+        self.totals = {}
+        self._last = 0.0
+
+    def start(self):
+        if self.enabled:
+            self._last = time.perf_counter()
+
+    def mark(self, stage):
+        if self.enabled:
+            now = time.perf_counter()
+            self.totals[stage] = self.totals.get(stage, 0.0) + now - self._last
+            self._last = now
+
+    def finish(self):
+        self.frames += self.enabled
+
+    def report(self):
+        """One `stage: ms/frame` line per stage, plus the total."""
+        if not self.frames:
+            return []
+        lines = [f"{stage:8s} {seconds / self.frames * 1000:7.3f} ms" for stage, seconds in self.totals.items()]
+        lines.append(f"{'total':8s} {sum(self.totals.values()) / self.frames * 1000:7.3f} ms")
+        return lines
+
+
+class RgbBuffers:
+    """
+    BGR -> RGB conversion into reused buffers.
+
+    `count` buffers are rotated so an image still queued in MediaPipe keeps its
+    pixels; a buffer is only reallocated when the frame size changes.
+    """
+
+    def __init__(self, count):
+        self._buffers = [None] * count
+        self._next = 0
+
+    def convert(self, image):
+        buffer = self._buffers[self._next]
+        if buffer is None or buffer.shape != image.shape:
+            buffer = self._buffers[self._next] = np.empty_like(image)
+        self._next = (self._next + 1) % len(self._buffers)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=buffer)
+
+
+class CaptureThread(threading.Thread):
+    """Reads and mirrors webcam frames into the ring as fast as the camera delivers them."""
+
+    def __init__(self, cap, ring, meter):
+        super().__init__(name="capture", daemon=True)
+        self.cap = cap
+        self.ring = ring
+        self.meter = meter
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        index = 0
+        try:
+            while not self._stop_event.is_set():
+                ret, image = self.cap.read()
+                if not ret:
+                    self.error = "Could not read frame"
+                    break
+                self.ring.put(Frame(index, cv2.flip(image, 1), time.monotonic()))
+                self.meter.tick()
+                index += 1
+        finally:
+            self.ring.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=2)
+
+
+class InferenceThread(threading.Thread):
+    """
+    Feeds the newest frames to a LIVE_STREAM landmarker leased from `pool` (a
+    `models.DetectorPool`); results arrive on MediaPipe's callback thread.
+    """
+
+    def __init__(self, pool, ring, meter, max_in_flight=1, stall_timeout=1.0):
+        super().__init__(name="inference", daemon=True)
+        self.ring = ring
+        self.meter = meter
+        self.max_in_flight = max_in_flight
+        self.stall_timeout = stall_timeout
+        self._stop_event = threading.Event()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._pending = {}  # timestamp_ms -> Frame
+        self._latest = None
+        self._last_timestamp = -1
+        self._rgb = RgbBuffers(max_in_flight + 1)
+
+        self.pool = pool
+        self.detector = self._create_detector(pool)
+
+    def _create_detector(self, pool):
+        detector = pool.acquire(vision.RunningMode.LIVE_STREAM)
+        detector.on_result = self._on_result
+        return detector
+
+    def _release_detector(self):
+        self.pool.release(self.detector)
+
+    def _on_result(self, result, output_image, timestamp_ms):
+        with self._cond:
+            frame = self._pending.pop(timestamp_ms, None)
+            if frame is not None:
+                self._latest = Detection(frame, result, time.monotonic())
+            self._in_flight = max(0, self._in_flight - 1)
+            self._cond.notify_all()
+        self.meter.tick()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            with self._cond:
+                if not self._cond.wait_for(lambda: self._in_flight < self.max_in_flight, self.stall_timeout):
+                    # MediaPipe may drop a frame without calling back; reclaim its slot.
+                    self._in_flight = 0
+                    self._pending.clear()
+
+            frame = self.ring.get(timeout=0.1)
+            if frame is None:
+                if self.ring.closed:
+                    break
+                continue
+
+            # LIVE_STREAM timestamps must strictly increase.
+            timestamp_ms = max(int(frame.captured_at * 1000), self._last_timestamp + 1)
+            self._last_timestamp = timestamp_ms
+            with self._cond:
+                self._pending[timestamp_ms] = frame
+                self._in_flight += 1
+            rgb_frame = self._rgb.convert(frame.image)
+            self.detector.detect_async(mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame), timestamp_ms)
+
+    def take_latest(self):
+        """The newest detection not yet taken, or None."""
+        with self._cond:
+            detection, self._latest = self._latest, None
+            return detection
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=2)
+        self._release_detector()